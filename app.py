@@ -1,5 +1,8 @@
-from flask import Flask, redirect, url_for
+from flask import Flask, redirect, url_for, session, jsonify
 from config import Config
+from db.connection import estatisticas_pool
+from db import broker
+from utils.progresso_depara import iniciar_reconciliacao_periodica, reconciliar_todos
 import sys
 import os
 
@@ -69,6 +72,9 @@ app = Flask(__name__)
 app.config.from_object(Config)
 app.secret_key = app.config.get("SECRET_KEY", "chave-secreta-padrao")
 
+# Uma conexão por banco durante toda a requisição, liberada no teardown
+broker.init_app(app)
+
 # Registrar os blueprints - AUTH PRIMEIRO
 app.register_blueprint(auth_bp, url_prefix="/auth")
 
@@ -152,10 +158,27 @@ def debug_endpoints():
     return json.dumps(endpoints, indent=2)
 
 
+@app.route("/debug-pool")
+def debug_pool():
+    if "usuario" not in session or not session["usuario"].get("adm"):
+        return jsonify({"success": False, "message": "Acesso não autorizado"}), 403
+    return jsonify(estatisticas_pool())
+
+
 @app.route("/")
 def index():
     return redirect(url_for("auth.login"))
 
 
+@app.cli.command("reconciliar-progresso")
+def reconciliar_progresso_cli():
+    """Reconcilia uma vez o resumo de progresso de todos os projetos (para agendadores)"""
+    print(f"Linhas do resumo corrigidas: {reconciliar_todos(app)}")
+
+
 if __name__ == "__main__":
+    # Com o reloader do modo debug o processo pai só vigia os arquivos: a thread fica no filho
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        # Corrige periodicamente o resumo de progresso do dashboard (PROGRESSO_RECONCILIAR_INTERVALO)
+        iniciar_reconciliacao_periodica(app)
     app.run(debug=True, port=5000)
\ No newline at end of file
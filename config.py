@@ -16,7 +16,49 @@ class Config:
     DB2_USER = os.getenv("DB2_USER", "sa")
     DB2_PASSWORD = os.getenv("DB2_PASSWORD", "sua_senha")
     DB2_TIMEOUT = int(os.getenv("DB2_TIMEOUT", "30"))
-    
+
+    # Pool de conexões (compartilhado entre DB1 e os bancos de projeto)
+    DB_POOL_ENABLED = os.getenv("DB_POOL_ENABLED", "true").lower() in ("1", "true", "sim")
+    DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))  # por banco
+    DB_POOL_MAX_TOTAL = int(os.getenv("DB_POOL_MAX_TOTAL", "50"))  # todos os bancos
+    DB_POOL_IDLE_TIMEOUT = int(os.getenv("DB_POOL_IDLE_TIMEOUT", "300"))  # segundos
+    DB_POOL_PING_INTERVAL = int(os.getenv("DB_POOL_PING_INTERVAL", "30"))  # segundos
+    DB_POOL_WAIT_TIMEOUT = int(os.getenv("DB_POOL_WAIT_TIMEOUT", "15"))  # segundos
+
+    # Cache dos metadados de projeto (BancoHomo/DadosGX) lidos do DB1
+    PROJETO_CACHE_TTL = int(os.getenv("PROJETO_CACHE_TTL", "300"))  # segundos
+
+    # Catálogos WF em memória: intervalo mínimo entre as sondas de alteração
+    CATALOGO_WF_PROBE_INTERVAL = int(os.getenv("CATALOGO_WF_PROBE_INTERVAL", "10"))  # segundos
+
+    # Resumo de progresso (ProgressoDePara): intervalo da reconciliação com as tabelas; 0 desativa.
+    # A thread só roda com python app.py; atrás de um servidor WSGI com vários processos,
+    # agende "flask --app app reconciliar-progresso" (uma execução por vez)
+    PROGRESSO_RECONCILIAR_INTERVALO = int(os.getenv("PROGRESSO_RECONCILIAR_INTERVALO", "86400"))  # segundos
+
+    # Importação de planilhas: linhas por lote e leitor (auto usa python-calamine se instalado)
+    IMPORTACAO_LOTE = int(os.getenv("IMPORTACAO_LOTE", "5000"))
+    IMPORTACAO_LEITOR = os.getenv("IMPORTACAO_LEITOR", "auto")  # auto | calamine | openpyxl
+
+    # Validação de arquivos de layout (envio de arquivo): linhas lidas por bloco e quantos
+    # erros são guardados com detalhe (os demais só entram na contagem); 0 = sem limite
+    VALIDACAO_LOTE = int(os.getenv("VALIDACAO_LOTE", "50000"))
+    VALIDACAO_MAX_ERROS = int(os.getenv("VALIDACAO_MAX_ERROS", "100000"))
+    # Processos que validam os blocos em paralelo; 0 ou 1 valida no próprio processo
+    VALIDACAO_PROCESSOS = int(os.getenv("VALIDACAO_PROCESSOS", "0"))
+    # Textos dos blocos em colunas Arrow (string[pyarrow]) em vez de objetos str do Python:
+    # menos memória e operações de texto mais rápidas; só vale com o pyarrow instalado
+    VALIDACAO_TEXTO_ARROW = os.getenv("VALIDACAO_TEXTO_ARROW", "true").lower() in ("1", "true", "sim")
+    # Uploads validados em segundo plano: quantos ao mesmo tempo e por quanto tempo a
+    # tarefa concluída (com o resultado) fica disponível
+    ENVIO_CONCORRENCIA = int(os.getenv("ENVIO_CONCORRENCIA", "2"))
+    ENVIO_TAREFA_TTL = int(os.getenv("ENVIO_TAREFA_TTL", "3600"))  # segundos
+    # Resultados da validação em disco (vazio = UPLOAD_FOLDER/resultados_validacao),
+    # compartilhados entre os processos: validade e tamanho máximo da pasta
+    RESULTADOS_PASTA = os.getenv("RESULTADOS_PASTA", "")
+    RESULTADOS_TTL = int(os.getenv("RESULTADOS_TTL", "3600"))  # segundos
+    RESULTADOS_MAX_MB = int(os.getenv("RESULTADOS_MAX_MB", "512"))
+
     # Outras configurações
     SECRET_KEY = os.getenv("SECRET_KEY", "chave-secreta-padrao")
     UPLOAD_FOLDER = os.getenv("UPLOAD_FOLDER", "uploads")
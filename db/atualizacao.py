@@ -0,0 +1,169 @@
+from logger import logger
+from utils.progresso_depara import DeltaProgresso
+
+# Limite de parâmetros por comando (o SQL Server aceita até 2100)
+_MAX_PARAMETROS = 2000
+
+
+def atualizar_campos_em_lote(cursor, tabela, updates, colunas_permitidas, derivados=None,
+                             validar=None, chave="id"):
+    """
+    Aplica a lista `updates` ([{id, field, value}, ...]) do grid agrupando por campo.
+
+    Atribuições do mesmo valor a vários ids viram um único UPDATE ... WHERE id IN (...);
+    as demais vão num executemany por campo. A existência dos ids é conferida com um
+    SELECT só, mantendo o resultado por item do loop antigo.
+
+    colunas_permitidas: campos editáveis; None aceita qualquer coluna da tabela menos a chave
+    derivados(field, value): dict opcional de colunas extras gravadas nos mesmos ids
+        (ex.: a descrição WF quando o código muda, ver descricao_automatica)
+    validar(field, value): quando devolve False o item é contado como erro
+
+    Retorna (success_count, error_count, error_messages); não faz commit.
+    """
+    success_count = 0
+    error_count = 0
+    error_messages = []
+
+    if colunas_permitidas is None:
+        colunas_permitidas = _colunas_tabela(cursor, tabela, chave)
+
+    itens = []
+    for update in updates:
+        record_id = update.get('id')
+        field = update.get('field')
+        value = update.get('value')
+
+        if not record_id or not field:
+            error_count += 1
+            error_messages.append(f"ID ou campo não fornecidos para atualização: {update}")
+            continue
+        if field not in colunas_permitidas:
+            error_count += 1
+            error_messages.append(f"Campo não permitido para edição: {field}")
+            continue
+        if validar and not validar(field, value):
+            error_count += 1
+            continue
+        itens.append((record_id, field, value))
+
+    if not itens:
+        return success_count, error_count, error_messages
+
+    existentes = _ids_existentes(cursor, tabela, chave, {str(item[0]) for item in itens})
+
+    # (campo, id) -> [valor, record_id, itens que dependem da atribuição]; a última edição vale
+    atribuicoes = {}
+    extras_cache = {}
+    for record_id, field, value in itens:
+        id_texto = str(record_id)
+        if id_texto not in existentes:
+            error_count += 1
+            error_messages.append(f"Registro não encontrado: {record_id}")
+            continue
+
+        success_count += 1
+        colunas = {field: value}
+        if derivados:
+            chave_extra = (field, value)
+            if chave_extra not in extras_cache:
+                extras_cache[chave_extra] = derivados(field, value) or {}
+            colunas.update(extras_cache[chave_extra])
+
+        for coluna, valor in colunas.items():
+            anterior = atribuicoes.get((coluna, id_texto))
+            itens_dependentes = (anterior[2] if anterior else 0) + 1
+            atribuicoes[(coluna, id_texto)] = [valor, record_id, itens_dependentes]
+
+    # campo -> valor -> [(id_texto, record_id, itens)]
+    por_campo = {}
+    for (coluna, id_texto), (valor, record_id, n) in atribuicoes.items():
+        por_campo.setdefault(coluna, {}).setdefault(valor, []).append((id_texto, record_id, n))
+
+    delta_progresso = DeltaProgresso(
+        cursor, tabela, list({id_texto for _, id_texto in atribuicoes}), set(por_campo), chave=chave
+    )
+
+    for coluna, por_valor in por_campo.items():
+        individuais = []
+        for valor, alvos in por_valor.items():
+            if len(alvos) == 1:
+                individuais.append((valor, alvos[0]))
+                continue
+            for i in range(0, len(alvos), _MAX_PARAMETROS):
+                parte = alvos[i:i + _MAX_PARAMETROS]
+                try:
+                    cursor.execute(
+                        f"UPDATE {tabela} SET [{coluna}] = ? WHERE [{chave}] IN ({', '.join('?' * len(parte))})",
+                        [valor] + [alvo[0] for alvo in parte],
+                    )
+                except Exception as e:
+                    logger.warning(f"UPDATE agrupado de {tabela}.{coluna} falhou, repetindo por registro: {str(e)}")
+                    individuais.extend((valor, alvo) for alvo in parte)
+
+        if not individuais:
+            continue
+        query = f"UPDATE {tabela} SET [{coluna}] = ? WHERE [{chave}] = ?"
+        try:
+            cursor.fast_executemany = True
+            cursor.executemany(query, [(valor, alvo[0]) for valor, alvo in individuais])
+            continue
+        except Exception as e:
+            logger.warning(f"executemany em {tabela}.{coluna} falhou, repetindo por registro: {str(e)}")
+        finally:
+            cursor.fast_executemany = False
+
+        # Repetição linha a linha só para isolar os itens com erro
+        for valor, (id_texto, record_id, n) in individuais:
+            try:
+                cursor.execute(query, (valor, id_texto))
+            except Exception as e:
+                success_count -= n
+                error_count += n
+                error_messages.append(f"Erro ao atualizar {record_id}: {str(e)}")
+
+    delta_progresso.aplicar()
+    logger.info(
+        f"update_batch em {tabela}: {len(itens)} itens, {len(atribuicoes)} atribuições em "
+        f"{len(por_campo)} campos"
+    )
+    return success_count, error_count, error_messages
+
+
+def descricao_automatica(campo_codigo, campo_descricao, obter_descricao):
+    """
+    Monta o `derivados` que grava em campo_descricao a descrição WF do código informado
+    (ignorando vazio e 'S/DePara'), como o grid faz ao trocar o código.
+    """
+    def derivados(field, value):
+        if field != campo_codigo or not value or value == 'S/DePara':
+            return None
+        descricao = obter_descricao(value)
+        if descricao:
+            logger.info(f"Descrição atualizada automaticamente para o código {value}: {descricao}")
+            return {campo_descricao: descricao}
+        return None
+    return derivados
+
+
+def _colunas_tabela(cursor, tabela, chave):
+    """Colunas da tabela, exceto a chave"""
+    cursor.execute(
+        "SELECT COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS WHERE TABLE_NAME = ?",
+        (tabela,),
+    )
+    return {linha[0] for linha in cursor.fetchall() if linha[0].lower() != chave.lower()}
+
+
+def _ids_existentes(cursor, tabela, chave, ids):
+    """Retorna, como texto, os ids de `ids` que existem na tabela"""
+    ids = list(ids)
+    existentes = set()
+    for i in range(0, len(ids), _MAX_PARAMETROS):
+        parte = ids[i:i + _MAX_PARAMETROS]
+        cursor.execute(
+            f"SELECT [{chave}] FROM {tabela} WHERE [{chave}] IN ({', '.join('?' * len(parte))})",
+            parte,
+        )
+        existentes.update(str(linha[0]) for linha in cursor.fetchall())
+    return existentes
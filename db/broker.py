@@ -0,0 +1,87 @@
+from flask import g, has_app_context, session
+from config import Config
+from db.connection import conectar_banco, conectar_segunda_base
+from logger import logger
+
+
+class ConexaoRequisicao:
+    """
+    Conexão compartilhada durante a requisição.
+    close() não faz nada: a conexão só é liberada no teardown_appcontext.
+    """
+
+    def __init__(self, conexao):
+        self._conexao = conexao
+
+    def __getattr__(self, nome):
+        return getattr(self._conexao, nome)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self._conexao.commit()
+        else:
+            self._conexao.rollback()
+
+    def close(self):
+        pass
+
+
+def _conexao_da_requisicao(servidor, banco, abrir):
+    """Devolve a conexão de (servidor, banco) já aberta nesta requisição, ou abre uma"""
+    if not has_app_context():
+        # Fora de uma requisição (scripts, jobs) cada chamada tem a sua conexão
+        return abrir()
+
+    conexoes = g.setdefault("_conexoes_requisicao", {})
+    chave = (servidor, banco)
+    conexao = conexoes.get(chave)
+    if conexao is None:
+        conexao = abrir()
+        if conexao is None:
+            return None
+        conexoes[chave] = conexao
+    return ConexaoRequisicao(conexao)
+
+
+def conexao_controle():
+    """Banco de controle (DB1: usuários, projetos, escopos)"""
+    return _conexao_da_requisicao(Config.DB1_SERVER, Config.DB1_NAME, conectar_banco)
+
+
+def conexao_projeto(banco_usuario=None):
+    """Banco do projeto (DadosGX); sem argumento usa o projeto selecionado na sessão"""
+    if banco_usuario is None:
+        banco_usuario = session.get("projeto_selecionado", {}).get("DadosGX")
+    if not banco_usuario:
+        return None
+    return _conexao_da_requisicao(
+        Config.DB2_SERVER, banco_usuario, lambda: conectar_segunda_base(banco_usuario)
+    )
+
+
+def conexao_homologacao(banco_homo):
+    """Banco homólogo (BancoHomo) com as tabelas WF"""
+    if not banco_homo:
+        return None
+    return _conexao_da_requisicao(
+        Config.DB2_SERVER, banco_homo, lambda: conectar_segunda_base(banco_homo)
+    )
+
+
+def liberar_conexoes_requisicao(exc=None):
+    """Fecha (devolve ao pool) todas as conexões abertas durante a requisição"""
+    conexoes = g.pop("_conexoes_requisicao", None)
+    if not conexoes:
+        return
+    for (_, banco), conexao in conexoes.items():
+        try:
+            conexao.close()
+        except Exception as e:
+            logger.error(f"Erro ao liberar conexão com {banco}: {e}")
+
+
+def init_app(app):
+    app.teardown_appcontext(liberar_conexoes_requisicao)
@@ -2,17 +2,38 @@ import pyodbc
 from config import Config
 from logger import logger
 from flask import session
+from db.pool import ConnectionPool
+
+# Pool compartilhado por todos os helpers abaixo, indexado por (servidor, banco)
+pool = ConnectionPool(
+    max_por_banco=Config.DB_POOL_MAX_SIZE,
+    max_total=Config.DB_POOL_MAX_TOTAL,
+    ocioso_segundos=Config.DB_POOL_IDLE_TIMEOUT,
+    ping_segundos=Config.DB_POOL_PING_INTERVAL,
+    espera_segundos=Config.DB_POOL_WAIT_TIMEOUT,
+)
+
+def _abrir(servidor, banco, fabrica):
+    """Abre a conexão pelo pool (ou direto, se o pool estiver desativado)"""
+    if not Config.DB_POOL_ENABLED:
+        return fabrica()
+    return pool.obter((servidor, banco), fabrica)
 
 def conectar_banco():
     """Conecta ao banco de dados principal (autenticação)"""
     try:
-        return pyodbc.connect(
-            Driver="{ODBC Driver 17 for SQL Server}",
-            Server=Config.DB1_SERVER,
-            Database=Config.DB1_NAME,
-            UID=Config.DB1_USER,
-            PWD=Config.DB1_PASSWORD,
-            timeout=Config.DB1_TIMEOUT,
+        return _abrir(
+            Config.DB1_SERVER,
+            Config.DB1_NAME,
+            lambda: pyodbc.connect(
+                Driver="{ODBC Driver 17 for SQL Server}",
+                Server=Config.DB1_SERVER,
+                Database=Config.DB1_NAME,
+                UID=Config.DB1_USER,
+                PWD=Config.DB1_PASSWORD,
+                timeout=Config.DB1_TIMEOUT,
+                MARS_Connection="yes",
+            ),
         )
     except Exception as e:
         logger.error(f"Erro de conexão: {e}")
@@ -32,12 +53,13 @@ def conectar_usuario():
     try:
         conn_str = (
             f"DRIVER={{ODBC Driver 17 for SQL Server}};"
-            f"SERVER={Config.DB2_SERVER};"  
+            f"SERVER={Config.DB2_SERVER};"
             f"DATABASE={banco};"
             f"UID={Config.DB2_USER};"
-            f"PWD={Config.DB2_PASSWORD}"
+            f"PWD={Config.DB2_PASSWORD};"
+            f"MARS_Connection=yes"
         )
-        return pyodbc.connect(conn_str)
+        return _abrir(Config.DB2_SERVER, banco, lambda: pyodbc.connect(conn_str))
     except Exception as e:
         logger.error(f"Erro na conexão com banco do usuário: {e}")
         return None
@@ -45,14 +67,25 @@ def conectar_usuario():
 def conectar_segunda_base(banco_nome):
     """Conecta a um banco específico"""
     try:
-        return pyodbc.connect(
-            Driver="{ODBC Driver 17 for SQL Server}",
-            Server=Config.DB2_SERVER,
-            Database=banco_nome,
-            UID=Config.DB2_USER,
-            PWD=Config.DB2_PASSWORD,
-            timeout=Config.DB2_TIMEOUT,
+        return _abrir(
+            Config.DB2_SERVER,
+            banco_nome,
+            lambda: pyodbc.connect(
+                Driver="{ODBC Driver 17 for SQL Server}",
+                Server=Config.DB2_SERVER,
+                Database=banco_nome,
+                UID=Config.DB2_USER,
+                PWD=Config.DB2_PASSWORD,
+                timeout=Config.DB2_TIMEOUT,
+                MARS_Connection="yes",
+            ),
         )
     except Exception as e:
         logger.error(f"Erro ao conectar base {banco_nome}: {e}")
-        return None
\ No newline at end of file
+        return None
+
+def estatisticas_pool():
+    """Retorna os contadores do pool de conexões"""
+    if not Config.DB_POOL_ENABLED:
+        return {"ativo": False}
+    return {"ativo": True, **pool.estatisticas()}
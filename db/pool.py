@@ -0,0 +1,268 @@
+import threading
+import time
+from collections import deque
+from logger import logger
+
+
+class PoolEsgotadoError(Exception):
+    """Nenhuma conexão ficou disponível dentro do tempo de espera do pool."""
+
+
+class PooledConnection:
+    """
+    Conexão emprestada do pool.
+    Repassa tudo para a conexão pyodbc original; close() devolve ao pool em vez de fechar.
+    """
+
+    def __init__(self, pool, chave, conexao):
+        self._pool = pool
+        self._chave = chave
+        self._conexao = conexao
+
+    def __getattr__(self, nome):
+        conexao = self.__dict__.get("_conexao")
+        if conexao is None:
+            raise AttributeError(f"Conexão já devolvida ao pool: {nome}")
+        return getattr(conexao, nome)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Mesmo comportamento do pyodbc: commit no sucesso, rollback no erro, sem fechar
+        if self._conexao is None:
+            return
+        if exc_type is None:
+            self._conexao.commit()
+        else:
+            self._conexao.rollback()
+
+    @property
+    def closed(self):
+        return self._conexao is None
+
+    def close(self):
+        """Devolve a conexão ao pool (idempotente)"""
+        conexao, self._conexao = self._conexao, None
+        if conexao is not None:
+            self._pool.devolver(self._chave, conexao)
+
+    def invalidar(self):
+        """Descarta a conexão física em vez de devolvê-la (ex.: após erro de comunicação)"""
+        conexao, self._conexao = self._conexao, None
+        if conexao is not None:
+            self._pool.devolver(self._chave, conexao, reutilizavel=False)
+
+    def __del__(self):
+        # Rotas que esquecem de chamar close() não podem prender a vaga no pool
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+class ConnectionPool:
+    """
+    Pool de conexões pyodbc indexado por (servidor, banco).
+
+    - max_por_banco: conexões abertas (em uso + ociosas) por banco
+    - max_total: teto global somando todos os bancos de projeto
+    - ocioso_segundos: conexões paradas há mais tempo que isso são fechadas
+    - ping_segundos: conexões ociosas há mais tempo que isso passam por um SELECT 1 antes do empréstimo
+    - espera_segundos: tempo máximo aguardando uma vaga antes de PoolEsgotadoError
+    """
+
+    def __init__(self, max_por_banco=10, max_total=50, ocioso_segundos=300,
+                 ping_segundos=30, espera_segundos=15):
+        self.max_por_banco = max_por_banco
+        self.max_total = max_total
+        self.ocioso_segundos = ocioso_segundos
+        self.ping_segundos = ping_segundos
+        self.espera_segundos = espera_segundos
+
+        self._cond = threading.Condition()
+        self._ociosas = {}
+        self._em_uso = {}
+        self._total = 0
+        self._contadores = {
+            "criadas": 0,
+            "reutilizadas": 0,
+            "fechadas_ociosas": 0,
+            "descartadas": 0,
+            "falhas_ping": 0,
+            "esperas": 0,
+            "timeouts": 0,
+        }
+
+    def obter(self, chave, fabrica):
+        """Empresta uma conexão para a chave, reaproveitando uma ociosa ou abrindo via fabrica()"""
+        prazo = time.monotonic() + self.espera_segundos
+        conexao = None
+        devolvida_em = None
+
+        with self._cond:
+            esperou = False
+            while True:
+                self._expirar_ociosas()
+                fila = self._ociosas.get(chave)
+                if fila:
+                    # LIFO: a conexão usada mais recentemente tem menos chance de ter caído
+                    conexao, devolvida_em = fila.pop()
+                    self._em_uso[chave] = self._em_uso.get(chave, 0) + 1
+                    self._contadores["reutilizadas"] += 1
+                    break
+
+                if self._abertas(chave) < self.max_por_banco:
+                    if self._total < self.max_total or self._liberar_ociosa_de_outro_banco(chave):
+                        # Reserva a vaga; a conexão é aberta fora do lock
+                        self._em_uso[chave] = self._em_uso.get(chave, 0) + 1
+                        self._total += 1
+                        break
+
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    self._contadores["timeouts"] += 1
+                    raise PoolEsgotadoError(
+                        f"Pool sem conexões livres para {chave[1]} "
+                        f"(por banco: {self.max_por_banco}, total: {self.max_total})"
+                    )
+                if not esperou:
+                    self._contadores["esperas"] += 1
+                    esperou = True
+                self._cond.wait(restante)
+
+        if conexao is not None and not self._conexao_viva(conexao, devolvida_em):
+            self._fechar_silenciosamente(conexao)
+            conexao = None
+            with self._cond:
+                self._contadores["falhas_ping"] += 1
+
+        if conexao is None:
+            try:
+                conexao = fabrica()
+            except Exception:
+                with self._cond:
+                    self._liberar_vaga(chave)
+                raise
+            with self._cond:
+                self._contadores["criadas"] += 1
+
+        return PooledConnection(self, chave, conexao)
+
+    def devolver(self, chave, conexao, reutilizavel=True):
+        """Recebe de volta uma conexão emprestada; transações pendentes são desfeitas"""
+        if reutilizavel:
+            try:
+                conexao.rollback()
+            except Exception as e:
+                logger.warning(f"Conexão com {chave[1]} descartada ao voltar para o pool: {e}")
+                reutilizavel = False
+
+        with self._cond:
+            self._em_uso[chave] = max(self._em_uso.get(chave, 0) - 1, 0)
+            if reutilizavel:
+                self._ociosas.setdefault(chave, deque()).append((conexao, time.monotonic()))
+            else:
+                self._total -= 1
+                self._contadores["descartadas"] += 1
+            self._cond.notify()
+
+        if not reutilizavel:
+            self._fechar_silenciosamente(conexao)
+
+    def limpar_ociosas(self):
+        """Fecha as conexões ociosas que passaram de ocioso_segundos"""
+        with self._cond:
+            self._expirar_ociosas()
+
+    def fechar_todas(self):
+        """Fecha todas as conexões ociosas (as emprestadas são fechadas ao voltar)"""
+        with self._cond:
+            para_fechar = [conexao for fila in self._ociosas.values() for conexao, _ in fila]
+            self._total -= len(para_fechar)
+            self._ociosas.clear()
+            self._cond.notify_all()
+        for conexao in para_fechar:
+            self._fechar_silenciosamente(conexao)
+
+    def estatisticas(self):
+        """Retorna um retrato do pool para monitoramento"""
+        with self._cond:
+            bancos = {}
+            for chave in set(self._ociosas) | set(self._em_uso):
+                em_uso = self._em_uso.get(chave, 0)
+                ociosas = len(self._ociosas.get(chave, ()))
+                if em_uso or ociosas:
+                    bancos[f"{chave[0]}/{chave[1]}"] = {"em_uso": em_uso, "ociosas": ociosas}
+            return {
+                "max_por_banco": self.max_por_banco,
+                "max_total": self.max_total,
+                "abertas": self._total,
+                "em_uso": sum(self._em_uso.values()),
+                "ociosas": sum(len(fila) for fila in self._ociosas.values()),
+                "bancos": bancos,
+                **self._contadores,
+            }
+
+    # Os métodos abaixo assumem que self._cond já está adquirido
+
+    def _abertas(self, chave):
+        return self._em_uso.get(chave, 0) + len(self._ociosas.get(chave, ()))
+
+    def _liberar_vaga(self, chave):
+        self._em_uso[chave] = max(self._em_uso.get(chave, 0) - 1, 0)
+        self._total -= 1
+        self._cond.notify()
+
+    def _expirar_ociosas(self):
+        limite = time.monotonic() - self.ocioso_segundos
+        expiradas = []
+        for chave, fila in list(self._ociosas.items()):
+            # A fila é ordenada pela devolução: as mais antigas ficam à esquerda
+            while fila and fila[0][1] < limite:
+                expiradas.append(fila.popleft()[0])
+            if not fila:
+                del self._ociosas[chave]
+        if expiradas:
+            self._total -= len(expiradas)
+            self._contadores["fechadas_ociosas"] += len(expiradas)
+            self._cond.notify_all()
+            for conexao in expiradas:
+                self._fechar_silenciosamente(conexao)
+
+    def _liberar_ociosa_de_outro_banco(self, chave):
+        """No teto global, fecha a conexão ociosa mais antiga de outro banco para abrir espaço"""
+        candidata = None
+        for outra_chave, fila in self._ociosas.items():
+            if outra_chave != chave and fila:
+                if candidata is None or fila[0][1] < self._ociosas[candidata][0][1]:
+                    candidata = outra_chave
+        if candidata is None:
+            return False
+        conexao, _ = self._ociosas[candidata].popleft()
+        if not self._ociosas[candidata]:
+            del self._ociosas[candidata]
+        self._total -= 1
+        self._contadores["fechadas_ociosas"] += 1
+        self._fechar_silenciosamente(conexao)
+        return True
+
+    def _conexao_viva(self, conexao, devolvida_em):
+        if devolvida_em is not None and time.monotonic() - devolvida_em < self.ping_segundos:
+            return True
+        try:
+            cursor = conexao.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except Exception as e:
+            logger.warning(f"Conexão ociosa não respondeu ao ping e será reaberta: {e}")
+            return False
+
+    @staticmethod
+    def _fechar_silenciosamente(conexao):
+        try:
+            conexao.close()
+        except Exception:
+            pass
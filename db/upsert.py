@@ -0,0 +1,182 @@
+import datetime
+import math
+from logger import logger
+from utils.progresso_depara import recalcular_tabela
+
+_STAGING = "#CargaDePara"
+
+
+def _valor_staging(valor):
+    """Normaliza o valor para a coluna NVARCHAR da staging (o SQL Server converte no MERGE)"""
+    if valor is None:
+        return None
+    if isinstance(valor, float):
+        if math.isnan(valor):
+            return None
+        if valor.is_integer():
+            return str(int(valor))
+    if isinstance(valor, bool):
+        return "1" if valor else "0"
+    if isinstance(valor, datetime.datetime):
+        return valor.isoformat(sep=" ")
+    if isinstance(valor, str):
+        return valor
+    return str(valor)
+
+
+class UpsertEmMassa:
+    """
+    UPDATE/INSERT de muitas linhas numa tabela DePara com um único MERGE.
+
+    As linhas são enviadas em lotes (fast_executemany) para uma tabela temporária e
+    aplicadas de uma vez em aplicar(), que devolve (atualizados, inseridos) contando
+    chaves distintas, como faziam os loops linha a linha. Chaves repetidas no arquivo
+    valem pela última ocorrência e contam como atualização, igual ao loop antigo.
+
+    colunas: colunas gravadas (devem incluir `chave`)
+    atualizar: colunas alteradas no UPDATE (padrão: todas menos a chave)
+    inserir: colunas usadas no INSERT (padrão: todas; vazio = só atualiza)
+    preservar_se_nulo: no UPDATE, NULL no arquivo mantém o valor atual
+    exigir_na_insercao: linhas novas sem essas colunas preenchidas não são inseridas
+    chave_destino: expressão SQL da chave no destino (alias d), ex. "LTRIM(RTRIM(d.prof_cd))"
+    inserir_sem_chave: linhas sem chave são inseridas direto, sem a coluna chave (padrão: ignoradas)
+    """
+
+    def __init__(self, cursor, tabela, colunas, chave="id", atualizar=None, inserir=None,
+                 preservar_se_nulo=(), exigir_na_insercao=(), chave_destino=None,
+                 inserir_sem_chave=False, lote=5000):
+        if chave not in colunas:
+            raise ValueError(f"A chave {chave} precisa estar entre as colunas")
+        self.cursor = cursor
+        self.tabela = tabela
+        self.colunas = list(colunas)
+        self.chave = chave
+        self.atualizar = [c for c in (atualizar or self.colunas) if c != chave]
+        self.inserir = list(self.colunas if inserir is None else inserir)
+        self.preservar_se_nulo = set(preservar_se_nulo)
+        self.exigir_na_insercao = list(exigir_na_insercao)
+        self.chave_destino = chave_destino or f"d.{chave}"
+        self.inserir_sem_chave = inserir_sem_chave
+        self.lote = lote
+        self.repetidas = 0
+        self._indice_chave = self.colunas.index(chave)
+        self._chaves = set()
+        self._sem_chave = []
+        self._inserir_sem_chave = [c for c in self.inserir if c != chave]
+        self._criada = False
+
+    def _criar_staging(self):
+        self.cursor.execute(f"IF OBJECT_ID('tempdb..{_STAGING}') IS NOT NULL DROP TABLE {_STAGING}")
+        definicoes = ", ".join(
+            f"[{c}] NVARCHAR(4000) COLLATE DATABASE_DEFAULT NULL" for c in self.colunas
+        )
+        self.cursor.execute(f"CREATE TABLE {_STAGING} ({definicoes})")
+        self.cursor.fast_executemany = True
+        self._criada = True
+
+    def adicionar(self, registros):
+        """Envia registros (dicts ou sequências na ordem de `colunas`) para a staging"""
+        if not self._criada:
+            self._criar_staging()
+
+        lote = {}
+        for registro in registros:
+            if isinstance(registro, dict):
+                valores = [_valor_staging(registro.get(c)) for c in self.colunas]
+            else:
+                valores = [_valor_staging(v) for v in registro]
+            chave = valores[self._indice_chave]
+            if chave is None:
+                if self.inserir_sem_chave:
+                    self._sem_chave.append([valores[self.colunas.index(c)] for c in self._inserir_sem_chave])
+                continue
+            if chave in lote:
+                self.repetidas += 1
+            lote[chave] = valores
+            if len(lote) >= self.lote:
+                self._enviar(lote)
+                lote = {}
+        if lote:
+            self._enviar(lote)
+
+    def _enviar(self, lote):
+        # Chaves já enviadas em lotes anteriores: a última ocorrência prevalece
+        anteriores = [chave for chave in lote if chave in self._chaves]
+        if anteriores:
+            self.repetidas += len(anteriores)
+            for i in range(0, len(anteriores), 1000):
+                parte = anteriores[i:i + 1000]
+                self.cursor.execute(
+                    f"DELETE FROM {_STAGING} WHERE [{self.chave}] IN ({', '.join('?' * len(parte))})",
+                    parte,
+                )
+        self._chaves.update(lote)
+        self.cursor.executemany(
+            f"INSERT INTO {_STAGING} ({', '.join(f'[{c}]' for c in self.colunas)}) "
+            f"VALUES ({', '.join('?' * len(self.colunas))})",
+            list(lote.values()),
+        )
+
+    def _sql_merge(self):
+        atribuicoes = ", ".join(
+            f"d.[{c}] = COALESCE(s.[{c}], d.[{c}])" if c in self.preservar_se_nulo else f"d.[{c}] = s.[{c}]"
+            for c in self.atualizar
+        )
+        condicao_insercao = "".join(f" AND s.[{c}] IS NOT NULL" for c in self.exigir_na_insercao)
+        colunas_insercao = ", ".join(f"[{c}]" for c in self.inserir)
+        valores_insercao = ", ".join(f"s.[{c}]" for c in self.inserir)
+        quando_existe = f"WHEN MATCHED THEN UPDATE SET {atribuicoes} " if atribuicoes else ""
+        quando_nao_existe = (
+            f"WHEN NOT MATCHED BY TARGET{condicao_insercao} THEN "
+            f"INSERT ({colunas_insercao}) VALUES ({valores_insercao}) "
+            if self.inserir else ""
+        )
+        return (
+            "SET NOCOUNT ON; "
+            "DECLARE @acoes TABLE (acao NVARCHAR(10), chave NVARCHAR(4000)); "
+            f"MERGE {self.tabela} WITH (HOLDLOCK) AS d "
+            f"USING {_STAGING} AS s ON {self.chave_destino} = s.[{self.chave}] "
+            f"{quando_existe}{quando_nao_existe}"
+            f"OUTPUT $action, s.[{self.chave}] INTO @acoes; "
+            "SELECT COUNT(DISTINCT CASE WHEN acao = 'UPDATE' THEN chave END), "
+            "COUNT(DISTINCT CASE WHEN acao = 'INSERT' THEN chave END) FROM @acoes;"
+        )
+
+    def aplicar(self):
+        """Executa o MERGE e devolve (atualizados, inseridos); não faz commit"""
+        if not self._chaves and not self._sem_chave:
+            return 0, 0
+        try:
+            atualizados, inseridos = 0, 0
+            if self._chaves:
+                self.cursor.execute(self._sql_merge())
+                resultado = self.cursor.fetchone()
+                if resultado:
+                    atualizados, inseridos = resultado[0] or 0, resultado[1] or 0
+            if self._sem_chave:
+                self.cursor.fast_executemany = True
+                self.cursor.executemany(
+                    f"INSERT INTO {self.tabela} ({', '.join(f'[{c}]' for c in self._inserir_sem_chave)}) "
+                    f"VALUES ({', '.join('?' * len(self._inserir_sem_chave))})",
+                    self._sem_chave,
+                )
+                inseridos += len(self._sem_chave)
+            recalcular_tabela(self.cursor, self.tabela)
+            logger.info(
+                f"MERGE em {self.tabela}: {len(self._chaves)} chaves, "
+                f"{atualizados} atualizadas, {inseridos} inseridas, {self.repetidas} repetidas no arquivo"
+            )
+            return atualizados + self.repetidas, inseridos
+        finally:
+            self.cursor.fast_executemany = False
+            try:
+                self.cursor.execute(f"IF OBJECT_ID('tempdb..{_STAGING}') IS NOT NULL DROP TABLE {_STAGING}")
+            except Exception as e:
+                logger.warning(f"Não foi possível remover {_STAGING}: {str(e)}")
+
+
+def upsert_em_massa(cursor, tabela, colunas, registros, **opcoes):
+    """Atalho: envia todos os registros e aplica o MERGE; devolve (atualizados, inseridos)"""
+    carga = UpsertEmMassa(cursor, tabela, colunas, **opcoes)
+    carga.adicionar(registros)
+    return carga.aplicar()
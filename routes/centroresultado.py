@@ -7,154 +7,36 @@ from flask import (
     flash,
     request,
     jsonify,
-    send_file,
 )
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_projeto, conexao_homologacao
+from db.atualizacao import atualizar_campos_em_lote
+from db.upsert import UpsertEmMassa
+from utils.projeto_metadados import obter_banco_homo
+from utils.catalogo_wf import codigos_wf, descricao_wf, atualizar_descricoes_depara
+from utils.progresso_depara import DeltaProgresso
+from utils.grade_depara import resposta_grade, resposta_exportacao_grade
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.excel_utils import PlanilhaEmLotes
+from utils.validacao_importacao import ValidacaoImportacao
+from utils.exportacao_colunar import formato_colunar, resposta_colunar
 from logger import logger
-import pandas as pd
-import io
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
 
 centroresultado_bp = Blueprint("centroresultado", __name__)
 
-def safe_convert_id(value):
-    """Converte valores para inteiro de forma segura"""
-    if value is None:
-        return None
-    try:
-        if isinstance(value, float):
-            return int(value)
-        elif isinstance(value, str):
-            cleaned = value.strip()
-            if cleaned == '':
-                return None
-            return int(float(cleaned))
-        elif isinstance(value, int):
-            return value
-        else:
-            return int(value)
-    except (ValueError, TypeError):
-        raise ValueError(f"Valor não pode ser convertido para inteiro: {value}")
-
-def obter_banco_homo(projeto_id):
-    """Função para obter o BancoHomo diretamente do banco de dados"""
-    try:
-        conn = conectar_banco()
-        if not conn:
-            logger.error("Falha ao conectar ao banco principal para obter BancoHomo")
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT BancoHomo FROM Projeto WHERE ProjetoID = ?", (projeto_id,))
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter BancoHomo: {str(e)}")
-        return None
-
 def obter_codigos_wf(banco_homo):
     """Obtém todos os códigos da tabela CentroResultado do banco homólogo"""
-    try:
-        if not banco_homo:
-            return []
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return []
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT CentroResultado_Codigo FROM CentroResultado")
-        registros = cursor.fetchall()
-        
-        codigos = [str(registro[0]) for registro in registros if registro[0] is not None]
-        
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Encontrados {len(codigos)} códigos na base WF")
-        return codigos
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter códigos WF: {str(e)}")
-        return []
+    return codigos_wf(banco_homo, "CentroResultado")
 
 def obter_descricao_wf(banco_homo, codigo):
     """Obtém a descrição de um código específico da tabela CentroResultado do banco homólogo"""
-    try:
-        if not banco_homo or not codigo:
-            return None
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return None
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT CentroResultado_Descricao FROM CentroResultado WHERE CentroResultado_Codigo = ?", (codigo,))
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conexao.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter descrição WF para código {codigo}: {str(e)}")
-        return None
+    return descricao_wf(banco_homo, "CentroResultado", codigo)
 
 def atualizar_descricoes_apos_importacao(banco_usuario, banco_homo):
     """Atualiza automaticamente as descrições após importação baseado nos códigos WF"""
-    try:
-        if not banco_homo:
-            return
-        
-        conexao = conectar_segunda_base(banco_usuario)
-        if not conexao:
-            logger.error("Falha ao conectar para atualizar descrições")
-            return
-        
-        cursor = conexao.cursor()
-        
-        cursor.execute("""
-            SELECT id, CentroResultado_Codigo, Centroresultado_Descricao 
-            FROM CentroResultado_DePara 
-            WHERE CentroResultado_Codigo IS NOT NULL AND CentroResultado_Codigo != 'S/DePara'
-        """)
-        registros = cursor.fetchall()
-        
-        atualizacoes = 0
-        for registro in registros:
-            id_registro, codigo_wf, descricao_atual = registro
-            descricao_wf = obter_descricao_wf(banco_homo, codigo_wf)
-            
-            if descricao_wf and descricao_wf != descricao_atual:
-                cursor.execute("""
-                    UPDATE CentroResultado_DePara 
-                    SET Centroresultado_Descricao = ? 
-                    WHERE id = ?
-                """, (descricao_wf, id_registro))
-                atualizacoes += 1
-                logger.info(f"Descrição atualizada para código {codigo_wf}: {descricao_wf}")
-        
-        conexao.commit()
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Atualizações automáticas de descrição: {atualizacoes} registros")
-        
-    except Exception as e:
-        logger.error(f"Erro ao atualizar descrições após importação: {str(e)}")
+    return atualizar_descricoes_depara(
+        banco_usuario, banco_homo, "CentroResultado", "CentroResultado_DePara", "CentroResultado_Codigo",
+        {"Centroresultado_Descricao": 0},
+    )
 
 def safe_fetchone(cursor):
     """Função segura para fetchone que evita None is not subscriptable"""
@@ -185,26 +67,21 @@ def index():
         
         logger.info(f"Tentando conectar ao banco: {banco_usuario} para o projeto: {projeto_nome}")
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return render_template('centroresultado.html', 
-                                 registros=[], 
                                  colunas=[], 
                                  projeto_nome=projeto_nome, 
                                  banco_usuario=banco_usuario, 
                                  codigos_wf=[])
         
         cursor = conexao.cursor()
-        cursor.execute("SELECT * FROM CentroResultado_DePara")
-        registros = cursor.fetchall()
+        # Só os nomes das colunas: as linhas vêm do /dados, em páginas
+        cursor.execute("SELECT TOP 0 * FROM CentroResultado_DePara")
         
         colunas = [column[0] for column in cursor.description]
-        
-        registros_dict = [dict(zip(colunas, row)) for row in registros]
-        
-        logger.info(f"Encontrados {len(registros_dict)} registros")
-        
+
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = []
         if banco_homo:
@@ -216,7 +93,6 @@ def index():
         conexao.close()
         
         return render_template('centroresultado.html', 
-                             registros=registros_dict, 
                              colunas=colunas,
                              projeto_nome=projeto_nome,
                              banco_usuario=banco_usuario,
@@ -227,12 +103,17 @@ def index():
         logger.error(f"Erro em centroresultado: {str(e)}")
         flash(f'Erro: {str(e)}', 'error')
         return render_template('centroresultado.html', 
-                             registros=[], 
                              colunas=[], 
                              projeto_nome='N/A', 
                              banco_usuario='N/A', 
                              codigos_wf=[])
 
+@centroresultado_bp.route('/dados')
+def dados():
+    """Página do grid em JSON (paginação por chave, filtros e ordenação no servidor)"""
+    return resposta_grade("CentroResultado_DePara", obter_codigos_wf, linhas="partials/linhas/centroresultado.html")
+
+
 @centroresultado_bp.route('/exportar')
 def exportar():
     try:
@@ -248,7 +129,7 @@ def exportar():
             flash('Banco não configurado para este projeto.', 'error')
             return redirect(url_for('centroresultado.index'))
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return redirect(url_for('centroresultado.index'))
@@ -260,7 +141,6 @@ def exportar():
                    CentroResultado_Codigo, Centroresultado_Descricao, Estrutura_Codigo
             FROM CentroResultado_DePara
         """)
-        registros = cursor.fetchall()
         colunas_originais = [column[0] for column in cursor.description]
         
         mapeamento_colunas = {
@@ -282,70 +162,22 @@ def exportar():
         
         colunas_amigaveis = [mapeamento_colunas.get(col, col) for col in colunas_originais]
         
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, colunas_amigaveis, "CentroResultado_DePara")
+
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        wb = Workbook()
-        
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        ws = wb.create_sheet(title="CentroResultado_DePara")
-        
-        for col_num, coluna in enumerate(colunas_amigaveis, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-        
-        for row_num, registro in enumerate(registros, 2):
-            for col_num, valor in enumerate(registro, 1):
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                if col_num == 12:  # CentroResultado_Codigo
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), colunas_amigaveis, "CentroResultado_DePara",
+            colunas_codigo=[11], codigos_wf=codigos_wf
+        )
+
         cursor.close()
         conexao.close()
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        nome_arquivo = "CentroResultado_DePara.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "CentroResultado_DePara.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar centroresultado: {str(e)}")
@@ -354,85 +186,9 @@ def exportar():
 
 @centroresultado_bp.route('/exportar_filtrados', methods=['POST'])
 def exportar_filtrados():
-    try:
-        data = request.get_json()
-        registros_filtrados = data.get('registros', [])
-        headers = data.get('headers', [])
-        
-        if not registros_filtrados:
-            return jsonify({'success': False, 'message': 'Nenhum registro para exportar'}), 400
-        
-        if 'projeto_selecionado' not in session:
-            return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
-        
-        projeto_selecionado = session['projeto_selecionado']
-        projeto_id = projeto_selecionado.get('ProjetoID')
-        
-        banco_homo = obter_banco_homo(projeto_id)
-        codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        wb = Workbook()
-        
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        ws = wb.create_sheet(title="CentroResultado_Filtrado")
-        
-        for col_num, coluna in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-        
-        for row_num, registro in enumerate(registros_filtrados, 2):
-            for col_num, header in enumerate(headers, 1):
-                valor = registro.get(header, '')
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                if header == 'CentroResultado_Codigo':
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="CentroResultado_Filtrado.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro ao exportar centroresultado filtrada: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
+    """Exporta do banco os registros que atendem ao filtro do grid (status, busca, filtros por coluna, ordem)"""
+    return resposta_exportacao_grade("CentroResultado_DePara", "CentroResultado_Filtrado", obter_codigos_wf)
+
 
 @centroresultado_bp.route('/export_wf')
 def export_wf():
@@ -453,37 +209,25 @@ def export_wf():
         
         logger.info(f"Exportando tabela WF do banco homólogo: {banco_homo}")
         
-        conexao = conectar_segunda_base(banco_homo)
+        conexao = conexao_homologacao(banco_homo)
         if not conexao:
             flash(f'Falha na conexão com o banco homólogo: {banco_homo}', 'error')
             return redirect(url_for('centroresultado.index'))
         
         cursor = conexao.cursor()
         cursor.execute("SELECT CentroResultado_Codigo, CentroResultado_Descricao, CentroResultado_Ativo FROM CentroResultado")
-        registros = cursor.fetchall()
-        colunas = [column[0] for column in cursor.description]
-        
-        registros_list = [dict(zip(colunas, row)) for row in registros]
-        
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, [column[0] for column in cursor.description], "CentroResultado_WF")
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), [column[0] for column in cursor.description], "CentroResultado_WF", limpar_texto=False
+        )
+
         cursor.close()
         conexao.close()
-        
-        df = pd.DataFrame(registros_list, columns=colunas)
-        
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='CentroResultado_WF', index=False)
-        
-        output.seek(0)
-        
-        nome_arquivo = "CentroResultado_WF.xlsx"
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "CentroResultado_WF.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar tabela WF: {str(e)}")
@@ -517,31 +261,22 @@ def importar():
         
         logger.info(f"Iniciando importação para o banco: {banco_usuario}")
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         
         cursor = conexao.cursor()
         
         try:
-            # Ler o arquivo Excel mantendo os tipos originais
-            df = pd.read_excel(arquivo, dtype=str, na_values=['', ' ', 'NULL', 'null', 'NaN'])
-            df = df.where(pd.notnull(df), None)
-            
-            # Converter coluna ID para numérico
-            if 'ID' in df.columns:
-                df['ID'] = pd.to_numeric(df['ID'], errors='coerce').astype('Int64')
-            elif 'id' in df.columns:
-                df['id'] = pd.to_numeric(df['id'], errors='coerce').astype('Int64')
-                
+            # Ler o arquivo Excel em lotes, mantendo os valores como texto
+            planilha = PlanilhaEmLotes(arquivo, na_values=['', ' ', 'NULL', 'null', 'NaN'])
         except Exception as e:
             logger.error(f"Erro ao ler arquivo Excel: {str(e)}")
             return jsonify({'success': False, 'message': f'Erro ao ler arquivo Excel: {str(e)}'})
         
-        registros = df.to_dict('records')
-        colunas_excel = df.columns.tolist()
+        colunas_excel = planilha.colunas
         
-        logger.info(f"Arquivo Excel lido: {len(registros)} registros, colunas: {colunas_excel}")
+        logger.info(f"Arquivo Excel aberto, colunas: {colunas_excel}")
         
         # Mapeamento das colunas - ACEITAR TANTO NOMES AMIGÁVEIS QUANTO NOMES ORIGINAIS
         mapeamento_colunas = {
@@ -625,197 +360,39 @@ def importar():
         # Resto do código permanece igual...
         # [Manter todo o resto do código de importação]
         
-        # Mapear registros
-        registros_mapeados = []
-        for registro in registros:
-            registro_mapeado = {}
-            
-            for coluna_banco in colunas_banco:
-                valor = None
-                
-                # Buscar o valor na planilha usando mapeamento
-                for chave_planilha, col_banco_mapeada in mapeamento_colunas.items():
-                    if col_banco_mapeada == coluna_banco and chave_planilha in colunas_excel:
-                        valor = registro.get(chave_planilha)
-                        if valor is not None:
-                            break
-                
-                # Se não encontrou pelo mapeamento, tentar pelo nome original
-                if valor is None and coluna_banco in colunas_excel:
-                    valor = registro.get(coluna_banco)
-                
-                # Processar o valor conforme o tipo da coluna
-                if valor is not None and isinstance(valor, str):
-                    valor = valor.strip()
-                    if valor == '':
-                        valor = None
-                
-                # Conversão específica para ID
-                if coluna_banco == 'id':
-                    try:
-                        valor = safe_convert_id(valor)
-                    except ValueError as e:
-                        return jsonify({
-                            'success': False, 
-                            'message': f'Erro de conversão do ID: {str(e)}'
-                        })
-                
-                registro_mapeado[coluna_banco] = valor
-            
-            registros_mapeados.append(registro_mapeado)
-        
-        logger.info(f"Registros mapeados: {len(registros_mapeados)}")
-        
-        # Verificar IDs
-        for registro in registros_mapeados:
-            if registro.get('id') is None:
-                return jsonify({
-                    'success': False, 
-                    'message': 'Encontrado registro sem ID. Todos os registros devem ter um ID inteiro válido.'
-                })
-        
         # Contar registros antes
         cursor.execute("SELECT COUNT(*) FROM CentroResultado_DePara")
         count_antes = safe_fetchone(cursor)
         logger.info(f"Registros na tabela ANTES da importação: {count_antes}")
         
         try:
-            contador_atualizacoes = 0
-            contador_insercoes = 0
-            registros_codigo_vazio = []  # Para coletar IDs com Código Centro Custo vazio
-            
-            for registro in registros_mapeados:
-                registro_id = registro.get('id')
-                codigo_centro_custo = registro.get('cdccusto')
-                centro_resultado_codigo = registro.get('CentroResultado_Codigo')
-                
-                if not registro_id:
-                    continue
-                
-                # Verificar se Código Centro Custo está vazio
-                if not codigo_centro_custo:
-                    registros_codigo_vazio.append(registro_id)
-                    logger.warning(f"AVISO: Registro ID {registro_id} tem 'Código Centro Custo' vazio. Atualização limitada.")
-                
-                # DEBUG: Log detalhado de cada registro
-                logger.info(f"Processando registro ID {registro_id}:")
-                logger.info(f"  - cdccusto: {codigo_centro_custo}")
-                logger.info(f"  - CentroResultado_Codigo: {centro_resultado_codigo}")
-                
-                # Verificar se o registro existe
-                cursor.execute("SELECT id, cdccusto, CentroResultado_Codigo FROM CentroResultado_DePara WHERE id = ?", (registro_id,))
-                resultado = cursor.fetchone()
-                
-                if resultado:
-                    # Registro existe - fazer UPDATE
-                    logger.info(f"Registro ID {registro_id} existe, executando UPDATE")
-                    
-                    # Se Código Centro Custo está vazio, manter o valor atual do banco
-                    if not codigo_centro_custo:
-                        cursor.execute("""
-                            UPDATE CentroResultado_DePara 
-                            SET cdbdados = ?,
-                                noccusto = ?,
-                                dcccusto = ?,
-                                sgccusto = ?,
-                                dtbloqueio = ?,
-                                tbempresa = ?,
-                                cdccresp = ?,
-                                tpccusto = ?,
-                                tbfiliais = ?,
-                                CentroResultado_Codigo = ?, 
-                                Centroresultado_Descricao = ?, 
-                                Estrutura_Codigo = ?
-                            WHERE id = ?
-                        """, (
-                            registro.get('cdbdados'),
-                            registro.get('noccusto'),
-                            registro.get('dcccusto'),
-                            registro.get('sgccusto'),
-                            registro.get('dtbloqueio'),
-                            registro.get('tbempresa'),
-                            registro.get('cdccresp'),
-                            registro.get('tpccusto'),
-                            registro.get('tbfiliais'),
-                            centro_resultado_codigo,
-                            registro.get('Centroresultado_Descricao'),
-                            registro.get('Estrutura_Codigo'),
-                            registro_id
-                        ))
-                    else:
-                        # Código Centro Custo preenchido - atualizar todos os campos
-                        cursor.execute("""
-                            UPDATE CentroResultado_DePara 
-                            SET cdbdados = ?,
-                                cdccusto = ?,
-                                noccusto = ?,
-                                dcccusto = ?,
-                                sgccusto = ?,
-                                dtbloqueio = ?,
-                                tbempresa = ?,
-                                cdccresp = ?,
-                                tpccusto = ?,
-                                tbfiliais = ?,
-                                CentroResultado_Codigo = ?, 
-                                Centroresultado_Descricao = ?, 
-                                Estrutura_Codigo = ?
-                            WHERE id = ?
-                        """, (
-                            registro.get('cdbdados'),
-                            codigo_centro_custo,
-                            registro.get('noccusto'),
-                            registro.get('dcccusto'),
-                            registro.get('sgccusto'),
-                            registro.get('dtbloqueio'),
-                            registro.get('tbempresa'),
-                            registro.get('cdccresp'),
-                            registro.get('tpccusto'),
-                            registro.get('tbfiliais'),
-                            centro_resultado_codigo,
-                            registro.get('Centroresultado_Descricao'),
-                            registro.get('Estrutura_Codigo'),
-                            registro_id
-                        ))
-                    
-                    if cursor.rowcount > 0:
-                        contador_atualizacoes += 1
-                        logger.info(f"UPDATE bem-sucedido para registro ID {registro_id}")
-                else:
-                    # Registro não existe - fazer INSERT
-                    logger.info(f"Registro ID {registro_id} não existe, executando INSERT")
-                    
-                    # Para INSERT, Código Centro Custo é obrigatório
-                    if not codigo_centro_custo:
-                        logger.error(f"ERRO: Não é possível inserir registro ID {registro_id} sem 'Código Centro Custo'")
-                        continue
-                    
-                    cursor.execute("""
-                        INSERT INTO CentroResultado_DePara 
-                        (id, cdbdados, cdccusto, noccusto, dcccusto, sgccusto,
-                         dtbloqueio, tbempresa, cdccresp, tpccusto, tbfiliais,
-                         CentroResultado_Codigo, Centroresultado_Descricao, Estrutura_Codigo)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        registro_id,
-                        registro.get('cdbdados'),
-                        codigo_centro_custo,
-                        registro.get('noccusto'),
-                        registro.get('dcccusto'),
-                        registro.get('sgccusto'),
-                        registro.get('dtbloqueio'),
-                        registro.get('tbempresa'),
-                        registro.get('cdccresp'),
-                        registro.get('tpccusto'),
-                        registro.get('tbfiliais'),
-                        centro_resultado_codigo,
-                        registro.get('Centroresultado_Descricao'),
-                        registro.get('Estrutura_Codigo')
-                    ))
-                    
-                    if cursor.rowcount > 0:
-                        contador_insercoes += 1
-                        logger.info(f"INSERT bem-sucedido para registro ID {registro_id}")
-            
+            # Sem cdccusto o registro mantém o valor atual no UPDATE e não é inserido
+            registros_codigo_vazio = []
+            validacao = ValidacaoImportacao(mapeamento_colunas, colunas_banco, colunas_excel, codigo=['cdccusto', 'cdbdados'], primeiro_preenchido=True)
+            carga = UpsertEmMassa(
+                cursor, "CentroResultado_DePara", colunas_banco,
+                preservar_se_nulo=['cdccusto'],
+                exigir_na_insercao=['cdccusto'],
+            )
+            for df in planilha.lotes():
+                registros = validacao.preparar(df)
+                logger.info(f"Registros mapeados: {len(registros)}")
+
+                registros_codigo_vazio += registros.loc[
+                    registros['id'].notna() & registros['cdccusto'].isna(), 'id'
+                ].tolist()
+                if not validacao.erros:
+                    carga.adicionar(registros.to_dict('records'))
+            # Com erros nada chega à tabela (as linhas param na staging temporária)
+            if validacao.erros:
+                return jsonify({
+                    'success': False,
+                    'message': validacao.mensagem(),
+                    'erros': validacao.erros
+                })
+            contador_atualizacoes, contador_insercoes = carga.aplicar()
+            logger.info(f"Arquivo Excel lido: {planilha.total} registros")
+
             logger.info(f"Operações concluídas: {contador_atualizacoes} UPDATEs, {contador_insercoes} INSERTs")
             
             # Construir mensagem com avisos
@@ -900,17 +477,14 @@ def update_registro():
         
         projeto_selecionado = session['projeto_selecionado']
         banco_usuario = projeto_selecionado.get('DadosGX')
-        projeto_id = projeto_selecionado.get('ProjetoID')
         
         if not banco_usuario:
             logger.error("Banco não configurado para este projeto")
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
         
-        banco_homo = obter_banco_homo(projeto_id)
-        
         logger.info(f"Atualizando registro {record_id}, campo {field} para valor '{value}' no banco {banco_usuario}")
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             logger.error(f"Falha na conexão com o banco: {banco_usuario}")
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
@@ -927,6 +501,9 @@ def update_registro():
             logger.error(f"Erro ao verificar registro: {str(e)}")
             return jsonify({'success': False, 'message': f'Campo {field} não existe na tabela'})
         
+        # Pendentes do resumo de progresso: conta antes, ajusta antes do commit
+        delta_progresso = DeltaProgresso(cursor, "CentroResultado_DePara", [record_id], [field])
+
         query = f"UPDATE CentroResultado_DePara SET {field} = ? WHERE id = ?"
         logger.info(f"Executando query: {query} com valores: ({value}, {record_id})")
         
@@ -938,6 +515,7 @@ def update_registro():
                 conexao.rollback()
             return jsonify({'success': False, 'message': 'Registro não encontrado ou não modificado'})
         
+        delta_progresso.aplicar()
         conexao.commit()
         
         logger.info(f"Registro {record_id} atualizado com sucesso")
@@ -988,50 +566,21 @@ def update_batch():
 
         projeto_selecionado = session['projeto_selecionado']
         banco_usuario = projeto_selecionado.get('DadosGX')
-        projeto_id = projeto_selecionado.get('ProjetoID')
 
         if not banco_usuario:
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
 
-        banco_homo = obter_banco_homo(projeto_id)
-
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
 
         cursor = conexao.cursor()
-        success_count = 0
-        error_count = 0
-        error_messages = []
 
         colunas_permitidas = ['CentroResultado_Codigo', 'Centroresultado_Descricao', 'Estrutura_Codigo']
 
-        for update in updates:
-            try:
-                record_id = update.get('id')
-                field = update.get('field')
-                value = update.get('value')
-
-                if not record_id or not field:
-                    error_count += 1
-                    continue
-
-                if field not in colunas_permitidas:
-                    error_count += 1
-                    continue
-
-                query = f"UPDATE CentroResultado_DePara SET {field} = ? WHERE id = ?"
-                cursor.execute(query, (value, record_id))
-                
-                if cursor.rowcount > 0:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    error_messages.append(f"Registro não encontrado: {record_id}")
-
-            except Exception as e:
-                error_count += 1
-                error_messages.append(f"Erro ao atualizar {record_id}: {str(e)}")
+        success_count, error_count, error_messages = atualizar_campos_em_lote(
+            cursor, "CentroResultado_DePara", updates, colunas_permitidas,
+        )
 
         conexao.commit()
         logger.info(f"Batch update concluído: {success_count} sucessos, {error_count} erros")
@@ -1095,7 +644,7 @@ def dados_centroresultado(banco_usuario):
     if not banco_usuario:
         return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
 
-    conexao = conectar_segunda_base(banco_usuario)
+    conexao = conexao_projeto(banco_usuario)
     if not conexao:
         return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
 
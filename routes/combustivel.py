@@ -7,14 +7,19 @@ from flask import (
     flash,
     request,
     jsonify,
-    send_file,
 )
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_projeto, conexao_homologacao
+from db.atualizacao import atualizar_campos_em_lote
+from db.upsert import UpsertEmMassa, upsert_em_massa
+from utils.projeto_metadados import obter_banco_homo
+from utils.catalogo_wf import codigos_wf, descricao_wf, atualizar_descricoes_depara
+from utils.progresso_depara import DeltaProgresso
+from utils.grade_depara import resposta_grade, resposta_exportacao_grade
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.excel_utils import PlanilhaEmLotes
+from utils.validacao_importacao import ValidacaoImportacao
+from utils.exportacao_colunar import formato_colunar, resposta_colunar
 from logger import logger
-import pandas as pd
-import io
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
 import tempfile
 import os
 
@@ -43,124 +48,20 @@ def safe_convert_id(value):
     except (ValueError, TypeError, AttributeError):
         raise ValueError(f"Valor não pode ser convertido para inteiro: {value}")
 
-def obter_banco_homo(projeto_id):
-    """Função para obter o BancoHomo diretamente do banco de dados"""
-    try:
-        conn = conectar_banco()
-        if not conn:
-            logger.error("Falha ao conectar ao banco principal para obter BancoHomo")
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT BancoHomo FROM Projeto WHERE ProjetoID = ?", (projeto_id,))
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter BancoHomo: {str(e)}")
-        return None
-
 def obter_codigos_wf(banco_homo):
     """Obtém todos os códigos da tabela Combustivel do banco homólogo"""
-    try:
-        if not banco_homo:
-            return []
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return []
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT Combustivel_Codigo FROM Combustivel")
-        registros = cursor.fetchall()
-        
-        codigos = [str(registro[0]) for registro in registros if registro[0] is not None]
-        
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Encontrados {len(codigos)} códigos na base WF")
-        return codigos
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter códigos WF: {str(e)}")
-        return []
+    return codigos_wf(banco_homo, "Combustivel")
 
 def obter_descricao_wf(banco_homo, codigo):
     """Obtém a descrição de um código específico da tabela Combustivel do banco homólogo"""
-    try:
-        if not banco_homo or not codigo:
-            return None
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return None
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT Combustivel_Descricao FROM Combustivel WHERE Combustivel_Codigo = ?", (codigo,))
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conexao.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter descrição WF para código {codigo}: {str(e)}")
-        return None
+    return descricao_wf(banco_homo, "Combustivel", codigo)
 
 def atualizar_descricoes_apos_importacao(banco_usuario, banco_homo):
     """Atualiza automaticamente as descrições após importação baseado nos códigos WF"""
-    try:
-        if not banco_homo:
-            return
-        
-        conexao = conectar_segunda_base(banco_usuario)
-        if not conexao:
-            logger.error("Falha ao conectar para atualizar descrições")
-            return
-        
-        cursor = conexao.cursor()
-        
-        cursor.execute("""
-            SELECT id, Combustivel_Codigo, Combustivel_Descricao 
-            FROM Combustivel_DePara 
-            WHERE Combustivel_Codigo IS NOT NULL AND Combustivel_Codigo != 'S/DePara'
-        """)
-        registros = cursor.fetchall()
-        
-        atualizacoes = 0
-        for registro in registros:
-            id_registro, codigo_wf, descricao_atual = registro
-            descricao_wf = obter_descricao_wf(banco_homo, codigo_wf)
-            
-            if descricao_wf and descricao_wf != descricao_atual:
-                cursor.execute("""
-                    UPDATE Combustivel_DePara 
-                    SET Combustivel_Descricao = ? 
-                    WHERE id = ?
-                """, (descricao_wf, id_registro))
-                atualizacoes += 1
-                logger.info(f"Descrição atualizada para código {codigo_wf}: {descricao_wf}")
-        
-        conexao.commit()
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Atualizações automáticas de descrição: {atualizacoes} registros")
-        
-    except Exception as e:
-        logger.error(f"Erro ao atualizar descrições após importação: {str(e)}")
+    return atualizar_descricoes_depara(
+        banco_usuario, banco_homo, "Combustivel", "Combustivel_DePara", "Combustivel_Codigo",
+        {"Combustivel_Descricao": 0},
+    )
 
 def safe_fetchone(cursor):
     """Função segura para fetchone que evita None is not subscriptable"""
@@ -191,26 +92,21 @@ def index():
         
         logger.info(f"Tentando conectar ao banco: {banco_usuario} para o projeto: {projeto_nome}")
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return render_template('combustivel.html', 
-                                 registros=[], 
                                  colunas=[], 
                                  projeto_nome=projeto_nome, 
                                  banco_usuario=banco_usuario, 
                                  codigos_wf=[])
         
         cursor = conexao.cursor()
-        cursor.execute("SELECT * FROM Combustivel_DePara")
-        registros = cursor.fetchall()
+        # Só os nomes das colunas: as linhas vêm do /dados, em páginas
+        cursor.execute("SELECT TOP 0 * FROM Combustivel_DePara")
         
         colunas = [column[0] for column in cursor.description]
-        
-        registros_dict = [dict(zip(colunas, row)) for row in registros]
-        
-        logger.info(f"Encontrados {len(registros_dict)} registros")
-        
+
         # Obter códigos WF para validação
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = []
@@ -223,7 +119,6 @@ def index():
         conexao.close()
         
         return render_template('combustivel.html', 
-                             registros=registros_dict, 
                              colunas=colunas,
                              projeto_nome=projeto_nome,
                              banco_usuario=banco_usuario,
@@ -234,12 +129,17 @@ def index():
         logger.error(f"Erro em combustivel: {str(e)}")
         flash(f'Erro: {str(e)}', 'error')
         return render_template('combustivel.html', 
-                             registros=[], 
                              colunas=[], 
                              projeto_nome='N/A', 
                              banco_usuario='N/A', 
                              codigos_wf=[])
 
+@combustivel_bp.route('/dados')
+def dados():
+    """Página do grid em JSON (paginação por chave, filtros e ordenação no servidor)"""
+    return resposta_grade("Combustivel_DePara", obter_codigos_wf, linhas="partials/linhas/combustivel.html")
+
+
 @combustivel_bp.route('/exportar')
 def exportar_combustivel():
     try:
@@ -255,14 +155,13 @@ def exportar_combustivel():
             flash('Banco não configurado para este projeto.', 'error')
             return redirect(url_for('combustivel.index'))
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return redirect(url_for('combustivel.index'))
         
         cursor = conexao.cursor()
         cursor.execute("SELECT id, comb_cd, comb_ds, Combustivel_Codigo, Combustivel_Descricao FROM Combustivel_DePara")
-        registros = cursor.fetchall()
         colunas_originais = [column[0] for column in cursor.description]
         
         mapeamento_colunas = {
@@ -275,70 +174,22 @@ def exportar_combustivel():
         
         colunas_amigaveis = [mapeamento_colunas.get(col, col) for col in colunas_originais]
         
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, colunas_amigaveis, "Combustivel_DePara")
+
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        wb = Workbook()
-        
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        ws = wb.create_sheet(title="Combustivel_DePara")
-        
-        for col_num, coluna in enumerate(colunas_amigaveis, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-        
-        for row_num, registro in enumerate(registros, 2):
-            for col_num, valor in enumerate(registro, 1):
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                if col_num == 4:  # Combustivel_Codigo
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), colunas_amigaveis, "Combustivel_DePara",
+            colunas_codigo=[3], codigos_wf=codigos_wf
+        )
+
         cursor.close()
         conexao.close()
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        nome_arquivo = "Combustivel_DePara.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "Combustivel_DePara.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar combustivel: {str(e)}")
@@ -347,85 +198,9 @@ def exportar_combustivel():
 
 @combustivel_bp.route('/exportar_filtrados', methods=['POST'])
 def exportar_combustivel_filtrados():
-    try:
-        data = request.get_json()
-        registros_filtrados = data.get('registros', [])
-        headers = data.get('headers', [])
-        
-        if not registros_filtrados:
-            return jsonify({'success': False, 'message': 'Nenhum registro para exportar'}), 400
-        
-        if 'projeto_selecionado' not in session:
-            return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
-        
-        projeto_selecionado = session['projeto_selecionado']
-        projeto_id = projeto_selecionado.get('ProjetoID')
-        
-        banco_homo = obter_banco_homo(projeto_id)
-        codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        wb = Workbook()
-        
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        ws = wb.create_sheet(title="Combustivel_Filtrado")
-        
-        for col_num, coluna in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-        
-        for row_num, registro in enumerate(registros_filtrados, 2):
-            for col_num, header in enumerate(headers, 1):
-                valor = registro.get(header, '')
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                if header == 'Combustivel_Codigo':
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="Combustivel_Filtrado.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro ao exportar combustivel filtrada: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
+    """Exporta do banco os registros que atendem ao filtro do grid (status, busca, filtros por coluna, ordem)"""
+    return resposta_exportacao_grade("Combustivel_DePara", "Combustivel_Filtrado", obter_codigos_wf)
+
 
 @combustivel_bp.route('/export_wf')
 def export_wf():
@@ -446,37 +221,25 @@ def export_wf():
         
         logger.info(f"Exportando tabela WF do banco homólogo: {banco_homo}")
         
-        conexao = conectar_segunda_base(banco_homo)
+        conexao = conexao_homologacao(banco_homo)
         if not conexao:
             flash(f'Falha na conexão com o banco homólogo: {banco_homo}', 'error')
             return redirect(url_for('combustivel.index'))
         
         cursor = conexao.cursor()
         cursor.execute("SELECT Combustivel_Codigo, Combustivel_Descricao, Combustivel_Ativo FROM Combustivel")
-        registros = cursor.fetchall()
-        colunas = [column[0] for column in cursor.description]
-        
-        registros_list = [dict(zip(colunas, row)) for row in registros]
-        
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, [column[0] for column in cursor.description], "Combustivel_WF")
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), [column[0] for column in cursor.description], "Combustivel_WF", limpar_texto=False
+        )
+
         cursor.close()
         conexao.close()
-        
-        df = pd.DataFrame(registros_list, columns=colunas)
-        
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Combustivel_WF', index=False)
-        
-        output.seek(0)
-        
-        nome_arquivo = "Combustivel_WF.xlsx"
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "Combustivel_WF.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar tabela WF: {str(e)}")
@@ -510,29 +273,22 @@ def importar_combustivel():
         
         logger.info(f"Iniciando importação para o banco: {banco_usuario}")
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         
         cursor = conexao.cursor()
         
         try:
-            # Ler o arquivo Excel mantendo os tipos originais
-            df = pd.read_excel(arquivo, dtype=str, na_values=['', ' ', 'NULL', 'null'])
-            df = df.where(pd.notnull(df), None)
-            
-            # Converter todas as strings para strip
-            for col in df.columns:
-                df[col] = df[col].apply(lambda x: x.strip() if isinstance(x, str) else x)
-                
+            # Ler o arquivo Excel em lotes, mantendo os valores como texto
+            planilha = PlanilhaEmLotes(arquivo, na_values=['', ' ', 'NULL', 'null'])
         except Exception as e:
             logger.error(f"Erro ao ler arquivo Excel: {str(e)}")
             return jsonify({'success': False, 'message': f'Erro ao ler arquivo Excel: {str(e)}'})
         
-        registros = df.to_dict('records')
-        colunas_excel = df.columns.tolist()
+        colunas_excel = planilha.colunas
         
-        logger.info(f"Arquivo Excel lido: {len(registros)} registros, colunas: {colunas_excel}")
+        logger.info(f"Arquivo Excel aberto, colunas: {colunas_excel}")
         
         # MAPEAMENTO DIRETO DAS COLUNAS - CORRIGIDO
         mapeamento_colunas = {
@@ -558,44 +314,6 @@ def importar_combustivel():
                           f'Certifique-se de que a planilha contém as colunas: {", ".join(mapeamento_colunas.keys())}'
             })
         
-        # MAPEAMENTO DOS REGISTROS - VERSÃO SIMPLIFICADA
-        registros_mapeados = []
-        for registro in registros:
-            registro_mapeado = {}
-            
-            # Mapear cada coluna diretamente
-            registro_mapeado['id'] = safe_convert_id(registro.get('ID'))
-            registro_mapeado['comb_cd'] = registro.get('Codigo de Origem')
-            registro_mapeado['comb_ds'] = registro.get('Descrição de origem')
-            registro_mapeado['Combustivel_Codigo'] = registro.get('Combustivel_Codigo')
-            registro_mapeado['Combustivel_Descricao'] = registro.get('Combustivel_Descricao')
-            
-            # Limpar valores string
-            for key, value in registro_mapeado.items():
-                if value is not None and isinstance(value, str):
-                    value = value.strip()
-                    if value == '':
-                        registro_mapeado[key] = None
-                    else:
-                        registro_mapeado[key] = value
-            
-            registros_mapeados.append(registro_mapeado)
-        
-        logger.info(f"Registros mapeados: {len(registros_mapeados)}")
-        
-        # Verificar se todos os registros têm ID e comb_cd
-        for i, registro in enumerate(registros_mapeados):
-            if registro.get('id') is None:
-                return jsonify({
-                    'success': False, 
-                    'message': f'Registro na linha {i+2} não tem ID válido.'
-                })
-            if registro.get('comb_cd') is None:
-                return jsonify({
-                    'success': False, 
-                    'message': f'Registro na linha {i+2} não tem Código de Origem válido.'
-                })
-        
         # LÓGICA DE INSERÇÃO/ATUALIZAÇÃO
         cursor.execute("SELECT COUNT(*) FROM Combustivel_DePara")
         result_antes = cursor.fetchone()
@@ -603,47 +321,27 @@ def importar_combustivel():
         logger.info(f"Registros na tabela ANTES da importação: {count_antes}")
         
         try:
-            contador_atualizacoes = 0
-            contador_insercoes = 0
-            
-            for registro in registros_mapeados:
-                registro_id = registro.get('id')
-                codigo_origem = registro.get('comb_cd')
-                
-                if registro_id and codigo_origem:
-                    cursor.execute("SELECT id FROM Combustivel_DePara WHERE id = ?", (registro_id,))
-                    resultado = cursor.fetchone()
-                    
-                    if resultado:
-                        cursor.execute("""
-                            UPDATE Combustivel_DePara 
-                            SET comb_cd = ?, 
-                                comb_ds = ?, 
-                                Combustivel_Codigo = ?, 
-                                Combustivel_Descricao = ?
-                            WHERE id = ?
-                        """, (
-                            codigo_origem,
-                            registro.get('comb_ds'),
-                            registro.get('Combustivel_Codigo'),
-                            registro.get('Combustivel_Descricao'),
-                            registro_id
-                        ))
-                        contador_atualizacoes += 1
-                    else:
-                        cursor.execute("""
-                            INSERT INTO Combustivel_DePara 
-                            (id, comb_cd, comb_ds, Combustivel_Codigo, Combustivel_Descricao)
-                            VALUES (?, ?, ?, ?, ?)
-                        """, (
-                            registro_id,
-                            codigo_origem,
-                            registro.get('comb_ds'),
-                            registro.get('Combustivel_Codigo'),
-                            registro.get('Combustivel_Descricao')
-                        ))
-                        contador_insercoes += 1
-            
+            validacao = ValidacaoImportacao(mapeamento_colunas, colunas_banco, colunas_excel, codigo='comb_cd', obrigatorias=['comb_cd'])
+            carga = UpsertEmMassa(
+                cursor, "Combustivel_DePara",
+                ['id', 'comb_cd', 'comb_ds', 'Combustivel_Codigo', 'Combustivel_Descricao'],
+            )
+            for df in planilha.lotes():
+                registros = validacao.preparar(df)
+                logger.info(f"Registros mapeados: {len(registros)}")
+
+                if not validacao.erros:
+                    carga.adicionar(registros.to_dict('records'))
+            # Com erros nada chega à tabela (as linhas param na staging temporária)
+            if validacao.erros:
+                return jsonify({
+                    'success': False,
+                    'message': validacao.mensagem(),
+                    'erros': validacao.erros
+                })
+            contador_atualizacoes, contador_insercoes = carga.aplicar()
+            logger.info(f"Arquivo Excel lido: {planilha.total} registros")
+
             logger.info(f"UPDATEs executados: {contador_atualizacoes} registros")
             logger.info(f"INSERTs executados: {contador_insercoes} registros")
             
@@ -757,19 +455,12 @@ def importar_arquivo_wf(cursor, conexao, registros, colunas_excel, banco_usuario
             })
         
         # Atualizar registros na base
-        contador_atualizacoes = 0
-        for registro in registros_processados:
-            cursor.execute("""
-                UPDATE Combustivel_DePara 
-                SET Combustivel_Codigo = ?, Combustivel_Descricao = ?
-                WHERE id = ?
-            """, (
-                registro.get('Combustivel_Codigo'),
-                registro.get('Combustivel_Descricao'),
-                registro.get('id')
-            ))
-            contador_atualizacoes += 1
-        
+        contador_atualizacoes, _ = upsert_em_massa(
+            cursor, "Combustivel_DePara", ['id', 'Combustivel_Codigo', 'Combustivel_Descricao'],
+            registros_processados,
+            inserir=(),
+        )
+
         conexao.commit()
         
         # Atualizar descrições com base no banco homólogo
@@ -917,47 +608,12 @@ def importar_arquivo_depara(cursor, conexao, registros, colunas_excel, banco_usu
         logger.info(f"Registros na tabela ANTES da importação: {count_antes}")
         
         try:
-            contador_atualizacoes = 0
-            contador_insercoes = 0
-            
-            for registro in registros_mapeados:
-                registro_id = registro.get('id')
-                codigo_origem = registro.get('comb_cd')
-                
-                if registro_id and codigo_origem:
-                    cursor.execute("SELECT id FROM Combustivel_DePara WHERE id = ?", (registro_id,))
-                    resultado = cursor.fetchone()
-                    
-                    if resultado:
-                        cursor.execute("""
-                            UPDATE Combustivel_DePara 
-                            SET comb_cd = ?, 
-                                comb_ds = ?, 
-                                Combustivel_Codigo = ?, 
-                                Combustivel_Descricao = ?
-                            WHERE id = ?
-                        """, (
-                            codigo_origem,
-                            registro.get('comb_ds'),
-                            registro.get('Combustivel_Codigo'),
-                            registro.get('Combustivel_Descricao'),
-                            registro_id
-                        ))
-                        contador_atualizacoes += 1
-                    else:
-                        cursor.execute("""
-                            INSERT INTO Combustivel_DePara 
-                            (id, comb_cd, comb_ds, Combustivel_Codigo, Combustivel_Descricao)
-                            VALUES (?, ?, ?, ?, ?)
-                        """, (
-                            registro_id,
-                            codigo_origem,
-                            registro.get('comb_ds'),
-                            registro.get('Combustivel_Codigo'),
-                            registro.get('Combustivel_Descricao')
-                        ))
-                        contador_insercoes += 1
-            
+            contador_atualizacoes, contador_insercoes = upsert_em_massa(
+                cursor, "Combustivel_DePara",
+                ['id', 'comb_cd', 'comb_ds', 'Combustivel_Codigo', 'Combustivel_Descricao'],
+                (r for r in registros_mapeados if r.get('id') and r.get('comb_cd')),
+            )
+
             logger.info(f"UPDATEs executados: {contador_atualizacoes} registros")
             logger.info(f"INSERTs executados: {contador_insercoes} registros")
             
@@ -1024,17 +680,14 @@ def update_registro():
         
         projeto_selecionado = session['projeto_selecionado']
         banco_usuario = projeto_selecionado.get('DadosGX')
-        projeto_id = projeto_selecionado.get('ProjetoID')
         
         if not banco_usuario:
             logger.error("Banco não configurado para este projeto")
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
         
-        banco_homo = obter_banco_homo(projeto_id)
-        
         logger.info(f"Atualizando registro {record_id}, campo {field} para valor '{value}' no banco {banco_usuario}")
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             logger.error(f"Falha na conexão com o banco: {banco_usuario}")
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
@@ -1051,6 +704,9 @@ def update_registro():
             logger.error(f"Erro ao verificar registro: {str(e)}")
             return jsonify({'success': False, 'message': f'Campo {field} não existe na tabela'})
         
+        # Pendentes do resumo de progresso: conta antes, ajusta antes do commit
+        delta_progresso = DeltaProgresso(cursor, "Combustivel_DePara", [record_id], [field])
+
         query = f"UPDATE Combustivel_DePara SET {field} = ? WHERE id = ?"
         logger.info(f"Executando query: {query} com valores: ({value}, {record_id})")
         
@@ -1062,6 +718,7 @@ def update_registro():
                 conexao.rollback()
             return jsonify({'success': False, 'message': 'Registro não encontrado ou não modificado'})
         
+        delta_progresso.aplicar()
         conexao.commit()
         
         logger.info(f"Registro {record_id} atualizado com sucesso")
@@ -1112,50 +769,21 @@ def update_batch():
 
         projeto_selecionado = session['projeto_selecionado']
         banco_usuario = projeto_selecionado.get('DadosGX')
-        projeto_id = projeto_selecionado.get('ProjetoID')
 
         if not banco_usuario:
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
 
-        banco_homo = obter_banco_homo(projeto_id)
-
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
 
         cursor = conexao.cursor()
-        success_count = 0
-        error_count = 0
-        error_messages = []
 
         colunas_permitidas = ['Combustivel_Codigo', 'Combustivel_Descricao']
 
-        for update in updates:
-            try:
-                record_id = update.get('id')
-                field = update.get('field')
-                value = update.get('value')
-
-                if not record_id or not field:
-                    error_count += 1
-                    continue
-
-                if field not in colunas_permitidas:
-                    error_count += 1
-                    continue
-
-                query = f"UPDATE Combustivel_DePara SET {field} = ? WHERE id = ?"
-                cursor.execute(query, (value, record_id))
-                
-                if cursor.rowcount > 0:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    error_messages.append(f"Registro não encontrado: {record_id}")
-
-            except Exception as e:
-                error_count += 1
-                error_messages.append(f"Erro ao atualizar {record_id}: {str(e)}")
+        success_count, error_count, error_messages = atualizar_campos_em_lote(
+            cursor, "Combustivel_DePara", updates, colunas_permitidas,
+        )
 
         conexao.commit()
         logger.info(f"Batch update concluído: {success_count} sucessos, {error_count} erros")
@@ -1219,7 +847,7 @@ def dados_combustivel(banco_usuario):
     if not banco_usuario:
         return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
 
-    conexao = conectar_segunda_base(banco_usuario)
+    conexao = conexao_projeto(banco_usuario)
     if not conexao:
         return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
 
@@ -1,58 +1,10 @@
-from flask import Blueprint, render_template, redirect, url_for, session, flash
+from flask import Blueprint, render_template, redirect, url_for, session, flash, jsonify
 from datetime import datetime
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_controle, conexao_projeto
 from logger import logger
 
 # Importar as funções de dados
-from utils.dados_depara import (
-    dados_condicao_pagamento,
-    dados_escolaridade,
-    dados_estado,
-    dados_estadocivil,
-    dados_municipio,
-    dados_pais,
-    dados_profissao,
-    dados_segmentomercado,
-    dados_tipologradouro,
-    dados_departamento,
-    dados_estoque,
-    dados_naturezaoperacao,
-    dados_equipe,
-    dados_usuario_depara,
-    dados_clasmontadora,
-    dados_grupolucratividade,
-    dados_grupoproduto,
-    dados_pessoacodfabricante,
-    dados_procedencia,
-    dados_tabelapreco,
-    dados_tipoproduto,
-    dados_unidade,
-    dados_combustivel,
-    dados_corexterna,
-    dados_corinterna,
-    dados_marca,
-    dados_modeloveiculo,
-    dados_opcional,
-    dados_setorservico,
-    dados_tipoos,
-    dados_tiposervico,
-    dados_tmo,
-    dados_veiculoano,
-    dados_agentecobrador,
-    dados_banco,
-    dados_contagerencial,
-    dados_tipocobranca,
-    dados_tipocreditodebito,
-    dados_tipodocumento,
-    dados_tipoficharazao,
-    dados_tipotitulo,
-    dados_centroresultado,
-    dados_historicopadrao,
-    dados_planoconta,
-    dados_subconta,
-    dados_tipolote,
-    dados_tiposubconta,
-)
+from utils.progresso_depara import ler_progresso, reconciliar_progresso
 
 dashboard_bp = Blueprint("dashboard", __name__)
 
@@ -81,7 +33,7 @@ def obter_escopos_projeto(projeto_id):
     conn = None
     cursor = None
     try:
-        conn = conectar_banco()
+        conn = conexao_controle()
         if conn is None:
             logger.error("Falha ao conectar ao banco de dados em obter_escopos_projeto")
             return []
@@ -109,67 +61,8 @@ def obter_escopos_projeto(projeto_id):
             conn.close()
 
 def obter_dados_por_categoria(banco_usuario, categorias_habilitadas):
-    """Obtém apenas os dados das categorias habilitadas"""
-    dados = {}
-    funcoes_dados = {
-        "cond_pag": dados_condicao_pagamento,
-        "escol": dados_escolaridade,
-        "estado": dados_estado,
-        "estadocivil": dados_estadocivil,
-        "municipio": dados_municipio,
-        "pais": dados_pais,
-        "profissao": dados_profissao,
-        "segmentomercado": dados_segmentomercado,
-        "tipologradouro": dados_tipologradouro,
-        "departamento": dados_departamento,
-        "estoque": dados_estoque,
-        "naturezaoperacao": dados_naturezaoperacao,
-        "equipe": dados_equipe,
-        "usuario_depara": dados_usuario_depara,
-        "clasmontadora": dados_clasmontadora,
-        "grupolucratividade": dados_grupolucratividade,
-        "grupoproduto": dados_grupoproduto,
-        "pessoacodfabricante": dados_pessoacodfabricante,
-        "procedencia": dados_procedencia,
-        "tabelapreco": dados_tabelapreco,
-        "tipoproduto": dados_tipoproduto,
-        "unidade": dados_unidade,
-        "combustivel": dados_combustivel,
-        "corexterna": dados_corexterna,
-        "corinterna": dados_corinterna,
-        "marca": dados_marca,
-        "modeloveiculo": dados_modeloveiculo,
-        "opcional": dados_opcional,
-        "setorservico": dados_setorservico,
-        "tipoos": dados_tipoos,
-        "tiposervico": dados_tiposervico,
-        "tmo": dados_tmo,
-        "veiculoano": dados_veiculoano,
-        "agentecobrador": dados_agentecobrador,
-        "banco": dados_banco,
-        "contagerencial": dados_contagerencial,
-        "tipocobranca": dados_tipocobranca,
-        "tipocreditodebito": dados_tipocreditodebito,
-        "tipodocumento": dados_tipodocumento,
-        "tipoficharazao": dados_tipoficharazao,
-        "tipotitulo": dados_tipotitulo,
-        "centroresultado": dados_centroresultado,
-        "historicopadrao": dados_historicopadrao,
-        "planoconta": dados_planoconta,
-        "subconta": dados_subconta,
-        "tipolote": dados_tipolote,
-        "tiposubconta": dados_tiposubconta,
-    }
-    
-    for categoria in categorias_habilitadas:
-        if categoria in funcoes_dados:
-            try:
-                dados[categoria] = funcoes_dados[categoria](banco_usuario)
-            except Exception as e:
-                logger.error(f"Erro ao carregar dados da categoria {categoria}: {e}")
-                dados[categoria] = {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
-    
-    return dados
+    """Obtém apenas os dados das categorias habilitadas (lidos do resumo ProgressoDePara)"""
+    return ler_progresso(banco_usuario, categorias_habilitadas)
 
 def calcular_progresso_categoria(dados_categoria):
     """Calcula o progresso de uma categoria específica"""
@@ -369,6 +262,22 @@ def calcular_progresso_total(dados_tabelas):
     }
 
 
+@dashboard_bp.route("/reconciliar_progresso", methods=["POST"])
+def reconciliar_progresso_projeto():
+    """Recalcula o resumo de progresso do projeto selecionado (corrige desvios)"""
+    if "usuario" not in session or not session["usuario"].get("adm"):
+        return jsonify({"success": False, "message": "Acesso não autorizado"}), 403
+    if "projeto_selecionado" not in session:
+        return jsonify({"success": False, "message": "Nenhum projeto selecionado"})
+
+    banco_usuario = session["projeto_selecionado"].get("DadosGX")
+    if not banco_usuario:
+        return jsonify({"success": False, "message": "Banco não configurado para este projeto"})
+
+    corrigidas = reconciliar_progresso(banco_usuario)
+    return jsonify({"success": True, "message": f"Progresso reconciliado: {corrigidas} tabelas corrigidas"})
+
+
 @dashboard_bp.route("/logout")
 def logout():
     session.clear()
@@ -393,7 +302,7 @@ def detalhes_tabela(nome_tabela):
     conn = None
     cursor = None
     try:
-        conn = conectar_segunda_base(banco_usuario)
+        conn = conexao_projeto(banco_usuario)
         if conn is None:
             raise Exception("Falha na conexão com o banco de dados")
 
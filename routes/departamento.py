@@ -7,140 +7,36 @@ from flask import (
     flash,
     request,
     jsonify,
-    send_file,
 )
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_projeto, conexao_homologacao
+from db.upsert import UpsertEmMassa
+from utils.projeto_metadados import obter_banco_homo
+from utils.catalogo_wf import codigos_wf, descricao_wf, atualizar_descricoes_depara
 from logger import logger
-from utils.excel_utils import export_to_excel, import_from_excel
+from utils.excel_utils import export_to_excel, import_from_excel, PlanilhaEmLotes
+from utils.progresso_depara import DeltaProgresso
+from utils.grade_depara import resposta_grade, resposta_exportacao_grade
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.exportacao_colunar import formato_colunar, resposta_colunar
 import tempfile
 import os
-import pandas as pd
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
 
 departamento_bp = Blueprint("departamento", __name__)
 
-def obter_banco_homo(projeto_id):
-    """Função para obter o BancoHomo diretamente do banco de dados (mesma lógica usada em outros módulos)"""
-    try:
-        conn = conectar_banco()
-        if not conn:
-            logger.error("Falha ao conectar ao banco principal para obter BancoHomo")
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT BancoHomo FROM Projeto WHERE ProjetoID = ?", projeto_id)
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter BancoHomo: {str(e)}")
-        return None
-
 def obter_codigos_wf(banco_homo):
     """Obtém todos os códigos da tabela departamento do banco homólogo"""
-    try:
-        if not banco_homo:
-            return []
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return []
-        
-        cursor = conexao.cursor()
-        # Seleciona o campo de codigo da tabela WF conforme informado
-        cursor.execute("SELECT Departamento_Codigo FROM departamento")
-        registros = cursor.fetchall()
-        
-        codigos = [str(registro[0]) for registro in registros if registro[0] is not None]
-        
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Encontrados {len(codigos)} códigos na base WF (departamento)")
-        return codigos
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter códigos WF (departamento): {str(e)}")
-        return []
+    return codigos_wf(banco_homo, "Departamento")
 
 def obter_descricao_wf(banco_homo, codigo):
     """Obtém a descrição de um código específico da tabela departamento do banco homólogo"""
-    try:
-        if not banco_homo or not codigo:
-            return None
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return None
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT Departamento_Descricao FROM departamento WHERE Departamento_Codigo = ?", codigo)
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conexao.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter descrição WF para código {codigo} (departamento): {str(e)}")
-        return None
+    return descricao_wf(banco_homo, "Departamento", codigo)
 
 def atualizar_descricoes_apos_importacao(banco_usuario, banco_homo):
     """Atualiza automaticamente as descrições do DePara após importação baseado nos códigos WF"""
-    try:
-        if not banco_homo:
-            return
-        
-        conexao = conectar_segunda_base(banco_usuario)
-        if not conexao:
-            logger.error("Falha ao conectar para atualizar descrições do departamento")
-            return
-        
-        cursor = conexao.cursor()
-        
-        # Buscar registros que têm código WF (não são S/DePara)
-        cursor.execute("""
-            SELECT id, Departamento_Codigo, Departamento_Descricao 
-            FROM Departamento_DePara 
-            WHERE Departamento_Codigo IS NOT NULL AND Departamento_Codigo != 'S/DePara'
-        """)
-        registros = cursor.fetchall()
-        
-        atualizacoes = 0
-        for registro in registros:
-            id_registro, codigo_wf, descricao_atual = registro
-            descricao_wf = obter_descricao_wf(banco_homo, codigo_wf)
-            
-            if descricao_wf and descricao_wf != descricao_atual:
-                cursor.execute("""
-                    UPDATE Departamento_DePara
-                    SET Departamento_Descricao = ?
-                    WHERE id = ?
-                """, (descricao_wf, id_registro))
-                atualizacoes += 1
-                logger.info(f"Descrição atualizada para código {codigo_wf}: {descricao_wf}")
-        
-        conexao.commit()
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Atualizações automáticas de descrição (departamento): {atualizacoes} registros")
-        
-    except Exception as e:
-        logger.error(f"Erro ao atualizar descrições de departamento após importação: {str(e)}")
+    return atualizar_descricoes_depara(
+        banco_usuario, banco_homo, "Departamento", "Departamento_DePara", "Departamento_Codigo",
+        {"Departamento_Descricao": 0},
+    )
 
 @departamento_bp.route("/")
 def index():
@@ -162,24 +58,19 @@ def index():
         logger.info(f"Tentando conectar ao banco: {banco_usuario} para o projeto: {projeto_nome}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
-            return render_template('departamento.html', registros=[], colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
+            return render_template('departamento.html', colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
         
         # Executar consulta - INCLUIR todas as colunas para edição
         cursor = conexao.cursor()
-        cursor.execute("SELECT * FROM Departamento_DePara")
-        registros = cursor.fetchall()
+        # Só os nomes das colunas: as linhas vêm do /dados, em páginas
+        cursor.execute("SELECT TOP 0 * FROM Departamento_DePara")
         
         # Obter nomes das colunas
         colunas = [column[0] for column in cursor.description]
-        
-        # Converter para dicionários
-        registros_dict = [dict(zip(colunas, row)) for row in registros]
-        
-        logger.info(f"Encontrados {len(registros_dict)} registros (departamento)")
-        
+
         # Obter códigos da base WF para comparação
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
@@ -189,7 +80,6 @@ def index():
         conexao.close()
         
         return render_template('departamento.html', 
-                             registros=registros_dict, 
                              colunas=colunas,
                              projeto_nome=projeto_nome,
                              banco_usuario=banco_usuario,
@@ -199,7 +89,13 @@ def index():
     except Exception as e:
         logger.error(f"Erro em departamento.index: {str(e)}")
         flash(f'Erro: {str(e)}', 'error')
-        return render_template('departamento.html', registros=[], colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+        return render_template('departamento.html', colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+
+@departamento_bp.route('/dados')
+def dados():
+    """Página do grid em JSON (paginação por chave, filtros e ordenação no servidor)"""
+    return resposta_grade("Departamento_DePara", obter_codigos_wf, linhas="partials/linhas/departamento.html")
+
 
 @departamento_bp.route('/exportar')
 def exportar_departamento():
@@ -218,7 +114,7 @@ def exportar_departamento():
             return redirect(url_for('departamento.index'))
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return redirect(url_for('departamento.index'))
@@ -230,7 +126,6 @@ def exportar_departamento():
                    Departamento_Descricao, Departamento_Sigla, Origem 
             FROM Departamento_DePara
         """)
-        registros = cursor.fetchall()
         colunas_originais = [column[0] for column in cursor.description]
         
         # Mapear nomes das colunas para nomes amigáveis
@@ -246,80 +141,23 @@ def exportar_departamento():
         
         colunas_amigaveis = [mapeamento_colunas.get(col, col) for col in colunas_originais]
         
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, colunas_amigaveis, "Departamento_DePara")
+
         # Obter códigos WF para colorir
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        # Criar workbook
-        wb = Workbook()
-        # Remover sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        ws = wb.create_sheet(title="Departamento_DePara")
-        
-        # Adicionar cabeçalhos
-        for col_num, coluna in enumerate(colunas_amigaveis, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Definir cores
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Para campos vazios
-        
-        # Adicionar dados com cores
-        for row_num, registro in enumerate(registros, 2):
-            for col_num, valor in enumerate(registro, 1):
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                # Aplicar cores na coluna Departamento_Codigo
-                # Identificar qual índice corresponde a Departamento_Codigo na query acima
-                # A query selecionou: dep_cd(1), dep_nm(2), dep_ativo(3), Departamento_Codigo(4), ...
-                if col_num == 4:  # Departamento_Codigo
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        # Ajustar largura das colunas automaticamente
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Fechar recursos
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), colunas_amigaveis, "Departamento_DePara",
+            colunas_codigo=[3], codigos_wf=codigos_wf
+        )
+
         cursor.close()
         conexao.close()
-        
-        # Salvar em buffer
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        nome_arquivo = "Departamento_DePara.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "Departamento_DePara.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar departamento: {str(e)}")
@@ -328,88 +166,9 @@ def exportar_departamento():
 
 @departamento_bp.route('/exportar_filtrados', methods=['POST'])
 def exportar_departamento_filtrados():
-    try:
-        data = request.get_json()
-        registros_filtrados = data.get('registros', [])
-        headers = data.get('headers', [])
-        
-        if not registros_filtrados:
-            return jsonify({'success': False, 'message': 'Nenhum registro para exportar'}), 400
-        
-        # Obter projeto e banco
-        if 'projeto_selecionado' not in session:
-            return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
-        
-        projeto_selecionado = session['projeto_selecionado']
-        projeto_id = projeto_selecionado.get('ProjetoID')
-        banco_usuario = projeto_selecionado.get('DadosGX')
-        
-        banco_homo = obter_banco_homo(projeto_id)
-        codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        # Criar workbook
-        wb = Workbook()
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        ws = wb.create_sheet(title="Departamento_Filtrado")
-        
-        # Cabeçalhos
-        for col_num, coluna in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-        
-        for row_num, registro in enumerate(registros_filtrados, 2):
-            for col_num, header in enumerate(headers, 1):
-                valor = registro.get(header, '')
-                if isinstance(valor, str):
-                    valor = valor.strip()
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                # Se a coluna é 'Departamento_Codigo' aplicar cores
-                if header == 'Departamento_Codigo':
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        # Ajustar colunas
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="Departamento_Filtrado.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro ao exportar departamento filtrado: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
+    """Exporta do banco os registros que atendem ao filtro do grid (status, busca, filtros por coluna, ordem)"""
+    return resposta_exportacao_grade("Departamento_DePara", "Departamento_Filtrado", obter_codigos_wf)
+
 
 @departamento_bp.route('/export_wf')
 def export_wf():
@@ -429,7 +188,7 @@ def export_wf():
             return redirect(url_for('departamento.index'))
         
         logger.info(f"Exportando tabela WF do banco homólogo: {banco_homo} (departamento)")
-        conexao = conectar_segunda_base(banco_homo)
+        conexao = conexao_homologacao(banco_homo)
         if not conexao:
             flash(f'Falha na conexão com o banco homólogo: {banco_homo}', 'error')
             return redirect(url_for('departamento.index'))
@@ -437,26 +196,18 @@ def export_wf():
         cursor = conexao.cursor()
         # SELECT informado por você:
         cursor.execute("select Departamento_Codigo, Departamento_Descricao, TipoDepartamento_Codigo, Departamento_Contabil, Departamento_Ativo from departamento")
-        registros = cursor.fetchall()
-        colunas = [column[0] for column in cursor.description]
-        
-        registros_list = [dict(zip(colunas, row)) for row in registros]
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, [column[0] for column in cursor.description], "Departamento_WF")
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), [column[0] for column in cursor.description], "Departamento_WF", limpar_texto=False
+        )
+
         cursor.close()
         conexao.close()
-        
-        df = pd.DataFrame(registros_list, columns=colunas)
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Departamento_WF', index=False)
-        output.seek(0)
-        
-        nome_arquivo = "Departamento_WF.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "Departamento_WF.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar tabela WF (departamento): {str(e)}")
@@ -493,7 +244,7 @@ def importar_departamento():
         logger.info(f"Iniciando importação de departamento para o banco: {banco_usuario}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         
@@ -512,15 +263,13 @@ def importar_departamento():
         
         # Ler o Excel
         try:
-            df = pd.read_excel(arquivo)
-            df = df.where(pd.notnull(df), None)
-            registros = df.to_dict('records')
-            colunas_excel = df.columns.tolist()
+            planilha = PlanilhaEmLotes(arquivo, texto=False)
+            colunas_excel = planilha.colunas
         except Exception as e:
             logger.error(f"Erro ao ler arquivo Excel (departamento): {str(e)}")
             return jsonify({'success': False, 'message': f'Erro ao ler arquivo Excel: {str(e)}'})
         
-        logger.info(f"Arquivo Excel lido: {len(registros)} registros, colunas: {colunas_excel}")
+        logger.info(f"Arquivo Excel aberto, colunas: {colunas_excel}")
         
         # 🔄 Mapeamento de nomes amigáveis -> nomes do banco
         mapeamento_colunas_excel = {
@@ -541,8 +290,6 @@ def importar_departamento():
             else:
                 colunas_excel_normalizadas.append(col)
 
-        df.columns = colunas_excel_normalizadas
-
         # Validar colunas necessárias
         colunas_excel_set = set(colunas_excel_normalizadas)
         colunas_necessarias = set(colunas_importacao)
@@ -554,27 +301,6 @@ def importar_departamento():
             })
         
         # Converter DataFrame novamente para dicionários normalizados
-        registros = df.to_dict('records')
-        
-        # Filtrar e ajustar tamanhos
-        registros_filtrados = []
-        for registro in registros:
-            registro_filtrado = {}
-            for col in colunas_importacao:
-                valor = registro.get(col)
-                if valor is None:
-                    registro_filtrado[col] = None
-                else:
-                    str_valor = str(valor)
-                    if col in ['dep_cd', 'dep_ativo', 'Departamento_Codigo', 'Departamento_Sigla']:
-                        registro_filtrado[col] = str_valor[:100]
-                    elif col in ['dep_nm', 'Departamento_Descricao', 'Origem']:
-                        registro_filtrado[col] = str_valor[:150]
-                    else:
-                        registro_filtrado[col] = str_valor
-            registros_filtrados.append(registro_filtrado)
-        
-        logger.info(f"Registros filtrados e tratados: {len(registros_filtrados)}")
         
         # Contagem antes da importação
         cursor.execute("SELECT COUNT(*) FROM Departamento_DePara")
@@ -582,46 +308,40 @@ def importar_departamento():
         count_antes = result_antes[0] if result_antes else 0
         logger.info(f"Registros antes da importação: {count_antes}")
         
-        contador_atualizacoes = 0
-        contador_insercoes = 0
-        
-        # Atualizar/Inserir registros
-        for registro in registros_filtrados:
-            codigo_origem = registro.get('dep_cd')
-            novo_codigo_wf = registro.get('Departamento_Codigo')
-            nova_descricao = registro.get('Departamento_Descricao')
-            
-            if codigo_origem:
-                cursor.execute("SELECT id FROM Departamento_DePara WHERE dep_cd = ?", (codigo_origem,))
-                resultado = cursor.fetchone()
-                if resultado:
-                    cursor.execute("""
-                        UPDATE Departamento_DePara
-                        SET dep_nm = ?, dep_ativo = ?, Departamento_Codigo = ?, 
-                            Departamento_Descricao = ?, Departamento_Sigla = ?, Origem = ?
-                        WHERE dep_cd = ?
-                    """, (
-                        registro.get('dep_nm'),
-                        registro.get('dep_ativo'),
-                        novo_codigo_wf,
-                        nova_descricao,
-                        registro.get('Departamento_Sigla'),
-                        registro.get('Origem'),
-                        codigo_origem
-                    ))
-                    contador_atualizacoes += 1
-                else:
-                    colunas_str = ', '.join(colunas_importacao)
-                    placeholders = ', '.join(['?' for _ in colunas_importacao])
-                    valores = [registro.get(c) for c in colunas_importacao]
-                    cursor.execute(f"INSERT INTO Departamento_DePara ({colunas_str}) VALUES ({placeholders})", valores)
-                    contador_insercoes += 1
-            else:
-                colunas_str = ', '.join(colunas_importacao)
-                placeholders = ', '.join(['?' for _ in colunas_importacao])
-                valores = [registro.get(c) for c in colunas_importacao]
-                cursor.execute(f"INSERT INTO Departamento_DePara ({colunas_str}) VALUES ({placeholders})", valores)
-                contador_insercoes += 1
+        # Sem código de origem (dep_cd) o registro é inserido mesmo assim
+        carga = UpsertEmMassa(
+            cursor,
+            "Departamento_DePara",
+            colunas_importacao,
+            chave="dep_cd",
+            inserir_sem_chave=True,
+        )
+        for df in planilha.lotes():
+            df.columns = colunas_excel_normalizadas
+            registros = df.to_dict('records')
+
+            # Filtrar e ajustar tamanhos
+            registros_filtrados = []
+            for registro in registros:
+                registro_filtrado = {}
+                for col in colunas_importacao:
+                    valor = registro.get(col)
+                    if valor is None:
+                        registro_filtrado[col] = None
+                    else:
+                        str_valor = str(valor)
+                        if col in ['dep_cd', 'dep_ativo', 'Departamento_Codigo', 'Departamento_Sigla']:
+                            registro_filtrado[col] = str_valor[:100]
+                        elif col in ['dep_nm', 'Departamento_Descricao', 'Origem']:
+                            registro_filtrado[col] = str_valor[:150]
+                        else:
+                            registro_filtrado[col] = str_valor
+                registros_filtrados.append(registro_filtrado)
+
+            logger.info(f"Registros filtrados e tratados: {len(registros_filtrados)}")
+
+            carga.adicionar(registros_filtrados)
+        contador_atualizacoes, contador_insercoes = carga.aplicar()
         
         conexao.commit()
         logger.info(f"UPDATEs: {contador_atualizacoes}, INSERTs: {contador_insercoes}")
@@ -692,7 +412,7 @@ def update_registro():
         banco_usuario = projeto_selecionado.get('DadosGX')
         projeto_id = projeto_selecionado.get('ProjetoID')
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'}), 500
         
@@ -704,8 +424,12 @@ def update_registro():
             if value != 'S/DePara' and value is not None and not str(value).isdigit():
                 return jsonify({'success': False, 'message': 'Departamento_Codigo deve ser somente números ou "S/DePara"'}), 400
         
+        # Pendentes do resumo de progresso: conta antes, ajusta antes do commit
+        delta_progresso = DeltaProgresso(cursor, "Departamento_DePara", [record_id], [field])
+
         # Fazer update
         cursor.execute(f"UPDATE Departamento_DePara SET {field} = ? WHERE id = ?", (value, record_id))
+        delta_progresso.aplicar()
         conexao.commit()
         logger.info(f"Registro id={record_id} atualizado: {field} = {value}")
         
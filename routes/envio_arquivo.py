@@ -6,22 +6,28 @@ from flask import (
     url_for,
     flash,
     request,
-    send_file,
+    jsonify,
+    Response,
+    stream_with_context,
 )
-import pandas as pd
+import csv
 import io
+import pandas as pd
 from utils.layout_configs import load_layout_configs
-from utils.data_processing import run_process_file_wrapper
+from utils.data_validation import formatar_erros
+from utils.fila_envio import enfileirar, obter_tarefa, progresso_tarefa
+from utils.exportacao import gerar_planilha, enviar_planilha
+from utils.resultados_validacao import ler_amostra, ler_metadados, limpar_resultados, lotes_erros, pagina_erros
 from datetime import datetime
-import uuid
 
 envio_arquivo_bp = Blueprint("envio_arquivo", __name__)
 
 # Carregar configurações dos layouts
 layout_columns_map, layouts_rules_map = load_layout_configs()
 
-# Dicionário para armazenar temporariamente os dados de erro
-temp_errors_store = {}
+# Erros por página na página de resultado e na consulta paginada (todos vão na exportação)
+ERROS_NA_PAGINA = 200
+MAX_ERROS_POR_PAGINA = 1000
 
 
 @envio_arquivo_bp.route("/", methods=["GET", "POST"])
@@ -52,77 +58,182 @@ def index():
 
         if arquivo:
             try:
-                # Processar o arquivo
-                layout, df, df_errors, status, message, elapsed = (
-                    run_process_file_wrapper(
-                        arquivo,
-                        layout_columns_map,
-                        layouts_rules_map,
-                        validar_nao_obrigatorios_flag=True,
-                    )
-                )
-
-                # Mensagens flash compactas
-                if status == "error":
-                    flash(f"Erro no processamento: {message}", "error")
-                elif status == "warning":
-                    flash(f"Aviso: {message}", "warning")
-                else:
-                    flash("Arquivo processado com sucesso", "success")
-
-                # Informações adicionais compactas
-                if layout:
-                    flash(f"Layout: {layout}", "info")
-
-                flash(f"Tempo: {elapsed:.2f}s", "info")
-
-                # Gerar ID único para os erros (se houver)
-                export_id = None
-                if not df_errors.empty:
-                    export_id = str(uuid.uuid4())
-                    # Armazenar apenas informações essenciais
-                    temp_errors_store[export_id] = {
-                        "df_errors": df_errors.to_dict(),
-                        "timestamp": datetime.now(),
-                        "usuario": usuario.get("usuario", ""),
-                        "layout": layout,
-                    }
-
-                # Preparar dados para exibição
-                dados_processados = None
-                if not df.empty:
-                    # Limitar a exibição para não sobrecarregar a página
-                    display_df = df.head(50)
-                    dados_processados = display_df.to_html(
-                        classes="compact-table", index=False, escape=False
-                    )
-
-                return render_template(
-                    "envio_arquivo.html",
-                    usuario=usuario,
-                    empresa=empresa,
-                    dados_processados=dados_processados,
-                    df_errors=df_errors,
-                    erros_processados=not df_errors.empty,
-                    layout=layout,
-                    total_erros=len(df_errors) if not df_errors.empty else 0,
-                    export_id=export_id,
+                # Validação em segundo plano: a resposta volta com o id da tarefa
+                job_id = enfileirar(
+                    arquivo, usuario.get("usuario", ""), layout_columns_map, layouts_rules_map
                 )
-
             except Exception as e:
+                if request.accept_mimetypes.best == "application/json":
+                    return jsonify({"success": False, "message": f"Erro ao enviar arquivo: {str(e)}"}), 500
                 flash(f"Erro ao processar arquivo: {str(e)}", "error")
                 return render_template(
                     "envio_arquivo.html", usuario=usuario, empresa=empresa
                 )
 
-    # Limpar dados temporários antigos (mais de 1 hora)
-    cleanup_old_temp_data()
+            if request.accept_mimetypes.best == "application/json":
+                return jsonify({
+                    "success": True,
+                    "job_id": job_id,
+                    "progresso": url_for("envio_arquivo.progresso", job_id=job_id),
+                    "resultado": url_for("envio_arquivo.resultado", job_id=job_id),
+                })
+            return redirect(url_for("envio_arquivo.resultado", job_id=job_id))
+
+    # Limpar resultados expirados ou acima do limite de tamanho
+    limpar_resultados()
 
     return render_template("envio_arquivo.html", usuario=usuario, empresa=empresa)
 
 
+@envio_arquivo_bp.route("/progresso/<job_id>")
+def progresso(job_id):
+    if "usuario" not in session:
+        return jsonify({"success": False, "message": "Usuário não autenticado"}), 401
+
+    tarefa = obter_tarefa(job_id, session["usuario"].get("usuario", ""))
+    if tarefa is None:
+        return jsonify({"success": False, "message": "Tarefa não encontrada ou expirada"}), 404
+    return jsonify({"success": True, **progresso_tarefa(tarefa)})
+
+
+@envio_arquivo_bp.route("/resultado/<job_id>")
+def resultado(job_id):
+    if "usuario" not in session:
+        flash("Você precisa fazer login para acessar esta página.", "warning")
+        return redirect(url_for("auth.login"))
+
+    usuario = session["usuario"]
+    empresa = usuario.get("empresa", "")
+
+    tarefa = obter_tarefa(job_id, usuario.get("usuario", ""))
+    if tarefa is None:
+        flash("Processamento não encontrado ou expirado.", "error")
+        return redirect(url_for("envio_arquivo.index"))
+
+    situacao = progresso_tarefa(tarefa)
+    if not situacao["concluido"]:
+        # A página consulta o progresso e recarrega quando a tarefa termina
+        return render_template(
+            "envio_arquivo.html", usuario=usuario, empresa=empresa, tarefa=situacao
+        )
+
+    if situacao["status"] != "concluido":
+        flash(f"Erro ao processar arquivo: {situacao['mensagem']}", "error")
+        return render_template("envio_arquivo.html", usuario=usuario, empresa=empresa)
+
+    # Resultado guardado em disco pela tarefa (pode ter sido em outro processo)
+    resultado_salvo = ler_metadados(job_id)
+    if resultado_salvo is None:
+        flash("Resultado do processamento não encontrado ou expirado.", "error")
+        return redirect(url_for("envio_arquivo.index"))
+    # Só a primeira página de erros; as demais vêm da consulta paginada (listar_erros)
+    df_errors = next(lotes_erros(job_id, tamanho=ERROS_NA_PAGINA), pd.DataFrame())
+
+    layout = resultado_salvo["layout"]
+    status = resultado_salvo["status"]
+    message = resultado_salvo["message"]
+    elapsed = resultado_salvo["elapsed"]
+    resumo = resultado_salvo["resumo"]
+    df = ler_amostra(resultado_salvo)
+
+    # Mensagens flash compactas
+    if status == "error":
+        flash(f"Erro no processamento: {message}", "error")
+    elif status == "warning":
+        flash(f"Aviso: {message}", "warning")
+    else:
+        flash("Arquivo processado com sucesso", "success")
+
+    # Informações adicionais compactas
+    if layout:
+        flash(f"Layout: {layout}", "info")
+
+    flash(f"Tempo: {elapsed:.2f}s", "info")
+
+    # Os erros ficam disponíveis para exportação pelo id da tarefa
+    export_id = job_id if not df_errors.empty else None
+
+    # Mensagens só para os erros exibidos
+    if not df_errors.empty:
+        df_errors = df_errors.assign(Erro=formatar_erros(df_errors, layouts_rules_map.get(layout, ())))
+
+    # Preparar dados para exibição
+    dados_processados = None
+    if not df.empty:
+        # df já é só a amostra das primeiras linhas do arquivo
+        display_df = df.head(50)
+        dados_processados = display_df.to_html(
+            classes="compact-table", index=False, escape=False
+        )
+
+    return render_template(
+        "envio_arquivo.html",
+        usuario=usuario,
+        empresa=empresa,
+        dados_processados=dados_processados,
+        df_errors=df_errors,
+        erros_processados=not df_errors.empty,
+        layout=layout,
+        total_erros=resumo["erros"] if not df_errors.empty else 0,
+        resumo_regras=resumo.get("regras", []),
+        erros_guardados=resultado_salvo.get("total_erros_guardados", 0),
+        erros_por_pagina=ERROS_NA_PAGINA,
+        export_id=export_id,
+    )
+
+
+@envio_arquivo_bp.route("/erros/<job_id>")
+def listar_erros(job_id):
+    """Erros do resultado em páginas (?pagina=, ?por_pagina=), filtráveis por ?coluna= e ?regra="""
+    if "usuario" not in session:
+        return jsonify({"success": False, "message": "Usuário não autenticado"}), 401
+
+    metadados = ler_metadados(job_id)
+    if not metadados or metadados.get("usuario") != session["usuario"].get("usuario", ""):
+        return jsonify({"success": False, "message": "Resultado não encontrado ou expirado"}), 404
+
+    try:
+        pagina = max(int(request.args.get("pagina", 1)), 1)
+        por_pagina = min(max(int(request.args.get("por_pagina", ERROS_NA_PAGINA)), 1), MAX_ERROS_POR_PAGINA)
+    except ValueError:
+        return jsonify({"success": False, "message": "Parâmetros de paginação inválidos"}), 400
+    coluna = request.args.get("coluna") or None
+    regra = request.args.get("regra") or None
+
+    # Só os erros da página saem do disco (o filtro é aplicado na leitura do Parquet)
+    lidos = pagina_erros(job_id, (pagina - 1) * por_pagina, por_pagina, coluna=coluna, regra=regra)
+    if lidos is None:
+        return jsonify({"success": False, "message": "Resultado não encontrado ou expirado"}), 404
+
+    total, erros = lidos
+    mensagens = formatar_erros(erros, layouts_rules_map.get(metadados.get("layout"), ()))
+    registros = [
+        {
+            "linha": int(linha),
+            "coluna": str(col),
+            "regra": str(erros["Regra"].iloc[i]) if "Regra" in erros.columns else None,
+            "valor": str(erros["Valor"].iloc[i]) if "Valor" in erros.columns else None,
+            "erro": mensagem,
+        }
+        for i, (linha, col, mensagem) in enumerate(zip(erros["Linha"], erros["Coluna"], mensagens))
+    ]
+    return jsonify({
+        "success": True,
+        "total": total,
+        "total_arquivo": (metadados.get("resumo") or {}).get("erros", total),
+        "pagina": pagina,
+        "por_pagina": por_pagina,
+        "paginas": max((total + por_pagina - 1) // por_pagina, 1),
+        "erros": registros,
+    })
+
+
 @envio_arquivo_bp.route("/exportar_erros")
 def exportar_erros():
+    """
+    Exporta os erros guardados (?formato=xlsx ou csv, filtros ?coluna= e ?regra=),
+    lendo o resultado em lotes e montando as mensagens lote a lote.
+    """
     if "usuario" not in session:
         flash("Você precisa fazer login para acessar esta página.", "warning")
         return redirect(url_for("auth.login"))
@@ -130,67 +241,60 @@ def exportar_erros():
     # Obter export_id da query string
     export_id = request.args.get("export_id")
 
-    if not export_id or export_id not in temp_errors_store:
+    error_data = ler_metadados(export_id) if export_id else None
+    if not error_data or error_data.get("usuario") != session["usuario"].get("usuario", ""):
         flash("Dados de exportação não encontrados ou expirados.", "error")
         return redirect(url_for("envio_arquivo.index"))
 
-    try:
-        # Recuperar dados do erro
-        error_data = temp_errors_store[export_id]
-        df_errors = pd.DataFrame(error_data["df_errors"])
-
-        # Verificar se há erros para exportar
-        if df_errors.empty:
-            flash("Nenhum erro encontrado para exportação.", "info")
-            return redirect(url_for("envio_arquivo.index"))
-
-        # Criar arquivo Excel em memória
-        output = io.BytesIO()
-
-        # Usar openpyxl diretamente para ter mais controle
-        from openpyxl import Workbook
-        from openpyxl.utils.dataframe import dataframe_to_rows
-
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "Erros_Validacao"
-
-        # Adicionar cabeçalho
-        ws.append(["Linha", "Coluna", "Erro"])
-
-        # Adicionar dados
-        for _, row in df_errors.iterrows():
-            ws.append([row["Linha"], row["Coluna"], row["Erro"]])
-
-        # Salvar no buffer
-        wb.save(output)
-        output.seek(0)
-
-        # Nome do arquivo com timestamp e layout
-        layout = error_data.get("layout", "desconhecido")
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"erros_validacao_{layout}_{timestamp}.xlsx"
-
-        return send_file(
-            output,
-            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            as_attachment=True,
-            download_name=filename,
-        )
+    # Verificar se há erros para exportar
+    if not error_data.get("total_erros_guardados"):
+        flash("Nenhum erro encontrado para exportação.", "info")
+        return redirect(url_for("envio_arquivo.index"))
 
-    except Exception as e:
-        flash(f"Erro ao exportar erros: {str(e)}", "error")
+    formato = (request.args.get("formato") or "xlsx").lower()
+    if formato not in ("xlsx", "csv"):
+        flash(f"Formato de exportação inválido: {formato}", "error")
         return redirect(url_for("envio_arquivo.index"))
 
+    coluna = request.args.get("coluna") or None
+    regra = request.args.get("regra") or None
+    layout_rules = layouts_rules_map.get(error_data.get("layout"), ())
 
-def cleanup_old_temp_data():
-    """Limpa dados temporários com mais de 1 hora"""
-    current_time = datetime.now()
-    keys_to_remove = []
+    def linhas():
+        for lote in lotes_erros(export_id, coluna=coluna, regra=regra):
+            yield from zip(lote["Linha"].tolist(), lote["Coluna"].astype(str).tolist(),
+                           formatar_erros(lote, layout_rules).tolist())
 
-    for key, data in temp_errors_store.items():
-        if (current_time - data["timestamp"]).total_seconds() > 3600:  # 1 hora
-            keys_to_remove.append(key)
+    # Nome do arquivo com timestamp e layout
+    layout = error_data.get("layout", "desconhecido")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"erros_validacao_{layout}_{timestamp}"
+
+    try:
+        if formato == "csv":
+            def transmitir():
+                buffer = io.StringIO()
+                escritor = csv.writer(buffer)
+                escritor.writerow(["Linha", "Coluna", "Erro"])
+                for linha in linhas():
+                    escritor.writerow(linha)
+                    if buffer.tell() > 65536:
+                        yield buffer.getvalue().encode("utf-8")
+                        buffer.seek(0)
+                        buffer.truncate()
+                yield buffer.getvalue().encode("utf-8")
+
+            return Response(
+                stream_with_context(transmitir()),
+                mimetype="text/csv; charset=utf-8",
+                headers={"Content-Disposition": f'attachment; filename="{filename}.csv"'},
+            )
 
-    for key in keys_to_remove:
-        del temp_errors_store[key]
+        arquivo = gerar_planilha(
+            linhas(), ["Linha", "Coluna", "Erro"], "Erros_Validacao", limpar_texto=False
+        )
+        return enviar_planilha(arquivo, f"{filename}.xlsx")
+
+    except Exception as e:
+        flash(f"Erro ao exportar erros: {str(e)}", "error")
+        return redirect(url_for("envio_arquivo.index"))
@@ -7,141 +7,37 @@ from flask import (
     flash,
     request,
     jsonify,
-    send_file,
 )
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_projeto, conexao_homologacao
+from db.atualizacao import atualizar_campos_em_lote, descricao_automatica
+from db.upsert import UpsertEmMassa
+from utils.projeto_metadados import obter_banco_homo
+from utils.catalogo_wf import codigos_wf, descricao_wf, atualizar_descricoes_depara
 from logger import logger
-from utils.excel_utils import export_to_excel, import_from_excel
+from utils.excel_utils import export_to_excel, import_from_excel, PlanilhaEmLotes
+from utils.progresso_depara import DeltaProgresso
+from utils.grade_depara import resposta_grade, resposta_exportacao_grade
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.exportacao_colunar import formato_colunar, resposta_colunar
 import tempfile
 import os
-import pandas as pd
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
 
 escolaridade_bp = Blueprint("escolaridade", __name__)
 
-def obter_banco_homo(projeto_id):
-    """Função para obter o BancoHomo diretamente do banco de dados"""
-    try:
-        conn = conectar_banco()
-        if not conn:
-            logger.error("Falha ao conectar ao banco principal para obter BancoHomo")
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT BancoHomo FROM Projeto WHERE ProjetoID = ?", projeto_id)
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter BancoHomo: {str(e)}")
-        return None
-
 def obter_codigos_wf(banco_homo):
     """Obtém todos os códigos da tabela Escolaridade do banco homólogo"""
-    try:
-        if not banco_homo:
-            return []
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return []
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT Escolaridade_Codigo FROM Escolaridade")
-        registros = cursor.fetchall()
-        
-        # Criar uma lista com todos os códigos (convertidos para string para comparação)
-        codigos = [str(registro[0]) for registro in registros if registro[0] is not None]
-        
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Encontrados {len(codigos)} códigos na base WF")
-        return codigos
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter códigos WF: {str(e)}")
-        return []
+    return codigos_wf(banco_homo, "Escolaridade")
 
 def obter_descricao_wf(banco_homo, codigo):
     """Obtém a descrição de um código específico da tabela Escolaridade do banco homólogo"""
-    try:
-        if not banco_homo or not codigo:
-            return None
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return None
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT Escolaridade_Descricao FROM Escolaridade WHERE Escolaridade_Codigo = ?", codigo)
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conexao.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter descrição WF para código {codigo}: {str(e)}")
-        return None
+    return descricao_wf(banco_homo, "Escolaridade", codigo)
 
 def atualizar_descricoes_apos_importacao(banco_usuario, banco_homo):
     """Atualiza automaticamente as descrições após importação baseado nos códigos WF"""
-    try:
-        if not banco_homo:
-            return
-        
-        conexao = conectar_segunda_base(banco_usuario)
-        if not conexao:
-            logger.error("Falha ao conectar para atualizar descrições")
-            return
-        
-        cursor = conexao.cursor()
-        
-        # Buscar registros que têm código WF (não são S/DePara)
-        cursor.execute("""
-            SELECT id, Escolaridade_Codigo, Escolaridade_Descricao 
-            FROM Escolaridade_DePara 
-            WHERE Escolaridade_Codigo IS NOT NULL AND Escolaridade_Codigo != 'S/DePara'
-        """)
-        registros = cursor.fetchall()
-        
-        atualizacoes = 0
-        for registro in registros:
-            id_registro, codigo_wf, descricao_atual = registro
-            descricao_wf = obter_descricao_wf(banco_homo, codigo_wf)
-            
-            if descricao_wf and descricao_wf != descricao_atual:
-                # Atualizar descrição
-                cursor.execute("""
-                    UPDATE Escolaridade_DePara 
-                    SET Escolaridade_Descricao = ? 
-                    WHERE id = ?
-                """, (descricao_wf, id_registro))
-                atualizacoes += 1
-                logger.info(f"Descrição atualizada para código {codigo_wf}: {descricao_wf}")
-        
-        conexao.commit()
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Atualizações automáticas de descrição: {atualizacoes} registros")
-        
-    except Exception as e:
-        logger.error(f"Erro ao atualizar descrições após importação: {str(e)}")
+    return atualizar_descricoes_depara(
+        banco_usuario, banco_homo, "Escolaridade", "Escolaridade_DePara", "Escolaridade_Codigo",
+        {"Escolaridade_Descricao": 0},
+    )
 
 @escolaridade_bp.route("/")
 def index():
@@ -163,24 +59,19 @@ def index():
         logger.info(f"Tentando conectar ao banco: {banco_usuario} para o projeto: {projeto_nome}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
-            return render_template('escolaridade.html', registros=[], colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
+            return render_template('escolaridade.html', colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
         
         # Executar consulta - INCLUIR todas as colunas para edição
         cursor = conexao.cursor()
-        cursor.execute("SELECT * FROM Escolaridade_DePara")
-        registros = cursor.fetchall()
+        # Só os nomes das colunas: as linhas vêm do /dados, em páginas
+        cursor.execute("SELECT TOP 0 * FROM Escolaridade_DePara")
         
         # Obter nomes das colunas
         colunas = [column[0] for column in cursor.description]
-        
-        # Converter para dicionários
-        registros_dict = [dict(zip(colunas, row)) for row in registros]
-        
-        logger.info(f"Encontrados {len(registros_dict)} registros")
-        
+
         # Obter códigos da base WF para comparação
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
@@ -190,7 +81,6 @@ def index():
         conexao.close()
         
         return render_template('escolaridade.html', 
-                             registros=registros_dict, 
                              colunas=colunas,
                              projeto_nome=projeto_nome,
                              banco_usuario=banco_usuario,
@@ -200,7 +90,13 @@ def index():
     except Exception as e:
         logger.error(f"Erro em escolaridade: {str(e)}")
         flash(f'Erro: {str(e)}', 'error')
-        return render_template('escolaridade.html', registros=[], colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+        return render_template('escolaridade.html', colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+
+@escolaridade_bp.route('/dados')
+def dados():
+    """Página do grid em JSON (paginação por chave, filtros e ordenação no servidor)"""
+    return resposta_grade("Escolaridade_DePara", obter_codigos_wf, linhas="partials/linhas/escolaridade.html")
+
 
 @escolaridade_bp.route('/exportar')
 def exportar_escolaridade():
@@ -219,7 +115,7 @@ def exportar_escolaridade():
             return redirect(url_for('escolaridade.index'))
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return redirect(url_for('escolaridade.index'))
@@ -227,7 +123,6 @@ def exportar_escolaridade():
         # Executar consulta - Excluir coluna id da exportação
         cursor = conexao.cursor()
         cursor.execute("SELECT escola_cd, escola_ds, Escolaridade_Codigo, Escolaridade_Descricao FROM Escolaridade_DePara")
-        registros = cursor.fetchall()
         colunas_originais = [column[0] for column in cursor.description]
         
         # Mapear nomes das colunas para os nomes amigáveis
@@ -240,83 +135,23 @@ def exportar_escolaridade():
         
         colunas_amigaveis = [mapeamento_colunas.get(col, col) for col in colunas_originais]
         
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, colunas_amigaveis, "Escolaridade_DePara")
+
         # Obter códigos WF para colorir
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        # CORREÇÃO: Criar workbook e worksheet de forma mais robusta
-        wb = Workbook()
-        
-        # Remover a sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        # Criar uma nova worksheet explicitamente
-        ws = wb.create_sheet(title="Escolaridade_DePara")
-        
-        # Adicionar cabeçalhos
-        for col_num, coluna in enumerate(colunas_amigaveis, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            # Estilizar cabeçalhos
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Definir cores
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Para campos vazios
-        
-        # Adicionar dados com cores
-        for row_num, registro in enumerate(registros, 2):
-            for col_num, valor in enumerate(registro, 1):
-                # Remover espaços extras dos valores
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                # Aplicar cores na coluna Escolaridade_Codigo (coluna 3)
-                if col_num == 3:  # Escolaridade_Codigo
-                    if not valor or valor == '':
-                        cell.fill = laranja  # Laranja para campos vazios
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        # Ajustar largura das colunas automaticamente
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)  # Limitar largura máxima
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Fechar recursos
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), colunas_amigaveis, "Escolaridade_DePara",
+            colunas_codigo=[2], codigos_wf=codigos_wf
+        )
+
         cursor.close()
         conexao.close()
-        
-        # Salvar para buffer
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        nome_arquivo = "Escolaridade_DePara.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "Escolaridade_DePara.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar escolaridade: {str(e)}")
@@ -325,99 +160,9 @@ def exportar_escolaridade():
 
 @escolaridade_bp.route('/exportar_filtrados', methods=['POST'])
 def exportar_escolaridade_filtrados():
-    try:
-        # Obter dados da requisição
-        data = request.get_json()
-        registros_filtrados = data.get('registros', [])
-        headers = data.get('headers', [])
-        
-        if not registros_filtrados:
-            return jsonify({'success': False, 'message': 'Nenhum registro para exportar'}), 400
-        
-        # Obter o projeto da sessão
-        if 'projeto_selecionado' not in session:
-            return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
-        
-        projeto_selecionado = session['projeto_selecionado']
-        projeto_id = projeto_selecionado.get('ProjetoID')
-        
-        # Obter códigos WF para colorir
-        banco_homo = obter_banco_homo(projeto_id)
-        codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        # Criar workbook
-        wb = Workbook()
-        
-        # Remover a sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        # Criar uma nova worksheet
-        ws = wb.create_sheet(title="Escolaridade_Filtrado")
-        
-        # Adicionar cabeçalhos
-        for col_num, coluna in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            # Estilizar cabeçalhos
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Definir cores
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Para campos vazios
-        
-        # Adicionar dados com cores
-        for row_num, registro in enumerate(registros_filtrados, 2):
-            for col_num, header in enumerate(headers, 1):
-                valor = registro.get(header, '')
-                # Remover espaços extras dos valores
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                # Aplicar cores na coluna Escolaridade_Codigo
-                if header == 'Escolaridade_Codigo':
-                    if not valor or valor == '':
-                        cell.fill = laranja  # Laranja para campos vazios
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        # Ajustar largura das colunas automaticamente
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)  # Limitar largura máxima
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Salvar para buffer
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="Escolaridade_Filtrado.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro ao exportar escolaridade filtrada: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
+    """Exporta do banco os registros que atendem ao filtro do grid (status, busca, filtros por coluna, ordem)"""
+    return resposta_exportacao_grade("Escolaridade_DePara", "Escolaridade_Filtrado", obter_codigos_wf)
+
 
 @escolaridade_bp.route('/export_wf')
 def export_wf():
@@ -441,7 +186,7 @@ def export_wf():
         logger.info(f"Exportando tabela WF do banco homólogo: {banco_homo}")
         
         # Conectar ao banco homólogo
-        conexao = conectar_segunda_base(banco_homo)
+        conexao = conexao_homologacao(banco_homo)
         if not conexao:
             flash(f'Falha na conexão com o banco homólogo: {banco_homo}', 'error')
             return redirect(url_for('escolaridade.index'))
@@ -449,35 +194,18 @@ def export_wf():
         # Executar consulta na tabela Escolaridade do banco homólogo
         cursor = conexao.cursor()
         cursor.execute("SELECT Escolaridade_Codigo, Escolaridade_Descricao, Escolaridade_Ativo FROM Escolaridade")
-        registros = cursor.fetchall()
-        colunas = [column[0] for column in cursor.description]
-        
-        # Converter para lista de dicionários
-        registros_list = [dict(zip(colunas, row)) for row in registros]
-        
-        # Fechar recursos
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, [column[0] for column in cursor.description], "Escolaridade_WF")
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), [column[0] for column in cursor.description], "Escolaridade_WF", limpar_texto=False
+        )
+
         cursor.close()
         conexao.close()
-        
-        # Criar DataFrame pandas
-        df = pd.DataFrame(registros_list, columns=colunas)
-        
-        # Criar buffer para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Escolaridade_WF', index=False)
-        
-        output.seek(0)
-        
-        # Nome do arquivo
-        nome_arquivo = "Escolaridade_WF.xlsx"
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "Escolaridade_WF.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar tabela WF: {str(e)}")
@@ -516,7 +244,7 @@ def importar_escolaridade():
         logger.info(f"Iniciando importação para o banco: {banco_usuario}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         
@@ -524,23 +252,16 @@ def importar_escolaridade():
         
         # CORREÇÃO: Ler arquivo garantindo que todas as colunas sejam tratadas como string
         try:
-            # Ler o arquivo forçando todas as colunas como string
-            df = pd.read_excel(arquivo, dtype=str)
-            
-            # Substituir NaN, NaT e valores nulos por None
-            df = df.replace({pd.NaT: None, 'nan': None, 'NaN': None, '': None})
-            df = df.where(pd.notnull(df), None)
-            
-            # Converter para lista de dicionários
-            registros = df.to_dict('records')
-            colunas_excel = df.columns.tolist()
-            
-            logger.info(f"Arquivo Excel lido: {len(registros)} registros, colunas: {colunas_excel}")
-            
+            # Ler o arquivo Excel em lotes, mantendo os valores como texto
+            planilha = PlanilhaEmLotes(arquivo)
         except Exception as e:
             logger.error(f"Erro ao ler arquivo Excel: {str(e)}")
             return jsonify({'success': False, 'message': f'Erro ao ler arquivo Excel: {str(e)}'})
         
+        colunas_excel = planilha.colunas
+        
+        logger.info(f"Arquivo Excel aberto, colunas: {colunas_excel}")
+        
         # MAPEAMENTO: Nomes das colunas na planilha para nomes das colunas no banco
         mapeamento_colunas = {
             'Cod. Escolaridade Origem': 'escola_cd',
@@ -574,49 +295,6 @@ def importar_escolaridade():
                 'message': f'Colunas necessárias faltando no arquivo: {", ".join(colunas_faltantes)}. Certifique-se de que a planilha contém as colunas: Cod. Escolaridade Origem, Escolaridade Descrição, Escolaridade_Codigo, Escolaridade_Descricao'
             })
         
-        # CORREÇÃO: Filtrar e mapear os registros com tratamento robusto de tipos
-        registros_mapeados = []
-        for registro in registros:
-            registro_mapeado = {}
-            
-            # Para cada coluna do banco, buscar o valor correspondente na planilha
-            for coluna_banco in colunas_banco:
-                # Encontrar o nome da coluna na planilha
-                coluna_planilha = None
-                for chave, valor in mapeamento_colunas.items():
-                    if valor == coluna_banco and chave in colunas_excel:
-                        coluna_planilha = chave
-                        break
-                
-                if coluna_planilha:
-                    valor = registro.get(coluna_planilha)
-                    
-                    # CORREÇÃO: Tratamento robusto de tipos
-                    if valor is not None:
-                        # Garantir que seja string
-                        if not isinstance(valor, str):
-                            valor = str(valor)
-                        
-                        # Remover espaços extras
-                        valor = valor.strip()
-                        
-                        # Se ficou vazio após strip, converter para None
-                        if valor == '':
-                            valor = None
-                        # CORREÇÃO: Para códigos, manter como está (incluindo 'A')
-                        elif coluna_banco == 'Escolaridade_Codigo' and valor.upper() == 'S/DEPARA':
-                            valor = 'S/DePara'
-                    
-                    registro_mapeado[coluna_banco] = valor
-                else:
-                    registro_mapeado[coluna_banco] = None
-            
-            # CORREÇÃO: Validar registro antes de adicionar
-            if registro_mapeado.get('escola_cd'):  # Pelo menos o código de origem deve existir
-                registros_mapeados.append(registro_mapeado)
-        
-        logger.info(f"Registros mapeados após filtro: {len(registros_mapeados)}")
-        
         # VERIFICAÇÃO ANTES: Contar registros antes da importação
         cursor.execute("SELECT COUNT(*) FROM Escolaridade_DePara")
         result_antes = cursor.fetchone()
@@ -625,51 +303,63 @@ def importar_escolaridade():
         
         # CORREÇÃO: FAZER UPDATE EM VEZ DE DELETE + INSERT
         try:
-            contador_atualizacoes = 0
-            contador_insercoes = 0
             erros_importacao = []
-            
-            for i, registro in enumerate(registros_mapeados):
-                try:
-                    codigo_origem = registro.get('escola_cd')
-                    novo_codigo_wf = registro.get('Escolaridade_Codigo')
-                    nova_descricao_wf = registro.get('Escolaridade_Descricao')
-                    
-                    if codigo_origem:
-                        # Verificar se o registro já existe
-                        cursor.execute("SELECT id FROM Escolaridade_DePara WHERE escola_cd = ?", (codigo_origem,))
-                        resultado = cursor.fetchone()
-                        
-                        if resultado:
-                            # UPDATE do registro existente
-                            cursor.execute("""
-                                UPDATE Escolaridade_DePara 
-                                SET Escolaridade_Codigo = ?, Escolaridade_Descricao = ?
-                                WHERE escola_cd = ?
-                            """, (novo_codigo_wf, nova_descricao_wf, codigo_origem))
-                            contador_atualizacoes += 1
+            carga = UpsertEmMassa(
+                cursor,
+                "Escolaridade_DePara",
+                ["escola_cd", "escola_ds", "Escolaridade_Codigo", "Escolaridade_Descricao"],
+                chave="escola_cd",
+                atualizar=["Escolaridade_Codigo", "Escolaridade_Descricao"],
+            )
+            for df in planilha.lotes():
+                registros = df.to_dict('records')
+
+                # CORREÇÃO: Filtrar e mapear os registros com tratamento robusto de tipos
+                registros_mapeados = []
+                for registro in registros:
+                    registro_mapeado = {}
+
+                    # Para cada coluna do banco, buscar o valor correspondente na planilha
+                    for coluna_banco in colunas_banco:
+                        # Encontrar o nome da coluna na planilha
+                        coluna_planilha = None
+                        for chave, valor in mapeamento_colunas.items():
+                            if valor == coluna_banco and chave in colunas_excel:
+                                coluna_planilha = chave
+                                break
+
+                        if coluna_planilha:
+                            valor = registro.get(coluna_planilha)
+
+                            # CORREÇÃO: Tratamento robusto de tipos
+                            if valor is not None:
+                                # Garantir que seja string
+                                if not isinstance(valor, str):
+                                    valor = str(valor)
+
+                                # Remover espaços extras
+                                valor = valor.strip()
+
+                                # Se ficou vazio após strip, converter para None
+                                if valor == '':
+                                    valor = None
+                                # CORREÇÃO: Para códigos, manter como está (incluindo 'A')
+                                elif coluna_banco == 'Escolaridade_Codigo' and valor.upper() == 'S/DEPARA':
+                                    valor = 'S/DePara'
+
+                            registro_mapeado[coluna_banco] = valor
                         else:
-                            # INSERT apenas se for um registro novo
-                            cursor.execute("""
-                                INSERT INTO Escolaridade_DePara 
-                                (escola_cd, escola_ds, Escolaridade_Codigo, Escolaridade_Descricao)
-                                VALUES (?, ?, ?, ?)
-                            """, (
-                                codigo_origem,
-                                registro.get('escola_ds'),
-                                novo_codigo_wf,
-                                nova_descricao_wf
-                            ))
-                            contador_insercoes += 1
-                    
-                    # COMMIT a cada 100 registros para evitar transações muito longas
-                    if i % 100 == 0:
-                        conexao.commit()
-                        
-                except Exception as e:
-                    erros_importacao.append(f"Registro {i+1} (código: {registro.get('escola_cd')}): {str(e)}")
-                    logger.error(f"Erro no registro {i+1}: {str(e)}")
-                    # Continuar com os próximos registros mesmo com erro
+                            registro_mapeado[coluna_banco] = None
+
+                    # CORREÇÃO: Validar registro antes de adicionar
+                    if registro_mapeado.get('escola_cd'):  # Pelo menos o código de origem deve existir
+                        registros_mapeados.append(registro_mapeado)
+
+                logger.info(f"Registros mapeados após filtro: {len(registros_mapeados)}")
+
+                carga.adicionar(registros_mapeados)
+            contador_atualizacoes, contador_insercoes = carga.aplicar()
+            logger.info(f"Arquivo Excel lido: {planilha.total} registros")
             
             # COMMIT final
             conexao.commit()
@@ -765,7 +455,7 @@ def update_registro():
         logger.info(f"Atualizando registro {record_id}, campo {field} para valor '{value}' no banco {banco_usuario}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             logger.error(f"Falha na conexão com o banco: {banco_usuario}")
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
@@ -783,6 +473,9 @@ def update_registro():
             logger.error(f"Erro ao verificar registro: {str(e)}")
             return jsonify({'success': False, 'message': f'Campo {field} não existe na tabela'})
         
+        # Pendentes do resumo de progresso: conta antes, ajusta antes do commit
+        delta_progresso = DeltaProgresso(cursor, "Escolaridade_DePara", [record_id], [field])
+
         # Atualizar registro - usando id como chave primária
         query = f"UPDATE Escolaridade_DePara SET {field} = ? WHERE id = ?"
         logger.info(f"Executando query: {query} com valores: ({value}, {record_id})")
@@ -797,6 +490,7 @@ def update_registro():
             return jsonify({'success': False, 'message': 'Registro não encontrado ou não modificado'})
         
         # Commit da transação
+        delta_progresso.aplicar()
         conexao.commit()
         
         logger.info(f"Registro {record_id} atualizado com sucesso")
@@ -857,60 +551,20 @@ def update_batch():
         # Obter banco homólogo
         banco_homo = obter_banco_homo(projeto_id)
 
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
 
         cursor = conexao.cursor()
-        success_count = 0
-        error_count = 0
-        error_messages = []
 
         colunas_permitidas = ['Escolaridade_Codigo', 'Escolaridade_Descricao']
 
-        for update in updates:
-            try:
-                record_id = update.get('id')
-                field = update.get('field')
-                value = update.get('value')
-
-                if not record_id or not field:
-                    error_count += 1
-                    error_messages.append(f"ID ou campo não fornecido: {update}")
-                    continue
-
-                if field not in colunas_permitidas:
-                    error_count += 1
-                    error_messages.append(f"Campo não permitido: {field}")
-                    continue
-
-                # Atualiza o campo alterado
-                query = f"UPDATE Escolaridade_DePara SET {field} = ? WHERE id = ?"
-                cursor.execute(query, (value, record_id))
-
-                # ⚙️ NOVO: se for o campo Escolaridade_Codigo, buscar descrição automaticamente
-                if field == 'Escolaridade_Codigo' and banco_homo:
-                    nova_descricao = None
-                    if value and value != 'S/DePara':
-                        nova_descricao = obter_descricao_wf(banco_homo, value)
-                    
-                    if nova_descricao:
-                        cursor.execute("""
-                            UPDATE Escolaridade_DePara
-                            SET Escolaridade_Descricao = ?
-                            WHERE id = ?
-                        """, (nova_descricao, record_id))
-                        logger.info(f"Descrição atualizada automaticamente para o código {value}: {nova_descricao}")
-
-                if cursor.rowcount > 0:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    error_messages.append(f"Registro não encontrado: {record_id}")
-
-            except Exception as e:
-                error_count += 1
-                error_messages.append(f"Erro ao atualizar {record_id}: {str(e)}")
+        success_count, error_count, error_messages = atualizar_campos_em_lote(
+            cursor, "Escolaridade_DePara", updates, colunas_permitidas,
+            derivados=descricao_automatica(
+                'Escolaridade_Codigo', 'Escolaridade_Descricao', lambda codigo: obter_descricao_wf(banco_homo, codigo)
+            ) if banco_homo else None,
+        )
 
         conexao.commit()
         logger.info(f"Batch update concluído: {success_count} sucessos, {error_count} erros")
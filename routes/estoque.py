@@ -7,80 +7,27 @@ from flask import (
     flash,
     request,
     jsonify,
-    send_file,
 )
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_projeto, conexao_homologacao
+from db.upsert import UpsertEmMassa
+from utils.projeto_metadados import obter_banco_homo
+from utils.catalogo_wf import codigos_wf, descricao_wf, atualizar_descricoes_depara
 from logger import logger
-from utils.excel_utils import export_to_excel, import_from_excel
-import pandas as pd
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
+from utils.excel_utils import export_to_excel, import_from_excel, PlanilhaEmLotes
+from utils.progresso_depara import DeltaProgresso
+from utils.grade_depara import resposta_grade, resposta_exportacao_grade
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.exportacao_colunar import formato_colunar, resposta_colunar
 
 estoque_bp = Blueprint("estoque", __name__)
 
-def obter_banco_homo(projeto_id):
-    """Obter BancoHomo (mesma lógica usada nos outros módulos)"""
-    try:
-        conn = conectar_banco()
-        if not conn:
-            logger.error("Falha ao conectar ao banco principal para obter BancoHomo")
-            return None
-
-        cursor = conn.cursor()
-        cursor.execute("SELECT BancoHomo FROM Projeto WHERE ProjetoID = ?", projeto_id)
-        resultado = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-    except Exception as e:
-        logger.error(f"Erro ao obter BancoHomo: {str(e)}")
-        return None
-
 def obter_codigos_wf(banco_homo):
     """Obtém todos os códigos da tabela estoque do banco homólogo"""
-    try:
-        if not banco_homo:
-            return []
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return []
-        cursor = conexao.cursor()
-        cursor.execute("SELECT Estoque_Codigo FROM estoque")
-        registros = cursor.fetchall()
-        cursor.close()
-        conexao.close()
-        codigos = [str(r[0]) for r in registros if r and r[0] is not None]
-        logger.info(f"Encontrados {len(codigos)} códigos na base WF (estoque)")
-        return codigos
-    except Exception as e:
-        logger.error(f"Erro ao obter códigos WF (estoque): {str(e)}")
-        return []
+    return codigos_wf(banco_homo, "Estoque")
 
 def obter_descricao_wf(banco_homo, codigo):
     """Obtém a descrição de um código específico da tabela estoque do banco homólogo"""
-    try:
-        if not banco_homo or not codigo:
-            return None
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return None
-        cursor = conexao.cursor()
-        cursor.execute("SELECT Estoque_Descricao FROM estoque WHERE Estoque_Codigo = ?", codigo)
-        resultado = cursor.fetchone()
-        cursor.close()
-        conexao.close()
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-    except Exception as e:
-        logger.error(f"Erro ao obter descrição WF para código {codigo} (estoque): {str(e)}")
-        return None
+    return descricao_wf(banco_homo, "Estoque", codigo)
 
 @estoque_bp.route("/")
 def index():
@@ -98,16 +45,15 @@ def index():
             flash('Banco não configurado para este projeto.', 'error')
             return redirect(url_for('auth.selecionar_projeto'))
 
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
-            return render_template('estoque.html', registros=[], colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
+            return render_template('estoque.html', colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
 
         cursor = conexao.cursor()
-        cursor.execute("SELECT * FROM Estoque_DePara")
-        registros = cursor.fetchall()
+        # Só os nomes das colunas: as linhas vêm do /dados, em páginas
+        cursor.execute("SELECT TOP 0 * FROM Estoque_DePara")
         colunas = [column[0] for column in cursor.description]
-        registros_dict = [dict(zip(colunas, row)) for row in registros]
 
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
@@ -116,7 +62,6 @@ def index():
         conexao.close()
 
         return render_template('estoque.html',
-                               registros=registros_dict,
                                colunas=colunas,
                                projeto_nome=projeto_nome,
                                banco_usuario=banco_usuario,
@@ -125,7 +70,13 @@ def index():
     except Exception as e:
         logger.error(f"Erro em estoque.index: {str(e)}")
         flash(f'Erro: {str(e)}', 'error')
-        return render_template('estoque.html', registros=[], colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+        return render_template('estoque.html', colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+
+@estoque_bp.route('/dados')
+def dados():
+    """Página do grid em JSON (paginação por chave, filtros e ordenação no servidor)"""
+    return resposta_grade("Estoque_DePara", obter_codigos_wf, linhas="partials/linhas/estoque.html")
+
 
 @estoque_bp.route('/exportar')
 def exportar_estoque():
@@ -142,7 +93,7 @@ def exportar_estoque():
             flash('Banco não configurado para este projeto.', 'error')
             return redirect(url_for('estoque.index'))
 
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return redirect(url_for('estoque.index'))
@@ -153,7 +104,6 @@ def exportar_estoque():
                    Estoque_Descricao, Origem, Estoque_Sigla
             FROM Estoque_DePara
         """)
-        registros = cursor.fetchall()
         colunas_originais = [column[0] for column in cursor.description]
 
         mapeamento_colunas = {
@@ -167,60 +117,22 @@ def exportar_estoque():
         }
         colunas_amigaveis = [mapeamento_colunas.get(col, col) for col in colunas_originais]
 
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, colunas_amigaveis, "Estoque_DePara")
+
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
 
-        wb = Workbook()
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std = wb['Sheet']
-            wb.remove(std)
-        ws = wb.create_sheet(title="Estoque_DePara")
-
-        for col_num, coluna in enumerate(colunas_amigaveis, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-
-        for row_num, registro in enumerate(registros, 2):
-            for col_num, valor in enumerate(registro, 1):
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                # Estoque_Codigo está na posição 4 na query acima
-                if col_num == 4:
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            ws.column_dimensions[column_letter].width = min(max_length + 2, 50)
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), colunas_amigaveis, "Estoque_DePara",
+            colunas_codigo=[3], codigos_wf=codigos_wf
+        )
 
         cursor.close()
         conexao.close()
 
-        out = BytesIO()
-        wb.save(out)
-        out.seek(0)
-        return send_file(out, as_attachment=True, download_name="Estoque_DePara.xlsx",
-                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        return enviar_planilha(arquivo, "Estoque_DePara.xlsx")
     except Exception as e:
         logger.error(f"Erro ao exportar estoque: {str(e)}")
         flash(f'Erro na exportação: {str(e)}', 'error')
@@ -228,72 +140,9 @@ def exportar_estoque():
 
 @estoque_bp.route('/exportar_filtrados', methods=['POST'])
 def exportar_estoque_filtrados():
-    try:
-        data = request.get_json()
-        registros_filtrados = data.get('registros', [])
-        headers = data.get('headers', [])
-        if not registros_filtrados:
-            return jsonify({'success': False, 'message': 'Nenhum registro para exportar'}), 400
+    """Exporta do banco os registros que atendem ao filtro do grid (status, busca, filtros por coluna, ordem)"""
+    return resposta_exportacao_grade("Estoque_DePara", "Estoque_Filtrado", obter_codigos_wf)
 
-        if 'projeto_selecionado' not in session:
-            return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
-        projeto_selecionado = session['projeto_selecionado']
-        projeto_id = projeto_selecionado.get('ProjetoID')
-
-        banco_homo = obter_banco_homo(projeto_id)
-        codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-
-        wb = Workbook()
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std = wb['Sheet']
-            wb.remove(std)
-        ws = wb.create_sheet(title="Estoque_Filtrado")
-
-        for col_num, coluna in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-
-        for row_num, registro in enumerate(registros_filtrados, 2):
-            for col_num, header in enumerate(headers, 1):
-                valor = registro.get(header, '')
-                if isinstance(valor, str):
-                    valor = valor.strip()
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                if header == 'Estoque_Codigo':
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if cell.value and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            ws.column_dimensions[column_letter].width = min(max_length + 2, 50)
-
-        out = BytesIO()
-        wb.save(out)
-        out.seek(0)
-        return send_file(out, as_attachment=True, download_name="Estoque_Filtrado.xlsx",
-                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    except Exception as e:
-        logger.error(f"Erro ao exportar estoque filtrado: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
 
 @estoque_bp.route('/export_wf')
 def export_wf():
@@ -311,7 +160,7 @@ def export_wf():
             flash('Banco homólogo não configurado para este projeto.', 'error')
             return redirect(url_for('estoque.index'))
 
-        conexao = conectar_segunda_base(banco_homo)
+        conexao = conexao_homologacao(banco_homo)
         if not conexao:
             flash(f'Falha na conexão com o banco homólogo: {banco_homo}', 'error')
             return redirect(url_for('estoque.index'))
@@ -319,19 +168,18 @@ def export_wf():
         cursor = conexao.cursor()
         # SELECT solicitado: Estoque_Codigo, Estoque_Descricao, Estoque_Tipo, Estoque_Ativo
         cursor.execute("select Estoque_Codigo, Estoque_Descricao, Estoque_Tipo, Estoque_Ativo from estoque")
-        registros = cursor.fetchall()
-        colunas = [column[0] for column in cursor.description]
-        registros_list = [dict(zip(colunas, row)) for row in registros]
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, [column[0] for column in cursor.description], "Estoque_WF")
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), [column[0] for column in cursor.description], "Estoque_WF", limpar_texto=False
+        )
+
         cursor.close()
         conexao.close()
 
-        df = pd.DataFrame(registros_list, columns=colunas)
-        out = BytesIO()
-        with pd.ExcelWriter(out, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Estoque_WF', index=False)
-        out.seek(0)
-        return send_file(out, as_attachment=True, download_name="Estoque_WF.xlsx",
-                         mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        return enviar_planilha(arquivo, "Estoque_WF.xlsx")
     except Exception as e:
         logger.error(f"Erro ao exportar tabela WF (estoque): {str(e)}")
         flash(f'Erro na exportação da tabela WF: {str(e)}', 'error')
@@ -363,7 +211,7 @@ def importar_estoque():
 
         logger.info(f"Iniciando importação de estoque para o banco: {banco_usuario}")
 
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
 
@@ -380,15 +228,13 @@ def importar_estoque():
         ]
 
         try:
-            df = pd.read_excel(arquivo)
-            df = df.where(pd.notnull(df), None)
-            registros = df.to_dict('records')
-            colunas_excel = df.columns.tolist()
+            planilha = PlanilhaEmLotes(arquivo, texto=False)
+            colunas_excel = planilha.colunas
         except Exception as e:
             logger.error(f"Erro ao ler arquivo Excel (estoque): {str(e)}")
             return jsonify({'success': False, 'message': f'Erro ao ler arquivo Excel: {str(e)}'})
 
-        logger.info(f"Arquivo Excel lido: {len(registros)} registros, colunas: {colunas_excel}")
+        logger.info(f"Arquivo Excel aberto, colunas: {colunas_excel}")
 
         # Mapeamento amigável -> técnico
         mapeamento_colunas_excel = {
@@ -408,82 +254,54 @@ def importar_estoque():
             else:
                 colunas_excel_normalizadas.append(col)
 
-        df.columns = colunas_excel_normalizadas
-
         colunas_excel_set = set(colunas_excel_normalizadas)
         colunas_necessarias = set(colunas_importacao)
         if not colunas_necessarias.issubset(colunas_excel_set):
             missing = colunas_necessarias - colunas_excel_set
             return jsonify({'success': False, 'message': f'Colunas necessárias faltando no arquivo: {", ".join(missing)}'})
 
-        registros = df.to_dict('records')
-
-        registros_filtrados = []
-        for registro in registros:
-            registro_filtrado = {}
-            for col in colunas_importacao:
-                valor = registro.get(col)
-                if valor is None:
-                    registro_filtrado[col] = None
-                else:
-                    str_valor = str(valor)
-                    if col in ['est_cd', 'est_ds', 'Estoque_Descricao']:
-                        registro_filtrado[col] = str_valor[:150]
-                    elif col == 'Migra_Estoque':
-                        registro_filtrado[col] = str_valor[:3]
-                    elif col in ['Estoque_Codigo', 'Estoque_Sigla']:
-                        registro_filtrado[col] = str_valor[:100]
-                    elif col == 'Origem':
-                        registro_filtrado[col] = str_valor[:200]
-                    else:
-                        registro_filtrado[col] = str_valor
-            registros_filtrados.append(registro_filtrado)
-
-        logger.info(f"Registros filtrados e tratados: {len(registros_filtrados)}")
-
         cursor.execute("SELECT COUNT(*) FROM Estoque_DePara")
         result_antes = cursor.fetchone()
         count_antes = result_antes[0] if result_antes else 0
         logger.info(f"Registros antes da importação: {count_antes}")
 
-        contador_atualizacoes = 0
-        contador_insercoes = 0
-
-        for registro in registros_filtrados:
-            codigo_origem = registro.get('est_cd')
-            novo_codigo_wf = registro.get('Estoque_Codigo')
-            nova_descricao = registro.get('Estoque_Descricao')
-
-            if codigo_origem:
-                cursor.execute("SELECT id FROM Estoque_DePara WHERE est_cd = ?", (codigo_origem,))
-                resultado = cursor.fetchone()
-                if resultado:
-                    cursor.execute("""
-                        UPDATE Estoque_DePara
-                        SET est_ds = ?, Migra_Estoque = ?, Estoque_Codigo = ?, Estoque_Descricao = ?, Origem = ?, Estoque_Sigla = ?
-                        WHERE est_cd = ?
-                    """, (
-                        registro.get('est_ds'),
-                        registro.get('Migra_Estoque'),
-                        novo_codigo_wf,
-                        nova_descricao,
-                        registro.get('Origem'),
-                        registro.get('Estoque_Sigla'),
-                        codigo_origem
-                    ))
-                    contador_atualizacoes += 1
-                else:
-                    colunas_str = ', '.join(colunas_importacao)
-                    placeholders = ', '.join(['?' for _ in colunas_importacao])
-                    valores = [registro.get(c) for c in colunas_importacao]
-                    cursor.execute(f"INSERT INTO Estoque_DePara ({colunas_str}) VALUES ({placeholders})", valores)
-                    contador_insercoes += 1
-            else:
-                colunas_str = ', '.join(colunas_importacao)
-                placeholders = ', '.join(['?' for _ in colunas_importacao])
-                valores = [registro.get(c) for c in colunas_importacao]
-                cursor.execute(f"INSERT INTO Estoque_DePara ({colunas_str}) VALUES ({placeholders})", valores)
-                contador_insercoes += 1
+        # Sem código de origem (est_cd) o registro é inserido mesmo assim
+        carga = UpsertEmMassa(
+            cursor,
+            "Estoque_DePara",
+            colunas_importacao,
+            chave="est_cd",
+            inserir_sem_chave=True,
+        )
+        for df in planilha.lotes():
+            df.columns = colunas_excel_normalizadas
+            registros = df.to_dict('records')
+
+            registros_filtrados = []
+            for registro in registros:
+                registro_filtrado = {}
+                for col in colunas_importacao:
+                    valor = registro.get(col)
+                    if valor is None:
+                        registro_filtrado[col] = None
+                    else:
+                        str_valor = str(valor)
+                        if col in ['est_cd', 'est_ds', 'Estoque_Descricao']:
+                            registro_filtrado[col] = str_valor[:150]
+                        elif col == 'Migra_Estoque':
+                            registro_filtrado[col] = str_valor[:3]
+                        elif col in ['Estoque_Codigo', 'Estoque_Sigla']:
+                            registro_filtrado[col] = str_valor[:100]
+                        elif col == 'Origem':
+                            registro_filtrado[col] = str_valor[:200]
+                        else:
+                            registro_filtrado[col] = str_valor
+                registros_filtrados.append(registro_filtrado)
+
+            logger.info(f"Registros filtrados e tratados: {len(registros_filtrados)}")
+
+            carga.adicionar(registros_filtrados)
+        contador_atualizacoes, contador_insercoes = carga.aplicar()
 
         conexao.commit()
         logger.info(f"UPDATEs: {contador_atualizacoes}, INSERTs: {contador_insercoes}")
@@ -491,24 +309,10 @@ def importar_estoque():
         banco_homo = obter_banco_homo(projeto_id)
         if banco_homo:
             logger.info("Atualizando descrições de estoque com base no banco homólogo...")
-            # percorre e atualiza descrições com base no banco homólogo
-            conexao_aux = conectar_segunda_base(banco_usuario)
-            if conexao_aux:
-                cursor_aux = conexao_aux.cursor()
-                cursor_aux.execute("""
-                    SELECT id, Estoque_Codigo, Estoque_Descricao 
-                    FROM Estoque_DePara 
-                    WHERE Estoque_Codigo IS NOT NULL AND Estoque_Codigo != 'S/DePara'
-                """)
-                rows = cursor_aux.fetchall()
-                for row in rows:
-                    id_reg, codigo_wf, desc_atual = row
-                    desc_wf = obter_descricao_wf(banco_homo, codigo_wf)
-                    if desc_wf and desc_wf != desc_atual:
-                        cursor_aux.execute("UPDATE Estoque_DePara SET Estoque_Descricao = ? WHERE id = ?", (desc_wf, id_reg))
-                conexao_aux.commit()
-                cursor_aux.close()
-                conexao_aux.close()
+            atualizar_descricoes_depara(
+                banco_usuario, banco_homo, "Estoque", "Estoque_DePara", "Estoque_Codigo",
+                {"Estoque_Descricao": 0},
+            )
 
         cursor.execute("SELECT COUNT(*) FROM Estoque_DePara")
         result_depois = cursor.fetchone()
@@ -572,7 +376,7 @@ def update_registro():
         banco_usuario = projeto_selecionado.get('DadosGX')
         projeto_id = projeto_selecionado.get('ProjetoID')
 
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'}), 500
 
@@ -582,7 +386,11 @@ def update_registro():
             if value != 'S/DePara' and value is not None and not str(value).isdigit():
                 return jsonify({'success': False, 'message': 'Estoque_Codigo deve ser somente números ou "S/DePara"'}), 400
 
+        # Pendentes do resumo de progresso: conta antes, ajusta antes do commit
+        delta_progresso = DeltaProgresso(cursor, "Estoque_DePara", [record_id], [field])
+
         cursor.execute(f"UPDATE Estoque_DePara SET {field} = ? WHERE id = ?", (value, record_id))
+        delta_progresso.aplicar()
         conexao.commit()
         logger.info(f"Registro id={record_id} atualizado: {field} = {value}")
 
@@ -7,14 +7,20 @@ from flask import (
     flash,
     request,
     jsonify,
-    send_file,
 )
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_projeto, conexao_homologacao
+from db.atualizacao import atualizar_campos_em_lote
+from db.upsert import UpsertEmMassa
+from utils.projeto_metadados import obter_banco_homo
+from utils.catalogo_wf import codigos_wf, descricao_wf, atualizar_descricoes_depara
+from utils.progresso_depara import DeltaProgresso
+from utils.grade_depara import resposta_grade, resposta_exportacao_grade
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.excel_utils import PlanilhaEmLotes
+from utils.validacao_importacao import ValidacaoImportacao
+from utils.exportacao_colunar import formato_colunar, resposta_colunar
 from logger import logger
 import pandas as pd
-import io
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
 from datetime import datetime
 
 historicopadrao_bp = Blueprint("historicopadrao", __name__)
@@ -38,124 +44,20 @@ def safe_convert_id(value):
     except (ValueError, TypeError):
         raise ValueError(f"Valor não pode ser convertido para inteiro: {value}")
 
-def obter_banco_homo(projeto_id):
-    """Função para obter o BancoHomo diretamente do banco de dados"""
-    try:
-        conn = conectar_banco()
-        if not conn:
-            logger.error("Falha ao conectar ao banco principal para obter BancoHomo")
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT BancoHomo FROM Projeto WHERE ProjetoID = ?", (projeto_id,))
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter BancoHomo: {str(e)}")
-        return None
-
 def obter_codigos_hp_wf(banco_homo):
     """Obtém todos os códigos da tabela HistoricoPadrao do banco homólogo"""
-    try:
-        if not banco_homo:
-            return []
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return []
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT HistoricoPadrao_Codigo FROM HistoricoPadrao")
-        registros = cursor.fetchall()
-        
-        codigos = [str(registro[0]) for registro in registros if registro[0] is not None]
-        
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Encontrados {len(codigos)} códigos na base WF")
-        return codigos
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter códigos HP WF: {str(e)}")
-        return []
+    return codigos_wf(banco_homo, "HistoricoPadrao")
 
 def obter_descricao_hp_wf(banco_homo, codigo):
     """Obtém a descrição de um código específico da tabela HistoricoPadrao do banco homólogo"""
-    try:
-        if not banco_homo or not codigo:
-            return None
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return None
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT HistoricoPadrao_Descricao FROM HistoricoPadrao WHERE HistoricoPadrao_Codigo = ?", (codigo,))
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conexao.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter descrição HP WF para código {codigo}: {str(e)}")
-        return None
+    return descricao_wf(banco_homo, "HistoricoPadrao", codigo)
 
 def atualizar_descricoes_apos_importacao(banco_usuario, banco_homo):
     """Atualiza automaticamente as descrições após importação baseado nos códigos WF"""
-    try:
-        if not banco_homo:
-            return
-        
-        conexao = conectar_segunda_base(banco_usuario)
-        if not conexao:
-            logger.error("Falha ao conectar para atualizar descrições")
-            return
-        
-        cursor = conexao.cursor()
-        
-        cursor.execute("""
-            SELECT HistoricoPadrao_Codigo, HistoricoPadrao_Descricao 
-            FROM HistoricoPadrao_DePara 
-            WHERE HistoricoPadrao_Codigo IS NOT NULL AND HistoricoPadrao_Codigo != 'S/DePara'
-        """)
-        registros = cursor.fetchall()
-        
-        atualizacoes = 0
-        for registro in registros:
-            codigo_wf, descricao_atual = registro
-            descricao_wf = obter_descricao_hp_wf(banco_homo, codigo_wf)
-            
-            if descricao_wf and descricao_wf != descricao_atual:
-                cursor.execute("""
-                    UPDATE HistoricoPadrao_DePara 
-                    SET HistoricoPadrao_Descricao = ? 
-                    WHERE HistoricoPadrao_Codigo = ?
-                """, (descricao_wf, codigo_wf))
-                atualizacoes += 1
-                logger.info(f"Descrição atualizada para código {codigo_wf}: {descricao_wf}")
-        
-        conexao.commit()
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Atualizações automáticas de descrição: {atualizacoes} registros")
-        
-    except Exception as e:
-        logger.error(f"Erro ao atualizar descrições após importação: {str(e)}")
+    return atualizar_descricoes_depara(
+        banco_usuario, banco_homo, "HistoricoPadrao", "HistoricoPadrao_DePara", "HistoricoPadrao_Codigo",
+        {"HistoricoPadrao_Descricao": 0},
+    )
 
 def safe_fetchone(cursor):
     """Função segura para fetchone que evita None is not subscriptable"""
@@ -186,26 +88,21 @@ def index():
         
         logger.info(f"Tentando conectar ao banco: {banco_usuario} para o projeto: {projeto_nome}")
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return render_template('historicopadrao.html', 
-                                 registros=[], 
                                  colunas=[], 
                                  projeto_nome=projeto_nome, 
                                  banco_usuario=banco_usuario, 
                                  codigos_wf=[])
         
         cursor = conexao.cursor()
-        cursor.execute("SELECT * FROM HistoricoPadrao_DePara")
-        registros = cursor.fetchall()
+        # Só os nomes das colunas: as linhas vêm do /dados, em páginas
+        cursor.execute("SELECT TOP 0 * FROM HistoricoPadrao_DePara")
         
         colunas = [column[0] for column in cursor.description]
-        
-        registros_dict = [dict(zip(colunas, row)) for row in registros]
-        
-        logger.info(f"Encontrados {len(registros_dict)} registros")
-        
+
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = []
         if banco_homo:
@@ -217,7 +114,6 @@ def index():
         conexao.close()
         
         return render_template('historicopadrao.html', 
-                             registros=registros_dict, 
                              colunas=colunas,
                              projeto_nome=projeto_nome,
                              banco_usuario=banco_usuario,
@@ -228,12 +124,17 @@ def index():
         logger.error(f"Erro em historicopadrao: {str(e)}")
         flash(f'Erro: {str(e)}', 'error')
         return render_template('historicopadrao.html', 
-                             registros=[], 
                              colunas=[], 
                              projeto_nome='N/A', 
                              banco_usuario='N/A', 
                              codigos_wf=[])
 
+@historicopadrao_bp.route('/dados')
+def dados():
+    """Página do grid em JSON (paginação por chave, filtros e ordenação no servidor)"""
+    return resposta_grade("HistoricoPadrao_DePara", obter_codigos_hp_wf, chave="cdbdados", linhas="partials/linhas/historicopadrao.html")
+
+
 @historicopadrao_bp.route('/exportar')
 def exportar():
     try:
@@ -249,7 +150,7 @@ def exportar():
             flash('Banco não configurado para este projeto.', 'error')
             return redirect(url_for('historicopadrao.index'))
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return redirect(url_for('historicopadrao.index'))
@@ -261,7 +162,6 @@ def exportar():
                    HistoricoPadrao_Sigla, Estrutura_Codigo
             FROM HistoricoPadrao_DePara
         """)
-        registros = cursor.fetchall()
         colunas_originais = [column[0] for column in cursor.description]
         
         mapeamento_colunas = {
@@ -277,70 +177,22 @@ def exportar():
         
         colunas_amigaveis = [mapeamento_colunas.get(col, col) for col in colunas_originais]
         
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, colunas_amigaveis, "HistoricoPadrao_DePara")
+
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_hp_wf(banco_homo) if banco_homo else []
-        
-        wb = Workbook()
-        
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        ws = wb.create_sheet(title="HistoricoPadrao_DePara")
-        
-        for col_num, coluna in enumerate(colunas_amigaveis, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-        
-        for row_num, registro in enumerate(registros, 2):
-            for col_num, valor in enumerate(registro, 1):
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                if col_num == 5:  # HistoricoPadrao_Codigo
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), colunas_amigaveis, "HistoricoPadrao_DePara",
+            colunas_codigo=[4], codigos_wf=codigos_wf
+        )
+
         cursor.close()
         conexao.close()
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        nome_arquivo = "HistoricoPadrao_DePara.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "HistoricoPadrao_DePara.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar historicopadrao: {str(e)}")
@@ -349,85 +201,9 @@ def exportar():
 
 @historicopadrao_bp.route('/exportar_filtrados', methods=['POST'])
 def exportar_filtrados():
-    try:
-        data = request.get_json()
-        registros_filtrados = data.get('registros', [])
-        headers = data.get('headers', [])
-        
-        if not registros_filtrados:
-            return jsonify({'success': False, 'message': 'Nenhum registro para exportar'}), 400
-        
-        if 'projeto_selecionado' not in session:
-            return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
-        
-        projeto_selecionado = session['projeto_selecionado']
-        projeto_id = projeto_selecionado.get('ProjetoID')
-        
-        banco_homo = obter_banco_homo(projeto_id)
-        codigos_wf = obter_codigos_hp_wf(banco_homo) if banco_homo else []
-        
-        wb = Workbook()
-        
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        ws = wb.create_sheet(title="HistoricoPadrao_Filtrado")
-        
-        for col_num, coluna in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-        
-        for row_num, registro in enumerate(registros_filtrados, 2):
-            for col_num, header in enumerate(headers, 1):
-                valor = registro.get(header, '')
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                if header == 'HistoricoPadrao_Codigo':
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="HistoricoPadrao_Filtrado.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro ao exportar historicopadrao filtrada: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
+    """Exporta do banco os registros que atendem ao filtro do grid (status, busca, filtros por coluna, ordem)"""
+    return resposta_exportacao_grade("HistoricoPadrao_DePara", "HistoricoPadrao_Filtrado", obter_codigos_hp_wf, chave="cdbdados")
+
 
 @historicopadrao_bp.route('/export_wf')
 def export_wf():
@@ -448,37 +224,25 @@ def export_wf():
         
         logger.info(f"Exportando tabela WF do banco homólogo: {banco_homo}")
         
-        conexao = conectar_segunda_base(banco_homo)
+        conexao = conexao_homologacao(banco_homo)
         if not conexao:
             flash(f'Falha na conexão com o banco homólogo: {banco_homo}', 'error')
             return redirect(url_for('historicopadrao.index'))
         
         cursor = conexao.cursor()
         cursor.execute("SELECT HistoricoPadrao_Codigo, HistoricoPadrao_Descricao, HistoricoPadrao_Sigla, Estrutura_Codigo, HistoricoPadrao_Ativo FROM HistoricoPadrao")
-        registros = cursor.fetchall()
-        colunas = [column[0] for column in cursor.description]
-        
-        registros_list = [dict(zip(colunas, row)) for row in registros]
-        
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, [column[0] for column in cursor.description], "HistoricoPadrao_WF")
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), [column[0] for column in cursor.description], "HistoricoPadrao_WF", limpar_texto=False
+        )
+
         cursor.close()
         conexao.close()
-        
-        df = pd.DataFrame(registros_list, columns=colunas)
-        
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='HistoricoPadrao_WF', index=False)
-        
-        output.seek(0)
-        
-        nome_arquivo = "HistoricoPadrao_WF.xlsx"
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "HistoricoPadrao_WF.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar tabela WF: {str(e)}")
@@ -512,25 +276,22 @@ def importar():
         
         logger.info(f"Iniciando importação para o banco: {banco_usuario}")
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         
         cursor = conexao.cursor()
         
         try:
-            # Ler o arquivo Excel
-            df = pd.read_excel(arquivo, dtype=str, na_values=['', ' ', 'NULL', 'null', 'NaN'])
-            df = df.where(pd.notnull(df), None)
-            
+            # Ler o arquivo Excel em lotes, mantendo os valores como texto
+            planilha = PlanilhaEmLotes(arquivo, na_values=['', ' ', 'NULL', 'null', 'NaN'])
         except Exception as e:
             logger.error(f"Erro ao ler arquivo Excel: {str(e)}")
             return jsonify({'success': False, 'message': f'Erro ao ler arquivo Excel: {str(e)}'})
         
-        registros = df.to_dict('records')
-        colunas_excel = df.columns.tolist()
+        colunas_excel = planilha.colunas
         
-        logger.info(f"Arquivo Excel lido: {len(registros)} registros, colunas: {colunas_excel}")
+        logger.info(f"Arquivo Excel aberto, colunas: {colunas_excel}")
         
         # Colunas esperadas para HistoricoPadrao
         colunas_banco = [
@@ -549,142 +310,48 @@ def importar():
                 'message': f'Colunas obrigatórias faltando no arquivo: {", ".join(colunas_faltantes)}'
             })
         
-        # Mapear registros
-        registros_mapeados = []
-        for idx, registro in enumerate(registros):
-            registro_mapeado = {}
-            
-            for coluna_banco in colunas_banco:
-                valor = registro.get(coluna_banco)
-                
-                # VALIDAÇÃO CRÍTICA: HistoricoPadrao_Codigo não pode ser nulo
-                if coluna_banco == 'HistoricoPadrao_Codigo':
-                    if valor is None or str(valor).strip() == '':
-                        return jsonify({
-                            'success': False, 
-                            'message': f'Erro na linha {idx+2}: HistoricoPadrao_Codigo não pode ser nulo ou vazio'
-                        })
-                
-                # Processar o valor conforme o tipo da coluna
-                if valor is not None and isinstance(valor, str):
-                    valor = valor.strip()
-                    if valor == '':
-                        valor = None
-                
-                # Conversão específica para campos numéricos
-                if coluna_banco in ['cdbdados', 'HistoricoPadrao_Codigo']:
-                    try:
-                        if valor is not None and str(valor).strip() != '':
-                            valor = int(valor)
-                        else:
-                            valor = None
-                    except (ValueError, TypeError):
-                        valor = None
-                
-                # Para Estrutura_Codigo, pode ser string como 'E001', então não converter para int
-                if coluna_banco == 'Estrutura_Codigo':
-                    if valor is not None and str(valor).strip() != '':
-                        # Tentar converter para int, se não conseguir, manter como string
-                        try:
-                            valor = int(valor)
-                        except (ValueError, TypeError):
-                            valor = str(valor).strip()
-                    else:
-                        valor = None
-                
-                # Conversão específica para data
-                if coluna_banco == 'dtbloqueio':
-                    if valor is not None and str(valor).strip() != '':
-                        try:
-                            if isinstance(valor, str):
-                                valor = pd.to_datetime(valor)
-                        except (ValueError, TypeError):
-                            valor = None
-                    else:
-                        valor = None
-                
-                registro_mapeado[coluna_banco] = valor
-            
-            registros_mapeados.append(registro_mapeado)
-        
-        logger.info(f"Registros mapeados: {len(registros_mapeados)}")
-        
-        # VALIDAÇÃO FINAL: Garantir que nenhum HistoricoPadrao_Codigo seja nulo
-        for idx, registro in enumerate(registros_mapeados):
-            if registro.get('HistoricoPadrao_Codigo') is None:
-                return jsonify({
-                    'success': False, 
-                    'message': f'Erro na linha {idx+2}: HistoricoPadrao_Codigo não pode ser nulo'
-                })
-        
         # Contar registros antes
         cursor.execute("SELECT COUNT(*) FROM HistoricoPadrao_DePara")
         count_antes = safe_fetchone(cursor)
         logger.info(f"Registros na tabela ANTES da importação: {count_antes}")
         
         try:
-            contador_insercoes = 0
-            contador_atualizacoes = 0
-            
-            for registro in registros_mapeados:
-                cdbdados = registro.get('cdbdados')
-                
-                # Verificar se o registro existe
-                cursor.execute("SELECT cdbdados FROM HistoricoPadrao_DePara WHERE cdbdados = ?", (cdbdados,))
-                resultado = cursor.fetchone()
-                
-                if resultado:
-                    # Registro existe - fazer UPDATE
-                    logger.info(f"Registro cdbdados {cdbdados} existe, executando UPDATE")
-                    
-                    cursor.execute("""
-                        UPDATE HistoricoPadrao_DePara 
-                        SET cdhistpad = ?, 
-                            dchistpad = ?,
-                            dtbloqueio = ?,
-                            HistoricoPadrao_Codigo = ?, 
-                            HistoricoPadrao_Descricao = ?, 
-                            HistoricoPadrao_Sigla = ?,
-                            Estrutura_Codigo = ?
-                        WHERE cdbdados = ?
-                    """, (
-                        registro.get('cdhistpad'),
-                        registro.get('dchistpad'),
-                        registro.get('dtbloqueio'),
-                        registro.get('HistoricoPadrao_Codigo'),
-                        registro.get('HistoricoPadrao_Descricao'),
-                        registro.get('HistoricoPadrao_Sigla'),
-                        registro.get('Estrutura_Codigo'),
-                        cdbdados
-                    ))
-                    
-                    if cursor.rowcount > 0:
-                        contador_atualizacoes += 1
-                        logger.info(f"UPDATE bem-sucedido para registro cdbdados {cdbdados}")
-                else:
-                    # Registro não existe - fazer INSERT
-                    logger.info(f"Registro cdbdados {cdbdados} não existe, executando INSERT")
-                    
-                    cursor.execute("""
-                        INSERT INTO HistoricoPadrao_DePara 
-                        (cdbdados, cdhistpad, dchistpad, dtbloqueio,
-                         HistoricoPadrao_Codigo, HistoricoPadrao_Descricao, 
-                         HistoricoPadrao_Sigla, Estrutura_Codigo)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                    """, (
-                        cdbdados,
-                        registro.get('cdhistpad'),
-                        registro.get('dchistpad'),
-                        registro.get('dtbloqueio'),
-                        registro.get('HistoricoPadrao_Codigo'),
-                        registro.get('HistoricoPadrao_Descricao'),
-                        registro.get('HistoricoPadrao_Sigla'),
-                        registro.get('Estrutura_Codigo')
-                    ))
-                    
-                    if cursor.rowcount > 0:
-                        contador_insercoes += 1
-                        logger.info(f"INSERT bem-sucedido para registro cdbdados {cdbdados}")
+            # HistoricoPadrao_Codigo é obrigatório; cdbdados e o código viram int
+            validacao = ValidacaoImportacao(
+                {coluna: coluna for coluna in colunas_banco}, colunas_banco, colunas_excel, chave=None,
+                obrigatorias=['HistoricoPadrao_Codigo'], inteiros=['cdbdados', 'HistoricoPadrao_Codigo'],
+            )
+            carga = UpsertEmMassa(
+                cursor, "HistoricoPadrao_DePara",
+                ['cdbdados', 'cdhistpad', 'dchistpad', 'dtbloqueio', 'HistoricoPadrao_Codigo',
+                 'HistoricoPadrao_Descricao', 'HistoricoPadrao_Sigla', 'Estrutura_Codigo'],
+                chave='cdbdados',
+                inserir_sem_chave=True,
+            )
+            for df in planilha.lotes():
+                registros = validacao.preparar(df)
+                logger.info(f"Registros mapeados: {len(registros)}")
+
+                # Estrutura_Codigo pode ser texto como 'E001': só os números viram int
+                estrutura = registros['Estrutura_Codigo']
+                numericos = estrutura.notna() & estrutura.astype(str).str.fullmatch(r'[+-]?\d+')
+                registros.loc[numericos, 'Estrutura_Codigo'] = [int(v) for v in estrutura[numericos]]
+
+                # dtbloqueio: datas inválidas ficam nulas
+                datas = pd.to_datetime(registros['dtbloqueio'], errors='coerce')
+                registros['dtbloqueio'] = datas.astype(object).where(datas.notna(), None)
+
+                if not validacao.erros:
+                    carga.adicionar(registros.to_dict('records'))
+            # Com erros nada chega à tabela (as linhas param na staging temporária)
+            if validacao.erros:
+                return jsonify({
+                    'success': False,
+                    'message': validacao.mensagem(),
+                    'erros': validacao.erros
+                })
+            contador_atualizacoes, contador_insercoes = carga.aplicar()
+            logger.info(f"Arquivo Excel lido: {planilha.total} registros")
             
             logger.info(f"Operações concluídas: {contador_atualizacoes} UPDATEs, {contador_insercoes} INSERTs")
             
@@ -762,17 +429,14 @@ def update_registro():
         
         projeto_selecionado = session['projeto_selecionado']
         banco_usuario = projeto_selecionado.get('DadosGX')
-        projeto_id = projeto_selecionado.get('ProjetoID')
         
         if not banco_usuario:
             logger.error("Banco não configurado para este projeto")
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
         
-        banco_homo = obter_banco_homo(projeto_id)
-        
         logger.info(f"Atualizando registro {record_id}, campo {field} para valor '{value}' no banco {banco_usuario}")
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             logger.error(f"Falha na conexão com o banco: {banco_usuario}")
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
@@ -789,6 +453,9 @@ def update_registro():
             logger.error(f"Erro ao verificar registro: {str(e)}")
             return jsonify({'success': False, 'message': f'Campo {field} não existe na tabela'})
         
+        # Pendentes do resumo de progresso: conta antes, ajusta antes do commit
+        delta_progresso = DeltaProgresso(cursor, "HistoricoPadrao_DePara", [record_id], [field], chave='cdbdados')
+
         query = f"UPDATE HistoricoPadrao_DePara SET {field} = ? WHERE cdbdados = ?"
         logger.info(f"Executando query: {query} com valores: ({value}, {record_id})")
         
@@ -800,6 +467,7 @@ def update_registro():
                 conexao.rollback()
             return jsonify({'success': False, 'message': 'Registro não encontrado ou não modificado'})
         
+        delta_progresso.aplicar()
         conexao.commit()
         
         logger.info(f"Registro {record_id} atualizado com sucesso")
@@ -850,50 +518,22 @@ def update_batch():
 
         projeto_selecionado = session['projeto_selecionado']
         banco_usuario = projeto_selecionado.get('DadosGX')
-        projeto_id = projeto_selecionado.get('ProjetoID')
 
         if not banco_usuario:
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
 
-        banco_homo = obter_banco_homo(projeto_id)
-
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
 
         cursor = conexao.cursor()
-        success_count = 0
-        error_count = 0
-        error_messages = []
 
         colunas_permitidas = ['HistoricoPadrao_Codigo', 'HistoricoPadrao_Descricao', 'HistoricoPadrao_Sigla', 'Estrutura_Codigo']
 
-        for update in updates:
-            try:
-                record_id = update.get('id')
-                field = update.get('field')
-                value = update.get('value')
-
-                if not record_id or not field:
-                    error_count += 1
-                    continue
-
-                if field not in colunas_permitidas:
-                    error_count += 1
-                    continue
-
-                query = f"UPDATE HistoricoPadrao_DePara SET {field} = ? WHERE cdbdados = ?"
-                cursor.execute(query, (value, record_id))
-                
-                if cursor.rowcount > 0:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    error_messages.append(f"Registro não encontrado: {record_id}")
-
-            except Exception as e:
-                error_count += 1
-                error_messages.append(f"Erro ao atualizar {record_id}: {str(e)}")
+        success_count, error_count, error_messages = atualizar_campos_em_lote(
+            cursor, "HistoricoPadrao_DePara", updates, colunas_permitidas,
+            chave='cdbdados',
+        )
 
         conexao.commit()
         logger.info(f"Batch update concluído: {success_count} sucessos, {error_count} erros")
@@ -957,7 +597,7 @@ def dados_historicopadrao(banco_usuario):
     if not banco_usuario:
         return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
 
-    conexao = conectar_segunda_base(banco_usuario)
+    conexao = conexao_projeto(banco_usuario)
     if not conexao:
         return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
 
@@ -7,14 +7,19 @@ from flask import (
     flash,
     request,
     jsonify,
-    send_file,
 )
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_projeto, conexao_homologacao
+from db.atualizacao import atualizar_campos_em_lote
+from db.upsert import UpsertEmMassa
+from utils.projeto_metadados import obter_banco_homo
+from utils.catalogo_wf import codigos_wf, descricao_wf, atualizar_descricoes_depara
+from utils.progresso_depara import DeltaProgresso
+from utils.grade_depara import resposta_grade, resposta_exportacao_grade
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.excel_utils import PlanilhaEmLotes
+from utils.validacao_importacao import ValidacaoImportacao
+from utils.exportacao_colunar import formato_colunar, resposta_colunar
 from logger import logger
-import pandas as pd
-import io
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
 
 modeloveiculo_bp = Blueprint("modeloveiculo", __name__)
 
@@ -25,143 +30,20 @@ def safe_fetchone(cursor):
         return result[0]
     return 0
 
-def safe_convert_id(value):
-    """Converte valores para inteiro de forma segura"""
-    if value is None:
-        return None
-    try:
-        if isinstance(value, float):
-            return int(value)
-        elif isinstance(value, str):
-            cleaned = value.strip()
-            if cleaned == '':
-                return None
-            return int(float(cleaned))
-        elif isinstance(value, int):
-            return value
-        else:
-            return int(value)
-    except (ValueError, TypeError):
-        raise ValueError(f"Valor não pode ser convertido para inteiro: {value}")
-
-def obter_banco_homo(projeto_id):
-    """Função para obter o BancoHomo diretamente do banco de dados"""
-    try:
-        conn = conectar_banco()
-        if not conn:
-            logger.error("Falha ao conectar ao banco principal para obter BancoHomo")
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT BancoHomo FROM Projeto WHERE ProjetoID = ?", (projeto_id,))
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter BancoHomo: {str(e)}")
-        return None
-
 def obter_codigos_wf_modelo(banco_homo):
     """Obtém todos os códigos da tabela ModeloVeiculo do banco homólogo"""
-    try:
-        if not banco_homo:
-            return []
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return []
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT ModeloVeiculo_Codigo FROM ModeloVeiculo")
-        registros = cursor.fetchall()
-        
-        codigos = [str(registro[0]) for registro in registros if registro[0] is not None]
-        
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Encontrados {len(codigos)} códigos na base WF para ModeloVeiculo")
-        return codigos
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter códigos WF para ModeloVeiculo: {str(e)}")
-        return []
+    return codigos_wf(banco_homo, "ModeloVeiculo")
 
 def obter_descricao_wf_modelo(banco_homo, codigo):
     """Obtém a descrição de um código específico da tabela ModeloVeiculo do banco homólogo"""
-    try:
-        if not banco_homo or not codigo:
-            return None
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return None
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT ModeloVeiculo_Descricao FROM ModeloVeiculo WHERE ModeloVeiculo_Codigo = ?", (codigo,))
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conexao.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter descrição WF para código {codigo}: {str(e)}")
-        return None
+    return descricao_wf(banco_homo, "ModeloVeiculo", codigo)
 
 def atualizar_descricoes_apos_importacao(banco_usuario, banco_homo):
     """Atualiza automaticamente as descrições após importação baseado nos códigos WF"""
-    try:
-        if not banco_homo:
-            return
-        
-        conexao = conectar_segunda_base(banco_usuario)
-        if not conexao:
-            logger.error("Falha ao conectar para atualizar descrições")
-            return
-        
-        cursor = conexao.cursor()
-        
-        cursor.execute("""
-            SELECT id, ModeloVeiculo_Codigo, ModeloVeiculo_Descricao 
-            FROM ModeloVeiculo_DePara 
-            WHERE ModeloVeiculo_Codigo IS NOT NULL AND ModeloVeiculo_Codigo != 'S/DePara'
-        """)
-        registros = cursor.fetchall()
-        
-        atualizacoes = 0
-        for registro in registros:
-            id_registro, codigo_wf, descricao_atual = registro
-            descricao_wf = obter_descricao_wf_modelo(banco_homo, codigo_wf)
-            
-            if descricao_wf and descricao_wf != descricao_atual:
-                cursor.execute("""
-                    UPDATE ModeloVeiculo_DePara 
-                    SET ModeloVeiculo_Descricao = ? 
-                    WHERE id = ?
-                """, (descricao_wf, id_registro))
-                atualizacoes += 1
-                logger.info(f"Descrição atualizada para código {codigo_wf}: {descricao_wf}")
-        
-        conexao.commit()
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Atualizações automáticas de descrição: {atualizacoes} registros")
-        
-    except Exception as e:
-        logger.error(f"Erro ao atualizar descrições após importação: {str(e)}")
+    return atualizar_descricoes_depara(
+        banco_usuario, banco_homo, "ModeloVeiculo", "ModeloVeiculo_DePara", "ModeloVeiculo_Codigo",
+        {"ModeloVeiculo_Descricao": 0},
+    )
 
 @modeloveiculo_bp.route("/")
 def index():
@@ -183,24 +65,19 @@ def index():
         logger.info(f"Tentando conectar ao banco: {banco_usuario} para o projeto: {projeto_nome}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
-            return render_template('modeloveiculo.html', registros=[], colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
+            return render_template('modeloveiculo.html', colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
         
         # Executar consulta
         cursor = conexao.cursor()
-        cursor.execute("SELECT * FROM ModeloVeiculo_DePara")
-        registros = cursor.fetchall()
+        # Só os nomes das colunas: as linhas vêm do /dados, em páginas
+        cursor.execute("SELECT TOP 0 * FROM ModeloVeiculo_DePara")
         
         # Obter nomes das colunas
         colunas = [column[0] for column in cursor.description]
-        
-        # Converter para dicionários
-        registros_dict = [dict(zip(colunas, row)) for row in registros]
-        
-        logger.info(f"Encontrados {len(registros_dict)} registros")
-        
+
         # Obter códigos WF para validação
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = []
@@ -214,7 +91,6 @@ def index():
         conexao.close()
         
         return render_template('modeloveiculo.html', 
-                             registros=registros_dict, 
                              colunas=colunas,
                              projeto_nome=projeto_nome,
                              banco_usuario=banco_usuario,
@@ -224,7 +100,13 @@ def index():
     except Exception as e:
         logger.error(f"Erro em modeloveiculo: {str(e)}")
         flash(f'Erro: {str(e)}', 'error')
-        return render_template('modeloveiculo.html', registros=[], colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+        return render_template('modeloveiculo.html', colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+
+@modeloveiculo_bp.route('/dados')
+def dados():
+    """Página do grid em JSON (paginação por chave, filtros e ordenação no servidor)"""
+    return resposta_grade("ModeloVeiculo_DePara", obter_codigos_wf_modelo, linhas="partials/linhas/modeloveiculo.html")
+
 
 @modeloveiculo_bp.route('/exportar')
 def exportar_modeloveiculo():
@@ -241,14 +123,13 @@ def exportar_modeloveiculo():
             flash('Banco não configurado para este projeto.', 'error')
             return redirect(url_for('modeloveiculo.index'))
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return redirect(url_for('modeloveiculo.index'))
         
         cursor = conexao.cursor()
         cursor.execute("SELECT id, mod_cd, mod_ds, mod_montcd, molicar_cd, ModeloVeiculo_Codigo, ModeloVeiculo_Descricao, ModeloVeiculo_MarcaCod, ModeloVeiculo_ModeloMarca, ModeloVeiculo_TabelaMolicar FROM ModeloVeiculo_DePara")
-        registros = cursor.fetchall()
         colunas_originais = [column[0] for column in cursor.description]
         
         # Mapeamento para nomes mais amigáveis
@@ -267,77 +148,23 @@ def exportar_modeloveiculo():
         
         colunas_amigaveis = [mapeamento_colunas.get(col, col) for col in colunas_originais]
         
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, colunas_amigaveis, "ModeloVeiculo_DePara")
+
         # Obter códigos WF para formatação condicional
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf_modelo(banco_homo) if banco_homo else []
-        
-        wb = Workbook()
-        
-        # Remover sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        ws = wb.create_sheet(title="ModeloVeiculo_DePara")
-        
-        # Cabeçalhos
-        for col_num, coluna in enumerate(colunas_amigaveis, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Cores para formatação condicional
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-        
-        # Dados
-        for row_num, registro in enumerate(registros, 2):
-            for col_num, valor in enumerate(registro, 1):
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                # Formatação condicional na coluna ModeloVeiculo_Codigo
-                if col_num == 6:  # ModeloVeiculo_Codigo
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        # Ajustar largura das colunas
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), colunas_amigaveis, "ModeloVeiculo_DePara",
+            colunas_codigo=[5], codigos_wf=codigos_wf
+        )
+
         cursor.close()
         conexao.close()
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        nome_arquivo = "ModeloVeiculo_DePara.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "ModeloVeiculo_DePara.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar modeloveiculo: {str(e)}")
@@ -346,85 +173,9 @@ def exportar_modeloveiculo():
 
 @modeloveiculo_bp.route('/exportar_filtrados', methods=['POST'])
 def exportar_modeloveiculo_filtrados():
-    try:
-        data = request.get_json()
-        registros_filtrados = data.get('registros', [])
-        headers = data.get('headers', [])
-        
-        if not registros_filtrados:
-            return jsonify({'success': False, 'message': 'Nenhum registro para exportar'}), 400
-        
-        if 'projeto_selecionado' not in session:
-            return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
-        
-        projeto_selecionado = session['projeto_selecionado']
-        projeto_id = projeto_selecionado.get('ProjetoID')
-        
-        banco_homo = obter_banco_homo(projeto_id)
-        codigos_wf = obter_codigos_wf_modelo(banco_homo) if banco_homo else []
-        
-        wb = Workbook()
-        
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        ws = wb.create_sheet(title="ModeloVeiculo_Filtrado")
-        
-        for col_num, coluna in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
-        
-        for row_num, registro in enumerate(registros_filtrados, 2):
-            for col_num, header in enumerate(headers, 1):
-                valor = registro.get(header, '')
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                if header == 'ModeloVeiculo_Codigo':
-                    if not valor or valor == '':
-                        cell.fill = laranja
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="ModeloVeiculo_Filtrado.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro ao exportar modeloveiculo filtrado: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
+    """Exporta do banco os registros que atendem ao filtro do grid (status, busca, filtros por coluna, ordem)"""
+    return resposta_exportacao_grade("ModeloVeiculo_DePara", "ModeloVeiculo_Filtrado", obter_codigos_wf_modelo)
+
 
 @modeloveiculo_bp.route('/export_wf')
 def export_wf():
@@ -445,37 +196,25 @@ def export_wf():
         
         logger.info(f"Exportando tabela WF do banco homólogo: {banco_homo}")
         
-        conexao = conectar_segunda_base(banco_homo)
+        conexao = conexao_homologacao(banco_homo)
         if not conexao:
             flash(f'Falha na conexão com o banco homólogo: {banco_homo}', 'error')
             return redirect(url_for('modeloveiculo.index'))
         
         cursor = conexao.cursor()
         cursor.execute("SELECT ModeloVeiculo_Codigo, ModeloVeiculo_Descricao, ModeloVeiculo_MarcaCod, ModeloVeiculo_ModeloMarca, ModeloVeiculo_TabelaMolicar FROM ModeloVeiculo")
-        registros = cursor.fetchall()
-        colunas = [column[0] for column in cursor.description]
-        
-        registros_list = [dict(zip(colunas, row)) for row in registros]
-        
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, [column[0] for column in cursor.description], "ModeloVeiculo_WF")
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), [column[0] for column in cursor.description], "ModeloVeiculo_WF", limpar_texto=False
+        )
+
         cursor.close()
         conexao.close()
-        
-        df = pd.DataFrame(registros_list, columns=colunas)
-        
-        output = io.BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='ModeloVeiculo_WF', index=False)
-        
-        output.seek(0)
-        
-        nome_arquivo = "ModeloVeiculo_WF.xlsx"
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "ModeloVeiculo_WF.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar tabela WF: {str(e)}")
@@ -514,7 +253,7 @@ def importar_modeloveiculo():
         logger.info(f"Iniciando importação para o banco: {banco_usuario}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         
@@ -543,35 +282,15 @@ def importar_modeloveiculo():
         
         # Importar dados do Excel
         try:
-            dtype = {
-                'ID': 'Int64',
-                'Código Origem': 'string',
-                'Descrição Origem': 'string',
-                'Montadora Código': 'string',
-                'Molicar Código': 'string',
-                'ModeloVeiculo_Codigo': 'string',
-                'ModeloVeiculo_Descricao': 'string',
-                'ModeloVeiculo_MarcaCod': 'string',
-                'ModeloVeiculo_ModeloMarca': 'string',
-                'ModeloVeiculo_TabelaMolicar': 'string'
-            }
-            
-            # Ler o Excel
-            df = pd.read_excel(arquivo, dtype=dtype, na_values=['', ' ', 'NULL', 'null'])
-            df = df.where(pd.notnull(df), None)
-            
-            if 'ID' in df.columns:
-                df['ID'] = pd.to_numeric(df['ID'], errors='coerce').astype('Int64')
-                
-            # Converter para lista de dicionários
-            registros = df.to_dict('records')
-            colunas_excel = df.columns.tolist()
-            
+            # Ler o arquivo Excel em lotes, mantendo os valores como texto
+            planilha = PlanilhaEmLotes(arquivo, na_values=['', ' ', 'NULL', 'null'])
         except Exception as e:
             logger.error(f"Erro ao ler arquivo Excel: {str(e)}")
             return jsonify({'success': False, 'message': f'Erro ao ler arquivo Excel: {str(e)}'})
         
-        logger.info(f"Arquivo Excel lido: {len(registros)} registros, colunas: {colunas_excel}")
+        colunas_excel = planilha.colunas
+        
+        logger.info(f"Arquivo Excel aberto, colunas: {colunas_excel}")
         
         # Validar colunas necessárias
         colunas_faltantes = []
@@ -591,50 +310,6 @@ def importar_modeloveiculo():
                 'message': f'Colunas necessárias faltando no arquivo: {", ".join(colunas_faltantes)}. Certifique-se de que a planilha contém as colunas: ID, Código Origem, Descrição Origem, Montadora Código, Molicar Código, ModeloVeiculo_Codigo, ModeloVeiculo_Descricao, ModeloVeiculo_MarcaCod, ModeloVeiculo_ModeloMarca, ModeloVeiculo_TabelaMolicar'
             })
         
-        # Mapear registros
-        registros_mapeados = []
-        for registro in registros:
-            registro_mapeado = {}
-            
-            for coluna_banco in colunas_banco:
-                coluna_planilha = None
-                for chave, valor in mapeamento_colunas.items():
-                    if valor == coluna_banco and chave in colunas_excel:
-                        coluna_planilha = chave
-                        break
-                
-                if coluna_planilha:
-                    valor = registro.get(coluna_planilha)
-                    
-                    if coluna_banco == 'id':
-                        try:
-                            valor = safe_convert_id(valor)
-                        except ValueError as e:
-                            return jsonify({
-                                'success': False, 
-                                'message': f'Erro de conversão do ID: {str(e)}'
-                            })
-                    elif valor is not None and isinstance(valor, str):
-                        valor = valor.strip()
-                        if valor == '':
-                            valor = None
-                    
-                    registro_mapeado[coluna_banco] = valor
-                else:
-                    registro_mapeado[coluna_banco] = None
-            
-            registros_mapeados.append(registro_mapeado)
-        
-        logger.info(f"Registros mapeados: {len(registros_mapeados)}")
-        
-        # Validar IDs
-        for registro in registros_mapeados:
-            if registro.get('id') is None:
-                return jsonify({
-                    'success': False, 
-                    'message': 'Encontrado registro sem ID. Todos os registros devem ter um ID inteiro válido.'
-                })
-        
         # Contar registros antes da importação
         cursor.execute("SELECT COUNT(*) FROM ModeloVeiculo_DePara")
         result_antes = cursor.fetchone()
@@ -643,61 +318,27 @@ def importar_modeloveiculo():
         
         # Fazer UPDATE/INSERT dos registros
         try:
-            contador_atualizacoes = 0
-            contador_insercoes = 0
-            
-            for registro in registros_mapeados:
-                registro_id = registro.get('id')
-                codigo_origem = registro.get('mod_cd')
-                
-                if registro_id and codigo_origem:
-                    cursor.execute("SELECT id FROM ModeloVeiculo_DePara WHERE id = ?", (registro_id,))
-                    resultado = cursor.fetchone()
-                    
-                    if resultado:
-                        cursor.execute("""
-                            UPDATE ModeloVeiculo_DePara 
-                            SET mod_cd = ?, 
-                                mod_ds = ?, 
-                                mod_montcd = ?,
-                                molicar_cd = ?,
-                                ModeloVeiculo_Codigo = ?, 
-                                ModeloVeiculo_Descricao = ?,
-                                ModeloVeiculo_MarcaCod = ?,
-                                ModeloVeiculo_ModeloMarca = ?,
-                                ModeloVeiculo_TabelaMolicar = ?
-                            WHERE id = ?
-                        """, (
-                            codigo_origem,
-                            registro.get('mod_ds'),
-                            registro.get('mod_montcd'),
-                            registro.get('molicar_cd'),
-                            registro.get('ModeloVeiculo_Codigo'),
-                            registro.get('ModeloVeiculo_Descricao'),
-                            registro.get('ModeloVeiculo_MarcaCod'),
-                            registro.get('ModeloVeiculo_ModeloMarca'),
-                            registro.get('ModeloVeiculo_TabelaMolicar'),
-                            registro_id
-                        ))
-                        contador_atualizacoes += 1
-                    else:
-                        cursor.execute("""
-                            INSERT INTO ModeloVeiculo_DePara 
-                            (id, mod_cd, mod_ds, mod_montcd, molicar_cd, ModeloVeiculo_Codigo, ModeloVeiculo_Descricao, ModeloVeiculo_MarcaCod, ModeloVeiculo_ModeloMarca, ModeloVeiculo_TabelaMolicar)
-                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                        """, (
-                            registro_id,
-                            codigo_origem,
-                            registro.get('mod_ds'),
-                            registro.get('mod_montcd'),
-                            registro.get('molicar_cd'),
-                            registro.get('ModeloVeiculo_Codigo'),
-                            registro.get('ModeloVeiculo_Descricao'),
-                            registro.get('ModeloVeiculo_MarcaCod'),
-                            registro.get('ModeloVeiculo_ModeloMarca'),
-                            registro.get('ModeloVeiculo_TabelaMolicar')
-                        ))
-                        contador_insercoes += 1
+            validacao = ValidacaoImportacao(mapeamento_colunas, colunas_banco, colunas_excel, codigo=['mod_cd', 'mod_montcd'])
+            carga = UpsertEmMassa(
+                cursor,
+                "ModeloVeiculo_DePara",
+                ['id', 'mod_cd', 'mod_ds', 'mod_montcd', 'molicar_cd', 'ModeloVeiculo_Codigo', 'ModeloVeiculo_Descricao', 'ModeloVeiculo_MarcaCod', 'ModeloVeiculo_ModeloMarca', 'ModeloVeiculo_TabelaMolicar'],
+            )
+            for df in planilha.lotes():
+                registros = validacao.preparar(df)
+                logger.info(f"Registros mapeados: {len(registros)}")
+
+                if not validacao.erros:
+                    carga.adicionar(registros[registros['mod_cd'].notna()].to_dict('records'))
+            # Com erros nada chega à tabela (as linhas param na staging temporária)
+            if validacao.erros:
+                return jsonify({
+                    'success': False,
+                    'message': validacao.mensagem(),
+                    'erros': validacao.erros
+                })
+            contador_atualizacoes, contador_insercoes = carga.aplicar()
+            logger.info(f"Arquivo Excel lido: {planilha.total} registros")
             
             logger.info(f"UPDATEs executados: {contador_atualizacoes} registros")
             logger.info(f"INSERTs executados: {contador_insercoes} registros")
@@ -771,17 +412,14 @@ def update_registro():
         
         projeto_selecionado = session['projeto_selecionado']
         banco_usuario = projeto_selecionado.get('DadosGX')
-        projeto_id = projeto_selecionado.get('ProjetoID')
         
         if not banco_usuario:
             logger.error("Banco não configurado para este projeto")
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
         
-        banco_homo = obter_banco_homo(projeto_id)
-        
         logger.info(f"Atualizando registro {record_id}, campo {field} para valor '{value}' no banco {banco_usuario}")
         
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             logger.error(f"Falha na conexão com o banco: {banco_usuario}")
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
@@ -798,6 +436,9 @@ def update_registro():
             logger.error(f"Erro ao verificar registro: {str(e)}")
             return jsonify({'success': False, 'message': f'Campo {field} não existe na tabela'})
         
+        # Pendentes do resumo de progresso: conta antes, ajusta antes do commit
+        delta_progresso = DeltaProgresso(cursor, "ModeloVeiculo_DePara", [record_id], [field])
+
         query = f"UPDATE ModeloVeiculo_DePara SET {field} = ? WHERE id = ?"
         logger.info(f"Executando query: {query} com valores: ({value}, {record_id})")
         
@@ -809,6 +450,7 @@ def update_registro():
                 conexao.rollback()
             return jsonify({'success': False, 'message': 'Registro não encontrado ou não modificado'})
         
+        delta_progresso.aplicar()
         conexao.commit()
         
         logger.info(f"Registro {record_id} atualizado com sucesso")
@@ -859,50 +501,21 @@ def update_batch():
 
         projeto_selecionado = session['projeto_selecionado']
         banco_usuario = projeto_selecionado.get('DadosGX')
-        projeto_id = projeto_selecionado.get('ProjetoID')
 
         if not banco_usuario:
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
 
-        banco_homo = obter_banco_homo(projeto_id)
-
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
 
         cursor = conexao.cursor()
-        success_count = 0
-        error_count = 0
-        error_messages = []
 
         colunas_permitidas = ['ModeloVeiculo_Codigo', 'ModeloVeiculo_Descricao', 'ModeloVeiculo_MarcaCod', 'ModeloVeiculo_ModeloMarca', 'ModeloVeiculo_TabelaMolicar']
 
-        for update in updates:
-            try:
-                record_id = update.get('id')
-                field = update.get('field')
-                value = update.get('value')
-
-                if not record_id or not field:
-                    error_count += 1
-                    continue
-
-                if field not in colunas_permitidas:
-                    error_count += 1
-                    continue
-
-                query = f"UPDATE ModeloVeiculo_DePara SET {field} = ? WHERE id = ?"
-                cursor.execute(query, (value, record_id))
-                
-                if cursor.rowcount > 0:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    error_messages.append(f"Registro não encontrado: {record_id}")
-
-            except Exception as e:
-                error_count += 1
-                error_messages.append(f"Erro ao atualizar {record_id}: {str(e)}")
+        success_count, error_count, error_messages = atualizar_campos_em_lote(
+            cursor, "ModeloVeiculo_DePara", updates, colunas_permitidas,
+        )
 
         conexao.commit()
         logger.info(f"Batch update concluído: {success_count} sucessos, {error_count} erros")
@@ -967,7 +580,7 @@ def dados_modeloveiculo(banco_usuario):
     if not banco_usuario:
         return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
 
-    conexao = conectar_segunda_base(banco_usuario)
+    conexao = conexao_projeto(banco_usuario)
     if not conexao:
         return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
 
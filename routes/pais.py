@@ -7,182 +7,41 @@ from flask import (
     flash,
     request,
     jsonify,
-    send_file,
 )
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_projeto, conexao_homologacao
+from db.upsert import UpsertEmMassa
+from db.atualizacao import atualizar_campos_em_lote, descricao_automatica
+from utils.projeto_metadados import obter_banco_homo
+from utils.catalogo_wf import codigos_wf, descricao_wf, atualizar_descricoes_depara
 from logger import logger
-from utils.excel_utils import export_to_excel, import_from_excel
+from utils.excel_utils import export_to_excel, import_from_excel, PlanilhaEmLotes
+from utils.progresso_depara import DeltaProgresso
+from utils.grade_depara import resposta_grade, resposta_exportacao_grade
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.exportacao_colunar import formato_colunar, resposta_colunar
 import tempfile
 import os
-import pandas as pd
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
 
 pais_bp = Blueprint("pais", __name__)
 
-def obter_banco_homo(projeto_id):
-    """Função para obter o BancoHomo diretamente do banco de dados"""
-    try:
-        conn = conectar_banco()
-        if not conn:
-            logger.error("Falha ao conectar ao banco principal para obter BancoHomo")
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT BancoHomo FROM Projeto WHERE ProjetoID = ?", projeto_id)
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter BancoHomo: {str(e)}")
-        return None
-
 def obter_codigos_wf(banco_homo):
     """Obtém todos os códigos da tabela Pais do banco homólogo"""
-    try:
-        if not banco_homo:
-            return []
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return []
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT Pais_Codigo FROM Pais")
-        registros = cursor.fetchall()
-        
-        # Criar uma lista com todos os códigos (convertidos para string para comparação)
-        codigos = [str(registro[0]) for registro in registros if registro[0] is not None]
-        
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Encontrados {len(codigos)} códigos na base WF")
-        return codigos
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter códigos WF: {str(e)}")
-        return []
+    return codigos_wf(banco_homo, "Pais")
 
 def obter_descricao_wf(banco_homo, codigo):
     """Obtém a descrição de um código específico da tabela Pais do banco homólogo"""
-    try:
-        if not banco_homo or not codigo:
-            return None
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return None
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT Pais_Nome FROM Pais WHERE Pais_Codigo = ?", codigo)
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conexao.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter descrição WF para código {codigo}: {str(e)}")
-        return None
+    return descricao_wf(banco_homo, "Pais", codigo)
 
 def atualizar_descricoes_apos_importacao(banco_usuario, projeto_id):
     """
     Atualiza o campo Pais_Nome na tabela Pais_DePara,
     com base no Pais_Codigo e nas descrições da base de homologação (BancoHomo).
     """
-    conexao_usuario = None
-    cursor_usuario = None
-    try:
-        logger.info("🔄 Iniciando atualização de descrições (Pais_Nome) após importação...")
-
-        # Conexão com o banco do usuário (DadosGX)
-        conexao_usuario = conectar_segunda_base(banco_usuario)
-        if not conexao_usuario:
-            logger.error(f"❌ Falha ao conectar ao banco do usuário: {banco_usuario}")
-            return False
-
-        cursor_usuario = conexao_usuario.cursor()
-
-        # Obter códigos únicos de País existentes na tabela DePara
-        cursor_usuario.execute("""
-            SELECT DISTINCT Pais_Codigo
-            FROM Pais_DePara
-            WHERE Pais_Codigo IS NOT NULL AND Pais_Codigo <> 'S/DePara'
-        """)
-        codigos = [row[0] for row in cursor_usuario.fetchall()]
-
-        if not codigos:
-            logger.warning("⚠️ Nenhum código de país encontrado para atualizar.")
-            return True
-
-        logger.info(f"✅ {len(codigos)} códigos encontrados para atualização.")
-
-        # Conectar na base de homologação (BancoHomo)
-        banco_homo = obter_banco_homo(projeto_id)
-        if not banco_homo:
-            logger.error("❌ Banco de homologação não configurado.")
-            return False
-
-        conexao_homo = conectar_segunda_base(banco_homo)
-        if not conexao_homo:
-            logger.error(f"❌ Falha ao conectar na base de homologação: {banco_homo}")
-            return False
-
-        cursor_homo = conexao_homo.cursor()
-
-        # Atualizar um por um
-        total_atualizados = 0
-        for codigo in codigos:
-            try:
-                cursor_homo.execute("SELECT Pais_Nome FROM Pais WHERE Pais_Codigo = ?", (codigo,))
-                resultado = cursor_homo.fetchone()
-                nome_pais = resultado[0] if resultado else None
-
-                if nome_pais:
-                    cursor_usuario.execute(
-                        "UPDATE Pais_DePara SET Pais_Nome = ? WHERE Pais_Codigo = ?",
-                        (nome_pais, codigo)
-                    )
-                    total_atualizados += 1
-            except Exception as e:
-                logger.warning(f"Erro ao atualizar País '{codigo}': {e}")
-
-        conexao_usuario.commit()
-
-        logger.info(f"✅ Atualização de descrições concluída. {total_atualizados} registros atualizados.")
-        cursor_usuario.close()
-        conexao_usuario.close()
-        cursor_homo.close()
-        conexao_homo.close()
-        return True
-
-    except Exception as e:
-        logger.error(f"❌ Erro durante atualização de descrições: {e}", exc_info=True)
-        if conexao_usuario:
-            conexao_usuario.rollback()
-        return False
-
-    finally:
-        try:
-            if cursor_usuario:
-                cursor_usuario.close()
-            if conexao_usuario:
-                conexao_usuario.close()
-        except Exception as e:
-            logger.error(f"Erro ao fechar conexões: {e}")
+    banco_homo = obter_banco_homo(projeto_id)
+    return atualizar_descricoes_depara(
+        banco_usuario, banco_homo, "Pais", "Pais_DePara", "Pais_Codigo",
+        {"Pais_Nome": 0},
+    )
 
 
 @pais_bp.route("/")
@@ -205,10 +64,10 @@ def index():
         logger.info(f"Tentando conectar ao banco: {banco_usuario} para o projeto: {projeto_nome}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
-            return render_template('pais.html', registros=[], colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
+            return render_template('pais.html', colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
         
         # Executar consulta - PRIMEIRO VAMOS VERIFICAR AS COLUNAS EXISTENTES
         cursor = conexao.cursor()
@@ -224,21 +83,15 @@ def index():
         
         # Construir a consulta baseada nas colunas existentes
         if 'Pais_Nome' in colunas_existentes:
-            cursor.execute("SELECT * FROM Pais_DePara")
+            # Só os nomes das colunas: as linhas vêm do /dados, em páginas
+            cursor.execute("SELECT TOP 0 * FROM Pais_DePara")
         else:
             # Se Pais_Nome não existe, usar Pais_Descricao ou apenas as colunas básicas
-            cursor.execute("SELECT id, pais_cd, pais_ds, Pais_Codigo FROM Pais_DePara")
-        
-        registros = cursor.fetchall()
-        
+            cursor.execute("SELECT TOP 0 id, pais_cd, pais_ds, Pais_Codigo FROM Pais_DePara")
+
         # Obter nomes das colunas
         colunas = [column[0] for column in cursor.description]
-        
-        # Converter para dicionários
-        registros_dict = [dict(zip(colunas, row)) for row in registros]
-        
-        logger.info(f"Encontrados {len(registros_dict)} registros")
-        
+
         # Obter códigos da base WF para comparação
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
@@ -248,7 +101,6 @@ def index():
         conexao.close()
         
         return render_template('pais.html', 
-                             registros=registros_dict, 
                              colunas=colunas,
                              projeto_nome=projeto_nome,
                              banco_usuario=banco_usuario,
@@ -258,7 +110,13 @@ def index():
     except Exception as e:
         logger.error(f"Erro em pais: {str(e)}")
         flash(f'Erro: {str(e)}', 'error')
-        return render_template('pais.html', registros=[], colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+        return render_template('pais.html', colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+
+@pais_bp.route('/dados')
+def dados():
+    """Página do grid em JSON (paginação por chave, filtros e ordenação no servidor)"""
+    return resposta_grade("Pais_DePara", obter_codigos_wf, linhas="partials/linhas/pais.html")
+
 
 @pais_bp.route('/exportar')
 def exportar_pais():
@@ -277,7 +135,7 @@ def exportar_pais():
             return redirect(url_for('pais.index'))
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return redirect(url_for('pais.index'))
@@ -313,87 +171,26 @@ def exportar_pais():
                 'Pais_Codigo': 'Pais_Codigo'
             }
         
-        registros = cursor.fetchall()
         
         colunas_amigaveis = [mapeamento_colunas.get(col, col) for col in colunas_originais]
         
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, colunas_amigaveis, "Pais_DePara")
+
         # Obter códigos WF para colorir
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        # Criar workbook e worksheet
-        wb = Workbook()
-        
-        # Remover a sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        # Criar uma nova worksheet explicitamente
-        ws = wb.create_sheet(title="Pais_DePara")
-        
-        # Adicionar cabeçalhos
-        for col_num, coluna in enumerate(colunas_amigaveis, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            # Estilizar cabeçalhos
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Definir cores
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Para campos vazios
-        
-        # Adicionar dados com cores
-        for row_num, registro in enumerate(registros, 2):
-            for col_num, valor in enumerate(registro, 1):
-                # Remover espaços extras dos valores
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                # Aplicar cores na coluna Pais_Codigo (coluna 3)
-                if col_num == 3:  # Pais_Codigo
-                    if not valor or valor == '':
-                        cell.fill = laranja  # Laranja para campos vazios
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        # Ajustar largura das colunas automaticamente
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)  # Limitar largura máxima
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Fechar recursos
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), colunas_amigaveis, "Pais_DePara",
+            colunas_codigo=[2], codigos_wf=codigos_wf
+        )
+
         cursor.close()
         conexao.close()
-        
-        # Salvar para buffer
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        nome_arquivo = "Pais_DePara.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "Pais_DePara.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar pais: {str(e)}")
@@ -402,99 +199,9 @@ def exportar_pais():
 
 @pais_bp.route('/exportar_filtrados', methods=['POST'])
 def exportar_pais_filtrados():
-    try:
-        # Obter dados da requisição
-        data = request.get_json()
-        registros_filtrados = data.get('registros', [])
-        headers = data.get('headers', [])
-        
-        if not registros_filtrados:
-            return jsonify({'success': False, 'message': 'Nenhum registro para exportar'}), 400
-        
-        # Obter o projeto da sessão
-        if 'projeto_selecionado' not in session:
-            return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
-        
-        projeto_selecionado = session['projeto_selecionado']
-        projeto_id = projeto_selecionado.get('ProjetoID')
-        
-        # Obter códigos WF para colorir
-        banco_homo = obter_banco_homo(projeto_id)
-        codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        # Criar workbook
-        wb = Workbook()
-        
-        # Remover a sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        # Criar uma nova worksheet
-        ws = wb.create_sheet(title="Pais_Filtrado")
-        
-        # Adicionar cabeçalhos
-        for col_num, coluna in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            # Estilizar cabeçalhos
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Definir cores
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Para campos vazios
-        
-        # Adicionar dados com cores
-        for row_num, registro in enumerate(registros_filtrados, 2):
-            for col_num, header in enumerate(headers, 1):
-                valor = registro.get(header, '')
-                # Remover espaços extras dos valores
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                # Aplicar cores na coluna Pais_Codigo
-                if header == 'Pais_Codigo':
-                    if not valor or valor == '':
-                        cell.fill = laranja  # Laranja para campos vazios
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        # Ajustar largura das colunas automaticamente
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)  # Limitar largura máxima
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Salvar para buffer
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="Pais_Filtrado.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro ao exportar pais filtrada: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
+    """Exporta do banco os registros que atendem ao filtro do grid (status, busca, filtros por coluna, ordem)"""
+    return resposta_exportacao_grade("Pais_DePara", "Pais_Filtrado", obter_codigos_wf)
+
 
 @pais_bp.route('/export_wf')
 def export_wf():
@@ -518,7 +225,7 @@ def export_wf():
         logger.info(f"Exportando tabela WF do banco homólogo: {banco_homo}")
         
         # Conectar ao banco homólogo
-        conexao = conectar_segunda_base(banco_homo)
+        conexao = conexao_homologacao(banco_homo)
         if not conexao:
             flash(f'Falha na conexão com o banco homólogo: {banco_homo}', 'error')
             return redirect(url_for('pais.index'))
@@ -526,35 +233,18 @@ def export_wf():
         # Executar consulta na tabela Pais do banco homólogo
         cursor = conexao.cursor()
         cursor.execute("SELECT Pais_Codigo, Pais_Nome, Pais_Ativo FROM Pais")
-        registros = cursor.fetchall()
-        colunas = [column[0] for column in cursor.description]
-        
-        # Converter para lista de dicionários
-        registros_list = [dict(zip(colunas, row)) for row in registros]
-        
-        # Fechar recursos
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, [column[0] for column in cursor.description], "Pais_WF")
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), [column[0] for column in cursor.description], "Pais_WF", limpar_texto=False
+        )
+
         cursor.close()
         conexao.close()
-        
-        # Criar DataFrame pandas
-        df = pd.DataFrame(registros_list, columns=colunas)
-        
-        # Criar buffer para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Pais_WF', index=False)
-        
-        output.seek(0)
-        
-        # Nome do arquivo
-        nome_arquivo = "Pais_WF.xlsx"
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "Pais_WF.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar tabela WF: {str(e)}")
@@ -583,26 +273,23 @@ def importar_pais():
         if not banco_usuario:
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto.'})
 
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         cursor = conexao.cursor()
 
-        # 🟢 Lê a planilha
-        df = pd.read_excel(arquivo, dtype=str)
-        df = df.replace({pd.NaT: None, 'nan': None, 'NaN': None, '': None})
-        df = df.where(pd.notnull(df), None)
+        # 🟢 Lê a planilha em lotes
+        planilha = PlanilhaEmLotes(arquivo)
 
         # Normaliza os nomes de colunas
-        df.columns = [c.strip().lower().replace(' ', '').replace('_', '') for c in df.columns]
-        colunas_norm = df.columns.tolist()
+        colunas_norm = [c.strip().lower().replace(' ', '').replace('_', '') for c in planilha.colunas]
         logger.info(f"Colunas normalizadas: {colunas_norm}")
 
         # Função auxiliar para buscar coluna equivalente
         def encontrar_coluna(possiveis):
             for possivel in possiveis:
                 possivel_norm = possivel.strip().lower().replace(' ', '').replace('_', '')
-                for c in df.columns:
+                for c in colunas_norm:
                     if possivel_norm in c or c in possivel_norm:
                         return c
             return None
@@ -620,35 +307,20 @@ def importar_pais():
                            f'A planilha deve conter colunas equivalentes a: Codigo Anterior e Pais_Codigo.'
             })
 
-        registros = df.to_dict('records')
-        contador_inseridos = 0
-        contador_atualizados = 0
-
-        for registro in registros:
-            pais_cd = registro.get(col_pais_cd)
-            pais_codigo = registro.get(col_pais_codigo)
-            pais_descricao = registro.get(col_pais_descricao) if col_pais_descricao else None
-
-            if not pais_cd:
-                continue
-
-            cursor.execute("SELECT COUNT(*) FROM Pais_DePara WHERE pais_cd = ?", (pais_cd,))
-            resultado = cursor.fetchone()
-            existe = resultado[0] if resultado else 0
-
-            if existe:
-                cursor.execute("""
-                    UPDATE Pais_DePara
-                    SET Pais_Codigo = ?, pais_ds = ?
-                    WHERE pais_cd = ?
-                """, (pais_codigo, pais_descricao, pais_cd))
-                contador_atualizados += 1
-            else:
-                cursor.execute("""
-                    INSERT INTO Pais_DePara (pais_cd, Pais_Codigo, pais_ds)
-                    VALUES (?, ?, ?)
-                """, (pais_cd, pais_codigo, pais_descricao))
-                contador_inseridos += 1
+        carga = UpsertEmMassa(cursor, "Pais_DePara", ["pais_cd", "Pais_Codigo", "pais_ds"], chave="pais_cd")
+        for df in planilha.lotes():
+            df.columns = colunas_norm
+            registros = df.to_dict('records')
+            carga.adicionar(
+                (
+                    registro.get(col_pais_cd),
+                    registro.get(col_pais_codigo),
+                    registro.get(col_pais_descricao) if col_pais_descricao else None,
+                )
+                for registro in registros
+                if registro.get(col_pais_cd)
+            )
+        contador_atualizados, contador_inseridos = carga.aplicar()
 
         conexao.commit()
         cursor.close()
@@ -708,7 +380,7 @@ def update_registro():
         logger.info(f"Atualizando registro {record_id}, campo {field} para valor '{value}' no banco {banco_usuario}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             logger.error(f"Falha na conexão com o banco: {banco_usuario}")
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
@@ -736,6 +408,9 @@ def update_registro():
                 descricao_wf = obter_descricao_wf(banco_homo, value.strip())
                 logger.info(f"Descrição WF encontrada para código {value}: {descricao_wf}")
         
+        # Pendentes do resumo de progresso: conta antes, ajusta antes do commit
+        delta_progresso = DeltaProgresso(cursor, "Pais_DePara", [record_id], [field])
+
         # Atualizar registro - usando id como chave primária
         if descricao_wf and nome_coluna_descricao:
             # Se encontrou descrição, atualizar ambos campos
@@ -756,6 +431,7 @@ def update_registro():
             return jsonify({'success': False, 'message': 'Registro não encontrado ou não modificado'})
         
         # Commit da transação
+        delta_progresso.aplicar()
         conexao.commit()
         
         logger.info(f"Registro {record_id} atualizado com sucesso")
@@ -824,53 +500,21 @@ def update_batch():
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         
         cursor = conexao.cursor()
-        success_count = 0
-        error_count = 0
-        error_messages = []
         
-        # Processar cada atualização
-        for update in updates:
-            try:
-                record_id = update.get('id')
-                field = update.get('field')
-                value = update.get('value')
-                
-                if not record_id or not field:
-                    error_count += 1
-                    error_messages.append(f"ID ou campo não fornecidos para atualização: {update}")
-                    continue
-                
-                # NOVA LÓGICA: Se estiver atualizando Pais_Codigo, buscar descrição automaticamente
-                descricao_wf = None
-                nome_coluna_descricao = 'Pais_Nome'
-                
-                if field == 'Pais_Codigo' and value and value != 'S/DePara' and value.strip() != '':
-                    banco_homo = obter_banco_homo(projeto_id)
-                    if banco_homo:
-                        descricao_wf = obter_descricao_wf(banco_homo, value.strip())
-                
-                # Atualizar registro
-                if descricao_wf and nome_coluna_descricao:
-                    query = f"UPDATE Pais_DePara SET Pais_Codigo = ?, {nome_coluna_descricao} = ? WHERE id = ?"
-                    cursor.execute(query, (value, descricao_wf, record_id))
-                else:
-                    query = f"UPDATE Pais_DePara SET {field} = ? WHERE id = ?"
-                    cursor.execute(query, (value, record_id))
-                
-                if cursor.rowcount > 0:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    error_messages.append(f"Registro não encontrado: {record_id}")
-                    
-            except Exception as e:
-                error_count += 1
-                error_messages.append(f"Erro ao atualizar {record_id}: {str(e)}")
+        # Ao trocar Pais_Codigo, Pais_Nome recebe a descrição WF do código
+        banco_homo = obter_banco_homo(projeto_id)
+        success_count, error_count, error_messages = atualizar_campos_em_lote(
+            cursor, "Pais_DePara", updates, None,
+            derivados=descricao_automatica(
+                'Pais_Codigo', 'Pais_Nome',
+                lambda codigo: obter_descricao_wf(banco_homo, str(codigo).strip()) if str(codigo).strip() else None
+            ) if banco_homo else None,
+        )
         
         # Commit de todas as atualizações
         conexao.commit()
@@ -7,83 +7,26 @@ from flask import (
     flash,
     request,
     jsonify,
-    send_file,
 )
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_projeto, conexao_homologacao
+from db.atualizacao import atualizar_campos_em_lote
+from db.upsert import UpsertEmMassa
+from utils.projeto_metadados import obter_banco_homo
+from utils.catalogo_wf import codigos_wf
 from logger import logger
-from utils.excel_utils import export_to_excel, import_from_excel
+from utils.excel_utils import export_to_excel, PlanilhaEmLotes
+from utils.progresso_depara import DeltaProgresso
+from utils.grade_depara import resposta_grade, resposta_exportacao_grade
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.exportacao_colunar import formato_colunar, resposta_colunar
 import tempfile
 import os
-import pandas as pd
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
 
 pessoacodfabricante_bp = Blueprint("pessoacodfabricante", __name__)
 
-def obter_banco_homo(projeto_id):
-    """Função para obter o BancoHomo diretamente do banco de dados"""
-    try:
-        conn = conectar_banco()
-        if not conn:
-            logger.error("Falha ao conectar ao banco principal para obter BancoHomo")
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT BancoHomo FROM Projeto WHERE ProjetoID = ?", projeto_id)
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter BancoHomo: {str(e)}")
-        return None
-
 def obter_codigos_wf(banco_homo):
     """Obtém todos os códigos da tabela Pessoa do banco homólogo onde Pessoa_TipoPessoa = 'J'"""
-    try:
-        if not banco_homo:
-            return []
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return []
-        
-        cursor = conexao.cursor()
-        
-        # Verificar se a tabela existe
-        cursor.execute("""
-            SELECT TABLE_NAME FROM INFORMATION_SCHEMA.TABLES 
-            WHERE TABLE_NAME = 'Pessoa'
-        """)
-        tabela_existe = cursor.fetchone()
-        
-        if not tabela_existe:
-            logger.warning(f"Tabela Pessoa não existe no banco homólogo: {banco_homo}")
-            return []
-        
-        # Query corrigida conforme solicitado - apenas códigos
-        cursor.execute("SELECT Pessoa_Codigo FROM Pessoa WHERE Pessoa_TipoPessoa = 'J'")
-        registros = cursor.fetchall()
-        
-        # Criar uma lista com todos os códigos (convertidos para string para comparação)
-        codigos = [str(registro[0]) for registro in registros if registro[0] is not None]
-        
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Encontrados {len(codigos)} códigos na base WF (Pessoa_TipoPessoa = 'J')")
-        return codigos
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter códigos WF: {str(e)}")
-        return []
+    return codigos_wf(banco_homo, "Pessoa")
 
 # REMOVIDA: função obter_descricao_wf - não temos campo de descrição para atualizar
 # REMOVIDA: função atualizar_descricoes_apos_importacao - não temos descrição para atualizar
@@ -108,24 +51,19 @@ def index():
         logger.info(f"Tentando conectar ao banco: {banco_usuario} para o projeto: {projeto_nome}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
-            return render_template('pessoacodfabricante.html', registros=[], colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
+            return render_template('pessoacodfabricante.html', colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
         
         # Executar consulta - INCLUIR todas as colunas para edição
         cursor = conexao.cursor()
-        cursor.execute("SELECT * FROM PessoaCodFabricante_DePara")
-        registros = cursor.fetchall()
+        # Só os nomes das colunas: as linhas vêm do /dados, em páginas
+        cursor.execute("SELECT TOP 0 * FROM PessoaCodFabricante_DePara")
         
         # Obter nomes das colunas
         colunas = [column[0] for column in cursor.description]
-        
-        # Converter para dicionários
-        registros_dict = [dict(zip(colunas, row)) for row in registros]
-        
-        logger.info(f"Encontrados {len(registros_dict)} registros")
-        
+
         # Obter códigos da base WF para comparação
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
@@ -135,7 +73,6 @@ def index():
         conexao.close()
         
         return render_template('pessoacodfabricante.html', 
-                             registros=registros_dict, 
                              colunas=colunas,
                              projeto_nome=projeto_nome,
                              banco_usuario=banco_usuario,
@@ -145,7 +82,13 @@ def index():
     except Exception as e:
         logger.error(f"Erro em pessoacodfabricante: {str(e)}")
         flash(f'Erro: {str(e)}', 'error')
-        return render_template('pessoacodfabricante.html', registros=[], colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+        return render_template('pessoacodfabricante.html', colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+
+@pessoacodfabricante_bp.route('/dados')
+def dados():
+    """Página do grid em JSON (paginação por chave, filtros e ordenação no servidor)"""
+    return resposta_grade("PessoaCodFabricante_DePara", obter_codigos_wf, linhas="partials/linhas/pessoacodfabricante.html")
+
 
 @pessoacodfabricante_bp.route('/exportar')
 def exportar_pessoacodfabricante():
@@ -164,7 +107,7 @@ def exportar_pessoacodfabricante():
             return redirect(url_for('pessoacodfabricante.index'))
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return redirect(url_for('pessoacodfabricante.index'))
@@ -209,7 +152,6 @@ def exportar_pessoacodfabricante():
         logger.info(f"Executando query: {query}")
         
         cursor.execute(query)
-        registros = cursor.fetchall()
         colunas_originais = [column[0] for column in cursor.description]
         
         # Mapear nomes das colunas para os nomes amigáveis - INCLUIR ID
@@ -226,83 +168,23 @@ def exportar_pessoacodfabricante():
         
         colunas_amigaveis = [mapeamento_colunas.get(col, col) for col in colunas_originais]
         
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, colunas_amigaveis, "PessoaCodFabricante_DePara")
+
         # Obter códigos WF para colorir
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        # Criar workbook e worksheet de forma mais robusta
-        wb = Workbook()
-        
-        # Remover a sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        # Criar uma nova worksheet explicitamente
-        ws = wb.create_sheet(title="PessoaCodFabricante_DePara")
-        
-        # Adicionar cabeçalhos
-        for col_num, coluna in enumerate(colunas_amigaveis, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            # Estilizar cabeçalhos
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Definir cores
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Para campos vazios
-        
-        # Adicionar dados com cores
-        for row_num, registro in enumerate(registros, 2):
-            for col_num, valor in enumerate(registro, 1):
-                # Remover espaços extras dos valores
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                # Aplicar cores na coluna ProdutoMarca_PessoaCodFabricante
-                if colunas_originais[col_num-1] == 'ProdutoMarca_PessoaCodFabricante':
-                    if not valor or valor == '':
-                        cell.fill = laranja  # Laranja para campos vazios
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        # Ajustar largura das colunas automaticamente
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)  # Limitar largura máxima
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Fechar recursos
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), colunas_amigaveis, "PessoaCodFabricante_DePara",
+            colunas_codigo=[colunas_originais.index('ProdutoMarca_PessoaCodFabricante')], codigos_wf=codigos_wf
+        )
+
         cursor.close()
         conexao.close()
-        
-        # Salvar para buffer
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        nome_arquivo = "PessoaCodFabricante_DePara.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "PessoaCodFabricante_DePara.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar pessoacodfabricante: {str(e)}")
@@ -311,99 +193,9 @@ def exportar_pessoacodfabricante():
 
 @pessoacodfabricante_bp.route('/exportar_filtrados', methods=['POST'])
 def exportar_pessoacodfabricante_filtrados():
-    try:
-        # Obter dados da requisição
-        data = request.get_json()
-        registros_filtrados = data.get('registros', [])
-        headers = data.get('headers', [])
-        
-        if not registros_filtrados:
-            return jsonify({'success': False, 'message': 'Nenhum registro para exportar'}), 400
-        
-        # Obter o projeto da sessão
-        if 'projeto_selecionado' not in session:
-            return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
-        
-        projeto_selecionado = session['projeto_selecionado']
-        projeto_id = projeto_selecionado.get('ProjetoID')
-        
-        # Obter códigos WF para colorir
-        banco_homo = obter_banco_homo(projeto_id)
-        codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        # Criar workbook
-        wb = Workbook()
-        
-        # Remover a sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        # Criar uma nova worksheet
-        ws = wb.create_sheet(title="PessoaCodFabricante_Filtrado")
-        
-        # Adicionar cabeçalhos
-        for col_num, coluna in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            # Estilizar cabeçalhos
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Definir cores
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Para campos vazios
-        
-        # Adicionar dados com cores
-        for row_num, registro in enumerate(registros_filtrados, 2):
-            for col_num, header in enumerate(headers, 1):
-                valor = registro.get(header, '')
-                # Remover espaços extras dos valores
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                # Aplicar cores na coluna ProdutoMarca_PessoaCodFabricante
-                if header == 'ProdutoMarca_PessoaCodFabricante':
-                    if not valor or valor == '':
-                        cell.fill = laranja  # Laranja para campos vazios
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        # Ajustar largura das colunas automaticamente
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)  # Limitar largura máxima
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Salvar para buffer
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="PessoaCodFabricante_Filtrado.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro ao exportar pessoacodfabricante filtrada: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
+    """Exporta do banco os registros que atendem ao filtro do grid (status, busca, filtros por coluna, ordem)"""
+    return resposta_exportacao_grade("PessoaCodFabricante_DePara", "PessoaCodFabricante_Filtrado", obter_codigos_wf)
+
 
 @pessoacodfabricante_bp.route('/export_wf')
 def export_wf():
@@ -427,7 +219,7 @@ def export_wf():
         logger.info(f"Exportando tabela WF do banco homólogo: {banco_homo}")
         
         # Conectar ao banco homólogo
-        conexao = conectar_segunda_base(banco_homo)
+        conexao = conexao_homologacao(banco_homo)
         if not conexao:
             flash(f'Falha na conexão com o banco homólogo: {banco_homo}', 'error')
             return redirect(url_for('pessoacodfabricante.index'))
@@ -447,35 +239,18 @@ def export_wf():
         
         # Executar consulta na tabela Pessoa do banco homólogo - COM A CONDIÇÃO CORRETA
         cursor.execute("SELECT Pessoa_Codigo, Pessoa_nome FROM Pessoa WHERE Pessoa_TipoPessoa = 'J'")
-        registros = cursor.fetchall()
-        colunas = [column[0] for column in cursor.description]
-        
-        # Converter para lista de dicionários
-        registros_list = [dict(zip(colunas, row)) for row in registros]
-        
-        # Fechar recursos
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, [column[0] for column in cursor.description], "PessoaCodFabricante_WF")
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), [column[0] for column in cursor.description], "PessoaCodFabricante_WF", limpar_texto=False
+        )
+
         cursor.close()
         conexao.close()
-        
-        # Criar DataFrame pandas
-        df = pd.DataFrame(registros_list, columns=colunas)
-        
-        # Criar buffer para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='PessoaCodFabricante_WF', index=False)
-        
-        output.seek(0)
-        
-        # Nome do arquivo
-        nome_arquivo = "PessoaCodFabricante_WF.xlsx"
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "PessoaCodFabricante_WF.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar tabela WF: {str(e)}")
@@ -507,7 +282,6 @@ def importar_pessoacodfabricante():
         
         projeto_selecionado = session['projeto_selecionado']
         banco_usuario = projeto_selecionado.get('DadosGX')
-        projeto_id = projeto_selecionado.get('ProjetoID')
         
         if not banco_usuario:
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
@@ -515,7 +289,7 @@ def importar_pessoacodfabricante():
         logger.info(f"Iniciando importação para o banco: {banco_usuario}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         
@@ -533,8 +307,9 @@ def importar_pessoacodfabricante():
         logger.info(f"Tipos de dados das colunas: {colunas_info}")
         
         # Importar dados do Excel
-        registros, colunas_excel = import_from_excel(arquivo)
-        logger.info(f"Arquivo Excel lido: {len(registros)} registros, colunas: {colunas_excel}")
+        planilha = PlanilhaEmLotes(arquivo, texto=False)
+        colunas_excel = planilha.colunas
+        logger.info(f"Arquivo Excel aberto, colunas: {colunas_excel}")
         
         # MAPEAMENTO: Nomes das colunas na planilha para nomes das colunas no banco - INCLUIR ID
         mapeamento_colunas = {
@@ -615,32 +390,6 @@ def importar_pessoacodfabricante():
                 # Para tipos desconhecidos, manter como está
                 return valor
         
-        # Filtrar e mapear os registros
-        registros_mapeados = []
-        for registro in registros:
-            registro_mapeado = {}
-            
-            # Para cada coluna do banco, buscar o valor correspondente na planilha
-            for coluna_banco in colunas_banco:
-                # Encontrar o nome da coluna na planilha
-                coluna_planilha = None
-                for chave, valor in mapeamento_colunas.items():
-                    if valor == coluna_banco and chave in colunas_excel:
-                        coluna_planilha = chave
-                        break
-                
-                if coluna_planilha:
-                    valor = registro.get(coluna_planilha)
-                    # Converter valor para o tipo apropriado
-                    valor_convertido = converter_valor_para_tipo(coluna_banco, valor)
-                    registro_mapeado[coluna_banco] = valor_convertido
-                else:
-                    registro_mapeado[coluna_banco] = None
-            
-            registros_mapeados.append(registro_mapeado)
-        
-        logger.info(f"Registros mapeados: {len(registros_mapeados)}")
-        
         # VERIFICAÇÃO ANTES: Contar registros antes da importação
         cursor.execute("SELECT COUNT(*) FROM PessoaCodFabricante_DePara")
         result_antes = cursor.fetchone()
@@ -649,77 +398,46 @@ def importar_pessoacodfabricante():
         
         # ESTRATÉGIA CORRIGIDA: Usar ID como chave primária
         try:
-            contador_atualizacoes = 0
-            contador_insercoes = 0
-            
-            for registro in registros_mapeados:
-                id_registro = registro.get('id')
-                
-                # CORREÇÃO: Se temos ID, tentar UPDATE, senão INSERT
-                if id_registro:
-                    # Verificar se o registro existe pelo ID
-                    cursor.execute("SELECT COUNT(*) FROM PessoaCodFabricante_DePara WHERE id = ?", (id_registro,))
-                    result = cursor.fetchone()
-                    existe = result[0] > 0 if result and result[0] is not None else False
-                    
-                    logger.info(f"Verificando registro id={id_registro}, existe={existe}")
-                    
-                    if existe:
-                        # UPDATE do registro existente pelo ID
-                        update_values = []
-                        update_fields = []
-                        
-                        # Atualizar todos os campos exceto o ID
-                        for coluna in colunas_banco:
-                            if coluna != 'id' and registro.get(coluna) is not None:
-                                update_fields.append(f"{coluna} = ?")
-                                update_values.append(registro.get(coluna))
-                        
-                        if update_fields:
-                            update_values.append(id_registro)
-                            query = f"UPDATE PessoaCodFabricante_DePara SET {', '.join(update_fields)} WHERE id = ?"
-                            logger.info(f"Executando UPDATE pelo ID: {query} com valores: {update_values}")
-                            cursor.execute(query, update_values)
-                            contador_atualizacoes += 1
-                            logger.info(f"UPDATE realizado para id={id_registro}")
+            # Registros com ID: UPDATE só dos campos preenchidos ou INSERT se o ID não existe;
+            # registros sem ID são inseridos direto
+            carga = UpsertEmMassa(
+                cursor, "PessoaCodFabricante_DePara", colunas_banco,
+                chave="id",
+                preservar_se_nulo=colunas_banco,
+                inserir_sem_chave=True,
+            )
+            for df in planilha.lotes():
+                registros = df.to_dict('records')
+
+                # Filtrar e mapear os registros
+                registros_mapeados = []
+                for registro in registros:
+                    registro_mapeado = {}
+
+                    # Para cada coluna do banco, buscar o valor correspondente na planilha
+                    for coluna_banco in colunas_banco:
+                        # Encontrar o nome da coluna na planilha
+                        coluna_planilha = None
+                        for chave, valor in mapeamento_colunas.items():
+                            if valor == coluna_banco and chave in colunas_excel:
+                                coluna_planilha = chave
+                                break
+
+                        if coluna_planilha:
+                            valor = registro.get(coluna_planilha)
+                            # Converter valor para o tipo apropriado
+                            valor_convertido = converter_valor_para_tipo(coluna_banco, valor)
+                            registro_mapeado[coluna_banco] = valor_convertido
                         else:
-                            logger.warning(f"Nenhum campo para atualizar no registro id={id_registro}")
-                    else:
-                        # INSERT de novo registro (ID não existe)
-                        insert_fields = []
-                        insert_placeholders = []
-                        insert_values = []
-                        
-                        for coluna in colunas_banco:
-                            if registro.get(coluna) is not None:  # Só incluir campos não nulos
-                                insert_fields.append(coluna)
-                                insert_placeholders.append("?")
-                                insert_values.append(registro.get(coluna))
-                        
-                        if insert_fields:
-                            query = f"INSERT INTO PessoaCodFabricante_DePara ({', '.join(insert_fields)}) VALUES ({', '.join(insert_placeholders)})"
-                            logger.info(f"Executando INSERT: {query} com valores: {insert_values}")
-                            cursor.execute(query, insert_values)
-                            contador_insercoes += 1
-                            logger.info(f"INSERT realizado para id={id_registro}")
-                else:
-                    # INSERT de novo registro (sem ID)
-                    insert_fields = []
-                    insert_placeholders = []
-                    insert_values = []
-                    
-                    for coluna in colunas_banco:
-                        if registro.get(coluna) is not None:  # Só incluir campos não nulos
-                            insert_fields.append(coluna)
-                            insert_placeholders.append("?")
-                            insert_values.append(registro.get(coluna))
-                    
-                    if insert_fields:
-                        query = f"INSERT INTO PessoaCodFabricante_DePara ({', '.join(insert_fields)}) VALUES ({', '.join(insert_placeholders)})"
-                        logger.info(f"Executando INSERT (sem ID): {query} com valores: {insert_values}")
-                        cursor.execute(query, insert_values)
-                        contador_insercoes += 1
-                        logger.info(f"INSERT realizado (sem ID)")
+                            registro_mapeado[coluna_banco] = None
+
+                    registros_mapeados.append(registro_mapeado)
+
+                logger.info(f"Registros mapeados: {len(registros_mapeados)}")
+
+                carga.adicionar(registros_mapeados)
+            contador_atualizacoes, contador_insercoes = carga.aplicar()
+            logger.info(f"Arquivo Excel lido: {planilha.total} registros")
             
             logger.info(f"UPDATEs executados: {contador_atualizacoes} registros")
             logger.info(f"INSERTs executados: {contador_insercoes} registros")
@@ -799,7 +517,7 @@ def update_registro():
         logger.info(f"Atualizando registro {record_id}, campo {field} para valor '{value}' no banco {banco_usuario}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             logger.error(f"Falha na conexão com o banco: {banco_usuario}")
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
@@ -825,6 +543,9 @@ def update_registro():
             logger.error(f"Registro não encontrado: {record_id}")
             return jsonify({'success': False, 'message': 'Registro não encontrado'})
         
+        # Pendentes do resumo de progresso: conta antes, ajusta antes do commit
+        delta_progresso = DeltaProgresso(cursor, "PessoaCodFabricante_DePara", [record_id], [field])
+
         # Atualizar registro - usando id como chave primária
         query = f"UPDATE PessoaCodFabricante_DePara SET {field} = ? WHERE id = ?"
         logger.info(f"Executando query: {query} com valores: ({value}, {record_id})")
@@ -839,6 +560,7 @@ def update_registro():
             return jsonify({'success': False, 'message': 'Registro não encontrado ou não modificado'})
         
         # Commit da transação
+        delta_progresso.aplicar()
         conexao.commit()
         
         logger.info(f"Registro {record_id} atualizado com sucesso")
@@ -891,12 +613,11 @@ def update_batch():
 
         projeto_selecionado = session['projeto_selecionado']
         banco_usuario = projeto_selecionado.get('DadosGX')
-        projeto_id = projeto_selecionado.get('ProjetoID')
 
         if not banco_usuario:
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
 
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
 
@@ -916,39 +637,10 @@ def update_batch():
             if coluna in colunas_existentes:
                 colunas_permitidas.append(coluna)
 
-        success_count = 0
-        error_count = 0
-        error_messages = []
 
-        for update in updates:
-            try:
-                record_id = update.get('id')
-                field = update.get('field')
-                value = update.get('value')
-
-                if not record_id or not field:
-                    error_count += 1
-                    continue
-
-                if field not in colunas_permitidas:
-                    error_count += 1
-                    continue
-
-                # Atualiza o campo alterado
-                query = f"UPDATE PessoaCodFabricante_DePara SET {field} = ? WHERE id = ?"
-                cursor.execute(query, (value, record_id))
-                
-                # REMOVIDO: atualização automática da descrição - não temos esse campo
-                
-                if cursor.rowcount > 0:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    error_messages.append(f"Registro não encontrado: {record_id}")
-
-            except Exception as e:
-                error_count += 1
-                error_messages.append(f"Erro ao atualizar {record_id}: {str(e)}")
+        success_count, error_count, error_messages = atualizar_campos_em_lote(
+            cursor, "PessoaCodFabricante_DePara", updates, colunas_permitidas,
+        )
 
         conexao.commit()
         logger.info(f"Batch update concluído: {success_count} sucessos, {error_count} erros")
@@ -984,7 +676,7 @@ def dados_pessoacodfabricante(banco_usuario):
     if not banco_usuario:
         return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
 
-    conexao = conectar_segunda_base(banco_usuario)
+    conexao = conexao_projeto(banco_usuario)
     if not conexao:
         return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
 
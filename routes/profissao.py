@@ -8,189 +8,38 @@ from flask import (
     flash,
     request,
     jsonify,
-    send_file,
 )
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_projeto, conexao_homologacao
+from db.atualizacao import atualizar_campos_em_lote
+from db.upsert import UpsertEmMassa
+from utils.projeto_metadados import obter_banco_homo
+from utils.catalogo_wf import codigos_wf, descricao_wf, atualizar_descricoes_depara
 from logger import logger
-from utils.excel_utils import export_to_excel, import_from_excel
-import pandas as pd
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
+from utils.excel_utils import export_to_excel, import_from_excel, PlanilhaEmLotes
+from utils.progresso_depara import DeltaProgresso
+from utils.grade_depara import resposta_grade, resposta_exportacao_grade
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.exportacao_colunar import formato_colunar, resposta_colunar
 
 profissao_bp = Blueprint("profissao", __name__)
 
 
-def obter_banco_homo(projeto_id):
-    """Função para obter o BancoHomo diretamente do banco de dados"""
-    try:
-        conn = conectar_banco()
-        if not conn:
-            logger.error("Falha ao conectar ao banco principal para obter BancoHomo")
-            return None
-
-        cursor = conn.cursor()
-        # passar parâmetros como tupla
-        cursor.execute("SELECT BancoHomo FROM Projeto WHERE ProjetoID = ?", (projeto_id,))
-        resultado = cursor.fetchone()
-
-        cursor.close()
-        conn.close()
-
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-
-    except Exception as e:
-        logger.error(f"Erro ao obter BancoHomo: {str(e)}")
-        return None
-
-
 def obter_codigos_wf(banco_homo):
     """Obtém todos os códigos da tabela Profissao do banco homólogo"""
-    try:
-        if not banco_homo:
-            return []
-
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return []
-
-        cursor = conexao.cursor()
-        cursor.execute("SELECT Profissao_Codigo FROM Profissao")
-        registros = cursor.fetchall()
-
-        # Criar uma lista com todos os códigos (convertidos para string para comparação)
-        codigos = [str(registro[0]) for registro in registros if registro and registro[0] is not None]
-
-        cursor.close()
-        conexao.close()
-
-        logger.info(f"Encontrados {len(codigos)} códigos na base WF")
-        return codigos
-
-    except Exception as e:
-        logger.error(f"Erro ao obter códigos WF: {str(e)}")
-        return []
+    return codigos_wf(banco_homo, "Profissao")
 
 
 def obter_descricao_wf(banco_homo, codigo):
     """Obtém a descrição de um código específico da tabela Profissao do banco homólogo"""
-    try:
-        if not banco_homo or not codigo:
-            return None
-
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return None
-
-        cursor = conexao.cursor()
-        cursor.execute("SELECT Profissao_Descricao FROM Profissao WHERE Profissao_Codigo = ?", (codigo,))
-        resultado = cursor.fetchone()
-
-        cursor.close()
-        conexao.close()
-
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-
-    except Exception as e:
-        logger.error(f"Erro ao obter descrição WF para código {codigo}: {str(e)}")
-        return None
+    return descricao_wf(banco_homo, "Profissao", codigo)
 
 
 def atualizar_descricoes_apos_importacao(banco_usuario, banco_homo):
     """Atualiza Profissao_Descricao registro a registro usando o banco homólogo (WF)."""
-    try:
-        if not banco_homo:
-            logger.error("Banco homólogo não informado para atualização de descrições.")
-            return False
-
-        # Conectar ao banco do usuário
-        conexao = conectar_segunda_base(banco_usuario)
-        if not conexao:
-            logger.error("Falha ao conectar ao banco do usuário para atualizar descrições.")
-            return False
-        cursor = conexao.cursor()
-
-        # Buscar registros que têm código WF (não são S/DePara) - trazer id para atualizar por id
-        cursor.execute("""
-            SELECT id, Profissao_Codigo, Profissao_Descricao
-            FROM Profissao_DePara
-            WHERE Profissao_Codigo IS NOT NULL AND Profissao_Codigo <> 'S/DePara' AND LTRIM(RTRIM(Profissao_Codigo)) <> ''
-        """)
-        registros = cursor.fetchall()
-
-        if not registros:
-            logger.info("Nenhum registro com código válido encontrado para atualização.")
-            cursor.close()
-            conexao.close()
-            return True
-
-        # Conectar ao banco WF (homologação) uma vez
-        conexao_wf = conectar_segunda_base(banco_homo)
-        if not conexao_wf:
-            logger.error(f"Falha ao conectar ao banco homólogo: {banco_homo}")
-            cursor.close()
-            conexao.close()
-            return False
-        cursor_wf = conexao_wf.cursor()
-
-        atualizacoes = 0
-        for registro in registros:
-            id_registro = registro[0]
-            codigo_wf = registro[1]
-            descricao_atual = registro[2]
-
-            if codigo_wf is None:
-                continue
-
-            # Normalizar código antes de buscar
-            codigo_norm = str(codigo_wf).strip()
-
-            if codigo_norm == '' or codigo_norm.upper() == 'S/DEPARA':
-                continue
-
-            try:
-                # Buscar descrição correspondente no WF
-                cursor_wf.execute("SELECT Profissao_Descricao FROM Profissao WHERE LTRIM(RTRIM(Profissao_Codigo)) = ?", (codigo_norm,))
-                resultado = cursor_wf.fetchone()
-                descricao_wf = resultado[0] if resultado else None
-
-                # Se encontrou descrição e for diferente da atual, atualiza somente esse id
-                if descricao_wf and descricao_wf != descricao_atual:
-                    cursor.execute("""
-                        UPDATE Profissao_DePara
-                        SET Profissao_Descricao = ?
-                        WHERE id = ?
-                    """, (descricao_wf, id_registro))
-                    atualizacoes += 1
-                    logger.info(f"Atualizado id {id_registro} (codigo {codigo_norm}) para descrição: {descricao_wf}")
-
-            except Exception as e:
-                logger.warning(f"Erro ao consultar/descrever código {codigo_norm} no WF: {e}")
-
-        # Commit e fechamento
-        conexao.commit()
-        cursor_wf.close()
-        conexao_wf.close()
-        cursor.close()
-        conexao.close()
-
-        logger.info(f"Atualizações automáticas de descrição concluídas: {atualizacoes} registros atualizados.")
-        return True
-
-    except Exception as e:
-        logger.error(f"Erro ao atualizar descrições após importação: {e}", exc_info=True)
-        try:
-            if 'conexao' in locals() and conexao:
-                conexao.rollback()
-        except Exception:
-            pass
-        return False
+    return atualizar_descricoes_depara(
+        banco_usuario, banco_homo, "Profissao", "Profissao_DePara", "Profissao_Codigo",
+        {"Profissao_Descricao": 0},
+    )
 
 
 
@@ -217,24 +66,19 @@ def index():
         logger.info(f"Tentando conectar ao banco: {banco_usuario} para o projeto: {projeto_nome}")
 
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
-            return render_template('profissao.html', registros=[], colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
+            return render_template('profissao.html', colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
 
         # Executar consulta - INCLUIR todas as colunas para edição
         cursor = conexao.cursor()
-        cursor.execute("SELECT * FROM Profissao_DePara")
-        registros = cursor.fetchall()
+        # Só os nomes das colunas: as linhas vêm do /dados, em páginas
+        cursor.execute("SELECT TOP 0 * FROM Profissao_DePara")
 
         # Obter nomes das colunas
         colunas = [column[0] for column in cursor.description] if cursor.description else []
 
-        # Converter para dicionários
-        registros_dict = [dict(zip(colunas, row)) for row in registros]
-
-        logger.info(f"Encontrados {len(registros_dict)} registros")
-
         # Obter códigos da base WF para comparação
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
@@ -244,7 +88,6 @@ def index():
         conexao.close()
 
         return render_template('profissao.html',
-                               registros=registros_dict,
                                colunas=colunas,
                                projeto_nome=projeto_nome,
                                banco_usuario=banco_usuario,
@@ -254,7 +97,13 @@ def index():
     except Exception as e:
         logger.error(f"Erro em profissao: {str(e)}")
         flash(f'Erro: {str(e)}', 'error')
-        return render_template('profissao.html', registros=[], colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+        return render_template('profissao.html', colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+
+
+@profissao_bp.route('/dados')
+def dados():
+    """Página do grid em JSON (paginação por chave, filtros e ordenação no servidor)"""
+    return resposta_grade("Profissao_DePara", obter_codigos_wf, linhas="partials/linhas/profissao.html")
 
 
 @profissao_bp.route('/exportar')
@@ -274,7 +123,7 @@ def exportar_profissao():
             return redirect(url_for('profissao.index'))
 
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return redirect(url_for('profissao.index'))
@@ -282,7 +131,6 @@ def exportar_profissao():
         # Executar consulta - Excluir coluna id da exportação
         cursor = conexao.cursor()
         cursor.execute("SELECT prof_cd, prof_ds, Profissao_Codigo, Profissao_Descricao FROM Profissao_DePara")
-        registros = cursor.fetchall()
         colunas_originais = [column[0] for column in cursor.description] if cursor.description else []
 
         # Mapear nomes das colunas para os nomes amigáveis
@@ -295,94 +143,23 @@ def exportar_profissao():
 
         colunas_amigaveis = [mapeamento_colunas.get(col, col) for col in colunas_originais]
 
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, colunas_amigaveis, "Profissao_DePara")
+
         # Obter códigos WF para colorir
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
 
-        # CORREÇÃO: Criar workbook e worksheet de forma mais robusta
-        wb = Workbook()
-
-        # Remover a sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-
-        # Criar uma nova worksheet explicitamente
-        ws = wb.create_sheet(title="Profissao_DePara")
-
-        # Adicionar cabeçalhos
-        for col_num, coluna in enumerate(colunas_amigaveis, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            # Estilizar cabeçalhos
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-
-        # Definir cores
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Para campos vazios
-
-        # Adicionar dados com cores
-        for row_num, registro in enumerate(registros, 2):
-            for col_num, valor in enumerate(registro, 1):
-                # Remover espaços extras dos valores
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-
-                # Aplicar cores na coluna Profissao_Codigo (coluna 3)
-                if col_num == 3:  # Profissao_Codigo
-                    if not valor or valor == '':
-                        cell.fill = laranja  # Laranja para campos vazios
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-
-        # Ajustar largura das colunas automaticamente (forma segura)
-        for column in ws.columns:
-            if not column or column[0] is None:
-                continue
-            try:
-                column_letter = getattr(column[0], "column_letter", None)
-                if not column_letter:
-                    continue
-            except Exception:
-                continue
-
-            max_length = 0
-            for cell in column:
-                try:
-                    if cell.value is not None and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except Exception:
-                    pass
-            adjusted_width = min(max_length + 2, 50)  # Limitar largura máxima
-            try:
-                ws.column_dimensions[column_letter].width = adjusted_width
-            except Exception:
-                pass
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), colunas_amigaveis, "Profissao_DePara",
+            colunas_codigo=[2], codigos_wf=codigos_wf
+        )
 
-        # Fechar recursos
         cursor.close()
         conexao.close()
 
-        # Salvar para buffer
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        nome_arquivo = "Profissao_DePara.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        return enviar_planilha(arquivo, "Profissao_DePara.xlsx")
 
     except Exception as e:
         logger.error(f"Erro ao exportar profissao: {str(e)}", exc_info=True)
@@ -392,110 +169,9 @@ def exportar_profissao():
 
 @profissao_bp.route('/exportar_filtrados', methods=['POST'])
 def exportar_profissao_filtrados():
-    try:
-        # Obter dados da requisição
-        data = request.get_json()
-        registros_filtrados = data.get('registros', [])
-        headers = data.get('headers', [])
+    """Exporta do banco os registros que atendem ao filtro do grid (status, busca, filtros por coluna, ordem)"""
+    return resposta_exportacao_grade("Profissao_DePara", "Profissao_Filtrado", obter_codigos_wf)
 
-        if not registros_filtrados:
-            return jsonify({'success': False, 'message': 'Nenhum registro para exportar'}), 400
-
-        # Obter o projeto da sessão
-        if 'projeto_selecionado' not in session:
-            return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
-
-        projeto_selecionado = session['projeto_selecionado']
-        projeto_id = projeto_selecionado.get('ProjetoID')
-
-        # Obter códigos WF para colorir
-        banco_homo = obter_banco_homo(projeto_id)
-        codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-
-        # Criar workbook
-        wb = Workbook()
-
-        # Remover a sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-
-        # Criar uma nova worksheet
-        ws = wb.create_sheet(title="Profissao_Filtrado")
-
-        # Adicionar cabeçalhos
-        for col_num, coluna in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            # Estilizar cabeçalhos
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-
-        # Definir cores
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Para campos vazios
-
-        # Adicionar dados com cores
-        for row_num, registro in enumerate(registros_filtrados, 2):
-            for col_num, header in enumerate(headers, 1):
-                valor = registro.get(header, '')
-                # Remover espaços extras dos valores
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-
-                # Aplicar cores na coluna Profissao_Codigo
-                if header == 'Profissao_Codigo':
-                    if not valor or valor == '':
-                        cell.fill = laranja  # Laranja para campos vazios
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-
-        # Ajustar largura das colunas automaticamente (forma segura)
-        for column in ws.columns:
-            if not column or column[0] is None:
-                continue
-            try:
-                column_letter = getattr(column[0], "column_letter", None)
-                if not column_letter:
-                    continue
-            except Exception:
-                continue
-
-            max_length = 0
-            for cell in column:
-                try:
-                    if cell.value is not None and len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except Exception:
-                    pass
-            adjusted_width = min(max_length + 2, 50)  # Limitar largura máxima
-            try:
-                ws.column_dimensions[column_letter].width = adjusted_width
-            except Exception:
-                pass
-
-        # Salvar para buffer
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="Profissao_Filtrado.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-
-    except Exception as e:
-        logger.error(f"Erro ao exportar profissao filtrada: {str(e)}", exc_info=True)
-        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
 
 
 @profissao_bp.route('/export_wf')
@@ -520,7 +196,7 @@ def export_wf():
         logger.info(f"Exportando tabela WF do banco homólogo: {banco_homo}")
 
         # Conectar ao banco homólogo
-        conexao = conectar_segunda_base(banco_homo)
+        conexao = conexao_homologacao(banco_homo)
         if not conexao:
             flash(f'Falha na conexão com o banco homólogo: {banco_homo}', 'error')
             return redirect(url_for('profissao.index'))
@@ -528,35 +204,18 @@ def export_wf():
         # Executar consulta na tabela Profissao do banco homólogo
         cursor = conexao.cursor()
         cursor.execute("SELECT Profissao_Codigo, Profissao_Descricao, Profissao_Ativo FROM Profissao")
-        registros = cursor.fetchall()
-        colunas = [column[0] for column in cursor.description] if cursor.description else []
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, [column[0] for column in cursor.description], "Profissao_WF")
 
-        # Converter para lista de dicionários
-        registros_list = [dict(zip(colunas, row)) for row in registros]
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), [column[0] for column in cursor.description], "Profissao_WF", limpar_texto=False
+        )
 
-        # Fechar recursos
         cursor.close()
         conexao.close()
 
-        # Criar DataFrame pandas
-        df = pd.DataFrame(registros_list, columns=colunas)
-
-        # Criar buffer para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Profissao_WF', index=False)
-
-        output.seek(0)
-
-        # Nome do arquivo
-        nome_arquivo = "Profissao_WF.xlsx"
-
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+        return enviar_planilha(arquivo, "Profissao_WF.xlsx")
 
     except Exception as e:
         logger.error(f"Erro ao exportar tabela WF: {str(e)}", exc_info=True)
@@ -590,16 +249,13 @@ def importar_profissao():
         if not banco_usuario:
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto.'})
 
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         cursor = conexao.cursor()
 
-        # === Leitura robusta da planilha ===
-        df = pd.read_excel(arquivo, dtype=str)
-        df = df.replace({pd.NaT: None, 'nan': None, 'NaN': None, '': None})
-        df = df.where(pd.notnull(df), None)
-        registros = df.to_dict('records')
+        # === Leitura robusta da planilha, em lotes ===
+        planilha = PlanilhaEmLotes(arquivo)
 
         # === Mapeamento de colunas ===
         mapeamento_colunas = {
@@ -613,56 +269,41 @@ def importar_profissao():
 
         colunas_banco = ['prof_cd', 'prof_ds', 'Profissao_Codigo', 'Profissao_Descricao']
 
-        # === Conversão ===
-        registros_mapeados = []
-        for reg in registros:
-            novo = {}
-            for coluna_banco in colunas_banco:
-                valor = None
-                for chave, destino in mapeamento_colunas.items():
-                    if destino == coluna_banco and chave in df.columns:
-                        valor = reg.get(chave)
-                        break
-                if valor is not None:
-                    valor = str(valor).strip()
-                    if valor == '':
-                        valor = None
-                    elif coluna_banco == 'Profissao_Codigo' and valor.upper() == 'S/DEPARA':
-                        valor = 'S/DePara'
-                novo[coluna_banco] = valor
-            if novo.get('prof_cd'):
-                registros_mapeados.append(novo)
-
-        logger.info(f"Registros mapeados após limpeza: {len(registros_mapeados)}")
-
         # === UPDATE/INSERT ===
-        atualizados = 0
-        inseridos = 0
-        for i, registro in enumerate(registros_mapeados):
-            prof_cd = registro['prof_cd']
-            prof_ds = registro['prof_ds']
-            codigo = registro['Profissao_Codigo']
-            descricao = registro['Profissao_Descricao']
-
-            cursor.execute("SELECT id FROM Profissao_DePara WHERE LTRIM(RTRIM(prof_cd)) = ?", (prof_cd,))
-            existe = cursor.fetchone()
-
-            if existe:
-                cursor.execute("""
-                    UPDATE Profissao_DePara
-                    SET prof_ds = ?, Profissao_Codigo = ?, Profissao_Descricao = ?
-                    WHERE LTRIM(RTRIM(prof_cd)) = ?
-                """, (prof_ds, codigo, descricao, prof_cd))
-                atualizados += 1
-            else:
-                cursor.execute("""
-                    INSERT INTO Profissao_DePara (prof_cd, prof_ds, Profissao_Codigo, Profissao_Descricao)
-                    VALUES (?, ?, ?, ?)
-                """, (prof_cd, prof_ds, codigo, descricao))
-                inseridos += 1
-
-            if i % 100 == 0:
-                conexao.commit()
+        carga = UpsertEmMassa(
+            cursor,
+            "Profissao_DePara",
+            ["prof_cd", "prof_ds", "Profissao_Codigo", "Profissao_Descricao"],
+            chave="prof_cd",
+            chave_destino="LTRIM(RTRIM(d.prof_cd))",
+        )
+        for df in planilha.lotes():
+            registros = df.to_dict('records')
+
+            # === Conversão ===
+            registros_mapeados = []
+            for reg in registros:
+                novo = {}
+                for coluna_banco in colunas_banco:
+                    valor = None
+                    for chave, destino in mapeamento_colunas.items():
+                        if destino == coluna_banco and chave in planilha.colunas:
+                            valor = reg.get(chave)
+                            break
+                    if valor is not None:
+                        valor = str(valor).strip()
+                        if valor == '':
+                            valor = None
+                        elif coluna_banco == 'Profissao_Codigo' and valor.upper() == 'S/DEPARA':
+                            valor = 'S/DePara'
+                    novo[coluna_banco] = valor
+                if novo.get('prof_cd'):
+                    registros_mapeados.append(novo)
+
+            logger.info(f"Registros mapeados após limpeza: {len(registros_mapeados)}")
+
+            carga.adicionar(registros_mapeados)
+        atualizados, inseridos = carga.aplicar()
 
         conexao.commit()
 
@@ -724,7 +365,7 @@ def update_registro():
         logger.info(f"Atualizando registro {record_id}, campo {field} para valor '{value}' no banco {banco_usuario}")
 
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             logger.error(f"Falha na conexão com o banco: {banco_usuario}")
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
@@ -742,6 +383,9 @@ def update_registro():
             logger.error(f"Erro ao verificar registro: {str(e)}")
             return jsonify({'success': False, 'message': f'Campo {field} não existe na tabela'})
 
+        # Pendentes do resumo de progresso: conta antes, ajusta antes do commit
+        delta_progresso = DeltaProgresso(cursor, "Profissao_DePara", [record_id], [field])
+
         # Atualizar registro - usando id como chave primária
         query = f"UPDATE Profissao_DePara SET {field} = ? WHERE id = ?"
         logger.info(f"Executando query: {query} com valores: ({value}, {record_id})")
@@ -753,7 +397,7 @@ def update_registro():
             try:
                 banco_homo = obter_banco_homo(projeto_id)
                 if banco_homo:
-                    conexao_wf = conectar_segunda_base(banco_homo)
+                    conexao_wf = conexao_homologacao(banco_homo)
                     if conexao_wf:
                         cursor_wf = conexao_wf.cursor()
                         cursor_wf.execute("SELECT Profissao_Descricao FROM Profissao WHERE Profissao_Codigo = ?", (value,))
@@ -776,6 +420,7 @@ def update_registro():
             return jsonify({'success': False, 'message': 'Registro não encontrado ou não modificado'})
 
         # Commit da transação
+        delta_progresso.aplicar()
         conexao.commit()
 
         logger.info(f"Registro {record_id} atualizado com sucesso")
@@ -838,40 +483,16 @@ def update_batch():
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
 
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
 
         cursor = conexao.cursor()
-        success_count = 0
-        error_count = 0
-        error_messages = []
 
         # Processar cada atualização
-        for update in updates:
-            try:
-                record_id = update.get('id')
-                field = update.get('field')
-                value = update.get('value')
-
-                if not record_id or not field:
-                    error_count += 1
-                    error_messages.append(f"ID ou campo não fornecidos para atualização: {update}")
-                    continue
-
-                # Atualizar registro
-                query = f"UPDATE Profissao_DePara SET {field} = ? WHERE id = ?"
-                cursor.execute(query, (value, record_id))
-
-                if cursor.rowcount > 0:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    error_messages.append(f"Registro não encontrado: {record_id}")
-
-            except Exception as e:
-                error_count += 1
-                error_messages.append(f"Erro ao atualizar {record_id}: {str(e)}")
+        success_count, error_count, error_messages = atualizar_campos_em_lote(
+            cursor, "Profissao_DePara", updates, None,
+        )
 
         # Commit de todas as atualizações
         conexao.commit()
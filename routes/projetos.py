@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, session, request, jsonify
 from db.connection import conectar_banco
 from logger import logger
+from utils.projeto_metadados import invalidar_projeto
 
 projetos_bp = Blueprint("projetos", __name__)
 
@@ -176,6 +177,8 @@ def salvar_projeto():
                 return jsonify({"status": "error", "message": "Falha ao obter ID do novo projeto"}), 500
 
         conn.commit()
+        if projeto_id:
+            invalidar_projeto(projeto_id)
         logger.info(f"Projeto {'atualizado' if projeto_id else 'criado'} com sucesso: {nome_projeto}")
         return jsonify({"status": "success", "message": "Projeto salvo com sucesso!"}), 200
 
@@ -226,6 +229,7 @@ def excluir_projeto(projeto_id):
         deleted = cursor.rowcount
 
         conn.commit()
+        invalidar_projeto(projeto_id)
 
         if deleted > 0:
             logger.info(f"Projeto {projeto_id} excluído com sucesso")
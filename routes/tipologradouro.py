@@ -7,139 +7,34 @@ from flask import (
     flash,
     request,
     jsonify,
-    send_file,
 )
-from db.connection import conectar_segunda_base, conectar_banco
+from db.broker import conexao_projeto, conexao_homologacao
+from db.atualizacao import atualizar_campos_em_lote
+from db.upsert import UpsertEmMassa
+from utils.projeto_metadados import obter_banco_homo
+from utils.catalogo_wf import codigos_wf, descricao_wf, atualizar_descricoes_depara
 from logger import logger
-from utils.excel_utils import export_to_excel, import_from_excel
-import pandas as pd
-from io import BytesIO
-from openpyxl import Workbook
-from openpyxl.styles import PatternFill, Font
+from utils.excel_utils import export_to_excel, import_from_excel, PlanilhaEmLotes
+from utils.grade_depara import resposta_grade, resposta_exportacao_grade
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.exportacao_colunar import formato_colunar, resposta_colunar
 
 tipologradouro_bp = Blueprint("tipologradouro", __name__)
 
-def obter_banco_homo(projeto_id):
-    """Função para obter o BancoHomo diretamente do banco de dados"""
-    try:
-        conn = conectar_banco()
-        if not conn:
-            logger.error("Falha ao conectar ao banco principal para obter BancoHomo")
-            return None
-        
-        cursor = conn.cursor()
-        cursor.execute("SELECT BancoHomo FROM Projeto WHERE ProjetoID = ?", projeto_id)
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter BancoHomo: {str(e)}")
-        return None
-
 def obter_codigos_wf(banco_homo):
     """Obtém todos os códigos da tabela TipoLogradouro do banco homólogo"""
-    try:
-        if not banco_homo:
-            return []
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return []
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT TipoLogradouro_Codigo FROM TipoLogradouro")
-        registros = cursor.fetchall()
-        
-        # Criar uma lista com todos os códigos (convertidos para string para comparação)
-        codigos = [str(registro[0]) for registro in registros if registro[0] is not None]
-        
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Encontrados {len(codigos)} códigos na base WF")
-        return codigos
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter códigos WF: {str(e)}")
-        return []
+    return codigos_wf(banco_homo, "TipoLogradouro")
 
 def obter_descricao_wf(banco_homo, codigo):
     """Obtém a descrição de um código específico da tabela TipoLogradouro do banco homólogo"""
-    try:
-        if not banco_homo or not codigo:
-            return None
-        
-        conexao = conectar_segunda_base(banco_homo)
-        if not conexao:
-            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
-            return None
-        
-        cursor = conexao.cursor()
-        cursor.execute("SELECT TipoLogradouro_Descricao FROM TipoLogradouro WHERE TipoLogradouro_Codigo = ?", codigo)
-        resultado = cursor.fetchone()
-        
-        cursor.close()
-        conexao.close()
-        
-        if resultado and resultado[0]:
-            return resultado[0]
-        return None
-        
-    except Exception as e:
-        logger.error(f"Erro ao obter descrição WF para código {codigo}: {str(e)}")
-        return None
+    return descricao_wf(banco_homo, "TipoLogradouro", codigo)
 
 def atualizar_descricoes_apos_importacao(banco_usuario, banco_homo):
     """Atualiza automaticamente as descrições após importação baseado nos códigos WF"""
-    try:
-        if not banco_homo:
-            return
-        
-        conexao = conectar_segunda_base(banco_usuario)
-        if not conexao:
-            logger.error("Falha ao conectar para atualizar descrições")
-            return
-        
-        cursor = conexao.cursor()
-        
-        # Buscar registros que têm código WF (não são S/DePara)
-        cursor.execute("""
-            SELECT id, TipoLogradouro_Codigo, TipoLogradouro_Descricao 
-            FROM TipoLogradouro_DePara 
-            WHERE TipoLogradouro_Codigo IS NOT NULL AND TipoLogradouro_Codigo != 'S/DePara'
-        """)
-        registros = cursor.fetchall()
-        
-        atualizacoes = 0
-        for registro in registros:
-            id_registro, codigo_wf, descricao_atual = registro
-            descricao_wf = obter_descricao_wf(banco_homo, codigo_wf)
-            
-            if descricao_wf and descricao_wf != descricao_atual:
-                # Atualizar descrição
-                cursor.execute("""
-                    UPDATE TipoLogradouro_DePara 
-                    SET TipoLogradouro_Descricao = ? 
-                    WHERE id = ?
-                """, (descricao_wf, id_registro))
-                atualizacoes += 1
-                logger.info(f"Descrição atualizada para código {codigo_wf}: {descricao_wf}")
-        
-        conexao.commit()
-        cursor.close()
-        conexao.close()
-        
-        logger.info(f"Atualizações automáticas de descrição: {atualizacoes} registros")
-        
-    except Exception as e:
-        logger.error(f"Erro ao atualizar descrições após importação: {str(e)}")
+    return atualizar_descricoes_depara(
+        banco_usuario, banco_homo, "TipoLogradouro", "TipoLogradouro_DePara", "TipoLogradouro_Codigo",
+        {"TipoLogradouro_Descricao": 0},
+    )
 
 @tipologradouro_bp.route("/")
 def index():
@@ -161,24 +56,19 @@ def index():
         logger.info(f"Tentando conectar ao banco: {banco_usuario} para o projeto: {projeto_nome}")
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
-            return render_template('tipologradouro.html', registros=[], colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
+            return render_template('tipologradouro.html', colunas=[], projeto_nome=projeto_nome, banco_usuario=banco_usuario, codigos_wf=[])
         
         # Executar consulta - INCLUIR todas as colunas para edição
         cursor = conexao.cursor()
-        cursor.execute("SELECT * FROM TipoLogradouro_DePara")
-        registros = cursor.fetchall()
+        # Só os nomes das colunas: as linhas vêm do /dados, em páginas
+        cursor.execute("SELECT TOP 0 * FROM TipoLogradouro_DePara")
         
         # Obter nomes das colunas
         colunas = [column[0] for column in cursor.description]
-        
-        # Converter para dicionários
-        registros_dict = [dict(zip(colunas, row)) for row in registros]
-        
-        logger.info(f"Encontrados {len(registros_dict)} registros")
-        
+
         # Obter códigos da base WF para comparação
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
@@ -188,7 +78,6 @@ def index():
         conexao.close()
         
         return render_template('tipologradouro.html', 
-                             registros=registros_dict, 
                              colunas=colunas,
                              projeto_nome=projeto_nome,
                              banco_usuario=banco_usuario,
@@ -198,7 +87,13 @@ def index():
     except Exception as e:
         logger.error(f"Erro em tipo logradouro: {str(e)}")
         flash(f'Erro: {str(e)}', 'error')
-        return render_template('tipologradouro.html', registros=[], colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+        return render_template('tipologradouro.html', colunas=[], projeto_nome='N/A', banco_usuario='N/A', codigos_wf=[])
+
+@tipologradouro_bp.route('/dados')
+def dados():
+    """Página do grid em JSON (paginação por chave, filtros e ordenação no servidor)"""
+    return resposta_grade("TipoLogradouro_DePara", obter_codigos_wf, linhas="partials/linhas/tipologradouro.html")
+
 
 @tipologradouro_bp.route('/exportar')
 def exportar_tipologradouro():
@@ -217,7 +112,7 @@ def exportar_tipologradouro():
             return redirect(url_for('tipologradouro.index'))
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             flash(f'Falha na conexão com o banco: {banco_usuario}', 'error')
             return redirect(url_for('tipologradouro.index'))
@@ -229,7 +124,6 @@ def exportar_tipologradouro():
                    TipoLogradouro_Sigla, TipoLogradouro_Descricao, tabela 
             FROM TipoLogradouro_DePara
         """)
-        registros = cursor.fetchall()
         colunas_originais = [column[0] for column in cursor.description]
         
         # Mapear nomes das colunas para os nomes amigáveis
@@ -244,83 +138,23 @@ def exportar_tipologradouro():
         
         colunas_amigaveis = [mapeamento_colunas.get(col, col) for col in colunas_originais]
         
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, colunas_amigaveis, "TipoLogradouro_DePara")
+
         # Obter códigos WF para colorir
         banco_homo = obter_banco_homo(projeto_id)
         codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        # CORREÇÃO: Criar workbook e worksheet de forma mais robusta
-        wb = Workbook()
-        
-        # Remover a sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        # Criar uma nova worksheet explicitamente
-        ws = wb.create_sheet(title="TipoLogradouro_DePara")
-        
-        # Adicionar cabeçalhos
-        for col_num, coluna in enumerate(colunas_amigaveis, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            # Estilizar cabeçalhos
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Definir cores
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Para campos vazios
-        
-        # Adicionar dados com cores
-        for row_num, registro in enumerate(registros, 2):
-            for col_num, valor in enumerate(registro, 1):
-                # Remover espaços extras dos valores
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                # Aplicar cores na coluna TipoLogradouro_Codigo (coluna 3)
-                if col_num == 3:  # TipoLogradouro_Codigo
-                    if not valor or valor == '':
-                        cell.fill = laranja  # Laranja para campos vazios
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        # Ajustar largura das colunas automaticamente
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)  # Limitar largura máxima
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Fechar recursos
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), colunas_amigaveis, "TipoLogradouro_DePara",
+            colunas_codigo=[2], codigos_wf=codigos_wf
+        )
+
         cursor.close()
         conexao.close()
-        
-        # Salvar para buffer
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        nome_arquivo = "TipoLogradouro_DePara.xlsx"
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "TipoLogradouro_DePara.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar tipo logradouro: {str(e)}")
@@ -329,99 +163,9 @@ def exportar_tipologradouro():
 
 @tipologradouro_bp.route('/exportar_filtrados', methods=['POST'])
 def exportar_tipologradouro_filtrados():
-    try:
-        # Obter dados da requisição
-        data = request.get_json()
-        registros_filtrados = data.get('registros', [])
-        headers = data.get('headers', [])
-        
-        if not registros_filtrados:
-            return jsonify({'success': False, 'message': 'Nenhum registro para exportar'}), 400
-        
-        # Obter o projeto da sessão
-        if 'projeto_selecionado' not in session:
-            return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
-        
-        projeto_selecionado = session['projeto_selecionado']
-        projeto_id = projeto_selecionado.get('ProjetoID')
-        
-        # Obter códigos WF para colorir
-        banco_homo = obter_banco_homo(projeto_id)
-        codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
-        
-        # Criar workbook
-        wb = Workbook()
-        
-        # Remover a sheet padrão se existir
-        if wb.sheetnames and 'Sheet' in wb.sheetnames:
-            std_sheet = wb['Sheet']
-            wb.remove(std_sheet)
-        
-        # Criar uma nova worksheet
-        ws = wb.create_sheet(title="TipoLogradouro_Filtrado")
-        
-        # Adicionar cabeçalhos
-        for col_num, coluna in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col_num, value=coluna)
-            # Estilizar cabeçalhos
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-        
-        # Definir cores
-        amarelo = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        verde = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
-        vermelho = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
-        laranja = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")  # Para campos vazios
-        
-        # Adicionar dados com cores
-        for row_num, registro in enumerate(registros_filtrados, 2):
-            for col_num, header in enumerate(headers, 1):
-                valor = registro.get(header, '')
-                # Remover espaços extras dos valores
-                if valor and isinstance(valor, str):
-                    valor = valor.strip()
-                
-                cell = ws.cell(row=row_num, column=col_num, value=valor)
-                
-                # Aplicar cores na coluna TipoLogradouro_Codigo
-                if header == 'TipoLogradouro_Codigo':
-                    if not valor or valor == '':
-                        cell.fill = laranja  # Laranja para campos vazios
-                    elif valor == 'S/DePara':
-                        cell.fill = amarelo
-                    elif valor and str(valor) in codigos_wf:
-                        cell.fill = verde
-                    elif valor and str(valor) not in codigos_wf:
-                        cell.fill = vermelho
-        
-        # Ajustar largura das colunas automaticamente
-        for column in ws.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)  # Limitar largura máxima
-            ws.column_dimensions[column_letter].width = adjusted_width
-        
-        # Salvar para buffer
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name="TipoLogradouro_Filtrado.xlsx",
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        
-    except Exception as e:
-        logger.error(f"Erro ao exportar tipo logradouro filtrada: {str(e)}")
-        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
+    """Exporta do banco os registros que atendem ao filtro do grid (status, busca, filtros por coluna, ordem)"""
+    return resposta_exportacao_grade("TipoLogradouro_DePara", "TipoLogradouro_Filtrado", obter_codigos_wf)
+
 
 @tipologradouro_bp.route('/export_wf')
 def export_wf():
@@ -445,7 +189,7 @@ def export_wf():
         logger.info(f"Exportando tabela WF do banco homólogo: {banco_homo}")
         
         # Conectar ao banco homólogo
-        conexao = conectar_segunda_base(banco_homo)
+        conexao = conexao_homologacao(banco_homo)
         if not conexao:
             flash(f'Falha na conexão com o banco homólogo: {banco_homo}', 'error')
             return redirect(url_for('tipologradouro.index'))
@@ -453,35 +197,18 @@ def export_wf():
         # Executar consulta na tabela TipoLogradouro do banco homólogo
         cursor = conexao.cursor()
         cursor.execute("SELECT TipoLogradouro_Codigo, TipoLogradouro_Descricao, TipoLogradouro_Ativo FROM TipoLogradouro")
-        registros = cursor.fetchall()
-        colunas = [column[0] for column in cursor.description]
-        
-        # Converter para lista de dicionários
-        registros_list = [dict(zip(colunas, row)) for row in registros]
-        
-        # Fechar recursos
+        # CSV, Parquet ou Arrow (?formato=): transmitidos direto do cursor
+        if formato_colunar():
+            return resposta_colunar(cursor, [column[0] for column in cursor.description], "TipoLogradouro_WF")
+
+        arquivo = gerar_planilha(
+            linhas_cursor(cursor), [column[0] for column in cursor.description], "TipoLogradouro_WF", limpar_texto=False
+        )
+
         cursor.close()
         conexao.close()
-        
-        # Criar DataFrame pandas
-        df = pd.DataFrame(registros_list, columns=colunas)
-        
-        # Criar buffer para o arquivo Excel
-        output = BytesIO()
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='TipoLogradouro_WF', index=False)
-        
-        output.seek(0)
-        
-        # Nome do arquivo
-        nome_arquivo = "TipoLogradouro_WF.xlsx"
-        
-        return send_file(
-            output,
-            as_attachment=True,
-            download_name=nome_arquivo,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
+
+        return enviar_planilha(arquivo, "TipoLogradouro_WF.xlsx")
         
     except Exception as e:
         logger.error(f"Erro ao exportar tabela WF: {str(e)}")
@@ -511,18 +238,15 @@ def importar_tipologradouro():
         if not banco_usuario:
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
 
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         cursor = conexao.cursor()
 
-        # === Leitura da planilha (forçando strings) ===
-        df = pd.read_excel(arquivo, dtype=str)
-        df = df.replace({pd.NaT: None, 'nan': None, 'NaN': None, '': None})
-        df = df.where(pd.notnull(df), None)
-        registros = df.to_dict('records')
-        colunas_excel = df.columns.tolist()
-        logger.info(f"Arquivo Excel lido: {len(registros)} registros, colunas: {colunas_excel}")
+        # === Leitura da planilha em lotes (forçando strings) ===
+        planilha = PlanilhaEmLotes(arquivo)
+        colunas_excel = planilha.colunas
+        logger.info(f"Arquivo Excel aberto, colunas: {colunas_excel}")
 
         # === Mapeamento de colunas ===
         mapeamento_colunas = {
@@ -543,101 +267,93 @@ def importar_tipologradouro():
             'TipoLogradouro_Descricao', 'tabela'
         ]
 
-        # === Normalização e filtragem ===
-        registros_mapeados = []
-        for registro in registros:
-            novo = {}
-            for coluna_banco in colunas_banco:
-                valor = None
-                for chave, destino in mapeamento_colunas.items():
-                    if destino == coluna_banco and chave in colunas_excel:
-                        valor = registro.get(chave)
-                        break
-                if valor is not None:
-                    valor = str(valor).strip() if not isinstance(valor, str) else valor.strip()
-                    if valor == '':
-                        valor = None
-                novo[coluna_banco] = valor
-            # Só adiciona se tiver pelo menos sigla ou nome
-            if novo.get('logradouro_sigla') or novo.get('logradouro_nm'):
-                registros_mapeados.append(novo)
-
-        logger.info(f"Registros mapeados após limpeza: {len(registros_mapeados)}")
-
         # === Importação (UPDATE/INSERT) com matching robusto ===
-        atualizados = 0
-        inseridos = 0
-        for i, registro in enumerate(registros_mapeados):
-            sigla = registro.get('logradouro_sigla') or ''
-            nome = registro.get('logradouro_nm') or ''
-            sigla = sigla.strip()
-            nome = nome.strip()
-
-            # Normaliza para comparação (maiusculas)
-            sigla_comp = sigla.upper() if sigla else ''
-            nome_comp = nome.upper() if nome else ''
-
-            # Se não houver chave válida, pula
-            if not sigla_comp and not nome_comp:
-                continue
-
-            # Monta SELECT dependendo das chaves disponíveis
-            if sigla_comp and nome_comp:
-                # Usar ambos para matching
-                cursor.execute("""
-                    SELECT id FROM TipoLogradouro_DePara
-                    WHERE UPPER(LTRIM(RTRIM(ISNULL(logradouro_sigla, '')))) = ?
-                      AND UPPER(LTRIM(RTRIM(ISNULL(logradouro_nm, '')))) = ?
-                """, (sigla_comp, nome_comp))
-            elif sigla_comp:
-                cursor.execute("""
-                    SELECT id FROM TipoLogradouro_DePara
-                    WHERE UPPER(LTRIM(RTRIM(ISNULL(logradouro_sigla, '')))) = ?
-                """, (sigla_comp,))
-            else:  # nome_comp
-                cursor.execute("""
-                    SELECT id FROM TipoLogradouro_DePara
-                    WHERE UPPER(LTRIM(RTRIM(ISNULL(logradouro_nm, '')))) = ?
-                """, (nome_comp,))
-
-            existe = cursor.fetchone()
-
-            if existe:
-                # UPDATE por id
-                cursor.execute("""
-                    UPDATE TipoLogradouro_DePara
-                    SET TipoLogradouro_Codigo = ?, 
-                        TipoLogradouro_Sigla = ?, 
-                        TipoLogradouro_Descricao = ?, 
-                        tabela = ?
-                    WHERE id = ?
-                """, (
-                    registro.get('TipoLogradouro_Codigo'),
-                    registro.get('TipoLogradouro_Sigla'),
-                    registro.get('TipoLogradouro_Descricao'),
-                    registro.get('tabela'),
-                    existe[0]
-                ))
-                atualizados += 1
-            else:
-                # INSERT
-                cursor.execute("""
-                    INSERT INTO TipoLogradouro_DePara
-                    (logradouro_sigla, logradouro_nm, TipoLogradouro_Codigo, 
-                     TipoLogradouro_Sigla, TipoLogradouro_Descricao, tabela)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    registro.get('logradouro_sigla'),
-                    registro.get('logradouro_nm'),
-                    registro.get('TipoLogradouro_Codigo'),
-                    registro.get('TipoLogradouro_Sigla'),
-                    registro.get('TipoLogradouro_Descricao'),
-                    registro.get('tabela')
-                ))
-                inseridos += 1
-
-            if i % 100 == 0:
-                conexao.commit()
+        # O matching por sigla/nome é resolvido em memória contra um único SELECT da tabela;
+        # as gravações vão num MERGE (atualizações por id) e num INSERT em lote (novos)
+        cursor.execute("""
+            SELECT id,
+                   UPPER(LTRIM(RTRIM(ISNULL(logradouro_sigla, '')))),
+                   UPPER(LTRIM(RTRIM(ISNULL(logradouro_nm, ''))))
+            FROM TipoLogradouro_DePara
+            ORDER BY id
+        """)
+        por_par, por_sigla, por_nome = {}, {}, {}
+
+        def indexar(alvo, sigla_comp, nome_comp):
+            por_par.setdefault((sigla_comp, nome_comp), alvo)
+            por_sigla.setdefault(sigla_comp, alvo)
+            por_nome.setdefault(nome_comp, alvo)
+
+        for linha in cursor.fetchall():
+            indexar(linha[0], linha[1], linha[2])
+
+        campos_update = ['TipoLogradouro_Codigo', 'TipoLogradouro_Sigla', 'TipoLogradouro_Descricao', 'tabela']
+        carga = UpsertEmMassa(
+            cursor, "TipoLogradouro_DePara", ['id'] + colunas_banco,
+            chave='id',
+            atualizar=campos_update,
+            inserir=colunas_banco,
+            inserir_sem_chave=True,
+        )
+        novos = []
+        atualizados_novos = 0
+        for df in planilha.lotes():
+            registros = df.to_dict('records')
+
+            # === Normalização e filtragem ===
+            registros_mapeados = []
+            for registro in registros:
+                novo = {}
+                for coluna_banco in colunas_banco:
+                    valor = None
+                    for chave, destino in mapeamento_colunas.items():
+                        if destino == coluna_banco and chave in colunas_excel:
+                            valor = registro.get(chave)
+                            break
+                    if valor is not None:
+                        valor = str(valor).strip() if not isinstance(valor, str) else valor.strip()
+                        if valor == '':
+                            valor = None
+                    novo[coluna_banco] = valor
+                # Só adiciona se tiver pelo menos sigla ou nome
+                if novo.get('logradouro_sigla') or novo.get('logradouro_nm'):
+                    registros_mapeados.append(novo)
+
+            logger.info(f"Registros mapeados após limpeza: {len(registros_mapeados)}")
+
+            atualizacoes = []
+            for registro in registros_mapeados:
+                sigla_comp = (registro.get('logradouro_sigla') or '').strip().upper()
+                nome_comp = (registro.get('logradouro_nm') or '').strip().upper()
+
+                # Se não houver chave válida, pula
+                if not sigla_comp and not nome_comp:
+                    continue
+
+                if sigla_comp and nome_comp:
+                    alvo = por_par.get((sigla_comp, nome_comp))
+                elif sigla_comp:
+                    alvo = por_sigla.get(sigla_comp)
+                else:
+                    alvo = por_nome.get(nome_comp)
+
+                if alvo is None:
+                    # Linha nova: linhas seguintes do arquivo com a mesma sigla/nome a atualizam
+                    novo = dict(registro)
+                    novos.append(novo)
+                    indexar(novo, sigla_comp, nome_comp)
+                elif isinstance(alvo, dict):
+                    alvo.update({campo: registro.get(campo) for campo in campos_update})
+                    atualizados_novos += 1
+                else:
+                    atualizacoes.append({'id': alvo, **registro})
+
+            carga.adicionar(atualizacoes)
+
+        # As linhas novas vão por último: linhas de lotes seguintes ainda podem atualizá-las
+        carga.adicionar(novos)
+        atualizados, inseridos = carga.aplicar()
+        atualizados += atualizados_novos
 
         conexao.commit()
         logger.info(f"Importação finalizada — {atualizados} atualizados, {inseridos} inseridos.")
@@ -701,40 +417,16 @@ def update_batch():
             return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'})
         
         # Conectar ao banco
-        conexao = conectar_segunda_base(banco_usuario)
+        conexao = conexao_projeto(banco_usuario)
         if not conexao:
             return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'})
         
         cursor = conexao.cursor()
-        success_count = 0
-        error_count = 0
-        error_messages = []
         
         # Processar cada atualização
-        for update in updates:
-            try:
-                record_id = update.get('id')
-                field = update.get('field')
-                value = update.get('value')
-                
-                if not record_id or not field:
-                    error_count += 1
-                    error_messages.append(f"ID ou campo não fornecidos para atualização: {update}")
-                    continue
-                
-                # Atualizar registro
-                query = f"UPDATE TipoLogradouro_DePara SET {field} = ? WHERE id = ?"
-                cursor.execute(query, (value, record_id))
-                
-                if cursor.rowcount > 0:
-                    success_count += 1
-                else:
-                    error_count += 1
-                    error_messages.append(f"Registro não encontrado: {record_id}")
-                    
-            except Exception as e:
-                error_count += 1
-                error_messages.append(f"Erro ao atualizar {record_id}: {str(e)}")
+        success_count, error_count, error_messages = atualizar_campos_em_lote(
+            cursor, "TipoLogradouro_DePara", updates, None,
+        )
         
         # Commit de todas as atualizações
         conexao.commit()
@@ -0,0 +1,148 @@
+// grade_depara.js - Grid das tabelas DePara carregado em páginas do /dados
+//
+// A página traz só o cabeçalho da tabela; as linhas vêm do servidor em páginas
+// (paginação por chave), já renderizadas pelo template de linhas do blueprint.
+// Filtro de problemas, busca e ordenação (clique no cabeçalho) são aplicados no
+// servidor, com a mesma especificação usada pela exportação filtrada.
+
+class GradeDePara {
+    /**
+     * url: rota /dados do blueprint
+     * tabela: <table> com <th data-coluna="..."> no cabeçalho (null = sem tabela)
+     * busca: <input> de busca (opcional)
+     * aoFiltrar: chamada sempre que o filtro muda (ex.: texto do botão de exportar)
+     */
+    constructor({ url, tabela, busca = null, aoFiltrar = null, tamanhoPagina = 200 }) {
+        this.url = url;
+        this.tabela = tabela;
+        this.aoFiltrar = aoFiltrar;
+        this.tamanhoPagina = tamanhoPagina;
+        this.filtro = { status: '', busca: '', ordem: '', direcao: 'asc' };
+        this.proximo = null;
+        this.carregados = 0;
+        this.requisicao = 0;  // respostas de filtros anteriores são descartadas
+
+        if (!tabela) return;
+        this.tbody = tabela.querySelector('tbody');
+        this.cabecalhos = Array.from(tabela.querySelectorAll('thead th[data-coluna]'));
+        this.colunas = this.cabecalhos.map(th => th.dataset.coluna);
+
+        GradeDePara.adicionarEstilo();
+        this.cabecalhos.forEach(th => {
+            th.classList.add('coluna-ordenavel');
+            th.addEventListener('click', () => this.ordenar(th.dataset.coluna));
+        });
+
+        if (busca) {
+            let espera = null;
+            busca.addEventListener('input', () => {
+                clearTimeout(espera);
+                espera = setTimeout(() => this.recarregar({ busca: busca.value.trim() }), 400);
+            });
+        }
+
+        this.criarRodape();
+        this.carregar();
+    }
+
+    static adicionarEstilo() {
+        if (document.getElementById('estilo-grade-depara')) return;
+        const estilo = document.createElement('style');
+        estilo.id = 'estilo-grade-depara';
+        // Setas em ::after: não entram no textContent (cabeçalhos da exportação)
+        estilo.textContent = `
+            .coluna-ordenavel { cursor: pointer; user-select: none; }
+            .ordem-asc::after { content: " \\25B2"; }
+            .ordem-desc::after { content: " \\25BC"; }
+        `;
+        document.head.appendChild(estilo);
+    }
+
+    criarRodape() {
+        this.rodape = document.createElement('div');
+        this.rodape.className = 'flex items-center justify-between gap-4 p-4 text-sm text-gray-600';
+        this.info = document.createElement('span');
+        this.botaoMais = document.createElement('button');
+        this.botaoMais.className = 'bg-blue-600 hover:bg-blue-700 text-white font-bold py-1 px-4 rounded hidden';
+        this.botaoMais.innerHTML = '<i class="fas fa-chevron-down"></i> Carregar mais';
+        this.botaoMais.addEventListener('click', () => this.carregar());
+        this.rodape.append(this.info, this.botaoMais);
+        this.tabela.insertAdjacentElement('afterend', this.rodape);
+    }
+
+    /** Filtro atual no formato do /dados e do exportar_filtrados */
+    especificacao() {
+        const especificacao = {};
+        for (const [nome, valor] of Object.entries(this.filtro)) {
+            if (valor) especificacao[nome] = valor;
+        }
+        return especificacao;
+    }
+
+    /** Há filtro de registros (status ou busca)? A ordenação não conta */
+    filtrada() {
+        return Boolean(this.filtro.status || this.filtro.busca);
+    }
+
+    ordenar(coluna) {
+        const direcao = this.filtro.ordem === coluna && this.filtro.direcao === 'asc' ? 'desc' : 'asc';
+        this.cabecalhos.forEach(th => {
+            th.classList.remove('ordem-asc', 'ordem-desc');
+            if (th.dataset.coluna === coluna) th.classList.add(`ordem-${direcao}`);
+        });
+        this.recarregar({ ordem: coluna, direcao: direcao });
+    }
+
+    /** Aplica as alterações ao filtro e volta para a primeira página */
+    recarregar(alteracoes = {}) {
+        Object.assign(this.filtro, alteracoes);
+        if (this.aoFiltrar) this.aoFiltrar();
+        if (!this.tabela) return Promise.resolve();
+        this.proximo = null;
+        this.carregados = 0;
+        this.tbody.innerHTML = '';
+        return this.carregar();
+    }
+
+    carregar() {
+        const numero = ++this.requisicao;
+        const parametros = new URLSearchParams({
+            formato: 'linhas',
+            limite: this.tamanhoPagina,
+            colunas: this.colunas.join(','),
+            ...this.especificacao(),
+        });
+        if (this.proximo) parametros.set('apos', this.proximo);
+
+        this.botaoMais.disabled = true;
+        this.info.textContent = 'Carregando registros...';
+
+        return fetch(`${this.url}?${parametros}`)
+            .then(resposta => resposta.json())
+            .then(dados => {
+                if (numero !== this.requisicao) return;
+                if (!dados.success) throw new Error(dados.message || 'Erro ao carregar registros');
+                this.tbody.insertAdjacentHTML('beforeend', dados.html);
+                this.carregados += dados.quantidade;
+                this.proximo = dados.proximo;
+                this.atualizarRodape();
+            })
+            .catch(erro => {
+                if (numero !== this.requisicao) return;
+                this.info.textContent = 'Erro ao carregar registros: ' + erro.message;
+            })
+            .finally(() => {
+                if (numero === this.requisicao) this.botaoMais.disabled = false;
+            });
+    }
+
+    atualizarRodape() {
+        if (this.carregados === 0) {
+            this.tbody.innerHTML = `<tr><td colspan="${this.colunas.length}" class="p-8 text-center text-gray-500">Nenhum registro encontrado.</td></tr>`;
+        }
+        this.info.textContent = this.proximo
+            ? `Exibindo os primeiros ${this.carregados} registros`
+            : `${this.carregados} registros`;
+        this.botaoMais.classList.toggle('hidden', !this.proximo);
+    }
+}
@@ -0,0 +1,332 @@
+import threading
+import time
+from collections import namedtuple
+from config import Config
+from db.broker import conexao_homologacao, conexao_projeto
+from logger import logger
+
+# Definição de uma tabela WF do banco homólogo.
+# descricao/ativo podem ser None quando a tabela não tem a coluna; extras são colunas adicionais
+# guardadas junto do item (ex.: Banco_Sigla); filtro é um WHERE fixo aplicado à tabela.
+TabelaWF = namedtuple(
+    "TabelaWF", ["tabela", "codigo", "descricao", "ativo", "extras", "filtro"],
+    defaults=(None, None, (), None),
+)
+
+# Catálogos por nome; CorExterna e CorInterna usam o mesmo catálogo "Cor"
+TABELAS_WF = {
+    "AgenteCobrador": TabelaWF("AgenteCobrador", "AgenteCobrador_Codigo", "AgenteCobrador_Descricao", "AgenteCobrador_Ativo"),
+    "Banco": TabelaWF("Banco", "Banco_Codigo", "Banco_Descricao", "Banco_Ativo", ("Banco_Sigla",)),
+    "CentroResultado": TabelaWF("CentroResultado", "CentroResultado_Codigo", "CentroResultado_Descricao", "CentroResultado_Ativo"),
+    "ClasMontadora": TabelaWF("ClasMontadora", "ClasMontadora_Codigo", "ClasMontadora_Descricao", "ClasMontadora_Ativo"),
+    "Combustivel": TabelaWF("Combustivel", "Combustivel_Codigo", "Combustivel_Descricao", "Combustivel_Ativo"),
+    "CondicaoPagamento": TabelaWF("CondicaoPagamento", "CondicaoPagamento_Codigo", "CondicaoPagamento_Descricao", "CondicaoPagamento_Ativo"),
+    "ContaGerencial": TabelaWF("ContaGerencial", "ContaGerencial_Codigo", "ContaGerencial_Descricao", "ContaGerencial_Ativo"),
+    "Cor": TabelaWF("Cor", "Cor_Codigo", "Cor_Descricao", "Cor_Ativo"),
+    "Departamento": TabelaWF("departamento", "Departamento_Codigo", "Departamento_Descricao", "Departamento_Ativo"),
+    "Equipe": TabelaWF("equipe", "Equipe_Codigo", "Equipe_Descricao", "Equipe_Ativo"),
+    "Escolaridade": TabelaWF("Escolaridade", "Escolaridade_Codigo", "Escolaridade_Descricao", "Escolaridade_Ativo"),
+    "Estado": TabelaWF("Estado", "Estado_Codigo", "Estado_Nome", "Estado_Ativo"),
+    "EstadoCivil": TabelaWF("EstadoCivil", "EstadoCivil_Codigo", "EstadoCivil_Descricao", "EstadoCivil_Ativo"),
+    "Estoque": TabelaWF("estoque", "Estoque_Codigo", "Estoque_Descricao", "Estoque_Ativo"),
+    "GrupoLucratividade": TabelaWF("GrupoLucratividade", "GrupoLucratividade_Codigo", "GrupoLucratividade_Descricao", "GrupoLucratividade_Ativo"),
+    "GrupoProduto": TabelaWF("GrupoProduto", "GrupoProduto_Codigo", "GrupoProduto_Descricao", "GrupoProduto_Ativo"),
+    "HistoricoPadrao": TabelaWF("HistoricoPadrao", "HistoricoPadrao_Codigo", "HistoricoPadrao_Descricao", "HistoricoPadrao_Ativo"),
+    "Marca": TabelaWF("Marca", "Marca_Codigo", "Marca_Descricao", "Marca_Ativo"),
+    "ModeloVeiculo": TabelaWF("ModeloVeiculo", "ModeloVeiculo_Codigo", "ModeloVeiculo_Descricao"),
+    "Municipio": TabelaWF("Municipio", "Municipio_Codigo", "Municipio_Nome", "Municipio_Ativo"),
+    "NaturezaOperacao": TabelaWF("NaturezaOperacao", "NaturezaOperacao_Codigo", "NaturezaOperacao_Descricao", "NaturezaOperacao_Ativo"),
+    "Opcional": TabelaWF("Opcional", "Opcional_Codigo", "Opcional_Descricao", "Opcional_Ativo"),
+    "Pais": TabelaWF("Pais", "Pais_Codigo", "Pais_Nome", "Pais_Ativo"),
+    "Pessoa": TabelaWF("Pessoa", "Pessoa_Codigo", "Pessoa_nome", None, (), "Pessoa_TipoPessoa = 'J'"),
+    "PlanoConta": TabelaWF("PlanoConta", "PlanoConta_Codigo", "PlanoConta_Descricao", "PlanoConta_Ativo"),
+    "Procedencia": TabelaWF("Procedencia", "Procedencia_Codigo", "Procedencia_Descricao", "Procedencia_Ativo"),
+    "Profissao": TabelaWF("Profissao", "Profissao_Codigo", "Profissao_Descricao", "Profissao_Ativo"),
+    "SegmentoMercado": TabelaWF("SegmentoMercado", "SegmentoMercado_Codigo", "SegmentoMercado_Descricao", "SegmentoMercado_Ativo"),
+    "SetorServico": TabelaWF("SetorServico", "SetorServico_Codigo", "SetorServico_Descricao", "SetorServico_Ativo"),
+    "SubConta": TabelaWF("SubConta", "SubConta_Codigo", "SubConta_Descricao", "SubConta_Ativo"),
+    "TabelaPreco": TabelaWF("TabelaPreco", "TabelaPreco_Codigo", "TabelaPreco_Descricao", "TabelaPreco_Ativo"),
+    "TipoCobranca": TabelaWF("TipoCobranca", "TipoCobranca_Codigo", "TipoCobranca_Descricao", "TipoCobranca_Ativo"),
+    "TipoCreditoDebito": TabelaWF("TipoCreditoDebito", "TipoCreditoDebito_Codigo", "TipoCreditoDebito_Descricao", "TipoCreditoDebito_Ativo"),
+    "TipoDocumento": TabelaWF("TipoDocumento", "TipoDocumento_Codigo", "TipoDocumento_Descricao", "TipoDocumento_Ativo"),
+    "TipoFichaRazao": TabelaWF("TipoFichaRazao", "TipoFichaRazao_Codigo", "TipoFichaRazao_Descricao", "TipoFichaRazao_Ativo"),
+    "TipoLogradouro": TabelaWF("TipoLogradouro", "TipoLogradouro_Codigo", "TipoLogradouro_Descricao", "TipoLogradouro_Ativo"),
+    "TipoLote": TabelaWF("TipoLote", "TipoLote_Codigo", "TipoLote_Descricao", "TipoLote_Ativo"),
+    "TipoOS": TabelaWF("TipoOS", "TipoOS_Codigo", "TipoOS_Descricao", "TipoOS_Ativo"),
+    "TipoProduto": TabelaWF("TipoProduto", "TipoProduto_Codigo", "TipoProduto_Descricao", "TipoProduto_Ativo"),
+    "TipoServico": TabelaWF("TipoServico", "TipoServico_Codigo", "TipoServico_Descricao", "TipoServico_Ativo"),
+    "TipoSubConta": TabelaWF("TipoSubConta", "TipoSubConta_Codigo", "TipoSubConta_Descricao", "TipoSubConta_Ativo"),
+    "TipoTitulo": TabelaWF("Tipotitulo", "Tipotitulo_Codigo", "Tipotitulo_Descricao", "Tipotitulo_Ativo"),
+    "TMO": TabelaWF("TMO", "TMO_Codigo", "TMO_Descricao", "TMO_Ativo"),
+    "Unidade": TabelaWF("Unidade", "Unidade_Codigo", "Unidade_Descricao", "Unidade_Ativo"),
+    "Usuario": TabelaWF("usuario", "Usuario_Codigo", "Usuario_Nome", "Usuario_Ativo", ("Usuario_Identificador",)),
+    "VeiculoAno": TabelaWF("VeiculoAno", "VeiculoAno_Codigo", None, "VeiculoAno_Ativo", ("VeiculoAno_Fabricacao", "VeiculoAno_Modelo")),
+}
+
+
+# Código de um registro DePara ainda sem correspondência no WF
+CODIGO_PENDENTE = "S/DePara"
+
+# Situações (situacao_codigo) que contam como problema
+SITUACOES_PROBLEMA = ("vazio", "pendente", "invalido")
+
+
+class ListaCodigos(list):
+    """Lista de códigos com busca O(1); continua sendo list para o tojson dos templates"""
+
+    def __init__(self, codigos):
+        super().__init__(codigos)
+        self._conjunto = frozenset(self)
+
+    def __contains__(self, codigo):
+        return codigo in self._conjunto
+
+
+class CatalogoWF:
+    """
+    Conteúdo de uma tabela WF carregado em memória.
+    itens: código (str) -> (descricao, ativo, *extras)
+    """
+
+    def __init__(self, versao, itens):
+        self.versao = versao
+        self.itens = itens
+        self.codigos = ListaCodigos(itens)
+        self.verificado_em = time.monotonic()
+
+    def descricao(self, codigo):
+        item = self.itens.get(str(codigo))
+        return item[0] if item and item[0] else None
+
+
+# (banco_homo, nome do catálogo) -> CatalogoWF
+_catalogos = {}
+_locks = {}
+_lock = threading.Lock()
+
+
+def _colunas(definicao):
+    return [definicao.codigo, definicao.descricao, definicao.ativo, *definicao.extras]
+
+
+def _sql_colunas(definicao):
+    return ", ".join(col if col else "NULL" for col in _colunas(definicao))
+
+
+def _sql_where(definicao):
+    return f" WHERE {definicao.filtro}" if definicao.filtro else ""
+
+
+def _sonda(cursor, definicao):
+    """Consulta barata que muda sempre que alguma linha do catálogo muda"""
+    colunas = ", ".join(col for col in _colunas(definicao) if col)
+    cursor.execute(
+        f"SELECT COUNT_BIG(*), CHECKSUM_AGG(BINARY_CHECKSUM({colunas})) "
+        f"FROM {definicao.tabela}{_sql_where(definicao)}"
+    )
+    resultado = cursor.fetchone()
+    return (resultado[0], resultado[1]) if resultado else (0, None)
+
+
+def _carregar(cursor, definicao):
+    cursor.execute(f"SELECT {_sql_colunas(definicao)} FROM {definicao.tabela}{_sql_where(definicao)}")
+    itens = {}
+    while True:
+        lote = cursor.fetchmany(5000)
+        if not lote:
+            break
+        for registro in lote:
+            if registro[0] is not None:
+                itens[str(registro[0])] = tuple(registro[1:])
+    return itens
+
+
+def obter_catalogo(banco_homo, nome):
+    """
+    Retorna o CatalogoWF de `nome` no banco homólogo.
+    O conteúdo só é baixado de novo quando a sonda (COUNT + CHECKSUM_AGG) indica mudança;
+    dentro de CATALOGO_WF_PROBE_INTERVAL segundos nem a sonda é executada.
+    """
+    if not banco_homo:
+        return None
+
+    definicao = TABELAS_WF[nome]
+    chave = (banco_homo, nome)
+
+    with _lock:
+        catalogo = _catalogos.get(chave)
+        lock_chave = _locks.setdefault(chave, threading.Lock())
+
+    if catalogo and time.monotonic() - catalogo.verificado_em < Config.CATALOGO_WF_PROBE_INTERVAL:
+        return catalogo
+
+    with lock_chave:
+        # Outra thread pode ter revalidado enquanto esperávamos
+        catalogo = _catalogos.get(chave)
+        if catalogo and time.monotonic() - catalogo.verificado_em < Config.CATALOGO_WF_PROBE_INTERVAL:
+            return catalogo
+
+        conexao = conexao_homologacao(banco_homo)
+        if not conexao:
+            logger.error(f"Falha na conexão com o banco homólogo: {banco_homo}")
+            return catalogo
+
+        cursor = None
+        try:
+            cursor = conexao.cursor()
+            versao = _sonda(cursor, definicao)
+            if catalogo and catalogo.versao == versao:
+                catalogo.verificado_em = time.monotonic()
+                return catalogo
+
+            catalogo = CatalogoWF(versao, _carregar(cursor, definicao))
+            with _lock:
+                _catalogos[chave] = catalogo
+            logger.info(f"Catálogo WF {nome} carregado de {banco_homo}: {len(catalogo.itens)} códigos")
+            return catalogo
+
+        except Exception as e:
+            logger.error(f"Erro ao carregar catálogo WF {nome} de {banco_homo}: {str(e)}")
+            return catalogo
+        finally:
+            if cursor:
+                cursor.close()
+            # Na requisição não faz nada (broker); fora dela devolve ao pool com rollback
+            conexao.close()
+
+
+def codigos_wf(banco_homo, nome):
+    """Lista de códigos (str) do catálogo; [] se o banco homólogo não estiver disponível"""
+    catalogo = obter_catalogo(banco_homo, nome)
+    return catalogo.codigos if catalogo else []
+
+
+def item_wf(banco_homo, nome, codigo):
+    """Tupla (descricao, ativo, *extras) do código, ou None"""
+    if not codigo:
+        return None
+    catalogo = obter_catalogo(banco_homo, nome)
+    return catalogo.itens.get(str(codigo)) if catalogo else None
+
+
+def descricao_wf(banco_homo, nome, codigo):
+    """Descrição do código no catálogo, ou None"""
+    item = item_wf(banco_homo, nome, codigo)
+    return item[0] if item and item[0] else None
+
+
+def situacao_codigo(valor, codigos=None):
+    """
+    Situação do código de um registro DePara: 'vazio', 'pendente' (S/DePara), 'invalido'
+    (fora do catálogo WF) ou 'valido'; None se preenchido e sem catálogo para conferir.
+
+    É a definição de "problema" (SITUACOES_PROBLEMA) do filtro do grid, da exportação
+    filtrada e das cores das linhas.
+    """
+    if valor is None:
+        return "vazio"
+    valor = str(valor).strip()
+    if not valor:
+        return "vazio"
+    if valor == CODIGO_PENDENTE:
+        return "pendente"
+    if codigos is None:
+        return None
+    return "valido" if valor in codigos else "invalido"
+
+
+def pendente_sql(campo_codigo):
+    """
+    Condição SQL das situações 'vazio' e 'pendente' de situacao_codigo ('invalido' depende
+    do catálogo WF, que está em outro banco). Grid, resumo de progresso e dashboard usam esta.
+    """
+    return f"([{campo_codigo}] IS NULL OR LTRIM(RTRIM([{campo_codigo}])) IN ('', '{CODIGO_PENDENTE}'))"
+
+
+def invalidar_catalogo(banco_homo=None, nome=None):
+    """Descarta catálogos em cache (todos, de um banco, ou um específico)"""
+    with _lock:
+        for chave in list(_catalogos):
+            if (banco_homo is None or chave[0] == banco_homo) and (nome is None or chave[1] == nome):
+                del _catalogos[chave]
+
+
+def atualizar_descricoes_depara(banco_usuario, banco_homo, nome, tabela, coluna_codigo, colunas):
+    """
+    Copia descrições do catálogo WF `nome` para a tabela DePara em um único UPDATE.
+    colunas: {coluna da DePara: posição no item do catálogo (0 = descricao, 2+ = extras)}
+    Só valores WF preenchidos e diferentes do atual são gravados.
+    Retorna quantas linhas da DePara mudaram.
+    """
+    catalogo = obter_catalogo(banco_homo, nome)
+    if not catalogo:
+        return 0
+
+    conexao = conexao_projeto(banco_usuario)
+    if not conexao:
+        logger.error("Falha ao conectar para atualizar descrições")
+        return 0
+
+    cursor = None
+    try:
+        cursor = conexao.cursor()
+        cursor.execute(
+            f"SELECT DISTINCT {coluna_codigo} FROM {tabela} "
+            f"WHERE {coluna_codigo} IS NOT NULL AND {coluna_codigo} != 'S/DePara'"
+        )
+        posicoes = list(colunas.values())
+        linhas = []
+        for (codigo,) in cursor.fetchall():
+            item = catalogo.itens.get(str(codigo))
+            if not item:
+                continue
+            valores = [str(item[pos]) if item[pos] not in (None, "") else None for pos in posicoes]
+            if any(valores):
+                linhas.append((str(codigo), *valores))
+
+        if not linhas:
+            return 0
+
+        # Os pares código -> descrição vão para uma temporária e a DePara é atualizada por JOIN
+        nomes = [f"V{i}" for i in range(len(posicoes))]
+        cursor.execute("IF OBJECT_ID('tempdb..#DescricoesWF') IS NOT NULL DROP TABLE #DescricoesWF")
+        cursor.execute(
+            "CREATE TABLE #DescricoesWF (Codigo NVARCHAR(100) COLLATE DATABASE_DEFAULT PRIMARY KEY, "
+            + ", ".join(f"{n} NVARCHAR(4000) COLLATE DATABASE_DEFAULT NULL" for n in nomes)
+            + ")"
+        )
+        cursor.fast_executemany = True
+        cursor.executemany(
+            f"INSERT INTO #DescricoesWF (Codigo, {', '.join(nomes)}) VALUES (?{', ?' * len(nomes)})",
+            linhas,
+        )
+
+        atribuicoes = ", ".join(
+            f"d.{coluna} = COALESCE(t.{n}, d.{coluna})" for coluna, n in zip(colunas, nomes)
+        )
+        diferencas = " OR ".join(
+            f"(t.{n} IS NOT NULL AND (d.{coluna} IS NULL OR d.{coluna} <> t.{n} COLLATE Latin1_General_BIN))"
+            for coluna, n in zip(colunas, nomes)
+        )
+        cursor.execute(
+            f"UPDATE d SET {atribuicoes} FROM {tabela} d "
+            f"JOIN #DescricoesWF t ON t.Codigo = d.{coluna_codigo} WHERE {diferencas}"
+        )
+        atualizadas = max(cursor.rowcount, 0)
+        cursor.execute("DROP TABLE #DescricoesWF")
+        conexao.commit()
+
+        logger.info(f"Atualizações automáticas de descrição em {tabela}: {atualizadas} registros")
+        return atualizadas
+
+    except Exception as e:
+        logger.error(f"Erro ao atualizar descrições de {tabela}: {str(e)}")
+        try:
+            conexao.rollback()
+        except Exception:
+            pass
+        return 0
+    finally:
+        if cursor:
+            cursor.close()
+        conexao.close()
@@ -1,5 +1,6 @@
-from db.connection import conectar_segunda_base
+from db.broker import conexao_projeto
 from logger import logger
+from utils.catalogo_wf import pendente_sql
 
 
 def obter_dados_tabela(banco_usuario, nome_tabela, campo_codigo):
@@ -13,7 +14,7 @@ def obter_dados_tabela(banco_usuario, nome_tabela, campo_codigo):
     # DEBUG: Log para verificar qual banco e tabela estão sendo acessados
     logger.debug(f"Conectando ao banco {banco_usuario} para tabela {nome_tabela}")
 
-    conexao = conectar_segunda_base(banco_usuario)
+    conexao = conexao_projeto(banco_usuario)
     if not conexao:
         logger.error(f"Falha na conexão com o banco {banco_usuario} para a tabela {nome_tabela}")
         return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
@@ -36,7 +37,7 @@ def obter_dados_tabela(banco_usuario, nome_tabela, campo_codigo):
         # Contar registros pendentes (S/DePara, NULL ou vazio)
         try:
             cursor.execute(
-                f"SELECT COUNT(*) FROM {nome_tabela} WHERE {campo_codigo} = 'S/DePara' OR {campo_codigo} IS NULL OR {campo_codigo} = ''"
+                f"SELECT COUNT(*) FROM {nome_tabela} WHERE {pendente_sql(campo_codigo)}"
             )
             result_pendentes = cursor.fetchone()
             qtdPendente = result_pendentes[0] if result_pendentes is not None else 0
@@ -70,6 +71,144 @@ def obter_dados_tabela(banco_usuario, nome_tabela, campo_codigo):
             logger.error(f"Erro ao fechar conexão: {e}")
 
 
+# Chave usada no dashboard -> (tabela DePara, campo de código)
+TABELAS_DEPARA = {
+    "cond_pag": ("CondicaoPagamento_DePara", "CondicaoPagamento_Codigo"),
+    "escol": ("Escolaridade_DePara", "Escolaridade_Codigo"),
+    "estado": ("Estado_DePara", "Estado_Codigo"),
+    "estadocivil": ("EstadoCivil_DePara", "EstadoCivil_Codigo"),
+    "municipio": ("Municipio_DePara", "Municipio_Codigo"),
+    "pais": ("Pais_DePara", "Pais_Codigo"),
+    "profissao": ("Profissao_DePara", "Profissao_Codigo"),
+    "segmentomercado": ("SegmentoMercado_DePara", "SegmentoMercado_Codigo"),
+    "tipologradouro": ("TipoLogradouro_DePara", "TipoLogradouro_Codigo"),
+    "departamento": ("Departamento_DePara", "Departamento_Codigo"),
+    "estoque": ("Estoque_DePara", "Estoque_Codigo"),
+    "naturezaoperacao": ("NaturezaOperacao_DePara", "NaturezaOperacao_Codigo"),
+    "equipe": ("Equipe_DePara", "Equipe_Codigo"),
+    "usuario_depara": ("Usuario_DePara", "Usuario_Codigo"),
+    "clasmontadora": ("ClasMontadora_DePara", "ClasMontadora_Codigo"),
+    "grupolucratividade": ("GrupoLucratividade_DePara", "GrupoLucratividade_Codigo"),
+    "grupoproduto": ("GrupoProduto_DePara", "GrupoProduto_Codigo"),
+    "pessoacodfabricante": ("PessoaCodFabricante_DePara", "PessoaCodFabricante_Codigo"),
+    "procedencia": ("Procedencia_DePara", "Procedencia_Codigo"),
+    "tabelapreco": ("TabelaPreco_DePara", "TabelaPreco_Codigo"),
+    "tipoproduto": ("TipoProduto_DePara", "TipoProduto_Codigo"),
+    "unidade": ("Unidade_DePara", "Unidade_Codigo"),
+    "combustivel": ("Combustivel_DePara", "Combustivel_Codigo"),
+    "corexterna": ("CorExterna_DePara", "Cor_Codigo"),
+    "corinterna": ("CorInterna_DePara", "Cor_Codigo"),
+    "marca": ("Marca_DePara", "Marca_Codigo"),
+    "modeloveiculo": ("ModeloVeiculo_DePara", "ModeloVeiculo_Codigo"),
+    "opcional": ("Opcional_DePara", "Opcional_Codigo"),
+    "setorservico": ("SetorServico_DePara", "SetorServico_Codigo"),
+    "tipoos": ("TipoOS_DePara", "TipoOS_Codigo"),
+    "tiposervico": ("TipoServico_DePara", "TipoServico_Codigo"),
+    "tmo": ("TMO_DePara", "TMO_Codigo"),
+    "veiculoano": ("VeiculoAno_DePara", "VeiculoAno_Codigo"),
+    "agentecobrador": ("AgenteCobrador_DePara", "AgenteCobrador_Codigo"),
+    "banco": ("Banco_DePara", "Banco_Codigo"),
+    "contagerencial": ("ContaGerencial_DePara", "ContaGerencial_Codigo"),
+    "tipocobranca": ("TipoCobranca_DePara", "TipoCobranca_Codigo"),
+    "tipocreditodebito": ("TipoCreditoDebito_DePara", "TipoCreditoDebito_Codigo"),
+    "tipodocumento": ("TipoDocumento_DePara", "TipoDocumento_Codigo"),
+    "tipoficharazao": ("TipoFichaRazao_DePara", "TipoFichaRazao_Codigo"),
+    "tipotitulo": ("TipoTitulo_DePara", "TipoTitulo_Codigo"),
+    "centroresultado": ("CentroResultado_DePara", "CentroResultado_Codigo"),
+    "historicopadrao": ("HistoricoPadrao_DePara", "HistoricoPadrao_Codigo"),
+    "planoconta": ("PlanoConta_DePara", "PlanoConta_Codigo"),
+    "subconta": ("SubConta_DePara", "SubConta_Codigo"),
+    "tipolote": ("TipoLote_DePara", "TipoLote_Codigo"),
+    "tiposubconta": ("TipoSubConta_DePara", "TipoSubConta_Codigo"),
+}
+
+
+def _dados_vazios():
+    return {"qtd": 0, "qtdPendente": 0, "percentualConclusao": 0}
+
+
+def _montar_dados(qtd, qtdPendente):
+    qtd = qtd or 0
+    qtdPendente = qtdPendente or 0
+    percentualConclusao = ((qtd - qtdPendente) / qtd * 100) if qtd > 0 else 0
+    return {
+        "qtd": qtd,
+        "qtdPendente": qtdPendente,
+        "percentualConclusao": round(percentualConclusao, 1),
+    }
+
+
+def obter_dados_tabelas(banco_usuario, chaves):
+    """
+    Totais e pendentes de várias tabelas DePara (chaves de TABELAS_DEPARA) numa conexão só:
+    uma consulta ao catálogo descobre quais tabelas/campos existem e um único
+    UNION ALL com agregação condicional devolve os totais de todas elas.
+    Tabelas ausentes retornam zeros, como em obter_dados_tabela.
+    """
+    chaves = [chave for chave in chaves if chave in TABELAS_DEPARA]
+    dados = {chave: _dados_vazios() for chave in chaves}
+    if not chaves:
+        return dados
+    if not banco_usuario:
+        logger.error("Banco do usuário não informado para os dados do dashboard")
+        return dados
+
+    conexao = conexao_projeto(banco_usuario)
+    if not conexao:
+        logger.error(f"Falha na conexão com o banco {banco_usuario} para os dados do dashboard")
+        return dados
+
+    cursor = None
+    try:
+        cursor = conexao.cursor()
+
+        tabelas = sorted({TABELAS_DEPARA[chave][0] for chave in chaves})
+        cursor.execute(
+            "SELECT TABLE_NAME, COLUMN_NAME FROM INFORMATION_SCHEMA.COLUMNS "
+            f"WHERE TABLE_NAME IN ({', '.join('?' * len(tabelas))})",
+            tabelas,
+        )
+        colunas_existentes = {}
+        for linha in cursor.fetchall():
+            colunas_existentes.setdefault(linha[0].lower(), set()).add(linha[1].lower())
+
+        partes = []
+        for chave in chaves:
+            tabela, campo_codigo = TABELAS_DEPARA[chave]
+            colunas = colunas_existentes.get(tabela.lower())
+            if colunas is None:
+                logger.error(f"Tabela {tabela} não encontrada no banco {banco_usuario}")
+                continue
+            if campo_codigo.lower() in colunas:
+                pendentes = f"SUM(CASE WHEN {pendente_sql(campo_codigo)} THEN 1 ELSE 0 END)"
+            else:
+                logger.error(f"Erro ao contar pendentes na tabela {tabela}, campo {campo_codigo}: campo inexistente")
+                pendentes = "0"
+            partes.append(f"SELECT '{chave}', COUNT(*), {pendentes} FROM {tabela}")
+
+        if partes:
+            cursor.execute(" UNION ALL ".join(partes))
+            for chave, qtd, qtdPendente in cursor.fetchall():
+                dados[chave] = _montar_dados(qtd, qtdPendente)
+
+        logger.debug(f"Dashboard {banco_usuario}: {len(partes)} tabelas agregadas numa consulta")
+        return dados
+    except Exception as e:
+        # Falha na consulta única: volta ao cálculo tabela a tabela
+        logger.error(f"Erro na agregação única do dashboard, calculando por tabela: {e}")
+        return {chave: obter_dados_tabela(banco_usuario, *TABELAS_DEPARA[chave]) for chave in chaves}
+    finally:
+        try:
+            if cursor is not None:
+                cursor.close()
+        except Exception as e:
+            logger.error(f"Erro ao fechar cursor: {e}")
+        try:
+            conexao.close()
+        except Exception as e:
+            logger.error(f"Erro ao fechar conexão: {e}")
+
+
 # Funções específicas para cada tabela (mantenha todas as funções existentes)
 def dados_condicao_pagamento(banco_usuario):
    return obter_dados_tabela(
@@ -1,8 +1,15 @@
+import importlib.util
+import os
 import pandas as pd
 import time
 import logging
-import re
-from utils.data_validation import validar_dados
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from utils.data_validation import erros_dataframe
+from utils.layout_configs import load_layout_configs
 
 
 def detectar_layout(filename, layouts_rules_map):
@@ -17,77 +24,240 @@ def detectar_layout(filename, layouts_rules_map):
     return None
 
 
-def processar_arquivo(file, layout, layout_rules, layout_columns):
-    file.seek(0)
+# Linhas do arquivo guardadas para exibição (o restante é só validado)
+LINHAS_AMOSTRA = 50
+
+# Exemplos (linha, valor) guardados no resumo para cada coluna × regra
+EXEMPLOS_POR_REGRA = 5
+
+
+def _dtype_texto():
+    """dtype das colunas lidas do arquivo: string[pyarrow] (Config.VALIDACAO_TEXTO_ARROW) ou str"""
+    if Config.VALIDACAO_TEXTO_ARROW and importlib.util.find_spec("pyarrow"):
+        return "string[pyarrow]"
+    return str
+
+# Pool de validação (Config.VALIDACAO_PROCESSOS), criado no primeiro uso e mantido entre
+# requisições. Cada processo recebe os planos dos layouts uma única vez, na inicialização.
+_pool = None
+_pool_lock = threading.Lock()
+_planos_pool = {}
+
+
+def _iniciar_processo(planos):
+    """Inicializador dos processos do pool: guarda os planos compilados dos layouts"""
+    _planos_pool.update(planos)
+
+
+def _validar_bloco(df, layout, plano, linha_inicial):
+    """Executado no pool; plano None usa o plano do layout recebido na inicialização"""
+    if plano is None:
+        plano = _planos_pool[layout]
+    return erros_dataframe(df, plano, validar_nao_obrigatorios_flag=True, linha_inicial=linha_inicial)
+
+
+def _pool_validacao():
+    global _pool
+    if Config.VALIDACAO_PROCESSOS <= 1:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            planos = dict(load_layout_configs()[1])
+            _planos_pool.update(planos)
+            _pool = ProcessPoolExecutor(
+                max_workers=Config.VALIDACAO_PROCESSOS,
+                initializer=_iniciar_processo,
+                initargs=(planos,),
+            )
+            logging.info(f"Pool de validação iniciado com {Config.VALIDACAO_PROCESSOS} processos")
+        return _pool
+
+
+def _descartar_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _validar_blocos(blocos, layout, layout_rules):
+    """
+    (bloco, df_errors) na ordem do arquivo. Com o pool, cada bloco lido já é enviado
+    para validação enquanto os próximos são lidos; no máximo 2 blocos por processo
+    ficam em andamento, e os resultados voltam na ordem das linhas.
+    """
+    pool = _pool_validacao()
+    linha_inicial = 1
+    if pool is None:
+        for df in blocos:
+            yield df, erros_dataframe(
+                df, layout_rules, validar_nao_obrigatorios_flag=True, linha_inicial=linha_inicial
+            )
+            linha_inicial += len(df)
+        return
+
+    # O plano só viaja com o bloco se não for o mesmo que os processos já têm
+    plano = None if _planos_pool.get(layout) is layout_rules else layout_rules
+    pendentes = deque()
     try:
-        df = pd.read_csv(file, sep="§", encoding="latin-1", header=None, dtype=str)
-        if df is None or df.empty:
-            raise ValueError("Erro ao ler o arquivo ou o arquivo está vazio.")
-    except Exception as e:
-        logging.error(f"Erro ao ler arquivo com separador '§': {e}")
-        return (
-            None,
-            pd.DataFrame(),
-            "error",
-            f"Erro ao ler o arquivo com separador '§'.",
-        )
+        for df in blocos:
+            pendentes.append((df, pool.submit(_validar_bloco, df, layout, plano, linha_inicial)))
+            linha_inicial += len(df)
+            if len(pendentes) >= 2 * Config.VALIDACAO_PROCESSOS:
+                df, futuro = pendentes.popleft()
+                yield df, futuro.result()
+        while pendentes:
+            df, futuro = pendentes.popleft()
+            yield df, futuro.result()
+    except BrokenProcessPool:
+        logging.error("Pool de validação interrompido; será recriado na próxima validação")
+        _descartar_pool(pool)
+        raise
+    finally:
+        for _, futuro in pendentes:
+            futuro.cancel()
+
 
-    # Verificar número de colunas e preencher colunas faltantes
+def _ajustar_colunas(df, layout, layout_columns, avisar):
+    """Completa ou corta as colunas do bloco conforme o layout e renomeia"""
     num_cols_expected = len(layout_columns)
     num_cols_actual = df.shape[1]
     if num_cols_actual < num_cols_expected:
-        logging.warning(
-            f"Arquivo possui {num_cols_actual} colunas, mas o layout '{layout}' espera {num_cols_expected}. Preenchendo colunas faltantes com strings vazias."
-        )
+        if avisar:
+            logging.warning(
+                f"Arquivo possui {num_cols_actual} colunas, mas o layout '{layout}' espera {num_cols_expected}. Preenchendo colunas faltantes com strings vazias."
+            )
         # Adicionar colunas faltantes com strings vazias
         for i in range(num_cols_actual, num_cols_expected):
             df[f"Column{i}"] = ""
     elif num_cols_actual > num_cols_expected:
-        logging.warning(
-            f"Arquivo possui {num_cols_actual} colunas, mas o layout '{layout}' espera {num_cols_expected}. Ignorando colunas extras."
-        )
+        if avisar:
+            logging.warning(
+                f"Arquivo possui {num_cols_actual} colunas, mas o layout '{layout}' espera {num_cols_expected}. Ignorando colunas extras."
+            )
         df = df.iloc[:, :num_cols_expected]  # Manter apenas as colunas esperadas
 
     # Renomear colunas para corresponder ao layout
     df.columns = layout_columns[: df.shape[1]]
-    logging.debug(f"Colunas do DataFrame após renomeação: {list(df.columns)}")
-
-    # Aplicar validação linha por linha
-    df_errors = []
-    for index, row in df.iterrows():
-        erros = validar_dados(row, layout_rules, validar_nao_obrigatorios_flag=True)
-        for erro in erros:
-            df_errors.append(
-                {
-                    "Linha": index + 1,  # Linha 1-based para o usuário
-                    "Coluna": (
-                        erro.split("Campo '")[1].split("'")[0]
-                        if "Campo '" in erro
-                        else "N/A"
-                    ),
-                    "Erro": erro,
-                }
-            )
+    return df
+
+
+def _resumir_erros(resumo, por_regra, df_errors):
+    """Soma os erros do bloco por coluna e por coluna × regra, guardando os primeiros exemplos"""
+    grupos = df_errors.groupby(["Coluna", "Regra"], observed=True, sort=False).indices
+    for (col, codigo), posicoes in grupos.items():
+        resumo["erros_por_coluna"][col] = resumo["erros_por_coluna"].get(col, 0) + len(posicoes)
+        item = por_regra.setdefault((col, codigo), {"coluna": col, "regra": codigo, "erros": 0, "exemplos": []})
+        item["erros"] += len(posicoes)
+        faltam = EXEMPLOS_POR_REGRA - len(item["exemplos"])
+        if faltam > 0:
+            exemplos = df_errors.iloc[posicoes[:faltam]]
+            item["exemplos"].extend([int(linha), str(valor)] for linha, valor in zip(exemplos["Linha"], exemplos["Valor"]))
+
+
+def processar_arquivo(
+    file, layout, layout_rules, layout_columns, tamanho_lote=None, max_erros=None, progresso=None
+):
+    """
+    Lê e valida o arquivo em blocos de tamanho_lote linhas (Config.VALIDACAO_LOTE), sem
+    carregar o arquivo inteiro; com Config.VALIDACAO_PROCESSOS > 1 os blocos são
+    validados em paralelo (ver _validar_blocos).
+    Devolve (amostra, df_errors, status, message, resumo): amostra são as primeiras
+    LINHAS_AMOSTRA linhas; df_errors são os erros compactos (ver erros_dataframe, as
+    mensagens saem do formatar_erros), no máximo max_erros (Config.VALIDACAO_MAX_ERROS,
+    0 = todos), em ordem de linha; resumo tem as contagens completas: linhas, erros,
+    erros_por_coluna, erros_truncados e regras (uma entrada por coluna × regra, com o
+    total e os primeiros EXEMPLOS_POR_REGRA [linha, valor], da mais frequente à menos).
+    progresso(resumo, fracao) é chamado a cada bloco validado, com a fração do arquivo
+    já lida (pela posição no arquivo).
+    """
+    tamanho_lote = tamanho_lote or Config.VALIDACAO_LOTE
+    max_erros = Config.VALIDACAO_MAX_ERROS if max_erros is None else max_erros
+
+    amostra = None
+    partes = []
+    guardados = 0
+    resumo = {"linhas": 0, "erros": 0, "erros_por_coluna": {}, "erros_truncados": False, "regras": []}
+    por_regra = {}
+    file.seek(0, os.SEEK_END)
+    tamanho = file.tell()
+    file.seek(0)
+    try:
+        # "§" não é aceito pelo motor C (tem 2 bytes em UTF-8): engine python explícito.
+        # Pelo mesmo motivo o leitor CSV do pyarrow não serve (separador de 1 byte ASCII);
+        # o Arrow entra no armazenamento das colunas de cada bloco
+        leitor = pd.read_csv(
+            file, sep="§", encoding="latin-1", header=None, dtype=_dtype_texto(),
+            engine="python", chunksize=tamanho_lote,
+        )
+        blocos = (
+            _ajustar_colunas(df, layout, layout_columns, avisar=i == 0)
+            for i, df in enumerate(leitor)
+        )
+        # Validação coluna a coluna: mesmas mensagens e ordem do validar_dados por linha
+        for df, df_errors in _validar_blocos(blocos, layout, layout_rules):
+            if amostra is None:
+                amostra = df.head(LINHAS_AMOSTRA).reset_index(drop=True)
+                logging.debug(f"Colunas do DataFrame após renomeação: {list(df.columns)}")
+            resumo["linhas"] += len(df)
+            if not df_errors.empty:
+                resumo["erros"] += len(df_errors)
+                _resumir_erros(resumo, por_regra, df_errors)
+                if max_erros and guardados + len(df_errors) > max_erros:
+                    df_errors = df_errors.head(max_erros - guardados)
+                    resumo["erros_truncados"] = True
+                if not df_errors.empty:
+                    partes.append(df_errors)
+                    guardados += len(df_errors)
+            if progresso:
+                progresso(resumo, min(file.tell() / tamanho, 1.0) if tamanho else 1.0)
+
+        if amostra is None or amostra.empty:
+            raise ValueError("Erro ao ler o arquivo ou o arquivo está vazio.")
+        resumo["regras"] = sorted(por_regra.values(), key=lambda item: -item["erros"])
+    except Exception as e:
+        logging.error(f"Erro ao ler arquivo com separador '§': {e}")
+        return (
+            None,
+            pd.DataFrame(),
+            "error",
+            f"Erro ao ler o arquivo com separador '§'.",
+            resumo,
+        )
 
-    df_errors = pd.DataFrame(df_errors)
-    if not df_errors.empty:
+    df_errors = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+    if resumo["erros"]:
         status = "error"
         message = "Erros encontrados durante a validação."
+        if resumo["erros_truncados"]:
+            message += f" {resumo['erros']} erros; detalhes apenas dos primeiros {len(df_errors)}."
     else:
         status = "success"
         message = "Arquivo processado com sucesso."
 
-    return df, df_errors, status, message
+    return amostra, df_errors, status, message, resumo
 
 
 def run_process_file_wrapper(
-    file, layout_columns_map, layouts_rules_map, validar_nao_obrigatorios_flag=True
+    file, layout_columns_map, layouts_rules_map, validar_nao_obrigatorios_flag=True,
+    nome_arquivo=None, progresso=None,
 ):
+    """
+    Detecta o layout pelo nome (nome_arquivo ou file.filename) e valida o arquivo. Devolve
+    (layout, amostra, df_errors, status, message, elapsed, resumo); resumo traz as
+    contagens completas (ver processar_arquivo), mesmo quando df_errors foi limitado.
+    """
+    nome_arquivo = nome_arquivo or file.filename
     start = time.time()
-    layout = detectar_layout(file.filename, layouts_rules_map)
+    resumo = {
+        "linhas": 0, "erros": 1, "erros_por_coluna": {"N/A": 1}, "erros_truncados": False,
+        "regras": [{"coluna": "N/A", "regra": "Arquivo", "erros": 1, "exemplos": []}],
+    }
+    layout = detectar_layout(nome_arquivo, layouts_rules_map)
 
     if not layout:
-        logging.warning(f"Layout não detectado para o arquivo: {file.filename}")
+        logging.warning(f"Layout não detectado para o arquivo: {nome_arquivo}")
         elapsed = time.time() - start
         return (
             None,
@@ -97,13 +267,14 @@ def run_process_file_wrapper(
                     {
                         "Linha": 0,
                         "Coluna": "N/A",
-                        "Erro": f"Layout não detectado para o arquivo **{file.filename}**.",
+                        "Erro": f"Layout não detectado para o arquivo **{nome_arquivo}**.",
                     }
                 ]
             ),
             "warning",
-            f"⚠️ Layout não detectado para o arquivo: **{file.filename}**.",
+            f"⚠️ Layout não detectado para o arquivo: **{nome_arquivo}**.",
             elapsed,
+            resumo,
         )
 
     layout_columns = layout_columns_map.get(layout, [])
@@ -127,10 +298,11 @@ def run_process_file_wrapper(
             "error",
             f"❌ Configuração de layout inválida para: **{layout}**.",
             elapsed,
+            resumo,
         )
 
-    df, df_errors, status, message = processar_arquivo(
-        file, layout, layout_rules, layout_columns
+    df, df_errors, status, message, resumo_arquivo = processar_arquivo(
+        file, layout, layout_rules, layout_columns, progresso=progresso
     )
 
     if df is None:
@@ -150,7 +322,12 @@ def run_process_file_wrapper(
             "error",
             f"❌ Erro ao processar o arquivo: {message}",
             elapsed,
+            resumo,
         )
 
     elapsed = time.time() - start
-    return layout, df, df_errors, status, message, elapsed
+    if resumo_arquivo["erros_truncados"]:
+        logging.warning(
+            f"{resumo_arquivo['erros']} erros em {resumo_arquivo['linhas']} linhas ({layout}); detalhes guardados: {len(df_errors)}"
+        )
+    return layout, df, df_errors, status, message, elapsed, resumo_arquivo
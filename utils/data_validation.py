@@ -1,6 +1,8 @@
 import re
 import pandas as pd
+from collections import namedtuple
 from datetime import datetime
+from functools import partial
 import logging
 
 # Regex pré-compiladas
@@ -142,68 +144,323 @@ TIPO_VALIDADORES = {
 }
 
 
+# Validação vetorizada (coluna a coluna) -------------------------------------------------
+#
+# Cada tipo tem um caminho rápido sobre a coluna inteira, escrito só com classes ASCII
+# ([0-9], [A-Za-z]) para dar o mesmo resultado no motor de regex do pandas (Python ou
+# Arrow). O que o caminho rápido não aceita é conferido pelo validador original, valor a
+# valor: o resultado é sempre o mesmo do validar_dados.
+
+NUMERO_REGEX = r"[+-]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)(?:[eE][+-]?[0-9]+)?"
+DATA_REGEX = r"[0-9]{4}-[0-9]{2}-[0-9]{2}"
+EMAIL_COLUNA_REGEX = r"[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}"
+PLACA_COLUNA_REGEX = r"[A-Za-z]{3}[0-9](?:[0-9]|[A-Za-z])[0-9]{2}"
+ANO_COLUNA_REGEX = r"[0-9]{4}"
+
+
+def _confirmar(valores, aceitos, validador):
+    """Valores recusados pelo caminho rápido são conferidos um a um pelo validador original"""
+    aceitos = aceitos.fillna(False).astype(bool)
+    pendentes = ~aceitos
+    if pendentes.any():
+        # Recusados costumam se repetir: cada valor distinto passa uma vez pelo validador
+        recusados = valores[pendentes]
+        validos = [v for v in recusados.unique() if validador(v)]
+        aceitos[pendentes] = recusados.isin(validos)
+    return aceitos
+
+
+def _inteiro_ou_falso(valor):
+    try:
+        return DataValidator.is_integer(valor)
+    except OverflowError:  # int(float("inf"))
+        return False
+
+
+def _validos_regex(valores, padrao, validador):
+    return _confirmar(valores, valores.str.fullmatch(padrao), validador)
+
+
+def _validos_data(valores):
+    formato = valores.str.fullmatch(DATA_REGEX).fillna(False).astype(bool)
+    datas = pd.to_datetime(valores.where(formato), format="%Y-%m-%d", errors="coerce")
+    return _confirmar(valores, formato & datas.notna(), DataValidator.is_valid_date)
+
+
+def _validos_numero(valores, validador):
+    aceitos = valores.str.replace(",", ".", regex=False).str.fullmatch(NUMERO_REGEX)
+    return _confirmar(valores, aceitos, validador)
+
+
+def _validos_digitos(valores, validador, tamanhos):
+    digitos = valores.str.replace(r"[^0-9]", "", regex=True).str.len()
+    # Dígitos de outros alfabetos (ex.: árabe) ficam para o validador original
+    ascii_ = valores.str.fullmatch(r"[\x00-\x7f]*").fillna(False).astype(bool)
+    return _confirmar(valores, digitos.isin(tamanhos) & ascii_, validador)
+
+
+def _validos_em(valores, permitidos):
+    return valores.isin(permitidos)
+
+
+# Mesmas regras de TIPO_VALIDADORES, aplicadas a uma coluna (Series de textos) inteira.
+# Só funções de módulo e partial: o plano compilado pode ser enviado a outros processos.
+TIPO_VALIDADORES_COLUNA = {
+    "Data": _validos_data,
+    "DataCondicional": _validos_data,
+    "Numerico": partial(_validos_numero, validador=DataValidator.is_numeric),
+    "Inteiro": partial(_validos_numero, validador=_inteiro_ou_falso),
+    "Email": partial(_validos_regex, padrao=EMAIL_COLUNA_REGEX, validador=DataValidator.is_valid_email),
+    "CPF_CNPJ": partial(_validos_digitos, validador=DataValidator.is_valid_cpf_cnpj, tamanhos=(11, 14)),
+    "CEP": partial(_validos_digitos, validador=DataValidator.is_valid_cep, tamanhos=(8,)),
+    "Ano": partial(_validos_regex, padrao=ANO_COLUNA_REGEX, validador=DataValidator.is_valid_year),
+    "SimNao": partial(_validos_em, permitidos=("0", "1")),
+    "FaixaRenda": partial(_validos_em, permitidos=("1", "2", "3")),
+    "Placa": partial(_validos_regex, padrao=PLACA_COLUNA_REGEX, validador=DataValidator.is_valid_plate),
+}
+
+
+# Plano de validação compilado ------------------------------------------------------------
+
+# Regra de uma coluna já resolvida: validadores, conjunto de permitidos e mensagens
+# pré-formatadas como (prefixo, sufixo) em volta do valor. tipo é o código dos erros de
+# tipo (o "Tipo" do layout) nos erros compactos.
+# condicional: obrigatório só quando condicao_campo está preenchido (DataCondicional);
+# sem condicao_campo, um DataCondicional vazio nunca é erro.
+RegraValidacao = namedtuple(
+    "RegraValidacao",
+    ["coluna", "tipo", "obrigatorio", "condicional", "condicao_campo", "permitidos", "validador",
+     "validador_coluna", "msg_obrigatorio", "msg_permitidos", "msg_tipo"],
+)
+
+# Códigos de regra dos erros compactos (além do tipo da coluna, ex.: "Data", "Email")
+REGRA_OBRIGATORIO = "Obrigatorio"
+REGRA_OBRIGATORIO_CONDICIONAL = "ObrigatorioCondicional"
+REGRA_PERMITIDOS = "ValoresPermitidos"
+
+
+def _modelo(modelo, **campos):
+    """Mensagem formatada com tudo menos o valor, como (prefixo, sufixo)"""
+    prefixo, sufixo = modelo.format(valor="\0", **campos).split("\0", 1)
+    return prefixo, sufixo
+
+
+def compilar_regra(col, regras):
+    tipo = regras.get("Tipo")
+    condicional = tipo == "DataCondicional"
+    condicao_campo = None
+    if condicional and regras.get("CondicaoValor") == "NAO_VAZIO":
+        condicao_campo = regras.get("CondicaoCampo")
+    if condicional:
+        msg_obrigatorio = _modelo(ERROR_MESSAGES["ObrigatorioCondicional"], col=col, condicao_campo=regras.get("CondicaoCampo"))
+    else:
+        msg_obrigatorio = _modelo(ERROR_MESSAGES["Obrigatorio"], col=col)
+
+    permitidos = msg_permitidos = None
+    if "ValoresPermitidos" in regras:
+        permitidos = frozenset(regras["ValoresPermitidos"])
+        if col == "VEICULO_NOVO":
+            msg_permitidos = _modelo(ERROR_MESSAGES["VEICULO_NOVO_ValoresPermitidos"])
+        else:
+            msg_permitidos = _modelo(
+                ERROR_MESSAGES["ValoresPermitidos"], col=col, permitidos=", ".join(regras["ValoresPermitidos"])
+            )
+
+    # VEICULO_NOVO só valida os valores permitidos, nunca o tipo
+    validador = validador_coluna = msg_tipo = None
+    if col != "VEICULO_NOVO" and TIPO_VALIDADORES.get(tipo):
+        validador = TIPO_VALIDADORES[tipo]
+        validador_coluna = TIPO_VALIDADORES_COLUNA[tipo]
+        msg_tipo = _modelo(ERROR_MESSAGES.get(tipo, "Campo '{col}': valor inválido. Valor: '{valor}'"), col=col)
+
+    return RegraValidacao(
+        col, tipo, bool(regras["Obrigatorio"]), condicional, condicao_campo, permitidos, validador,
+        validador_coluna, msg_obrigatorio, msg_permitidos, msg_tipo,
+    )
+
+
+def compilar_plano(layout_rules):
+    """
+    Plano imutável (tupla de RegraValidacao, na ordem das colunas) a partir das regras
+    JSON de um layout. Aceita um plano já compilado e o devolve como está.
+    """
+    if isinstance(layout_rules, tuple):
+        return layout_rules
+    return tuple(compilar_regra(col, regras) for col, regras in layout_rules.items())
+
+
 def validar_dados(row, layout_rules, validar_nao_obrigatorios_flag):
+    """Valida uma linha; layout_rules é o plano compilado (ou as regras JSON do layout)"""
     erros = []
-    for col, regras in layout_rules.items():
-        valor = str(row.get(col, "")).strip()
+    for regra in compilar_plano(layout_rules):
+        bruto = row.get(regra.coluna, "")
+        valor = str(bruto).strip()
+        vazio = valor == "" or pd.isna(bruto) or valor.lower() == "nan"
 
         # Verifica se o campo é obrigatório e está vazio
-        if regras["Obrigatorio"] and (
-            valor == "" or pd.isna(row.get(col)) or valor.lower() == "nan"
-        ):
-            if regras.get("Tipo") == "DataCondicional":
-                condicao_campo = regras.get("CondicaoCampo")
-                valor_condicao = str(row.get(condicao_campo, "")).strip()
-                if regras.get("CondicaoValor") == "NAO_VAZIO" and (
+        if regra.obrigatorio and vazio:
+            if not regra.condicional:
+                erros.append(valor.join(regra.msg_obrigatorio))
+            elif regra.condicao_campo:
+                bruto_condicao = row.get(regra.condicao_campo, "")
+                valor_condicao = str(bruto_condicao).strip()
+                if (
                     valor_condicao != ""
-                    and not pd.isna(row.get(condicao_campo))
+                    and not pd.isna(bruto_condicao)
                     and valor_condicao.lower() != "nan"
                 ):
-                    erros.append(
-                        ERROR_MESSAGES["ObrigatorioCondicional"].format(
-                            col=col, condicao_campo=condicao_campo, valor=valor
-                        )
-                    )
-            else:
-                erros.append(ERROR_MESSAGES["Obrigatorio"].format(col=col, valor=valor))
+                    erros.append(valor.join(regra.msg_obrigatorio))
             logging.debug(
-                f"Erro em {col}: obrigatório não preenchido. Valor: '{valor}'"
+                f"Erro em {regra.coluna}: obrigatório não preenchido. Valor: '{valor}'"
             )
             continue
 
-        if (not regras["Obrigatorio"] and not validar_nao_obrigatorios_flag) or (
-            valor == "" or pd.isna(row.get(col)) or valor.lower() == "nan"
-        ):
+        if (not regra.obrigatorio and not validar_nao_obrigatorios_flag) or vazio:
+            continue
+
+        # Valores permitidos têm prioridade: sem validação de tipo se já caiu aqui
+        if regra.permitidos is not None and valor not in regra.permitidos:
+            erros.append(valor.join(regra.msg_permitidos))
             continue
 
-        # Validação de valores permitidos (prioridade para VEICULO_NOVO)
-        if (
-            "ValoresPermitidos" in regras
-            and valor not in regras["ValoresPermitidos"]
-            and valor != ""
-        ):
-            permitidos = ", ".join(regras["ValoresPermitidos"])
-            if col == "VEICULO_NOVO":
-                erros.append(
-                    ERROR_MESSAGES["VEICULO_NOVO_ValoresPermitidos"].format(valor=valor)
-                )
-            else:
-                erros.append(
-                    ERROR_MESSAGES["ValoresPermitidos"].format(
-                        col=col, valor=valor, permitidos=permitidos
-                    )
-                )
-            continue  # Não faz validação de tipo se já caiu aqui
-
-        tipo = regras.get("Tipo")
-        # NUNCA valide tipo para VEICULO_NOVO, pois só deve validar os valores permitidos
-        if col != "VEICULO_NOVO" and tipo:
-            validador = TIPO_VALIDADORES.get(tipo)
-            if validador and not validador(valor):
-                erros.append(
-                    ERROR_MESSAGES.get(
-                        tipo, f"Campo '{col}': valor inválido. Valor: '{valor}'"
-                    ).format(col=col, valor=valor)
-                )
+        if regra.validador and not regra.validador(valor):
+            erros.append(valor.join(regra.msg_tipo))
 
     return erros
+
+
+def _texto_e_vazio(df, col):
+    """Valor como o validar_dados vê (str + strip) e a máscara de vazios"""
+    if col not in df.columns:
+        valores = pd.Series("", index=df.index, dtype=object)
+        return valores, pd.Series(True, index=df.index)
+    bruto = df[col]
+    nulos = bruto.isna()
+    if isinstance(bruto.dtype, pd.StringDtype):
+        valores = bruto.fillna("nan")  # str(nan) == "nan"
+    else:
+        valores = bruto.astype(object)
+        if nulos.any():
+            valores = valores.where(~nulos, valores[nulos].map(str))
+        valores = valores.astype(str)
+    valores = valores.str.strip()
+    vazio = nulos | (valores == "") | (valores.str.lower() == "nan")
+    return valores, vazio
+
+
+def _erros_coluna(valores, mascara, col, codigo):
+    """Linhas marcadas viram (posição, coluna, código da regra, valor)"""
+    if not mascara.any():
+        return None
+    return pd.DataFrame({
+        "posicao": mascara.index[mascara.to_numpy(dtype=bool)],
+        "Coluna": col,
+        "Regra": codigo,
+        "Valor": valores[mascara].array,
+    })
+
+
+def codigos_regra(regra):
+    """Códigos de regra que a coluna pode gerar, na ordem em que são avaliados"""
+    codigos = []
+    if regra.obrigatorio:
+        codigos.append(REGRA_OBRIGATORIO_CONDICIONAL if regra.condicional else REGRA_OBRIGATORIO)
+    if regra.permitidos is not None:
+        codigos.append(REGRA_PERMITIDOS)
+    if regra.validador_coluna:
+        codigos.append(regra.tipo)
+    return codigos
+
+
+def erros_dataframe(df, layout_rules, validar_nao_obrigatorios_flag, linha_inicial=1):
+    """
+    Versão vetorizada do validar_dados: cada regra do plano é avaliada sobre a coluna
+    inteira (regex, to_datetime, isin) em vez de linha a linha.
+
+    Devolve os erros compactos: Linha (posição + linha_inicial), Coluna e Regra
+    (categóricas, com as categorias do plano) e Valor, na mesma ordem do validar_dados.
+    As mensagens são montadas só quando necessárias, com formatar_erros.
+    """
+    plano = compilar_plano(layout_rules)
+    partes = []
+    for ordem, regra in enumerate(plano):
+        col = regra.coluna
+        valores, vazio = _texto_e_vazio(df, col)
+        erros = []
+
+        if regra.obrigatorio:
+            if not regra.condicional:
+                erros.append(_erros_coluna(valores, vazio, col, REGRA_OBRIGATORIO))
+            elif regra.condicao_campo:
+                _, condicao_vazia = _texto_e_vazio(df, regra.condicao_campo)
+                erros.append(_erros_coluna(valores, vazio & ~condicao_vazia, col, REGRA_OBRIGATORIO_CONDICIONAL))
+        elif not validar_nao_obrigatorios_flag:
+            continue
+
+        pendentes = ~vazio
+        if regra.permitidos is not None:
+            fora = pendentes & ~valores.isin(regra.permitidos)
+            erros.append(_erros_coluna(valores, fora, col, REGRA_PERMITIDOS))
+            pendentes &= ~fora
+
+        if regra.validador_coluna and pendentes.any():
+            invalidos = pendentes.copy()
+            invalidos[pendentes] = ~regra.validador_coluna(valores[pendentes]).astype(bool)
+            erros.append(_erros_coluna(valores, invalidos, col, regra.tipo))
+
+        partes.extend((e, ordem) for e in erros if e is not None)
+
+    if not partes:
+        return pd.DataFrame()
+    erros = pd.concat([e.assign(ordem=ordem) for e, ordem in partes], ignore_index=True)
+    posicoes = pd.Series(range(len(df)), index=df.index)
+    erros["Linha"] = posicoes.loc[erros["posicao"]].to_numpy() + linha_inicial
+    erros = erros.sort_values(["Linha", "ordem"], kind="stable")
+    codigos = list(dict.fromkeys(c for regra in plano for c in codigos_regra(regra)))
+    return pd.DataFrame({
+        "Linha": erros["Linha"].to_numpy(),
+        "Coluna": pd.Categorical(erros["Coluna"], categories=[regra.coluna for regra in plano]),
+        "Regra": pd.Categorical(erros["Regra"], categories=codigos),
+        "Valor": erros["Valor"].array,
+    })
+
+
+def formatar_erros(erros, layout_rules):
+    """
+    Mensagens (Series alinhada a erros) dos erros compactos, as mesmas do validar_dados.
+    Erros que já trazem a coluna Erro (ex.: layout não detectado) são devolvidos como estão.
+    """
+    if "Erro" in erros.columns:
+        return erros["Erro"]
+    if erros.empty:
+        return pd.Series("", index=erros.index, dtype=object)
+    regras = {regra.coluna: regra for regra in compilar_plano(layout_rules)}
+    valores = erros["Valor"].reset_index(drop=True)
+    partes = []
+    for (col, codigo), posicoes in erros.groupby(["Coluna", "Regra"], observed=True, sort=False).indices.items():
+        regra = regras[col]
+        if codigo in (REGRA_OBRIGATORIO, REGRA_OBRIGATORIO_CONDICIONAL):
+            prefixo, sufixo = regra.msg_obrigatorio
+        elif codigo == REGRA_PERMITIDOS:
+            prefixo, sufixo = regra.msg_permitidos
+        else:
+            prefixo, sufixo = regra.msg_tipo
+        partes.append(prefixo + valores.iloc[posicoes] + sufixo)
+    mensagens = pd.concat(partes).sort_index()
+    mensagens.index = erros.index
+    return mensagens
+
+
+def validar_dataframe(df, layout_rules, validar_nao_obrigatorios_flag, linha_inicial=1):
+    """
+    Erros do erros_dataframe já com as mensagens: DataFrame com Linha/Coluna/Erro na
+    mesma ordem e com as mesmas mensagens que o validar_dados produziria para cada linha.
+    """
+    erros = erros_dataframe(df, layout_rules, validar_nao_obrigatorios_flag, linha_inicial)
+    if erros.empty:
+        return erros
+    return pd.DataFrame({
+        "Linha": erros["Linha"],
+        "Coluna": erros["Coluna"].astype(object),
+        "Erro": formatar_erros(erros, layout_rules),
+    })
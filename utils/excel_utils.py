@@ -3,58 +3,57 @@ from io import BytesIO
 from datetime import datetime
 import os
 from logger import logger
-from openpyxl import load_workbook
+from config import Config
+from openpyxl import Workbook, load_workbook
+from openpyxl.formatting.rule import CellIsRule
 from openpyxl.styles import PatternFill
 from openpyxl.utils import get_column_letter
 
 def export_to_excel(registros, colunas, nome_arquivo):
     """
-    Exporta registros para um arquivo Excel com formatação
+    Exporta registros para um arquivo Excel com formatação.
+
+    Gravação em uma única passada (modo write-only): o destaque de "S/DePara" nas colunas
+    *_Codigo é uma regra de formatação condicional por coluna, sem preencher célula a célula.
     """
     try:
-        # Criar DataFrame
-        df = pd.DataFrame(registros, columns=colunas)
-        
-        # Criar buffer em memória
-        output = BytesIO()
-        
-        # Salvar primeiro com pandas
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            df.to_excel(writer, sheet_name='Dados', index=False)
-            
-            # Ajustar largura das colunas
-            worksheet = writer.sheets['Dados']
-            for idx, col in enumerate(df.columns):
-                max_length = max(df[col].astype(str).str.len().max(), len(col)) + 2
-                worksheet.column_dimensions[get_column_letter(idx + 1)].width = min(max_length, 50)
-        
-        # Agora aplicar formatação condicional
-        output.seek(0)
-        workbook = load_workbook(output)
-        worksheet = workbook['Dados']
-        
-        # Definir fill amarelo para células com "S/DePara"
+        linhas = [
+            [registro.get(c) for c in colunas] if isinstance(registro, dict) else list(registro)
+            for registro in registros
+        ]
+
+        workbook = Workbook(write_only=True)
+        worksheet = workbook.create_sheet(title='Dados')
+
+        # Ajustar largura das colunas
+        larguras = [len(str(c)) for c in colunas]
+        for linha in linhas:
+            for idx, valor in enumerate(linha[:len(larguras)]):
+                if valor is not None:
+                    larguras[idx] = max(larguras[idx], len(str(valor)))
+        for idx, largura in enumerate(larguras):
+            worksheet.column_dimensions[get_column_letter(idx + 1)].width = min(largura + 2, 50)
+
+        # Uma regra por coluna de código: amarelo para "S/DePara"
         yellow_fill = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
-        
-        # Encontrar todas as colunas que terminam com "_Codigo"
-        colunas_codigo = []
-        for idx, cell in enumerate(worksheet[1]):  # Linha 1 é o cabeçalho
-            if cell.value and str(cell.value).endswith('_Codigo'):
-                colunas_codigo.append(idx)
-        
-        # Aplicar formatação para todas as colunas de código
-        for coluna_idx in colunas_codigo:
-            for row in worksheet.iter_rows(min_row=2):  # Pular cabeçalho
-                cell = row[coluna_idx]
-                if cell.value == "S/DePara":
-                    cell.fill = yellow_fill
-        
-        # Salvar de volta no buffer
+        if linhas:
+            for idx, coluna in enumerate(colunas):
+                if str(coluna).endswith('_Codigo'):
+                    letra = get_column_letter(idx + 1)
+                    worksheet.conditional_formatting.add(
+                        f"{letra}2:{letra}{len(linhas) + 1}",
+                        CellIsRule(operator='equal', formula=['"S/DePara"'], fill=yellow_fill)
+                    )
+
+        worksheet.append(list(colunas))
+        for linha in linhas:
+            worksheet.append(linha)
+
         output = BytesIO()
         workbook.save(output)
         output.seek(0)
-        
-        logger.info(f"Arquivo Excel exportado com {len(registros)} registros e {len(colunas)} colunas")
+
+        logger.info(f"Arquivo Excel exportado com {len(linhas)} registros e {len(colunas)} colunas")
         return output
     
     except Exception as e:
@@ -86,4 +85,124 @@ def import_from_excel(arquivo):
     
     except Exception as e:
         logger.error(f"Erro ao importar do Excel: {str(e)}")
-        raise e
\ No newline at end of file
+        raise e
+
+
+# Textos tratados como nulos, os mesmos que o pd.read_excel reconhece por padrão
+VALORES_NULOS = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+}
+
+
+def _leitor_calamine():
+    if Config.IMPORTACAO_LEITOR not in ('auto', 'calamine'):
+        return None
+    try:
+        import python_calamine
+        return python_calamine
+    except ImportError:
+        if Config.IMPORTACAO_LEITOR == 'calamine':
+            logger.warning("python-calamine não instalado, usando openpyxl para ler planilhas")
+        return None
+
+
+class PlanilhaEmLotes:
+    """
+    Leitura da primeira aba de uma planilha em lotes de DataFrames, sem carregar o arquivo
+    inteiro no pandas: usa python-calamine quando instalado ou o openpyxl em modo read-only.
+
+    Equivale ao pd.read_excel que as importações usavam: cabeçalho na primeira linha,
+    linhas vazias no fim ignoradas, nulos do pandas (mais `na_values`) viram None e,
+    com texto=True (dtype=str), os valores vêm como texto. O índice de cada lote é o número
+    da linha no Excel, para as mensagens de erro.
+
+    colunas: cabeçalhos (lidos na criação); total: linhas entregues até agora
+    """
+
+    def __init__(self, arquivo, tamanho_lote=None, texto=True, na_values=()):
+        self.tamanho_lote = tamanho_lote or Config.IMPORTACAO_LOTE
+        self.texto = texto
+        self.nulos = VALORES_NULOS | set(na_values)
+        self.total = 0
+        self._workbook = None
+
+        calamine = _leitor_calamine()
+        if calamine is not None:
+            aba = calamine.CalamineWorkbook.from_filelike(arquivo).get_sheet_by_index(0)
+            self._linhas = iter(aba.iter_rows())
+        else:
+            self._workbook = load_workbook(arquivo, read_only=True, data_only=True)
+            aba = self._workbook.worksheets[0]
+            self._linhas = aba.iter_rows(values_only=True)
+
+        cabecalho = list(next(self._linhas, None) or [])
+        while cabecalho and cabecalho[-1] in (None, ''):
+            cabecalho.pop()
+        self.colunas = self._nomes_colunas(cabecalho)
+
+    @staticmethod
+    def _nomes_colunas(cabecalho):
+        """Nomes como o pandas dá: 'Unnamed: i' para vazios e sufixo .1, .2 em repetidos"""
+        nomes, vistos = [], {}
+        for i, nome in enumerate(cabecalho):
+            nome = f"Unnamed: {i}" if nome in (None, '') else str(nome)
+            if nome in vistos:
+                vistos[nome] += 1
+                nome = f"{nome}.{vistos[nome]}"
+            else:
+                vistos[nome] = 0
+            nomes.append(nome)
+        return nomes
+
+    def _valor(self, valor):
+        if valor is None:
+            return None
+        if isinstance(valor, str):
+            return None if valor in self.nulos else valor
+        if isinstance(valor, float):
+            if valor != valor:
+                return None
+            if valor.is_integer():
+                valor = int(valor)
+        if not self.texto:
+            return valor
+        return str(int(valor)) if isinstance(valor, bool) else str(valor)
+
+    def lotes(self):
+        """Gera DataFrames de até tamanho_lote linhas (índice = linha no Excel)"""
+        largura = len(self.colunas)
+        linha_excel = 1
+        valores, indice = [], []
+        vazias = []  # linhas vazias só entram se houver dados depois delas
+        try:
+            for linha in self._linhas:
+                linha_excel += 1
+                linha = [self._valor(v) for v in linha[:largura]]
+                if all(v is None for v in linha):
+                    vazias.append(linha_excel)
+                    continue
+                for numero in vazias:
+                    valores.append([None] * largura)
+                    indice.append(numero)
+                vazias = []
+                linha.extend([None] * (largura - len(linha)))
+                valores.append(linha)
+                indice.append(linha_excel)
+                if len(valores) >= self.tamanho_lote:
+                    yield self._lote(valores, indice)
+                    valores, indice = [], []
+            if valores:
+                yield self._lote(valores, indice)
+        finally:
+            self.fechar()
+
+    def _lote(self, valores, indice):
+        self.total += len(valores)
+        return pd.DataFrame(valores, columns=self.colunas, index=indice, dtype=object)
+
+    def fechar(self):
+        if self._workbook is not None:
+            self._workbook.close()
+            self._workbook = None
+
@@ -0,0 +1,117 @@
+import tempfile
+from itertools import chain, islice
+from flask import send_file
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles import PatternFill, Font
+from openpyxl.utils import get_column_letter
+from logger import logger
+from utils.catalogo_wf import situacao_codigo
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Linhas lidas do banco por fetchmany e linhas usadas para calcular a largura das colunas
+LOTE_EXPORTACAO = 2000
+AMOSTRA_LARGURA = 1000
+LARGURA_MAXIMA = 50
+
+FONTE_CABECALHO = Font(bold=True, color="FFFFFF")
+FUNDO_CABECALHO = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
+
+# Cores da coluna de código por situacao_codigo: vazio, S/DePara, existe no WF, não existe no WF
+LARANJA = PatternFill(start_color="FFA500", end_color="FFA500", fill_type="solid")
+AMARELO = PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid")
+VERDE = PatternFill(start_color="00FF00", end_color="00FF00", fill_type="solid")
+VERMELHO = PatternFill(start_color="FF0000", end_color="FF0000", fill_type="solid")
+_CORES_SITUACAO = {"vazio": LARANJA, "pendente": AMARELO, "valido": VERDE, "invalido": VERMELHO}
+
+
+def linhas_cursor(cursor, lote=LOTE_EXPORTACAO):
+    """Percorre o resultado do cursor em lotes (fetchmany), sem carregar tudo em memória"""
+    while True:
+        linhas = cursor.fetchmany(lote)
+        if not linhas:
+            break
+        yield from linhas
+
+
+def cor_codigo(valor, codigos_wf):
+    """Cor da célula de código conforme o valor e o catálogo WF"""
+    return _CORES_SITUACAO[situacao_codigo(valor, codigos_wf)]
+
+
+def gerar_planilha(linhas, cabecalhos, titulo, colunas_codigo=(), codigos_wf=None, limpar_texto=True):
+    """
+    Gera o .xlsx em modo write-only num arquivo temporário e devolve o arquivo no início.
+
+    linhas: iterável de sequências na ordem de `cabecalhos` (ex.: linhas_cursor(cursor))
+    colunas_codigo: índices (0-based) das colunas coloridas com cor_codigo
+    limpar_texto: remove espaços das pontas dos textos, como as exportações do grid
+
+    A memória fica constante: as larguras saem das primeiras AMOSTRA_LARGURA linhas e as
+    demais são gravadas conforme chegam.
+    """
+    codigos_wf = codigos_wf if codigos_wf is not None else []
+    colunas_codigo = set(colunas_codigo)
+    linhas = iter(linhas)
+
+    def texto(valor):
+        # Caracteres de controle (ex.: \x00, \x1A) não são aceitos pelo Excel
+        valor = ILLEGAL_CHARACTERS_RE.sub('', valor)
+        return valor.strip() if limpar_texto else valor
+
+    def valores(linha):
+        return [texto(v) if isinstance(v, str) else v for v in linha]
+
+    amostra = [valores(linha) for linha in islice(linhas, AMOSTRA_LARGURA)]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=titulo[:31])
+
+    larguras = [len(str(c)) for c in cabecalhos]
+    for linha in amostra:
+        for i, valor in enumerate(linha[:len(larguras)]):
+            if valor is not None:
+                larguras[i] = max(larguras[i], len(str(valor)))
+    for i, largura in enumerate(larguras, 1):
+        ws.column_dimensions[get_column_letter(i)].width = min(largura + 2, LARGURA_MAXIMA)
+
+    cabecalho = []
+    for nome in cabecalhos:
+        cell = WriteOnlyCell(ws, value=nome)
+        cell.font = FONTE_CABECALHO
+        cell.fill = FUNDO_CABECALHO
+        cabecalho.append(cell)
+    ws.append(cabecalho)
+
+    total = 0
+    for linha in chain(amostra, (valores(linha) for linha in linhas)):
+        if colunas_codigo:
+            for i in colunas_codigo:
+                if i < len(linha):
+                    cell = WriteOnlyCell(ws, value=linha[i])
+                    cell.fill = cor_codigo(linha[i], codigos_wf)
+                    linha[i] = cell
+        ws.append(linha)
+        total += 1
+
+    arquivo = tempfile.TemporaryFile()
+    try:
+        wb.save(arquivo)
+        arquivo.seek(0)
+    except Exception:
+        arquivo.close()
+        raise
+    logger.info(f"Planilha {titulo} gerada com {total} linhas")
+    return arquivo
+
+
+def enviar_planilha(arquivo, nome_arquivo):
+    """Resposta de download que transmite o arquivo em blocos e o apaga ao terminar"""
+    return send_file(
+        arquivo,
+        as_attachment=True,
+        download_name=nome_arquivo,
+        mimetype=XLSX_MIMETYPE
+    )
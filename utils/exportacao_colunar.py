@@ -0,0 +1,222 @@
+import csv
+import datetime
+import decimal
+import io
+import zlib
+from flask import Response, request, stream_with_context
+from logger import logger
+from utils.exportacao import LOTE_EXPORTACAO
+
+# formato -> (extensão, mimetype, compressões aceitas, compressão padrão)
+FORMATOS_COLUNARES = {
+    "csv": (".csv", "text/csv; charset=utf-8", ("gzip",), None),
+    "parquet": (".parquet", "application/vnd.apache.parquet", ("snappy", "zstd", "gzip"), "snappy"),
+    "arrow": (".arrows", "application/vnd.apache.arrow.stream", ("zstd", "lz4"), None),
+}
+
+_SEM_COMPRESSAO = ("", "nenhuma", "none")
+
+# Linhas por row group do Parquet (os lotes do cursor são pequenos demais para isso)
+LINHAS_GRUPO_PARQUET = 64000
+
+
+def formato_colunar():
+    """
+    Formato pedido em ?formato= quando não é a planilha: csv, parquet ou arrow.
+    Devolve None para xlsx (padrão); ValueError para formato desconhecido.
+    """
+    formato = (request.args.get("formato") or "xlsx").lower()
+    if formato == "xlsx":
+        return None
+    if formato not in FORMATOS_COLUNARES:
+        raise ValueError(f"Formato de exportação inválido: {formato}")
+    return formato
+
+
+def _pyarrow():
+    try:
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise ValueError("Exportação em Parquet/Arrow requer o pacote pyarrow")
+
+
+def _lotes(cursor):
+    while True:
+        linhas = cursor.fetchmany(LOTE_EXPORTACAO)
+        if not linhas:
+            break
+        yield linhas
+
+
+def _tipo_arrow(pa, descricao):
+    """Tipo Arrow da coluna a partir do cursor.description do pyodbc (texto quando incerto)"""
+    tipo, precisao, escala = descricao[1], descricao[4], descricao[5]
+    if tipo is bool:
+        return pa.bool_()
+    if tipo is int:
+        return pa.int64()
+    if tipo is float:
+        return pa.float64()
+    if tipo is decimal.Decimal and precisao and 0 < precisao <= 38:
+        return pa.decimal128(precisao, escala or 0)
+    if tipo is datetime.datetime:
+        return pa.timestamp("us")
+    if tipo is datetime.date:
+        return pa.date32()
+    if tipo is datetime.time:
+        return pa.time64("us")
+    if tipo in (bytes, bytearray):
+        return pa.binary()
+    return pa.string()
+
+
+def _esquema(pa, descricao, cabecalhos):
+    return pa.schema([pa.field(str(nome), _tipo_arrow(pa, d)) for nome, d in zip(cabecalhos, descricao)])
+
+
+def _lote_arrow(pa, esquema, linhas):
+    colunas = []
+    for i, campo in enumerate(esquema):
+        valores = [linha[i] for linha in linhas]
+        if pa.types.is_string(campo.type):
+            valores = [v if v is None or isinstance(v, str) else str(v) for v in valores]
+        colunas.append(pa.array(valores, type=campo.type))
+    return pa.RecordBatch.from_arrays(colunas, schema=esquema)
+
+
+class _SaidaContinua(io.RawIOBase):
+    """Destino de escrita que acumula os bytes até serem retirados, mantendo a posição total"""
+
+    def __init__(self):
+        self.partes = []
+        self.posicao = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        dados = bytes(dados)
+        self.partes.append(dados)
+        self.posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self.posicao
+
+    def retirar(self):
+        dados = b"".join(self.partes)
+        self.partes = []
+        return dados
+
+
+def _gerar_csv(cursor, cabecalhos, compressao):
+    compressor = zlib.compressobj(wbits=31) if compressao == "gzip" else None
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(cabecalhos)
+    total = 0
+    for linhas in _lotes(cursor):
+        escritor.writerows(linhas)
+        total += len(linhas)
+        dados = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        yield compressor.compress(dados) if compressor else dados
+    dados = buffer.getvalue().encode("utf-8")
+    if compressor:
+        dados = compressor.compress(dados) + compressor.flush()
+    if dados:
+        yield dados
+    return total
+
+
+def _gerar_arrow(cursor, cabecalhos, formato, compressao):
+    pa = _pyarrow()
+    esquema = _esquema(pa, cursor.description, cabecalhos)
+    saida = _SaidaContinua()
+    if formato == "parquet":
+        escritor = pa.parquet.ParquetWriter(saida, esquema, compression=compressao or "none")
+    else:
+        opcoes = pa.ipc.IpcWriteOptions(compression=compressao)
+        escritor = pa.ipc.new_stream(saida, esquema, options=opcoes)
+    total = 0
+    pendentes, acumuladas = [], 0
+    try:
+        for linhas in _lotes(cursor):
+            lote = _lote_arrow(pa, esquema, linhas)
+            total += len(linhas)
+            if formato == "parquet":
+                pendentes.append(lote)
+                acumuladas += len(linhas)
+                if acumuladas < LINHAS_GRUPO_PARQUET:
+                    continue
+                escritor.write_table(pa.Table.from_batches(pendentes))
+                pendentes, acumuladas = [], 0
+            else:
+                escritor.write_batch(lote)
+            dados = saida.retirar()
+            if dados:
+                yield dados
+        if pendentes:
+            escritor.write_table(pa.Table.from_batches(pendentes))
+    finally:
+        escritor.close()
+    dados = saida.retirar()
+    if dados:
+        yield dados
+    return total
+
+
+def resposta_colunar(cursor, cabecalhos, nome, formato=None, compressao=None):
+    """
+    Exporta o resultado do cursor em CSV, Parquet ou Arrow IPC (stream), transmitido
+    lote a lote (fetchmany) sem estilos, com colunas tipadas nos formatos Arrow.
+
+    cabecalhos: nomes das colunas (None: os do cursor)
+    formato/compressao: padrão ?formato= e ?compressao= (csv: gzip; parquet: snappy,
+    zstd, gzip; arrow: zstd, lz4; "nenhuma" desliga)
+
+    O cursor é lido e fechado durante o envio da resposta; a conexão da requisição só é
+    liberada ao final (stream_with_context).
+    """
+    formato = formato or formato_colunar()
+    if formato not in FORMATOS_COLUNARES:
+        raise ValueError(f"Formato de exportação inválido: {formato}")
+    extensao, mimetype, aceitas, padrao = FORMATOS_COLUNARES[formato]
+
+    if compressao is None:
+        compressao = request.args.get("compressao", padrao)
+    compressao = (compressao or "").lower()
+    if compressao in _SEM_COMPRESSAO:
+        compressao = None
+    elif compressao not in aceitas:
+        raise ValueError(f"Compressão inválida para {formato}: {compressao}")
+
+    cabecalhos = list(cabecalhos) if cabecalhos else [d[0] for d in cursor.description]
+    if formato == "csv":
+        gerador = _gerar_csv(cursor, cabecalhos, compressao)
+    else:
+        _pyarrow()
+        gerador = _gerar_arrow(cursor, cabecalhos, formato, compressao)
+
+    nome_arquivo = nome + extensao
+    if formato == "csv" and compressao == "gzip":
+        nome_arquivo += ".gz"
+        mimetype = "application/gzip"
+
+    def transmitir():
+        try:
+            total = yield from gerador
+            logger.info(f"Exportação {nome_arquivo} concluída com {total} linhas")
+        except Exception as e:
+            logger.error(f"Erro ao exportar {nome_arquivo}: {str(e)}")
+            raise
+        finally:
+            cursor.close()
+
+    return Response(
+        stream_with_context(transmitir()),
+        mimetype=mimetype,
+        headers={"Content-Disposition": f'attachment; filename="{nome_arquivo}"'},
+    )
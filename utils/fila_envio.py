@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.utils import secure_filename
+from config import Config
+from logger import logger
+from utils.data_processing import run_process_file_wrapper
+from utils.resultados_validacao import guardar_andamento, guardar_resultado, ler_andamento, ler_metadados
+
+# Validação dos arquivos do envio_arquivo fora da requisição: o upload é gravado em
+# disco, entra na fila e a página acompanha o progresso pelo id da tarefa.
+# No máximo Config.ENVIO_CONCORRENCIA arquivos são validados ao mesmo tempo; os demais
+# esperam na fila. O andamento fica em memória no processo que recebeu o upload e é
+# copiado (no máximo a cada _INTERVALO_ANDAMENTO segundos) para utils.resultados_validacao,
+# junto do resultado, para que qualquer processo responda pela tarefa.
+
+NA_FILA = "na_fila"
+PROCESSANDO = "processando"
+CONCLUIDO = "concluido"
+FALHOU = "falhou"
+
+# Campos da tarefa copiados para o andamento compartilhado
+_CAMPOS_ANDAMENTO = ("usuario", "arquivo", "status", "linhas", "erros", "fracao", "criada_em", "inicio", "fim", "mensagem")
+_INTERVALO_ANDAMENTO = 1.0
+
+_tarefas = {}
+_lock = threading.Lock()
+_executor = None
+
+
+def _obter_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=max(Config.ENVIO_CONCORRENCIA, 1), thread_name_prefix="validacao-envio"
+            )
+        return _executor
+
+
+def _pasta_envios():
+    pasta = os.path.join(Config.UPLOAD_FOLDER, "envio_arquivo")
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+
+def _gravar_andamento(tarefa):
+    try:
+        guardar_andamento(tarefa["id"], **{campo: tarefa[campo] for campo in _CAMPOS_ANDAMENTO})
+    except (OSError, ValueError) as e:
+        logger.warning(f"Não foi possível gravar o andamento da tarefa {tarefa['id']}: {e}")
+
+
+def enfileirar(arquivo, usuario, layout_columns_map, layouts_rules_map):
+    """Grava o upload (FileStorage) em disco, coloca a validação na fila e devolve o id da tarefa"""
+    limpar_tarefas_antigas()
+    tarefa_id = str(uuid.uuid4())
+    caminho = os.path.join(_pasta_envios(), f"{tarefa_id}_{secure_filename(arquivo.filename) or 'arquivo'}")
+    arquivo.save(caminho)
+
+    tarefa = {
+        "id": tarefa_id,
+        "usuario": usuario,
+        "arquivo": arquivo.filename,
+        "tamanho": os.path.getsize(caminho),
+        "status": NA_FILA,
+        "linhas": 0,
+        "erros": 0,
+        "fracao": 0.0,
+        "criada_em": time.time(),
+        "inicio": None,
+        "fim": None,
+        "mensagem": None,
+    }
+    with _lock:
+        _tarefas[tarefa_id] = tarefa
+    _gravar_andamento(tarefa)
+    _obter_executor().submit(_executar, tarefa, caminho, layout_columns_map, layouts_rules_map)
+    logger.info(f"Tarefa de validação {tarefa_id} na fila: {arquivo.filename} ({tarefa['tamanho']} bytes)")
+    return tarefa_id
+
+
+def _executar(tarefa, caminho, layout_columns_map, layouts_rules_map):
+    tarefa["inicio"] = time.time()
+    tarefa["status"] = PROCESSANDO
+    _gravar_andamento(tarefa)
+    gravado_em = time.monotonic()
+
+    def progresso(resumo, fracao):
+        nonlocal gravado_em
+        tarefa["linhas"] = resumo["linhas"]
+        tarefa["erros"] = resumo["erros"]
+        tarefa["fracao"] = fracao
+        if time.monotonic() - gravado_em >= _INTERVALO_ANDAMENTO:
+            _gravar_andamento(tarefa)
+            gravado_em = time.monotonic()
+
+    try:
+        with open(caminho, "rb") as arquivo:
+            resultado = run_process_file_wrapper(
+                arquivo,
+                layout_columns_map,
+                layouts_rules_map,
+                validar_nao_obrigatorios_flag=True,
+                nome_arquivo=tarefa["arquivo"],
+                progresso=progresso,
+            )
+        layout, amostra, df_errors, status, message, elapsed, resumo = resultado
+        guardar_resultado(
+            tarefa["id"],
+            df_errors,
+            amostra=amostra,
+            usuario=tarefa["usuario"],
+            arquivo=tarefa["arquivo"],
+            layout=layout,
+            status=status,
+            message=message,
+            elapsed=elapsed,
+            resumo=resumo,
+        )
+        tarefa.update(linhas=resumo["linhas"], erros=resumo["erros"], fracao=1.0)
+        tarefa["status"] = CONCLUIDO
+    except Exception as e:
+        logger.error(f"Erro na tarefa de validação {tarefa['id']}: {e}")
+        tarefa["mensagem"] = str(e)
+        tarefa["status"] = FALHOU
+    finally:
+        tarefa["fim"] = time.time()
+        _gravar_andamento(tarefa)
+        try:
+            os.remove(caminho)
+        except OSError as e:
+            logger.warning(f"Não foi possível remover o upload {caminho}: {e}")
+
+
+def obter_tarefa(tarefa_id, usuario):
+    """
+    Tarefa do usuário (None se não existir, tiver expirado ou for de outro usuário).
+    Se a tarefa é de outro processo, é montada a partir do resultado guardado ou, se
+    ainda não terminou, do último andamento gravado.
+    """
+    tarefa = _tarefas.get(tarefa_id)
+    if tarefa is None:
+        metadados = ler_metadados(tarefa_id)
+        andamento = ler_andamento(tarefa_id) if metadados is None else None
+        if andamento is not None and andamento.get("status") == CONCLUIDO:
+            # O resultado foi gravado entre as duas leituras
+            metadados, andamento = ler_metadados(tarefa_id), None
+        if andamento is not None:
+            tarefa = {"id": tarefa_id, **{campo: andamento.get(campo) for campo in _CAMPOS_ANDAMENTO}}
+        elif metadados is None:
+            return None
+        else:
+            resumo = metadados.get("resumo") or {}
+            tarefa = {
+                "id": tarefa_id,
+                "usuario": metadados.get("usuario"),
+                "arquivo": metadados.get("arquivo"),
+                "status": CONCLUIDO,
+                "linhas": resumo.get("linhas", 0),
+                "erros": resumo.get("erros", 0),
+                "fracao": 1.0,
+                "criada_em": metadados.get("criado_em"),
+                "inicio": None,
+                "fim": None,
+                "mensagem": None,
+                "decorrido": metadados.get("elapsed", 0.0),
+            }
+    if tarefa["usuario"] != usuario:
+        return None
+    return tarefa
+
+
+def progresso_tarefa(tarefa):
+    """Situação da tarefa para a consulta de progresso: linhas, erros, fração e ETA (segundos)"""
+    agora = time.time()
+    decorrido = (tarefa["fim"] or agora) - tarefa["inicio"] if tarefa["inicio"] else tarefa.get("decorrido", 0.0)
+    eta = None
+    if tarefa["status"] == PROCESSANDO and tarefa["fracao"] > 0:
+        eta = round(decorrido * (1 - tarefa["fracao"]) / tarefa["fracao"], 1)
+    with _lock:
+        na_frente = sum(
+            1 for t in _tarefas.values() if t["status"] == NA_FILA and t["criada_em"] < tarefa["criada_em"]
+        ) if tarefa["status"] == NA_FILA else 0
+    return {
+        "job_id": tarefa["id"],
+        "arquivo": tarefa["arquivo"],
+        "status": tarefa["status"],
+        "concluido": tarefa["status"] in (CONCLUIDO, FALHOU),
+        "linhas": tarefa["linhas"],
+        "erros": tarefa["erros"],
+        "percentual": round(tarefa["fracao"] * 100, 1),
+        "decorrido": round(decorrido, 1),
+        "eta": eta,
+        "na_frente": na_frente,
+        "mensagem": tarefa["mensagem"],
+    }
+
+
+def limpar_tarefas_antigas():
+    """Descarta tarefas concluídas há mais de Config.ENVIO_TAREFA_TTL segundos"""
+    limite = time.time() - Config.ENVIO_TAREFA_TTL
+    with _lock:
+        antigas = [k for k, t in _tarefas.items() if t["fim"] and t["fim"] < limite]
+        for k in antigas:
+            del _tarefas[k]
@@ -0,0 +1,414 @@
+import base64
+import datetime
+import decimal
+import json
+from itertools import chain
+from flask import request, session, jsonify, render_template
+from db.broker import conexao_projeto
+from logger import logger
+from utils.catalogo_wf import SITUACOES_PROBLEMA, pendente_sql, situacao_codigo
+from utils.dados_depara import TABELAS_DEPARA
+from utils.exportacao import gerar_planilha, linhas_cursor, enviar_planilha
+from utils.projeto_metadados import obter_banco_homo
+
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+
+# Tipos que podem ser ordenados/paginados e tipos pesquisados pela busca textual
+_TIPOS_NAO_ORDENAVEIS = {"text", "ntext", "image", "binary", "varbinary", "xml", "geography", "geometry"}
+_TIPOS_TEXTO = {"char", "varchar", "nchar", "nvarchar"}
+
+# nome da tabela (minúsculo) -> campo de código
+_CAMPO_CODIGO = {tabela.lower(): campo for tabela, campo in TABELAS_DEPARA.values()}
+# O grid de PessoaCodFabricante edita e colore ProdutoMarca_PessoaCodFabricante; o filtro
+# de problemas tem que olhar o mesmo campo
+_CAMPO_CODIGO["pessoacodfabricante_depara"] = "ProdutoMarca_PessoaCodFabricante"
+
+
+def _valor_cursor(valor):
+    """Valor serializável no cursor, que volta como parâmetro e o SQL Server converte"""
+    if isinstance(valor, datetime.datetime):
+        return valor.isoformat(timespec="milliseconds")
+    if isinstance(valor, (datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, decimal.Decimal):
+        return str(valor)
+    return valor
+
+
+def _codificar_cursor(valor_ordem, valor_chave):
+    texto = json.dumps([_valor_cursor(valor_ordem), _valor_cursor(valor_chave)])
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii")
+
+
+def _decodificar_cursor(cursor_texto):
+    try:
+        valor_ordem, valor_chave = json.loads(base64.urlsafe_b64decode(cursor_texto.encode("ascii")))
+        return valor_ordem, valor_chave
+    except Exception:
+        raise ValueError("Cursor de paginação inválido")
+
+
+def _escapar_like(texto):
+    return texto.replace("[", "[[]").replace("%", "[%]").replace("_", "[_]")
+
+
+def _colunas_tabela(cursor, tabela):
+    """[(coluna, tipo)] na ordem da tabela"""
+    cursor.execute(
+        "SELECT COLUMN_NAME, DATA_TYPE FROM INFORMATION_SCHEMA.COLUMNS "
+        "WHERE TABLE_NAME = ? ORDER BY ORDINAL_POSITION",
+        (tabela,),
+    )
+    return [(linha[0], linha[1].lower()) for linha in cursor.fetchall()]
+
+
+class _ConsultaGrade:
+    """
+    Interpreta a especificação do grid (projeção, status, busca, filtros por coluna e
+    ordenação) sobre uma tabela DePara e monta o SELECT correspondente. Usada pela página
+    JSON (consultar_grade) e pela exportação filtrada (exportar_grade).
+    """
+
+    def __init__(self, cursor, tabela, parametros, chave="id", codigos_validos=None):
+        self.tabela = tabela
+        self.codigos_validos = codigos_validos
+        colunas_tabela = _colunas_tabela(cursor, tabela)
+        if not colunas_tabela:
+            raise ValueError(f"Tabela {tabela} não encontrada")
+        por_nome = {nome.lower(): (nome, tipo) for nome, tipo in colunas_tabela}
+
+        def coluna(nome):
+            if str(nome).lower() not in por_nome:
+                raise ValueError(f"Coluna inválida: {nome}")
+            return por_nome[str(nome).lower()]
+
+        self.chave, _ = coluna(chave)
+        campo_codigo = _CAMPO_CODIGO.get(tabela.lower())
+        if campo_codigo and campo_codigo.lower() in por_nome:
+            self.campo_codigo = por_nome[campo_codigo.lower()][0]
+        else:
+            self.campo_codigo = None
+
+        # Projeção: a chave vai sempre (o grid edita por ela)
+        pedidas = parametros.get("colunas") or []
+        if isinstance(pedidas, str):
+            pedidas = pedidas.split(",")
+        pedidas = [str(c).strip() for c in pedidas if str(c).strip()]
+        self.projecao = [coluna(c)[0] for c in pedidas] if pedidas else [nome for nome, _ in colunas_tabela]
+        if self.chave not in self.projecao:
+            self.projecao.insert(0, self.chave)
+
+        self.ordem, tipo_ordem = coluna(parametros.get("ordem") or self.chave)
+        if tipo_ordem in _TIPOS_NAO_ORDENAVEIS:
+            raise ValueError(f"Coluna não ordenável: {self.ordem}")
+        self.descendente = str(parametros.get("direcao") or "asc").lower() == "desc"
+
+        self.filtros = []
+        self.valores = []
+
+        status = str(parametros.get("status") or "").lower()
+        if status and status not in ("pendente", "concluido", "problemas"):
+            raise ValueError(f"Status inválido: {status}")
+        if status and not self.campo_codigo:
+            raise ValueError(f"A tabela {tabela} não tem campo de código para filtrar por status")
+        if status == "pendente":
+            self.filtros.append(pendente_sql(self.campo_codigo))
+        elif status == "concluido":
+            self.filtros.append(f"NOT {pendente_sql(self.campo_codigo)}")
+        self.verificar_catalogo = status == "problemas" and codigos_validos is not None
+        if status == "problemas" and codigos_validos is None:
+            self.filtros.append(pendente_sql(self.campo_codigo))
+
+        codigo = parametros.get("codigo")
+        if codigo:
+            if not self.campo_codigo:
+                raise ValueError(f"A tabela {tabela} não tem campo de código")
+            self.filtros.append(f"[{self.campo_codigo}] = ?")
+            self.valores.append(codigo)
+
+        busca = str(parametros.get("busca") or "").strip()
+        if busca:
+            colunas_texto = [nome for nome, tipo in colunas_tabela if tipo in _TIPOS_TEXTO]
+            if colunas_texto:
+                self.filtros.append("(" + " OR ".join(f"[{c}] LIKE ?" for c in colunas_texto) + ")")
+                self.valores.extend([f"%{_escapar_like(busca)}%"] * len(colunas_texto))
+            else:
+                self.filtros.append("1 = 0")
+
+        # Filtros por coluna: {coluna: texto contido no valor}
+        filtros_coluna = parametros.get("filtros") or {}
+        if not isinstance(filtros_coluna, dict):
+            raise ValueError("Filtros por coluna inválidos")
+        for nome, texto in filtros_coluna.items():
+            texto = str(texto if texto is not None else "").strip()
+            if not texto:
+                continue
+            nome, tipo = coluna(nome)
+            if tipo in _TIPOS_NAO_ORDENAVEIS:
+                raise ValueError(f"Coluna não filtrável: {nome}")
+            expressao = f"[{nome}]" if tipo in _TIPOS_TEXTO else f"CAST([{nome}] AS NVARCHAR(4000))"
+            self.filtros.append(f"{expressao} LIKE ?")
+            self.valores.append(f"%{_escapar_like(texto)}%")
+
+        direcao = "DESC" if self.descendente else "ASC"
+        self.ordenacao = (
+            f"[{self.chave}] {direcao}" if self.ordem == self.chave
+            else f"[{self.ordem}] {direcao}, [{self.chave}] {direcao}"
+        )
+
+        self.selecionadas = list(self.projecao)
+        for extra in (self.ordem, self.campo_codigo if self.verificar_catalogo else None):
+            if extra and extra not in self.selecionadas:
+                self.selecionadas.append(extra)
+        self.indice_ordem = self.selecionadas.index(self.ordem)
+        self.indice_chave = self.selecionadas.index(self.chave)
+        self.indice_codigo = self.selecionadas.index(self.campo_codigo) if self.verificar_catalogo else None
+        self.indices_projecao = [self.selecionadas.index(c) for c in self.projecao]
+
+    def sql(self, posicao=None, quantidade=None):
+        """SELECT (e parâmetros) dos registros depois de `posicao`; sem `quantidade`, todos"""
+        condicoes, parametros_sql = list(self.filtros), list(self.valores)
+        if posicao is not None:
+            condicao, valores_posicao = _depois_de(self.ordem, self.chave, self.descendente, *posicao)
+            condicoes.append(condicao)
+            parametros_sql.extend(valores_posicao)
+        where = f" WHERE {' AND '.join(condicoes)}" if condicoes else ""
+        topo = f"TOP ({quantidade}) " if quantidade else ""
+        return (
+            f"SELECT {topo}{', '.join(f'[{c}]' for c in self.selecionadas)} "
+            f"FROM {self.tabela}{where} ORDER BY {self.ordenacao}",
+            parametros_sql,
+        )
+
+    def aceita(self, linha):
+        """status=problemas com catálogo: vazio, pendente ou código fora do catálogo WF"""
+        if not self.verificar_catalogo:
+            return True
+        return situacao_codigo(linha[self.indice_codigo], self.codigos_validos) in SITUACOES_PROBLEMA
+
+    def projetar(self, linha):
+        return [linha[i] for i in self.indices_projecao]
+
+
+def consultar_grade(cursor, tabela, parametros, chave="id", codigos_validos=None):
+    """
+    Uma página do grid de uma tabela DePara, sem carregar a tabela inteira.
+
+    Paginação por chave (keyset): a página seguinte começa depois do último registro
+    devolvido (ordem, chave), então o custo não cresce com a profundidade da página.
+
+    parametros (query string):
+        colunas   lista separada por vírgula (padrão: todas)
+        status    pendente | concluido | problemas (pendente ou código fora do catálogo WF)
+        busca     texto procurado (LIKE) nas colunas de texto
+        filtros   {coluna: texto contido no valor} (na query string: filtro.<coluna>=texto)
+        codigo    valor exato do campo de código
+        ordem     coluna de ordenação (padrão: a chave); direcao asc | desc
+        limite    registros por página (até LIMITE_MAXIMO)
+        apos      cursor devolvido em `proximo` pela página anterior
+
+    codigos_validos: códigos do catálogo WF (com `in` rápido), usado por status=problemas
+
+    Retorna {"colunas", "registros", "proximo"}; ValueError para parâmetros inválidos.
+    """
+    consulta = _ConsultaGrade(cursor, tabela, parametros, chave=chave, codigos_validos=codigos_validos)
+
+    try:
+        limite = int(parametros.get("limite") or LIMITE_PADRAO)
+    except ValueError:
+        raise ValueError("Limite inválido")
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+
+    def consultar(posicao, quantidade):
+        cursor.execute(*consulta.sql(posicao, quantidade))
+        return cursor.fetchall()
+
+    apos = parametros.get("apos")
+    posicao = _decodificar_cursor(apos) if apos else None
+
+    if not consulta.verificar_catalogo:
+        linhas = consultar(posicao, limite + 1)
+    else:
+        # "problemas" depende do catálogo WF (outro banco): filtra em memória, avançando
+        # em lotes pela mesma ordenação até completar a página
+        lote = max(limite * 2, 500)
+        linhas = []
+        while len(linhas) <= limite:
+            lidas = consultar(posicao, lote)
+            linhas.extend(linha for linha in lidas if consulta.aceita(linha))
+            if len(lidas) < lote:
+                break
+            posicao = (lidas[-1][consulta.indice_ordem], lidas[-1][consulta.indice_chave])
+
+    proximo = None
+    if len(linhas) > limite:
+        linhas = linhas[:limite]
+        ultima = linhas[-1]
+        proximo = _codificar_cursor(ultima[consulta.indice_ordem], ultima[consulta.indice_chave])
+
+    registros = [dict(zip(consulta.projecao, consulta.projetar(linha))) for linha in linhas]
+    return {"colunas": consulta.projecao, "registros": registros, "proximo": proximo}
+
+
+def exportar_grade(cursor, tabela, parametros, titulo, chave="id", codigos_validos=None, codigos_wf=None):
+    """
+    Exporta para .xlsx (gerar_planilha) os registros que atendem à mesma especificação do
+    grid (status, busca, filtros, ordem; sem paginação), lendo direto do banco em lotes.
+
+    parametros["cabecalhos"]: rótulos das colunas na ordem da projeção (os do grid);
+    se não baterem com a projeção, usa os nomes das colunas.
+
+    Retorna (arquivo, total); ValueError para parâmetros inválidos ou nenhum registro.
+    """
+    consulta = _ConsultaGrade(cursor, tabela, parametros, chave=chave, codigos_validos=codigos_validos)
+
+    # O grid mostra todas as colunas da tabela, inclusive a chave; sem colunas pedidas a
+    # projeção já é essa
+    cabecalhos = parametros.get("cabecalhos") or []
+    if not isinstance(cabecalhos, list) or len(cabecalhos) != len(consulta.projecao):
+        cabecalhos = list(consulta.projecao)
+
+    cursor.execute(*consulta.sql())
+    linhas = (consulta.projetar(linha) for linha in linhas_cursor(cursor) if consulta.aceita(linha))
+    primeira = next(linhas, None)
+    if primeira is None:
+        raise ValueError("Nenhum registro para exportar com o filtro atual")
+
+    total = 0
+
+    def contadas():
+        nonlocal total
+        for linha in chain([primeira], linhas):
+            total += 1
+            yield linha
+
+    colunas_codigo = [consulta.projecao.index(consulta.campo_codigo)] if consulta.campo_codigo in consulta.projecao else []
+    arquivo = gerar_planilha(contadas(), [str(c) for c in cabecalhos], titulo,
+                             colunas_codigo=colunas_codigo, codigos_wf=codigos_wf)
+    return arquivo, total
+
+
+def _depois_de(ordem, chave, descendente, valor_ordem, valor_chave):
+    """
+    Condição keyset para os registros depois de (valor_ordem, valor_chave), seguindo o
+    ORDER BY ordem, chave (o SQL Server põe NULLs antes no ASC e depois no DESC)
+    """
+    comparacao = "<" if descendente else ">"
+    if ordem == chave:
+        return f"[{chave}] {comparacao} ?", [valor_chave]
+    if valor_ordem is None:
+        nulos_seguintes = f"[{ordem}] IS NULL AND [{chave}] {comparacao} ?"
+        if descendente:
+            return f"({nulos_seguintes})", [valor_chave]
+        return f"([{ordem}] IS NOT NULL OR ({nulos_seguintes}))", [valor_chave]
+    seguintes = f"[{ordem}] {comparacao} ? OR ([{ordem}] = ? AND [{chave}] {comparacao} ?)"
+    if descendente:
+        seguintes += f" OR [{ordem}] IS NULL"
+    return f"({seguintes})", [valor_ordem, valor_ordem, valor_chave]
+
+
+def resposta_grade(tabela, obter_codigos_wf=None, chave="id", linhas=None):
+    """
+    Rota GET /dados dos blueprints: uma página do grid (consultar_grade) do projeto da
+    sessão em JSON. obter_codigos_wf(banco_homo) alimenta o filtro status=problemas e as
+    cores da coluna de código.
+
+    Com formato=linhas, a página vem em "html", renderizada pelo template `linhas` do
+    blueprint (as mesmas <tr> que a página do grid montava), no lugar de "registros".
+    """
+    if 'projeto_selecionado' not in session:
+        return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
+
+    projeto_selecionado = session['projeto_selecionado']
+    banco_usuario = projeto_selecionado.get('DadosGX')
+    if not banco_usuario:
+        return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'}), 400
+
+    parametros = request.args.to_dict()
+    parametros["filtros"] = {
+        nome[len("filtro."):]: valor for nome, valor in request.args.items() if nome.startswith("filtro.")
+    }
+    em_linhas = linhas is not None and parametros.get("formato") == "linhas"
+    problemas = (parametros.get("status") or "").lower() == "problemas"
+    codigos_wf = None
+    if obter_codigos_wf and (em_linhas or problemas):
+        banco_homo = obter_banco_homo(projeto_selecionado.get('ProjetoID'))
+        codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else None
+    codigos_validos = codigos_wf if problemas else None
+
+    conexao = conexao_projeto(banco_usuario)
+    if not conexao:
+        return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'}), 500
+
+    cursor = None
+    try:
+        cursor = conexao.cursor()
+        pagina = consultar_grade(cursor, tabela, parametros, chave=chave, codigos_validos=codigos_validos)
+        if em_linhas:
+            registros = pagina.pop("registros")
+            pagina["quantidade"] = len(registros)
+            # As cores das linhas usam o mesmo catálogo (e a mesma situacao_codigo) do filtro
+            pagina["html"] = render_template(
+                linhas, registros=registros, colunas=pagina["colunas"], codigos_wf=codigos_wf,
+                situacao_codigo=situacao_codigo,
+            )
+        return jsonify({'success': True, **pagina})
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao consultar o grid de {tabela}: {str(e)}")
+        return jsonify({'success': False, 'message': f'Erro ao consultar registros: {str(e)}'}), 500
+    finally:
+        if cursor is not None:
+            cursor.close()
+        conexao.close()
+
+
+def resposta_exportacao_grade(tabela, titulo, obter_codigos_wf=None, chave="id"):
+    """
+    Rota POST /exportar_filtrados dos blueprints: recebe só a especificação do filtro do
+    grid em JSON ({status, busca, filtros, ordem, direcao, colunas, cabecalhos}) e exporta
+    os registros do projeto da sessão direto do banco (exportar_grade).
+    """
+    if 'projeto_selecionado' not in session:
+        return jsonify({'success': False, 'message': 'Nenhum projeto selecionado'}), 400
+
+    projeto_selecionado = session['projeto_selecionado']
+    banco_usuario = projeto_selecionado.get('DadosGX')
+    if not banco_usuario:
+        return jsonify({'success': False, 'message': 'Banco não configurado para este projeto'}), 400
+
+    parametros = request.get_json(silent=True) or {}
+    if not isinstance(parametros, dict):
+        return jsonify({'success': False, 'message': 'Especificação de filtro inválida'}), 400
+
+    # Catálogo WF: cores da coluna de código e filtro status=problemas
+    codigos_wf = []
+    if obter_codigos_wf:
+        banco_homo = obter_banco_homo(projeto_selecionado.get('ProjetoID'))
+        codigos_wf = obter_codigos_wf(banco_homo) if banco_homo else []
+    codigos_validos = codigos_wf if obter_codigos_wf else None
+
+    conexao = conexao_projeto(banco_usuario)
+    if not conexao:
+        return jsonify({'success': False, 'message': f'Falha na conexão com o banco: {banco_usuario}'}), 500
+
+    cursor = None
+    try:
+        cursor = conexao.cursor()
+        arquivo, total = exportar_grade(cursor, tabela, parametros, titulo, chave=chave,
+                                        codigos_validos=codigos_validos, codigos_wf=codigos_wf)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        logger.error(f"Erro ao exportar {tabela} filtrada: {str(e)}")
+        return jsonify({'success': False, 'message': f'Erro na exportação: {str(e)}'}), 500
+    finally:
+        if cursor is not None:
+            cursor.close()
+        conexao.close()
+
+    resposta = enviar_planilha(arquivo, f"{titulo}.xlsx")
+    resposta.headers['X-Total-Registros'] = str(total)
+    return resposta
@@ -1,6 +1,10 @@
 import json
 import logging
-from typing import Tuple, Dict, Any
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Tuple, Dict, Any, Mapping
+
+from utils.data_validation import compilar_plano
 
 # Configuração básica de logging
 logging.basicConfig(level=logging.INFO)
@@ -330,15 +334,19 @@ LAYOUTS_RULES_JSON = """
 """
 
 
-def load_layout_configs() -> Tuple[Dict[str, Any], Dict[str, Any]]:
+@lru_cache(maxsize=None)
+def load_layout_configs() -> Tuple[Dict[str, Any], Mapping[str, tuple]]:
     """
     Carrega as configurações de colunas e regras de validação dos layouts
-    a partir de strings JSON.
+    a partir de strings JSON. As regras de cada layout são compiladas uma única
+    vez em um plano de validação (ver compilar_plano); o resultado fica em cache
+    e é o mesmo para todas as chamadas do processo.
 
     Returns:
-        Tuple contendo dois dicionários:
+        Tuple contendo:
             - layout_columns: Mapeamento de layouts para colunas.
-            - layouts_rules: Mapeamento de layouts para regras de validação.
+            - layouts_rules: Mapeamento somente leitura de layouts para planos
+              de validação (tuplas de RegraValidacao).
 
     Raises:
         Exception em caso de erro de sintaxe JSON.
@@ -350,6 +358,9 @@ def load_layout_configs() -> Tuple[Dict[str, Any], Dict[str, Any]]:
         missing_rules = [k for k in layout_columns if k not in layouts_rules]
         if missing_rules:
             logging.warning(f"Layouts sem regras de validação: {missing_rules}")
+        layouts_rules = MappingProxyType(
+            {layout: compilar_plano(regras) for layout, regras in layouts_rules.items()}
+        )
         logging.info("Configurações de layouts carregadas com sucesso do JSON.")
         return layout_columns, layouts_rules
     except json.JSONDecodeError as e:
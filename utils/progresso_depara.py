@@ -0,0 +1,309 @@
+import threading
+import time
+from config import Config
+from db.broker import conexao_controle, conexao_projeto
+from logger import logger
+from utils.catalogo_wf import pendente_sql
+from utils.dados_depara import TABELAS_DEPARA, obter_dados_tabelas
+
+# Resumo por projeto (no próprio banco DadosGX): uma linha por tabela DePara.
+# As escritas (update, update_batch, importar*) ajustam as contagens na mesma transação;
+# reconciliar_progresso recalcula tudo para corrigir desvios.
+TABELA_PROGRESSO = "ProgressoDePara"
+
+_SQL_CRIAR = f"""
+    IF OBJECT_ID('{TABELA_PROGRESSO}', 'U') IS NULL
+        CREATE TABLE {TABELA_PROGRESSO} (
+            Tabela NVARCHAR(128) NOT NULL PRIMARY KEY,
+            Qtd INT NOT NULL,
+            QtdPendente INT NOT NULL,
+            AtualizadoEm DATETIME NOT NULL DEFAULT GETDATE()
+        )
+"""
+
+_MAX_PARAMETROS = 2000
+
+# nome da tabela (minúsculo) -> (chave do dashboard, tabela, campo de código)
+_POR_TABELA = {tabela.lower(): (chave, tabela, campo) for chave, (tabela, campo) in TABELAS_DEPARA.items()}
+
+
+def _pendente_caso(campo_codigo):
+    """1 para registro pendente (pendente_sql), 0 para os demais: somado com SUM"""
+    return f"CASE WHEN {pendente_sql(campo_codigo)} THEN 1 ELSE 0 END"
+
+
+def _gravar(cursor, linhas):
+    """Grava (tabela, qtd, qtdPendente) no resumo, inserindo as que faltam"""
+    for tabela, qtd, qtd_pendente in linhas:
+        cursor.execute(
+            f"UPDATE {TABELA_PROGRESSO} SET Qtd = ?, QtdPendente = ?, AtualizadoEm = GETDATE() WHERE Tabela = ?",
+            (qtd, qtd_pendente, tabela),
+        )
+        if cursor.rowcount == 0:
+            cursor.execute(
+                f"INSERT INTO {TABELA_PROGRESSO} (Tabela, Qtd, QtdPendente) VALUES (?, ?, ?)",
+                (tabela, qtd, qtd_pendente),
+            )
+
+
+def _ler_resumo(cursor, conexao):
+    """
+    {tabela (minúsculo): (qtd, qtdPendente)} do resumo. Normalmente é só o SELECT; se a
+    tabela ainda não existe no banco, cria (uma vez) e lê de novo.
+    """
+    sql = f"SELECT Tabela, Qtd, QtdPendente FROM {TABELA_PROGRESSO}"
+    try:
+        cursor.execute(sql)
+    except Exception as e:
+        logger.info(f"Resumo de progresso indisponível ({e}), criando {TABELA_PROGRESSO}")
+        cursor.execute(_SQL_CRIAR)
+        conexao.commit()
+        cursor.execute(sql)
+    return {linha[0].lower(): (linha[1], linha[2]) for linha in cursor.fetchall()}
+
+
+def ler_progresso(banco_usuario, chaves):
+    """
+    Dados do dashboard ({chave: {qtd, qtdPendente, percentualConclusao}}) lidos do resumo.
+    Tabelas ainda sem linha no resumo são calculadas uma vez (obter_dados_tabelas) e gravadas.
+    """
+    chaves = [chave for chave in chaves if chave in TABELAS_DEPARA]
+    if not chaves or not banco_usuario:
+        return obter_dados_tabelas(banco_usuario, chaves)
+
+    conexao = conexao_projeto(banco_usuario)
+    if not conexao:
+        logger.error(f"Falha na conexão com o banco {banco_usuario} para ler o progresso")
+        return obter_dados_tabelas(banco_usuario, chaves)
+
+    cursor = None
+    try:
+        cursor = conexao.cursor()
+        resumo = _ler_resumo(cursor, conexao)
+
+        dados = {}
+        faltantes = []
+        for chave in chaves:
+            tabela = TABELAS_DEPARA[chave][0]
+            if tabela.lower() in resumo:
+                qtd, qtd_pendente = resumo[tabela.lower()]
+                percentual = ((qtd - qtd_pendente) / qtd * 100) if qtd > 0 else 0
+                dados[chave] = {
+                    "qtd": qtd,
+                    "qtdPendente": qtd_pendente,
+                    "percentualConclusao": round(percentual, 1),
+                }
+            else:
+                faltantes.append(chave)
+
+        if faltantes:
+            calculados = obter_dados_tabelas(banco_usuario, faltantes)
+            _gravar(cursor, [
+                (TABELAS_DEPARA[chave][0], calculados[chave]["qtd"], calculados[chave]["qtdPendente"])
+                for chave in faltantes
+            ])
+            conexao.commit()
+            dados.update(calculados)
+            logger.info(f"Progresso inicializado em {banco_usuario} para {len(faltantes)} tabelas")
+
+        return dados
+    except Exception as e:
+        logger.error(f"Erro ao ler o resumo de progresso de {banco_usuario}, calculando direto: {e}")
+        try:
+            conexao.rollback()
+        except Exception:
+            pass
+        return obter_dados_tabelas(banco_usuario, chaves)
+    finally:
+        if cursor is not None:
+            cursor.close()
+        conexao.close()
+
+
+def reconciliar_progresso(banco_usuario, chaves=None):
+    """
+    Recalcula o resumo a partir das tabelas DePara e corrige as linhas divergentes.
+    Retorna quantas linhas foram corrigidas (ou criadas).
+    """
+    chaves = list(TABELAS_DEPARA) if chaves is None else chaves
+    calculados = obter_dados_tabelas(banco_usuario, chaves)
+
+    conexao = conexao_projeto(banco_usuario)
+    if not conexao:
+        logger.error(f"Falha na conexão com o banco {banco_usuario} para reconciliar o progresso")
+        return 0
+
+    cursor = None
+    try:
+        cursor = conexao.cursor()
+        cursor.execute(_SQL_CRIAR)
+        cursor.execute(f"SELECT Tabela, Qtd, QtdPendente FROM {TABELA_PROGRESSO}")
+        resumo = {linha[0].lower(): (linha[1], linha[2]) for linha in cursor.fetchall()}
+
+        divergentes = []
+        for chave, dados in calculados.items():
+            tabela = TABELAS_DEPARA[chave][0]
+            atual = (dados["qtd"], dados["qtdPendente"])
+            if resumo.get(tabela.lower()) != atual:
+                divergentes.append((tabela, *atual))
+
+        _gravar(cursor, divergentes)
+        conexao.commit()
+        if divergentes:
+            logger.info(f"Progresso de {banco_usuario} reconciliado: {[d[0] for d in divergentes]}")
+        return len(divergentes)
+    except Exception as e:
+        logger.error(f"Erro ao reconciliar o progresso de {banco_usuario}: {e}")
+        try:
+            conexao.rollback()
+        except Exception:
+            pass
+        return 0
+    finally:
+        if cursor is not None:
+            cursor.close()
+        conexao.close()
+
+
+def recalcular_tabela(cursor, tabela):
+    """
+    Recalcula a linha de uma tabela no resumo dentro da transação do chamador
+    (usado após importações, que já percorrem a tabela inteira). Não faz commit.
+    """
+    info = _POR_TABELA.get(tabela.lower())
+    if not info:
+        return
+    _, tabela, campo_codigo = info
+    try:
+        cursor.execute(f"""
+            IF OBJECT_ID('{TABELA_PROGRESSO}', 'U') IS NOT NULL
+                MERGE {TABELA_PROGRESSO} AS p
+                USING (SELECT ? AS Tabela, COUNT(*) AS Qtd,
+                              ISNULL(SUM({_pendente_caso(campo_codigo)}), 0) AS QtdPendente
+                       FROM {tabela}) AS s
+                ON p.Tabela = s.Tabela
+                WHEN MATCHED THEN UPDATE SET Qtd = s.Qtd, QtdPendente = s.QtdPendente, AtualizadoEm = GETDATE()
+                WHEN NOT MATCHED THEN INSERT (Tabela, Qtd, QtdPendente) VALUES (s.Tabela, s.Qtd, s.QtdPendente);
+        """, (tabela,))
+    except Exception as e:
+        logger.warning(f"Não foi possível recalcular o progresso de {tabela}: {e}")
+
+
+class DeltaProgresso:
+    """
+    Ajuste incremental do resumo para edições de registros já existentes.
+
+    Criado antes do UPDATE: conta quantos dos ids estão pendentes; aplicar(), depois do
+    UPDATE e antes do commit, conta de novo e soma a diferença em QtdPendente.
+    Só consulta algo quando o campo de código da tabela está entre os campos alterados.
+
+    A primeira contagem trava as linhas (UPDLOCK) até o commit: duas edições simultâneas do
+    mesmo registro são serializadas, e a segunda já conta o estado gravado pela primeira.
+    """
+
+    def __init__(self, cursor, tabela, ids, campos, chave="id"):
+        self.cursor = cursor
+        self.chave = chave
+        info = _POR_TABELA.get(tabela.lower())
+        self.ativo = bool(info and ids and info[2] in campos)
+        if not self.ativo:
+            return
+        _, self.tabela, self.campo_codigo = info
+        self.ids = [str(i) for i in ids]
+        try:
+            self.antes = self._pendentes(travar=True)
+        except Exception as e:
+            logger.warning(f"Progresso de {self.tabela} não será ajustado: {e}")
+            self.ativo = False
+
+    def _pendentes(self, travar=False):
+        dica = " WITH (UPDLOCK, ROWLOCK)" if travar else ""
+        total = 0
+        for i in range(0, len(self.ids), _MAX_PARAMETROS):
+            parte = self.ids[i:i + _MAX_PARAMETROS]
+            self.cursor.execute(
+                f"SELECT ISNULL(SUM({_pendente_caso(self.campo_codigo)}), 0) FROM {self.tabela}{dica} "
+                f"WHERE [{self.chave}] IN ({', '.join('?' * len(parte))})",
+                parte,
+            )
+            linha = self.cursor.fetchone()
+            total += linha[0] if linha and linha[0] else 0
+        return total
+
+    def aplicar(self):
+        """Soma a variação de pendentes no resumo; não faz commit"""
+        if not self.ativo:
+            return
+        try:
+            delta = self._pendentes() - self.antes
+            if delta:
+                self.cursor.execute(f"""
+                    IF OBJECT_ID('{TABELA_PROGRESSO}', 'U') IS NOT NULL
+                        UPDATE {TABELA_PROGRESSO}
+                        SET QtdPendente = QtdPendente + ?, AtualizadoEm = GETDATE()
+                        WHERE Tabela = ?
+                """, (delta, self.tabela))
+        except Exception as e:
+            logger.warning(f"Não foi possível ajustar o progresso de {self.tabela}: {e}")
+
+
+def _bancos_projetos():
+    """DadosGX de todos os projetos que têm um configurado"""
+    conn = conexao_controle()
+    if not conn:
+        logger.error("Falha ao conectar ao banco principal para reconciliar o progresso")
+        return []
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT DISTINCT DadosGX FROM Projeto WHERE DadosGX IS NOT NULL AND DadosGX <> ''")
+        return [linha[0] for linha in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def reconciliar_todos(app):
+    """
+    Reconcilia o resumo de todos os projetos com DadosGX configurado.
+    Cada banco tem o seu app context: a conexão volta ao pool (teardown) antes do
+    próximo, em vez de todas ficarem presas em g até o fim do laço.
+    """
+    with app.app_context():
+        bancos = _bancos_projetos()
+    corrigidas = 0
+    for banco in bancos:
+        try:
+            with app.app_context():
+                corrigidas += reconciliar_progresso(banco)
+        except Exception as e:
+            logger.error(f"Erro ao reconciliar o progresso de {banco}: {e}")
+    return corrigidas
+
+
+_thread_reconciliacao = None
+_lock_reconciliacao = threading.Lock()
+
+
+def iniciar_reconciliacao_periodica(app):
+    """
+    Thread que a cada PROGRESSO_RECONCILIAR_INTERVALO segundos (0 desativa) corrige desvios
+    do resumo. Chamada explícita na inicialização; uma única thread por processo.
+    """
+    global _thread_reconciliacao
+    intervalo = Config.PROGRESSO_RECONCILIAR_INTERVALO
+    if intervalo <= 0:
+        return None
+
+    def executar():
+        while True:
+            time.sleep(intervalo)
+            try:
+                reconciliar_todos(app)
+            except Exception as e:
+                logger.error(f"Erro na reconciliação periódica do progresso: {e}")
+
+    with _lock_reconciliacao:
+        if _thread_reconciliacao is None:
+            _thread_reconciliacao = threading.Thread(target=executar, name="reconciliar-progresso", daemon=True)
+            _thread_reconciliacao.start()
+        return _thread_reconciliacao
@@ -0,0 +1,78 @@
+import threading
+import time
+from config import Config
+from db.broker import conexao_controle
+from logger import logger
+
+# ProjetoID -> (expira_em, metadados); escritas em Projeto chamam invalidar_projeto
+_cache = {}
+_lock = threading.Lock()
+
+
+def obter_metadados_projeto(projeto_id):
+    """
+    Retorna {ProjetoID, NomeProjeto, DadosGX, BancoHomo} do projeto, consultando o
+    banco de controle só quando a entrada não está em cache ou expirou (PROJETO_CACHE_TTL).
+    """
+    if not projeto_id:
+        return None
+
+    chave = str(projeto_id)
+    agora = time.monotonic()
+    with _lock:
+        entrada = _cache.get(chave)
+        if entrada and entrada[0] > agora:
+            return entrada[1]
+
+    conn = None
+    cursor = None
+    try:
+        conn = conexao_controle()
+        if not conn:
+            logger.error("Falha ao conectar ao banco principal para obter dados do projeto")
+            return None
+
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT ProjetoID, NomeProjeto, DadosGX, BancoHomo FROM Projeto WHERE ProjetoID = ?",
+            (projeto_id,),
+        )
+        resultado = cursor.fetchone()
+        if not resultado:
+            return None
+
+        metadados = {
+            "ProjetoID": resultado[0],
+            "NomeProjeto": resultado[1],
+            "DadosGX": resultado[2],
+            "BancoHomo": resultado[3],
+        }
+        with _lock:
+            _cache[chave] = (agora + Config.PROJETO_CACHE_TTL, metadados)
+        return metadados
+
+    except Exception as e:
+        logger.error(f"Erro ao obter dados do projeto {projeto_id}: {str(e)}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+
+def obter_banco_homo(projeto_id):
+    """Retorna o BancoHomo do projeto (ou None se não configurado)"""
+    metadados = obter_metadados_projeto(projeto_id)
+    if metadados and metadados["BancoHomo"]:
+        return metadados["BancoHomo"]
+    return None
+
+
+def invalidar_projeto(projeto_id=None):
+    """Remove o projeto do cache; sem argumento limpa o cache inteiro"""
+    with _lock:
+        if projeto_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(str(projeto_id), None)
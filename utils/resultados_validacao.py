@@ -0,0 +1,290 @@
+import importlib.util
+import json
+import os
+import time
+import pandas as pd
+from config import Config
+from logger import logger
+
+# Resultados da validação do envio_arquivo guardados em disco, legíveis por qualquer
+# processo da aplicação: <id>.json (metadados, resumo e amostra) e <id>.parquet com os
+# erros (pickle quando o pyarrow não está instalado). O .json é gravado por último e
+# marca o resultado como completo; a data de modificação dele é o último acesso (LRU).
+# Limites: Config.RESULTADOS_TTL segundos desde a criação e Config.RESULTADOS_MAX_MB no
+# total da pasta (os menos acessados saem primeiro).
+# Enquanto a validação roda, <id>.andamento guarda a situação da tarefa (fila, linhas,
+# erros, fração) para que o progresso possa ser consultado em qualquer processo.
+
+_EXTENSAO_ERROS = ".parquet" if importlib.util.find_spec("pyarrow") else ".pkl"
+_EXTENSAO_ANDAMENTO = ".andamento"
+
+# Linhas de erro lidas por vez ao percorrer um resultado (lotes_erros)
+LOTE_ERROS = 20000
+# Linhas por row group do Parquet de erros: uma página (pagina_erros) lê só os grupos que a contêm
+GRUPO_ERROS = 5000
+
+
+def _pasta():
+    pasta = Config.RESULTADOS_PASTA or os.path.join(Config.UPLOAD_FOLDER, "resultados_validacao")
+    os.makedirs(pasta, exist_ok=True)
+    return pasta
+
+
+def _base(resultado_id):
+    # O id vira nome de arquivo: só os caracteres de um uuid
+    if not resultado_id or not all(c.isalnum() or c == "-" for c in resultado_id):
+        raise ValueError(f"Id de resultado inválido: {resultado_id!r}")
+    return os.path.join(_pasta(), resultado_id)
+
+
+def _caminhos(resultado_id):
+    base = _base(resultado_id)
+    return base + ".json", base + _EXTENSAO_ERROS
+
+
+def _gravar_atomico(caminho, gravar):
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        gravar(temporario)
+        os.replace(temporario, caminho)
+    finally:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+def guardar_resultado(resultado_id, df_errors, amostra=None, **metadados):
+    """
+    Grava os erros e os metadados (valores serializáveis em JSON: usuario, layout,
+    status, resumo...) do resultado; amostra (DataFrame) vai junto nos metadados.
+    """
+    caminho_meta, caminho_erros = _caminhos(resultado_id)
+
+    def gravar_erros(caminho):
+        if _EXTENSAO_ERROS == ".parquet":
+            df_errors.to_parquet(caminho, index=False, row_group_size=GRUPO_ERROS)
+        else:
+            df_errors.to_pickle(caminho)
+
+    _gravar_atomico(caminho_erros, gravar_erros)
+
+    metadados["criado_em"] = time.time()
+    metadados["total_erros_guardados"] = len(df_errors)
+    if amostra is not None:
+        metadados["amostra"] = {
+            "colunas": [str(c) for c in amostra.columns],
+            "linhas": amostra.astype(object).where(amostra.notna(), None).values.tolist(),
+        }
+
+    def gravar_meta(caminho):
+        with open(caminho, "w", encoding="utf-8") as f:
+            json.dump(metadados, f, ensure_ascii=False, default=str)
+
+    _gravar_atomico(caminho_meta, gravar_meta)
+    limpar_resultados()
+
+
+def ler_metadados(resultado_id):
+    """Metadados do resultado (None se não existir ou tiver expirado); conta como acesso"""
+    try:
+        caminho_meta, _ = _caminhos(resultado_id)
+        with open(caminho_meta, encoding="utf-8") as f:
+            metadados = json.load(f)
+    except (ValueError, OSError):
+        return None
+    if time.time() - metadados.get("criado_em", 0) > Config.RESULTADOS_TTL:
+        remover_resultado(resultado_id)
+        return None
+    try:
+        os.utime(caminho_meta)
+    except OSError:
+        pass
+    return metadados
+
+
+def guardar_andamento(resultado_id, **situacao):
+    """Grava a situação (serializável em JSON) da tarefa ainda sem resultado"""
+    caminho = _base(resultado_id) + _EXTENSAO_ANDAMENTO
+
+    def gravar(temporario):
+        with open(temporario, "w", encoding="utf-8") as f:
+            json.dump(situacao, f, ensure_ascii=False, default=str)
+
+    _gravar_atomico(caminho, gravar)
+
+
+def ler_andamento(resultado_id):
+    """Última situação gravada por guardar_andamento (None se não existir ou tiver expirado)"""
+    try:
+        caminho = _base(resultado_id) + _EXTENSAO_ANDAMENTO
+        if time.time() - os.path.getmtime(caminho) > Config.RESULTADOS_TTL:
+            return None
+        with open(caminho, encoding="utf-8") as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return None
+
+
+def ler_amostra(metadados):
+    """DataFrame da amostra guardada nos metadados (vazio se não houver)"""
+    amostra = metadados.get("amostra")
+    if not amostra:
+        return pd.DataFrame()
+    return pd.DataFrame(amostra["linhas"], columns=amostra["colunas"])
+
+
+def _filtrar(erros, coluna=None, regra=None):
+    if coluna:
+        erros = erros[erros["Coluna"] == coluna]
+    if regra and "Regra" in erros.columns:
+        erros = erros[erros["Regra"] == regra]
+    return erros
+
+
+def pagina_erros(resultado_id, inicio, quantidade, coluna=None, regra=None):
+    """
+    (total, DataFrame) com até `quantidade` erros a partir da posição `inicio` entre os
+    erros do resultado (filtrados por coluna/regra); None se o resultado não existir.
+    No Parquet, o filtro lê só as colunas Coluna/Regra de cada row group e as linhas
+    completas vêm apenas dos row groups que contêm a página.
+    """
+    try:
+        _, caminho_erros = _caminhos(resultado_id)
+        if _EXTENSAO_ERROS != ".parquet":
+            erros = _filtrar(pd.read_pickle(caminho_erros), coluna, regra)
+            return len(erros), erros.iloc[inicio:inicio + quantidade].reset_index(drop=True)
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.parquet as pq
+        arquivo = pq.ParquetFile(caminho_erros)
+    except (ValueError, OSError):
+        return None
+
+    try:
+        nomes = arquivo.schema_arrow.names
+        # Mesmo critério do _filtrar: sem a coluna Regra (resultados antigos), a regra é ignorada
+        filtros = [
+            (nome, valor) for nome, valor in (("Coluna", coluna), ("Regra", regra))
+            if valor and (nome == "Coluna" or nome in nomes)
+        ]
+
+        # Linhas do filtro em cada row group (máscara None = todas as linhas do grupo)
+        grupos = []
+        for i in range(arquivo.num_row_groups):
+            if not filtros:
+                grupos.append((arquivo.metadata.row_group(i).num_rows, None))
+                continue
+            tabela = arquivo.read_row_group(i, columns=[nome for nome, _ in filtros])
+            mascara = None
+            for nome, valor in filtros:
+                igual = pc.equal(pc.cast(tabela.column(nome), pa.string()), valor)
+                mascara = igual if mascara is None else pc.and_(mascara, igual)
+            grupos.append((pc.sum(mascara).as_py() or 0, mascara))
+
+        partes = []
+        posicao = 0
+        fim = inicio + quantidade
+        for i, (linhas, mascara) in enumerate(grupos):
+            if posicao < fim and posicao + linhas > inicio:
+                tabela = arquivo.read_row_group(i)
+                if mascara is not None:
+                    tabela = tabela.filter(mascara)
+                desde = max(inicio - posicao, 0)
+                partes.append(tabela.slice(desde, min(fim, posicao + linhas) - posicao - desde))
+            posicao += linhas
+
+        if partes:
+            erros = pa.concat_tables(partes).to_pandas()
+        else:
+            erros = arquivo.schema_arrow.empty_table().to_pandas()
+    finally:
+        arquivo.close()
+    return posicao, erros
+
+
+def lotes_erros(resultado_id, coluna=None, regra=None, tamanho=LOTE_ERROS):
+    """
+    Percorre os erros do resultado em DataFrames de até `tamanho` linhas (filtrados por
+    coluna/regra), lendo o Parquet por partes. Sem resultado, não produz nada.
+    """
+    try:
+        _, caminho_erros = _caminhos(resultado_id)
+        if _EXTENSAO_ERROS == ".parquet":
+            import pyarrow.parquet as pq
+            arquivo = pq.ParquetFile(caminho_erros)
+        else:
+            arquivo = pd.read_pickle(caminho_erros)
+    except (ValueError, OSError):
+        return
+    if _EXTENSAO_ERROS == ".parquet":
+        lotes = (lote.to_pandas() for lote in arquivo.iter_batches(batch_size=tamanho))
+    else:
+        lotes = (arquivo.iloc[i:i + tamanho] for i in range(0, len(arquivo), tamanho))
+    try:
+        for lote in lotes:
+            lote = _filtrar(lote, coluna, regra)
+            if not lote.empty:
+                yield lote
+    finally:
+        if _EXTENSAO_ERROS == ".parquet":
+            arquivo.close()
+
+
+def remover_resultado(resultado_id):
+    for caminho in (*_caminhos(resultado_id), _base(resultado_id) + _EXTENSAO_ANDAMENTO):
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+
+
+def limpar_resultados():
+    """Remove resultados expirados e, acima do limite de tamanho, os acessados há mais tempo"""
+    agora = time.time()
+    resultados = {}
+    for entrada in os.scandir(_pasta()):
+        resultado_id, extensao = os.path.splitext(entrada.name)
+        try:
+            info = entrada.stat()
+            if extensao == ".tmp":
+                # Gravação interrompida (processo morto no meio)
+                if agora - info.st_mtime > Config.RESULTADOS_TTL:
+                    os.remove(entrada.path)
+                continue
+            if extensao not in (".json", _EXTENSAO_ERROS, _EXTENSAO_ANDAMENTO):
+                continue
+            item = resultados.setdefault(
+                resultado_id, {"tamanho": 0, "modificado": 0, "acesso": None, "criado_em": None}
+            )
+            item["tamanho"] += info.st_size
+            item["modificado"] = max(item["modificado"], info.st_mtime)
+            if extensao == ".json":
+                item["acesso"] = info.st_mtime
+                with open(entrada.path, encoding="utf-8") as f:
+                    item["criado_em"] = json.load(f).get("criado_em", 0)
+        except FileNotFoundError:
+            continue  # removido por outro processo durante a varredura
+        except (ValueError, OSError):
+            pass
+
+    removidos = 0
+    for resultado_id, item in list(resultados.items()):
+        # Sem .json (gravação em andamento ou restos) vale a data dos arquivos
+        criado_em = item["criado_em"] if item["criado_em"] is not None else item["modificado"]
+        if agora - criado_em > Config.RESULTADOS_TTL:
+            remover_resultado(resultado_id)
+            del resultados[resultado_id]
+            removidos += 1
+
+    limite = Config.RESULTADOS_MAX_MB * 1024 * 1024
+    total = sum(item["tamanho"] for item in resultados.values())
+    completos = sorted((item["acesso"], k) for k, item in resultados.items() if item["acesso"] is not None)
+    # O acessado por último fica sempre, mesmo maior que o limite
+    for _, resultado_id in completos[:-1]:
+        if total <= limite:
+            break
+        total -= resultados[resultado_id]["tamanho"]
+        remover_resultado(resultado_id)
+        removidos += 1
+
+    if removidos:
+        logger.info(f"Resultados de validação removidos: {removidos} (pasta com {total // 1024} KB)")
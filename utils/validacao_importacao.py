@@ -0,0 +1,154 @@
+import numpy as np
+import pandas as pd
+
+# Quantos erros entram no texto da resposta (a lista completa vai em 'erros')
+ERROS_NA_MENSAGEM = 10
+
+# Junta as partes de um código de origem composto
+_SEPARADOR = '\x1f'
+
+
+def texto_limpo(serie):
+    """Strip nos textos da coluna; vazios e nulos viram None, outros tipos ficam como estão"""
+    serie = serie.astype(object)
+    try:
+        limpos = serie.str.strip()
+    except AttributeError:
+        return serie.where(serie.notna(), None)
+    serie = serie.where(limpos.isna(), limpos)
+    return serie.where(serie.notna() & (serie != ''), None)
+
+
+def _inteiros(serie):
+    """
+    Conversão da coluna (já limpa) para int como o antigo safe_convert_id: nos textos
+    ficam só dígitos, ponto e sinal; decimais são truncados. Devolve (inteiros, inválidos),
+    onde inválidos marca valores preenchidos que não puderam ser convertidos.
+    """
+    numeros = pd.to_numeric(serie, errors='coerce')
+    falhas = numeros.isna() & serie.notna()
+    if falhas.any():
+        # Só os valores que não são números simples passam pela limpeza de caracteres
+        digitos = serie[falhas].astype(str).str.replace(r'[^\d.\-]', '', regex=True)
+        numeros[falhas] = pd.to_numeric(digitos.where(~digitos.isin(['', '.', '-']), None), errors='coerce')
+    invalidos = numeros.isna() & serie.notna()
+    inteiros = np.trunc(numeros.astype(float)).astype('Int64')
+    return pd.Series(inteiros.to_numpy(dtype=object, na_value=None), index=serie.index), invalidos
+
+
+class ValidacaoImportacao:
+    """
+    Normalização e pré-validação coluna a coluna das planilhas de importação, antes
+    de qualquer gravação: cada lote da PlanilhaEmLotes vira um DataFrame com as colunas
+    do banco e todas as linhas com problema são anotadas (sem parar na primeira).
+
+    mapeamento: coluna da planilha -> coluna do banco (vale a primeira presente)
+    chave: coluna inteira obrigatória e única (None para não validar)
+    codigo: coluna do código de origem, que não pode se repetir entre IDs diferentes
+    (lista para código composto, ex.: código + empresa; só conta com o código preenchido)
+    obrigatorias: colunas do banco que precisam estar preenchidas em toda linha
+    inteiros: colunas convertidas para int (valores inválidos viram None)
+    primeiro_preenchido: usa o primeiro valor não nulo entre as colunas mapeadas e, em
+    último caso, a coluna da planilha com o próprio nome do banco
+
+    Repetições são detectadas também entre lotes; erros traz as mensagens com a linha
+    do Excel.
+    """
+
+    def __init__(self, mapeamento, colunas_banco, colunas_excel, chave='id', codigo=None,
+                 obrigatorias=(), inteiros=(), primeiro_preenchido=False):
+        self.colunas_banco = list(colunas_banco)
+        self.chave = chave
+        self.codigo = [codigo] if isinstance(codigo, str) else list(codigo or [])
+        self.obrigatorias = list(obrigatorias)
+        self.inteiros = [c for c in inteiros if c != chave]
+        self.erros = []
+        self._linhas = []
+        self._chaves_vistas = {}
+        self._codigos_vistos = {}
+
+        self._origens = {}
+        self._rotulos = {}
+        for coluna_banco in self.colunas_banco:
+            candidatas = [p for p, b in mapeamento.items() if b == coluna_banco and p in colunas_excel]
+            if primeiro_preenchido and coluna_banco in colunas_excel and coluna_banco not in candidatas:
+                candidatas.append(coluna_banco)
+            elif not primeiro_preenchido:
+                candidatas = candidatas[:1]
+            self._origens[coluna_banco] = candidatas
+            rotulos = [p for p, b in mapeamento.items() if b == coluna_banco]
+            self._rotulos[coluna_banco] = rotulos[0] if rotulos else coluna_banco
+
+    def preparar(self, df):
+        """DataFrame do lote com as colunas do banco, limpas e convertidas (índice = linha no Excel)"""
+        dados = {}
+        for coluna_banco, candidatas in self._origens.items():
+            serie = pd.Series(np.full(len(df), None, dtype=object), index=df.index)
+            for coluna_planilha in candidatas:
+                serie = serie.where(serie.notna(), texto_limpo(df[coluna_planilha]))
+            dados[coluna_banco] = serie
+        registros = pd.DataFrame(dados, index=df.index, columns=self.colunas_banco)
+
+        for coluna in self.inteiros:
+            registros[coluna] = _inteiros(registros[coluna])[0]
+
+        repetidas = pd.Series(False, index=df.index)
+        if self.chave:
+            original = registros[self.chave]
+            registros[self.chave], invalidos = _inteiros(original)
+            rotulo = self._rotulos[self.chave]
+            for linha, valor in original[invalidos].items():
+                self._anotar(linha, f"Linha {linha}: {rotulo} inválido ({valor})")
+            for linha in df.index[registros[self.chave].isna() & ~invalidos]:
+                self._anotar(linha, f"Linha {linha}: registro sem {rotulo} válido")
+            repetidas = self._repetidos(registros[self.chave], self._chaves_vistas, rotulo)
+
+        for coluna in self.obrigatorias:
+            rotulo = self._rotulos[coluna]
+            for linha in df.index[registros[coluna].isna()]:
+                self._anotar(linha, f"Linha {linha}: {rotulo} não preenchido")
+
+        if self.codigo:
+            codigos = registros[self.codigo[0]]
+            for coluna in self.codigo[1:]:
+                # Código composto (ex.: por empresa/origem); partes vazias contam como ''
+                parte = registros[coluna].where(registros[coluna].notna(), '').astype(str)
+                codigos = (codigos.astype(str) + _SEPARADOR + parte).where(codigos.notna(), None)
+            self._repetidos(codigos, self._codigos_vistos, self._rotulos[self.codigo[0]], ignorar=repetidas)
+
+        return registros
+
+    def _repetidos(self, valores, vistos, rotulo, ignorar=None):
+        """Anota valores já vistos (neste lote ou em lotes anteriores); devolve a máscara das repetidas"""
+        validos = valores.dropna()
+        repetidas = pd.Series(False, index=valores.index)
+        if validos.empty:
+            return repetidas
+        linhas = pd.Series(validos.index, index=validos.index)
+        primeira = validos.map(vistos.get).fillna(linhas.groupby(validos.values, sort=False).transform('first'))
+        novas = primeira == linhas
+        vistos.update(zip(validos[novas].tolist(), linhas[novas].tolist()))
+        repetidas[validos.index] = ~novas
+        anotar = ~novas if ignorar is None else ~novas & ~ignorar[validos.index]
+        for linha, valor, anterior in zip(linhas[anotar], validos[anotar], primeira[anotar]):
+            valor = str(valor).replace(_SEPARADOR, ' / ')
+            self._anotar(linha, f"Linha {linha}: {rotulo} {valor} repetido (já aparece na linha {int(anterior)})")
+        return repetidas
+
+    def _anotar(self, linha, mensagem):
+        self._linhas.append(linha)
+        self.erros.append(mensagem)
+
+    def ordenar(self):
+        """Erros em ordem de linha (dentro de cada lote eles saem agrupados por regra)"""
+        ordem = sorted(range(len(self.erros)), key=self._linhas.__getitem__)
+        self.erros = [self.erros[i] for i in ordem]
+        self._linhas = [self._linhas[i] for i in ordem]
+
+    def mensagem(self):
+        """Texto da resposta com os primeiros erros e o total"""
+        self.ordenar()
+        texto = f"Importação cancelada, {len(self.erros)} erro(s) na planilha: " + "; ".join(self.erros[:ERROS_NA_MENSAGEM])
+        if len(self.erros) > ERROS_NA_MENSAGEM:
+            texto += f"; ... e mais {len(self.erros) - ERROS_NA_MENSAGEM}"
+        return texto